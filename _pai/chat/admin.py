@@ -1,3 +1,81 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
-# Register your models here.
+from .models import RequestTrace
+
+
+def _flatten_spans(node, depth=0):
+    """
+    span 트리를 (깊이, span, 자기 시간 ms) 목록으로 펼칩니다. 자기 시간 = 자신 - 자식 합 (병렬 자식이면 0 으로 자름)
+    """
+    children = node.get("children", [])
+    self_ms = max(0.0, node["duration_ms"] - sum(child["duration_ms"] for child in children))
+    rows = [(depth, node, self_ms)]
+    for child in children:
+        rows.extend(_flatten_spans(child, depth + 1))
+    return rows
+
+
+def _format_attrs(node):
+    attrs = ", ".join(f"{k}={v}" for k, v in node.get("attrs", {}).items() if v is not None)
+    return f"{attrs} ⚠ {node['error']}" if node.get("error") else attrs
+
+
+@admin.register(RequestTrace)
+class RequestTraceAdmin(admin.ModelAdmin):
+    list_display = ("trace_id", "created_at", "name", "history_id", "status", "duration_ms", "span_count")
+    list_filter = ("status", "name")
+    search_fields = ("history_id",)
+    ordering = ("-trace_id",)
+    readonly_fields = (
+        "trace_id", "name", "history_id", "status", "duration_ms", "span_count", "created_at",
+        "slowest_spans", "span_tree",
+    )
+    exclude = ("tree",)
+
+    # 기록 전용 (요청 처리 중에만 생성)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="자기 시간 상위 span")
+    def slowest_spans(self, obj):
+        rows = sorted(_flatten_spans(obj.tree), key=lambda row: row[2], reverse=True)[:8]
+        return format_html(
+            "<table><tr><th>span</th><th>자기 시간(ms)</th><th>전체(ms)</th><th>정보</th></tr>{}</table>",
+            format_html_join(
+                "",
+                "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>",
+                (
+                    (node["name"], f"{self_ms:.1f}", f"{node['duration_ms']:.1f}", _format_attrs(node))
+                    for _, node, self_ms in rows
+                ),
+            ),
+        )
+
+    @admin.display(description="span 트리")
+    def span_tree(self, obj):
+        total = max(obj.tree["duration_ms"], 1e-9)
+        rows = []
+        for depth, node, self_ms in _flatten_spans(obj.tree):
+            left = 100.0 * node["start_ms"] / total
+            width = max(0.3, 100.0 * node["duration_ms"] / total)
+            color = "#d9534f" if node.get("error") else "#5b8def"
+            rows.append((
+                depth * 18, node["name"], f"{node['start_ms']:.1f}", f"{node['duration_ms']:.1f}", f"{self_ms:.1f}",
+                f"{left:.2f}", f"{min(width, 100.0 - left):.2f}", color, _format_attrs(node),
+            ))
+        return format_html(
+            "<table style='width:100%'><tr><th>span</th><th>시작(ms)</th><th>소요(ms)</th>"
+            "<th>자기(ms)</th><th style='width:35%'>타임라인</th><th>정보</th></tr>{}</table>",
+            format_html_join(
+                "",
+                "<tr><td style='padding-left:{}px;white-space:nowrap'>{}</td><td>{}</td><td>{}</td>"
+                "<td>{}</td><td><div style='position:relative;height:12px;background:#eee'>"
+                "<div style='position:absolute;left:{}%;width:{}%;height:12px;background:{}'></div>"
+                "</div></td><td>{}</td></tr>",
+                rows,
+            ),
+        )
@@ -1,5 +1,63 @@
+import os
+import sys
+import threading
+import time
+
 from django.apps import AppConfig
 
+# ✅ 상수 설정
+# 서빙 프로세스 시작 시 모델/인덱스/그래프 미리 로드
+#   "1": 시작 시 동기로 로드 (gunicorn 등 — 로드가 끝나야 요청을 받음)
+#   "background": 백그라운드 스레드에서 로드 (시작은 바로, 첫 요청이 로드 중이면 그만큼 대기)
+#   "0": 끄기 (첫 요청 시 로드)
+# 설정이 없으면 runserver 의 실제 서빙 프로세스에서만 background 로 동작하고,
+# migrate / shell 같은 다른 manage.py 명령은 아무것도 로드하지 않습니다.
+# gunicorn --preload 와 함께 "1" 을 쓰면 master 에서 로드한 뒤 워커로 fork 됩니다.
+# 임베딩/결과 캐시의 SQLite 연결, 결과 캐시 owner, 마이크로 배치 워커 스레드는 fork 후 각 워커에서 새로 만들어지지만,
+# "background" 는 로드 중인 스레드가 fork 시점의 잠금을 쥐고 있을 수 있으므로 --preload 와 함께 쓰지 마세요.
+PAI_WARMUP = os.getenv("PAI_WARMUP")
+
+
+def _warmup_mode():
+    if PAI_WARMUP is not None:
+        return PAI_WARMUP
+    if "runserver" in sys.argv and os.environ.get("RUN_MAIN") == "true":
+        return "background"
+    return "0"
+
+
+def warm_up():
+    """
+    검색 리소스(검색 서버를 쓰지 않는 경우)와 LLM 그래프를 로드하고 단계별 소요 시간(초)을 반환합니다.
+    """
+    from llm_module import main, retrieval_service
+    from llm_module.total_tools import RETRIEVAL_SERVER_SOCKET
+
+    timings = {}
+    if not RETRIEVAL_SERVER_SOCKET:
+        timings.update(retrieval_service.warm_up())
+    timings.update(main.warm_up())
+    return timings
+
+
+def _run_warm_up():
+    started = time.perf_counter()
+    try:
+        timings = warm_up()
+    except Exception as e:
+        # 로드 실패는 첫 요청에서 다시 시도되며 그때 오류가 드러남
+        print(f"[warm-up] 실패: {type(e).__name__}: {e}", file=sys.stderr)
+        return
+    detail = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items())
+    print(f"[warm-up] 완료 ({time.perf_counter() - started:.1f}s): {detail}", file=sys.stderr)
+
 
 class ChatConfig(AppConfig):
     name = "chat"
+
+    def ready(self):
+        mode = _warmup_mode()
+        if mode == "1":
+            _run_warm_up()
+        elif mode == "background":
+            threading.Thread(target=_run_warm_up, name="pai-warm-up", daemon=True).start()
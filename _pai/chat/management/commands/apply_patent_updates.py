@@ -0,0 +1,113 @@
+import os
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.collection_versions import VersionFile, version_file_path
+from llm_module.incremental import apply_patent_updates
+from llm_module.ingest import (
+    COLLECTION_PRESETS,
+    ENCODE_BATCH_SIZE,
+    iter_source_rows,
+    load_ingest_encoder,
+    to_record,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "새/변경된 특허의 청구항(JSONL/CSV, ingest_collection 과 같은 형식)과 삭제할 출원번호를 "
+        "patent_claims 컬렉션, BM25 인덱스, 특허 메타 저장소에 재빌드 없이 반영하고 컬렉션 버전을 올립니다. "
+        "입력 파일에 나온 특허는 청구항 전체가 교체됩니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", nargs="?", help="추가/교체할 청구항 파일 (.jsonl / .csv)")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="기본: 확장자로 판단")
+        parser.add_argument("--delete", nargs="+", default=[], metavar="PATENT_ID", help="삭제할 출원번호")
+        parser.add_argument("--delete-file", help="삭제할 출원번호 파일 (한 줄에 하나)")
+        parser.add_argument(
+            "--db-path",
+            default=os.path.join(settings.BASE_DIR, "db_search", "doc_db"),
+            help="특허 청구항 Chroma DB 경로",
+        )
+        parser.add_argument(
+            "--bm25-index",
+            default=os.path.join(settings.BASE_DIR, "db_search", "bm25_index"),
+            help="BM25 인덱스 디렉토리 (없으면 건너뜀)",
+        )
+        parser.add_argument(
+            "--patent-meta",
+            default=os.path.join(settings.BASE_DIR, "db_search", "patent_meta"),
+            help="특허 메타 저장소 디렉토리 (없으면 건너뜀)",
+        )
+        parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+        parser.add_argument(
+            "--doc-mmap",
+            default=os.path.join(settings.BASE_DIR, "db_search", "doc_mmap"),
+            help="patent_claims 의 mmap 내보내기 디렉토리 (있으면 --allow-stale-mmap 없이는 반영하지 않음)",
+        )
+        parser.add_argument(
+            "--allow-stale-mmap",
+            action="store_true",
+            help="mmap 내보내기가 있어도 반영 (VECTOR_BACKEND=mmap 으로 서빙하지 않거나, 반영 후 다시 내보낼 때)",
+        )
+
+    def handle(self, *args, **options):
+        name = "patent_claims"
+        preset = COLLECTION_PRESETS[name]
+
+        deleted = list(options["delete"])
+        if options["delete_file"]:
+            with open(options["delete_file"], encoding="utf-8") as f:
+                deleted.extend(line.strip() for line in f if line.strip())
+        if not options["source"] and not deleted:
+            raise CommandError("반영할 입력 파일이나 --delete / --delete-file 을 지정하세요.")
+
+        # mmap 내보내기는 증분 반영 대상이 아님: 반영하면 BM25/메타 저장소(파일)만 바뀌어
+        # 재시작한 mmap 서빙 워커에서 벡터 쪽(이전 스냅샷)과 어긋나므로 명시적으로 허용한 경우에만 진행
+        doc_mmap_path = options["doc_mmap"]
+        if os.path.exists(doc_mmap_path) and not options["allow_stale_mmap"]:
+            raise CommandError(
+                f"{doc_mmap_path} 에 mmap 내보내기가 있습니다. VECTOR_BACKEND=mmap 으로 서빙 중이면 반영 후 "
+                "export_vector_backend 로 다시 내보내고 재시작해야 합니다. 확인했다면 --allow-stale-mmap 을 지정하세요."
+            )
+
+        records = []
+        if options["source"]:
+            if not os.path.exists(options["source"]):
+                raise CommandError(f"입력 파일이 없습니다: {options['source']}")
+            records = [to_record(row, preset) for row in iter_source_rows(options["source"], options["format"])]
+
+        client = chromadb.PersistentClient(path=options["db_path"])
+        collection = client.get_collection(name=name)
+
+        try:
+            summary = apply_patent_updates(
+                collection,
+                records,
+                load_ingest_encoder(preset["encoder"]),
+                VersionFile(version_file_path(options["db_path"])),
+                deleted_patent_ids=deleted,
+                bm25_dir=options["bm25_index"],
+                meta_dir=options["patent_meta"],
+                encode_batch_size=options["encode_batch_size"],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if os.path.exists(doc_mmap_path):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{doc_mmap_path} 는 갱신되지 않았습니다. mmap 을 쓰려면 export_vector_backend 를 다시 실행하세요."
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"반영 완료: 컬렉션 버전 {summary['version']}, 특허 {summary['patents']:,}개 "
+                f"(교체 {summary.get('updated_patents', 0):,}, 삭제 {summary.get('deleted_patents', 0):,}), "
+                f"청구항 {summary['claims']:,}개"
+            )
+        )
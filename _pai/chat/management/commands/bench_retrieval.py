@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.benchmark import (
+    DEFAULT_K,
+    DEFAULT_QUERIES,
+    compare_reports,
+    corpus_config,
+    environment,
+    prepare_corpus,
+    run_benchmark,
+)
+from llm_module.synthetic_corpus import CLAIMS_PER_PATENT, DEFAULT_DIM, DEFAULT_VOCAB_SIZE
+from llm_module.vector_compress import COMPRESSION_METHODS
+
+
+class Command(BaseCommand):
+    help = (
+        "결정적 합성 청구항/IPC 코퍼스와 해싱 임베더로 인덱스를 만들고, 검색 단계별 "
+        "p50/p95/p99 지연시간·처리량과 exact 검색 대비 recall@k 를 측정합니다. "
+        "(오프라인 / CPU 전용, 커밋 간 비교용 JSON 출력)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--claims", type=int, default=10_000, help="합성 청구항 수 (10k ~ 5M)")
+        parser.add_argument("--claims-per-patent", type=int, default=CLAIMS_PER_PATENT)
+        parser.add_argument("--vocab-size", type=int, default=DEFAULT_VOCAB_SIZE)
+        parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="해싱 임베더 차원")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+        parser.add_argument("--k", type=int, default=DEFAULT_K)
+        parser.add_argument("--ivf-lists", type=int, default=0, help="0 이면 IVF 단계 생략")
+        parser.add_argument("--nprobe", type=int, default=16)
+        parser.add_argument("--compression", nargs="*", default=[], choices=COMPRESSION_METHODS)
+        parser.add_argument("--rescore-factor", type=int, default=4)
+        parser.add_argument("--threads", type=int, default=1, help="동시 질의 스레드 수 (처리량 측정)")
+        parser.add_argument(
+            "--work-dir",
+            help=f"인덱스를 만들 디렉토리 (기본: 임시 디렉토리, 끝나면 삭제. 예: {os.path.join('db_search', 'bench')})",
+        )
+        parser.add_argument("--reuse", action="store_true", help="--work-dir 에 같은 설정의 인덱스가 있으면 다시 빌드하지 않음")
+        parser.add_argument("--json", dest="json_out", help="결과를 JSON 파일로 저장")
+        parser.add_argument("--baseline", help="비교할 이전 결과 JSON (단계별 변화율 출력)")
+
+    def handle(self, *args, **options):
+        if options["claims"] <= 0 or options["queries"] <= 0:
+            raise CommandError("--claims 와 --queries 는 1 이상이어야 합니다.")
+
+        config = corpus_config(
+            options["claims"],
+            claims_per_patent=options["claims_per_patent"],
+            vocab_size=options["vocab_size"],
+            dim=options["dim"],
+            seed=options["seed"],
+            ivf_lists=options["ivf_lists"],
+            compressions=options["compression"],
+        )
+        work_dir = options["work_dir"] or tempfile.mkdtemp(prefix="pai_bench_")
+        try:
+            corpus, encoder, build = prepare_corpus(config, work_dir, reuse=options["reuse"], log=self.stdout.write)
+            queries = corpus.sample_queries(options["queries"], seed=options["seed"] + 1)
+            stages = run_benchmark(
+                corpus,
+                encoder,
+                work_dir,
+                queries,
+                k=options["k"],
+                nprobe=options["nprobe"],
+                compressions=config["compressions"],
+                rescore_factor=options["rescore_factor"],
+                threads=options["threads"],
+                log=self.stdout.write,
+            )
+        finally:
+            if not options["work_dir"]:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        report = {
+            "config": {**config, "queries": options["queries"], "k": options["k"],
+                       "nprobe": options["nprobe"], "threads": options["threads"]},
+            "environment": environment(settings.BASE_DIR),
+            "build_seconds": build,
+            "stages": stages,
+        }
+
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            report["baseline_commit"] = baseline.get("environment", {}).get("git_commit")
+            report["vs_baseline"] = compare_reports(report, baseline)
+            self.stdout.write(f"기준 대비 ({report['baseline_commit'] or options['baseline']}):")
+            for name, row in report["vs_baseline"].items():
+                changes = " ".join(
+                    f"{key}={value:+.1%}" if key.endswith("_ms") else f"{key}={value:+.4f}"
+                    for key, value in row.items()
+                )
+                self.stdout.write(f"  {name:22s} {changes}")
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"결과 저장: {options['json_out']}"))
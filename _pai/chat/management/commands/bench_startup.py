@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 각 측정은 새 파이썬 프로세스에서 실행 (이미 로드된 모듈/모델의 영향을 받지 않도록)
+IMPORT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import llm_module.main
+print(json.dumps({"import_seconds": time.perf_counter() - started}))
+"""
+
+SEARCH_SCRIPT = """
+import json, sys, time
+warm = sys.argv[1] == "warm"
+queries = sys.argv[2:4]
+from llm_module import retrieval_service
+
+result = {}
+if warm:
+    started = time.perf_counter()
+    result["warm_up"] = retrieval_service.warm_up()
+    result["warm_up_seconds"] = time.perf_counter() - started
+
+# 같은 프로세스 안의 메모리 캐시 영향을 받지 않도록 서로 다른 질의 두 개로 측정
+# (프로세스 간에 남는 결과/임베딩 SQLite 캐시는 _run 에서 RESULT_CACHE=0, EMBED_CACHE_PERSIST=0 으로 끔)
+for label, query in zip(("first_search_seconds", "second_search_seconds"), queries):
+    started = time.perf_counter()
+    retrieval_service.search_patents(query_text=query, top_k=5)
+    result[label] = time.perf_counter() - started
+print(json.dumps(result))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "시작 비용을 측정합니다: llm_module.main import 시간, manage.py check 소요 시간, "
+        "warm-up 시간, 그리고 warm-up 유무에 따른 첫/두 번째 특허 검색 지연시간."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--query", default="배터리 셀의 열 폭주를 방지하는 냉각 구조")
+        parser.add_argument("--second-query", default="이미지 센서의 노이즈를 줄이는 신호 처리 방법")
+        parser.add_argument("--skip-search", action="store_true", help="모델/인덱스가 필요한 검색 측정 생략")
+        parser.add_argument("--json", dest="json_out", help="결과를 JSON 파일로 저장")
+
+    def _run(self, args):
+        # cold 실행이 채운 영구 캐시를 warm 실행이 그대로 맞히지 않도록 디스크 캐시는 끄고 측정
+        env = dict(
+            os.environ,
+            PAI_WARMUP="0",
+            RESULT_CACHE="0",
+            EMBED_CACHE_PERSIST="0",
+            DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "_pai.settings"),
+        )
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise CommandError(f"측정 실패 ({' '.join(args[:2])}):\n{proc.stderr.strip()}")
+        return proc.stdout, elapsed
+
+    def _run_json(self, args):
+        stdout, elapsed = self._run(args)
+        result = json.loads(stdout.strip().splitlines()[-1])
+        result["process_seconds"] = elapsed
+        return result
+
+    def handle(self, *args, **options):
+        report = {}
+
+        # 1. import 비용 (리소스는 지연 로드되므로 모델 로딩이 포함되지 않아야 함)
+        report["import_main"] = self._run_json(["-c", IMPORT_SCRIPT])
+        self.stdout.write(f"import llm_module.main: {report['import_main']['import_seconds']:.2f}s")
+
+        # 2. manage.py check (CLI 명령 하나의 전체 시작 비용)
+        _, elapsed = self._run(["manage.py", "check"])
+        report["manage_check_seconds"] = elapsed
+        self.stdout.write(f"manage.py check: {elapsed:.2f}s")
+
+        # 3. 검색: warm-up 없이(첫 요청이 로딩 비용 부담) vs warm-up 후
+        if not options["skip_search"]:
+            queries = [options["query"], options["second_query"]]
+            for mode in ("cold", "warm"):
+                result = self._run_json(["-c", SEARCH_SCRIPT, mode, *queries])
+                report[f"search_{mode}"] = result
+                line = (
+                    f"{mode}: first={result['first_search_seconds']:.2f}s "
+                    f"second={result['second_search_seconds']:.2f}s"
+                )
+                if mode == "warm":
+                    line += f" (warm-up {result['warm_up_seconds']:.2f}s)"
+                self.stdout.write(line)
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"결과 저장: {options['json_out']}"))
@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from llm_module.vector_backend import MmapBackend, open_vector_backend
+
+
+def _latency_summary(latencies):
+    arr = np.asarray(latencies) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "mean_ms": float(arr.mean()),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "patent_claims 에 대해 Chroma / mmap exact / mmap IVF 백엔드의 "
+        "검색 지연시간과 recall@k(exact 기준)를 비교합니다."
+    )
+
+    def add_arguments(self, parser):
+        base = os.path.join(settings.BASE_DIR, "db_search")
+        parser.add_argument("--db-path", default=os.path.join(base, "doc_db"))
+        parser.add_argument("--mmap-path", default=os.path.join(base, "doc_mmap"))
+        parser.add_argument("--collection", default="patent_claims")
+        parser.add_argument("--queries", type=int, default=100, help="샘플 쿼리 수 (저장된 임베딩에서 추출)")
+        parser.add_argument("--k", type=int, default=200)
+        parser.add_argument("--nprobe", type=int, default=16)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skip-chroma", action="store_true")
+        parser.add_argument("--json", dest="json_out", help="결과를 JSON 파일로 저장")
+
+    def handle(self, *args, **options):
+        k = options["k"]
+        exact = MmapBackend(options["mmap_path"], use_ivf=False)
+
+        rng = np.random.default_rng(options["seed"])
+        rows = rng.choice(exact.count(), size=min(options["queries"], exact.count()), replace=False)
+        queries = np.asarray(exact.embeddings[np.sort(rows)], dtype=np.float32)
+
+        backends = {"mmap_exact": exact}
+        ivf = MmapBackend(options["mmap_path"], nprobe=options["nprobe"])
+        if ivf.ivf_centroids is not None:
+            backends["mmap_ivf"] = ivf
+        if not options["skip_chroma"]:
+            backends["chroma"] = open_vector_backend(
+                "chroma", chroma_path=options["db_path"], collection_name=options["collection"]
+            )
+
+        # 1. exact 결과(정답) 및 백엔드별 측정
+        truth = []
+        report = {"k": k, "queries": len(queries), "backends": {}}
+        for name, backend in backends.items():
+            latencies, recalls = [], []
+            for qi, query in enumerate(queries):
+                started = time.perf_counter()
+                result = backend.query([query.tolist()], n_results=k, include=["distances"])
+                latencies.append(time.perf_counter() - started)
+
+                found = set(result["ids"][0])
+                if name == "mmap_exact":
+                    truth.append(found)
+                recalls.append(len(found & truth[qi]) / max(1, len(truth[qi])))
+
+            report["backends"][name] = {
+                **_latency_summary(latencies),
+                f"recall@{k}": float(np.mean(recalls)),
+            }
+
+        # 2. 출력
+        for name, stats in report["backends"].items():
+            self.stdout.write(
+                f"{name:12s} p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+                f"recall@{k}={stats[f'recall@{k}']:.4f}"
+            )
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
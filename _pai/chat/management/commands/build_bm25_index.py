@@ -0,0 +1,41 @@
+import os
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from llm_module.bm25_index import BUILD_BATCH_SIZE, build_bm25_index
+
+
+class Command(BaseCommand):
+    help = "patent_claims 컬렉션 전체에 대한 영속 BM25 역색인을 생성합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--db-path",
+            default=os.path.join(settings.BASE_DIR, "db_search", "doc_db"),
+            help="특허 청구항 Chroma DB 경로",
+        )
+        parser.add_argument("--collection", default="patent_claims")
+        parser.add_argument(
+            "--out",
+            default=os.path.join(settings.BASE_DIR, "db_search", "bm25_index"),
+            help="BM25 인덱스를 저장할 디렉토리",
+        )
+        parser.add_argument("--batch-size", type=int, default=BUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        client = chromadb.PersistentClient(path=options["db_path"])
+        collection = client.get_collection(name=options["collection"])
+
+        meta = build_bm25_index(
+            collection,
+            options["out"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"BM25 인덱스 생성 완료: {options['out']} (문서 {meta['n_docs']}개)"
+            )
+        )
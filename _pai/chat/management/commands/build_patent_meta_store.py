@@ -0,0 +1,42 @@
+import os
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from llm_module.patent_meta_store import BUILD_BATCH_SIZE, build_patent_meta_store
+
+
+class Command(BaseCommand):
+    help = "patent_claims 컬렉션으로부터 특허(patent_id) 단위 컬럼형 메타데이터 저장소를 생성합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--db-path",
+            default=os.path.join(settings.BASE_DIR, "db_search", "doc_db"),
+            help="특허 청구항 Chroma DB 경로",
+        )
+        parser.add_argument("--collection", default="patent_claims")
+        parser.add_argument(
+            "--out",
+            default=os.path.join(settings.BASE_DIR, "db_search", "patent_meta"),
+            help="메타데이터 저장소를 저장할 디렉토리",
+        )
+        parser.add_argument("--batch-size", type=int, default=BUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        client = chromadb.PersistentClient(path=options["db_path"])
+        collection = client.get_collection(name=options["collection"])
+
+        meta = build_patent_meta_store(
+            collection,
+            options["out"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"메타데이터 저장소 생성 완료: {options['out']} "
+                f"(특허 {meta['n_patents']}개, 청구항 {meta['n_claims']}개)"
+            )
+        )
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.chat_loadtest import DEFAULT_TIMEOUT, run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "실행 중인 웹 서버의 채팅 스트리밍 API 에 동시 NDJSON 스트림을 열어 TTFT, 토큰/초, "
+        "응답당 DB 쓰기 수, 도구 호출 지연, 오류율을 측정합니다. "
+        "(서버는 run_openai_stub 스텁과 OPENAI_BASE_URL / PAI_STREAM_STATS=1 로 실행)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="웹 서버 주소")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="동시 사용자 수 (여러 개면 차례로)")
+        parser.add_argument("--requests", type=int, default=4, help="사용자당 보낼 메시지 수")
+        parser.add_argument("--turns", type=int, default=1, help="대화방 하나에 보낼 메시지 수 (넘으면 새 방)")
+        parser.add_argument("--messages-file", help="보낼 메시지 목록 (한 줄에 하나)")
+        parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+        parser.add_argument("--stub-url", help="스텁 서버 주소 (예: http://127.0.0.1:8765/v1, /stats 차이 기록)")
+        parser.add_argument("--json", dest="json_out", help="결과를 JSON 파일로 저장")
+
+    def handle(self, *args, **options):
+        if options["requests"] <= 0 or min(options["concurrency"]) <= 0:
+            raise CommandError("--requests 와 --concurrency 는 1 이상이어야 합니다.")
+
+        messages = None
+        if options["messages_file"]:
+            with open(options["messages_file"], encoding="utf-8") as f:
+                messages = [line.strip() for line in f if line.strip()]
+            if not messages:
+                raise CommandError(f"메시지가 없습니다: {options['messages_file']}")
+
+        def fmt(stats, key="p50"):
+            return f"{stats[key]:8.1f}" if stats else "       -"
+
+        reports = []
+        for concurrency in options["concurrency"]:
+            summary = run_load(
+                options["url"],
+                concurrency,
+                options["requests"],
+                turns=options["turns"],
+                messages=messages,
+                timeout=options["timeout"],
+                stub_url=options["stub_url"],
+            )
+            reports.append(summary)
+            self.stdout.write(
+                f"동시 {concurrency:3d} | 요청 {summary['requests']:4d} 오류율 {summary['error_rate']:.1%} "
+                f"| {summary['throughput_rps'] or 0:.2f} req/s "
+                f"| TTFT p50/p95 {fmt(summary['ttft_ms'])}/{fmt(summary['ttft_ms'], 'p95')}ms "
+                f"| tok/s p50 {fmt(summary['tokens_per_second'])} "
+                f"| 도구 p50 {fmt(summary['tool_latency_ms'])}ms "
+                f"| DB 쓰기/응답 {fmt(summary['db_writes_per_response'], 'mean')}"
+            )
+            if summary["error_kinds"]:
+                self.stdout.write(self.style.WARNING(f"  오류: {summary['error_kinds']}"))
+
+        if reports and reports[-1]["db_writes_per_response"] is None:
+            self.stdout.write(self.style.WARNING("DB 쓰기 수가 없습니다. 서버를 PAI_STREAM_STATS=1 로 실행하세요."))
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump({"url": options["url"], "runs": reports}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"결과 저장: {options['json_out']}"))
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from llm_module.vector_backend import MmapBackend
+from llm_module.vector_compress import (
+    COMPRESSION_METHODS,
+    DEFAULT_PCA_DIM,
+    DEFAULT_RESCORE_FACTOR,
+    build_compressed_codes,
+)
+
+REPORT_FILE = "compression_report.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "mmap 벡터 백엔드(patent_claims)에 압축 코드(pca/int8/binary)를 생성하고, "
+        "메모리 절감량과 recall@k(비압축 exact 기준) 리포트를 작성합니다."
+    )
+
+    def add_arguments(self, parser):
+        base = os.path.join(settings.BASE_DIR, "db_search")
+        parser.add_argument("--mmap-path", default=os.path.join(base, "doc_mmap"))
+        parser.add_argument(
+            "--methods",
+            nargs="+",
+            choices=COMPRESSION_METHODS,
+            default=list(COMPRESSION_METHODS),
+        )
+        parser.add_argument("--pca-dim", type=int, default=DEFAULT_PCA_DIM)
+        parser.add_argument("--rescore-factor", type=int, default=DEFAULT_RESCORE_FACTOR)
+        parser.add_argument("--queries", type=int, default=100, help="샘플 쿼리 수 (저장된 임베딩에서 추출)")
+        parser.add_argument("--k", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--skip-build", action="store_true", help="이미 만든 코드로 리포트만 작성")
+        parser.add_argument("--json", dest="json_out", help=f"리포트 경로 (기본: <mmap-path>/{REPORT_FILE})")
+
+    def handle(self, *args, **options):
+        mmap_path = options["mmap_path"]
+        ks = sorted(set(options["k"]))
+        max_k = ks[-1]
+
+        # 1. 코드 생성
+        if not options["skip_build"]:
+            for method in options["methods"]:
+                build_compressed_codes(
+                    mmap_path,
+                    method,
+                    pca_dim=options["pca_dim"],
+                    seed=options["seed"],
+                    log=self.stdout.write,
+                )
+
+        # 2. 비압축 exact 결과(정답)
+        exact = MmapBackend(mmap_path, use_ivf=False)
+        rng = np.random.default_rng(options["seed"])
+        rows = rng.choice(exact.count(), size=min(options["queries"], exact.count()), replace=False)
+        queries = np.asarray(exact.embeddings[np.sort(rows)], dtype=np.float32)
+
+        truth = [
+            exact.query([query.tolist()], n_results=max_k, include=["distances"])["ids"][0]
+            for query in queries
+        ]
+
+        full_bytes = int(exact.embeddings.nbytes)
+        report = {
+            "collection": exact.name,
+            "count": exact.count(),
+            "dim": int(exact.embeddings.shape[1]),
+            "full_bytes": full_bytes,
+            "queries": len(queries),
+            "rescore_factor": options["rescore_factor"],
+            "methods": {},
+        }
+
+        # 3. 방식별 메모리 / recall@k / 지연시간
+        for method in options["methods"]:
+            backend = MmapBackend(
+                mmap_path,
+                use_ivf=False,
+                compression=method,
+                rescore_factor=options["rescore_factor"],
+            )
+            latencies = []
+            recalls = {k: [] for k in ks}
+            for qi, query in enumerate(queries):
+                started = time.perf_counter()
+                found = backend.query([query.tolist()], n_results=max_k, include=["distances"])["ids"][0]
+                latencies.append(time.perf_counter() - started)
+                for k in ks:
+                    expected = set(truth[qi][:k])
+                    recalls[k].append(len(set(found[:k]) & expected) / max(1, len(expected)))
+
+            code_bytes = backend.codes.nbytes
+            latency_ms = np.asarray(latencies) * 1000.0
+            report["methods"][method] = {
+                "code_bytes": code_bytes,
+                "compression_ratio": full_bytes / max(1, code_bytes),
+                "saved_mib": (full_bytes - code_bytes) / 2**20,
+                "p50_ms": float(np.percentile(latency_ms, 50)),
+                "p95_ms": float(np.percentile(latency_ms, 95)),
+                **{f"recall@{k}": float(np.mean(recalls[k])) for k in ks},
+            }
+
+        # 4. 출력 / 저장
+        self.stdout.write(f"full float32: {full_bytes / 2**20:.1f}MiB ({report['count']}개 × {report['dim']}차원)")
+        for method, stats in report["methods"].items():
+            recall_text = " ".join(f"recall@{k}={stats[f'recall@{k}']:.4f}" for k in ks)
+            self.stdout.write(
+                f"{method:7s} {stats['code_bytes'] / 2**20:.1f}MiB (x{stats['compression_ratio']:.1f}, "
+                f"-{stats['saved_mib']:.1f}MiB) p50={stats['p50_ms']:.2f}ms {recall_text}"
+            )
+
+        json_out = options["json_out"] or os.path.join(mmap_path, REPORT_FILE)
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"리포트 저장: {json_out}"))
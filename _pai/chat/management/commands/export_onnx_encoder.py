@@ -0,0 +1,93 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.onnx_encoder import (
+    DEFAULT_OPSET,
+    EXPORT_MAX_SEQ_LENGTH,
+    ONNX_INT8_MODEL_FILE,
+    SAMPLE_TEXTS,
+    OnnxEncoder,
+    compare_encoders,
+    export_onnx_encoder,
+)
+
+REPORT_FILE = "parity_report.json"
+
+
+class Command(BaseCommand):
+    help = (
+        "특허 검색용 문서 인코더(BGE-m3-ko)를 ONNX(+ 동적 int8 양자화)로 내보내고, "
+        "torch 임베딩 대비 코사인 유사도 패리티와 인코딩 지연시간을 점검합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default="dragonkue/BGE-m3-ko")
+        parser.add_argument(
+            "--out",
+            default=os.path.join(settings.BASE_DIR, "db_search", "doc_encoder_onnx"),
+            help="ONNX 모델을 저장할 디렉토리 (DOC_ENCODER_BACKEND=onnx 가 읽는 경로)",
+        )
+        parser.add_argument("--no-quantize", action="store_true", help="int8 양자화 모델을 만들지 않음")
+        parser.add_argument("--opset", type=int, default=DEFAULT_OPSET)
+        parser.add_argument("--max-seq-length", type=int, default=EXPORT_MAX_SEQ_LENGTH)
+        parser.add_argument("--skip-export", action="store_true", help="이미 내보낸 모델로 점검만 수행")
+        parser.add_argument("--texts-file", help="점검용 문장 파일 (한 줄에 한 문장)")
+        parser.add_argument("--repeats", type=int, default=5)
+        parser.add_argument(
+            "--min-cosine",
+            type=float,
+            default=0.99,
+            help="후보 인코더의 최소 코사인 유사도가 이 값보다 낮으면 실패 처리",
+        )
+
+    def handle(self, *args, **options):
+        out_dir = options["out"]
+
+        # 1. 내보내기
+        if not options["skip_export"]:
+            export_onnx_encoder(
+                options["model"],
+                out_dir,
+                quantize=not options["no_quantize"],
+                opset=options["opset"],
+                max_seq_length=options["max_seq_length"],
+                log=self.stdout.write,
+            )
+
+        # 2. 패리티 / 지연시간 점검 (torch 기준)
+        from sentence_transformers import SentenceTransformer
+
+        texts = SAMPLE_TEXTS
+        if options["texts_file"]:
+            with open(options["texts_file"], encoding="utf-8") as f:
+                texts = [line.strip() for line in f if line.strip()]
+
+        reference = SentenceTransformer(options["model"], device="cpu")
+        candidates = {"onnx_fp32": OnnxEncoder(out_dir, quantized=False)}
+        if os.path.exists(os.path.join(out_dir, ONNX_INT8_MODEL_FILE)):
+            candidates["onnx_int8"] = OnnxEncoder(out_dir, quantized=True)
+
+        report = compare_encoders(reference, candidates, texts, repeats=options["repeats"])
+
+        ref = report["reference"]
+        self.stdout.write(f"torch      p50={ref['p50_ms']:.1f}ms p95={ref['p95_ms']:.1f}ms")
+        failed = []
+        for name, stats in report["candidates"].items():
+            self.stdout.write(
+                f"{name:10s} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms "
+                f"cosine min={stats['cosine_min']:.4f} mean={stats['cosine_mean']:.4f}"
+            )
+            if stats["cosine_min"] < options["min_cosine"]:
+                failed.append(name)
+
+        with open(os.path.join(out_dir, REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if failed:
+            raise CommandError(
+                f"코사인 패리티 기준({options['min_cosine']}) 미달: {', '.join(failed)}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"패리티 점검 통과: {out_dir}"))
@@ -0,0 +1,75 @@
+import os
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from llm_module.collection_versions import VersionFile, version_file_path
+from llm_module.patent_meta_store import PATENT_FIELDS
+from llm_module.vector_backend import EXPORT_BATCH_SIZE, ChromaBackend, build_ivf, export_chroma_collection
+
+# 컬렉션별 기본 경로 (Chroma DB 경로, mmap 출력 경로)
+TARGETS = {
+    "patent_claims": ("doc_db", "doc_mmap"),
+    "ipc_clean": ("ipc_db", "ipc_mmap"),
+    "ipc_clean_local": ("ipc_db", "ipc_local_mmap"),
+}
+
+
+class Command(BaseCommand):
+    help = "Chroma 컬렉션을 메모리 매핑 벡터 백엔드(VECTOR_BACKEND=mmap) 형식으로 내보냅니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument("collection", choices=sorted(TARGETS))
+        parser.add_argument("--db-path", help="Chroma DB 경로 (기본: db_search/<컬렉션별 DB>)")
+        parser.add_argument("--out", help="출력 디렉토리 (기본: db_search/<컬렉션별 mmap>)")
+        parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--ivf-lists",
+            type=int,
+            default=0,
+            help="0보다 크면 해당 개수의 IVF 리스트(ANN)도 함께 생성",
+        )
+        parser.add_argument("--ivf-iterations", type=int, default=10)
+        parser.add_argument(
+            "--strip-patent-fields",
+            action="store_true",
+            help=(
+                "patent_claims 의 청구항별 중복 메타데이터(title/priority/register/link/ipc)를 제외 "
+                "(build_patent_meta_store 로 만든 저장소에서 보강)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        name = options["collection"]
+        db_dir, mmap_dir = TARGETS[name]
+        base = os.path.join(settings.BASE_DIR, "db_search")
+        db_path = options["db_path"] or os.path.join(base, db_dir)
+        out_dir = options["out"] or os.path.join(base, mmap_dir)
+
+        client = chromadb.PersistentClient(path=db_path)
+        # 내보낸 시점의 증분 반영 버전을 pai:version 으로 함께 기록 (MmapBackend.source_version)
+        collection = ChromaBackend(
+            client.get_collection(name=name),
+            version_file=VersionFile(version_file_path(db_path)),
+        )
+
+        meta = export_chroma_collection(
+            collection,
+            out_dir,
+            batch_size=options["batch_size"],
+            strip_fields=PATENT_FIELDS if options["strip_patent_fields"] and name == "patent_claims" else (),
+            log=self.stdout.write,
+        )
+
+        if options["ivf_lists"] > 0:
+            build_ivf(
+                out_dir,
+                options["ivf_lists"],
+                iterations=options["ivf_iterations"],
+                log=self.stdout.write,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"내보내기 완료: {out_dir} ({meta['count']}개, dim={meta['dim']})")
+        )
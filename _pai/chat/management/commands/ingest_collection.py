@@ -0,0 +1,107 @@
+import os
+import time
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.collection_versions import VersionFile, version_file_path
+from llm_module.ingest import (
+    CHECKPOINT_SUFFIX,
+    COLLECTION_PRESETS,
+    ENCODE_BATCH_SIZE,
+    WRITE_CHUNK_SIZE,
+    IngestCheckpoint,
+    count_source_rows,
+    ingest_rows,
+    iter_source_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "JSONL/CSV 파일에서 청구항(또는 IPC 코드)을 스트리밍으로 읽어 임베딩한 뒤 "
+        "Chroma 컬렉션(patent_claims / ipc_clean)에 청크 단위로 적재합니다. "
+        "중단되면 같은 명령으로 체크포인트부터 이어서 진행합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("collection", choices=sorted(COLLECTION_PRESETS))
+        parser.add_argument("source", help="입력 파일 (.jsonl / .csv)")
+        parser.add_argument("--format", choices=["jsonl", "csv"], help="기본: 확장자로 판단")
+        parser.add_argument("--db-path", help="Chroma DB 경로 (기본: db_search/<컬렉션별 DB>)")
+        parser.add_argument("--workers", type=int, default=0, help="인코딩 프로세스 수 (0: 현재 프로세스에서 인코딩)")
+        parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+        parser.add_argument("--chunk-size", type=int, default=WRITE_CHUNK_SIZE, help="upsert / 체크포인트 단위")
+        parser.add_argument("--encoder", choices=["doc", "openai"], help="기본: 컬렉션별 설정")
+        parser.add_argument("--text-field", help="문서 본문 필드 (기본: document)")
+        parser.add_argument("--id-field", help="id 필드 (기본: id, 없으면 컬렉션별 템플릿으로 생성)")
+        parser.add_argument(
+            "--space",
+            choices=["l2", "cosine", "ip"],
+            default="l2",
+            help="새 컬렉션을 만들 때의 거리 함수 (기존 컬렉션은 그대로 사용)",
+        )
+        parser.add_argument("--restart", action="store_true", help="체크포인트를 무시하고 처음부터 적재")
+        parser.add_argument("--no-count", action="store_true", help="진행률용 전체 행 수 세기 생략")
+
+    def handle(self, *args, **options):
+        name = options["collection"]
+        preset = dict(COLLECTION_PRESETS[name])
+        if options["text_field"]:
+            preset["text_field"] = options["text_field"]
+        if options["id_field"]:
+            preset["id_field"] = options["id_field"]
+        encoder_kind = options["encoder"] or preset["encoder"]
+
+        source = options["source"]
+        if not os.path.exists(source):
+            raise CommandError(f"입력 파일이 없습니다: {source}")
+
+        db_path = options["db_path"] or os.path.join(settings.BASE_DIR, "db_search", preset["db_dir"])
+        os.makedirs(db_path, exist_ok=True)
+        client = chromadb.PersistentClient(path=db_path)
+        collection = client.get_or_create_collection(name=name, metadata={"hnsw:space": options["space"]})
+
+        checkpoint = IngestCheckpoint(os.path.join(db_path, name + CHECKPOINT_SUFFIX), source, name)
+        if options["restart"]:
+            checkpoint.clear()
+            checkpoint.rows_done = 0
+
+        total_rows = None if options["no_count"] else count_source_rows(source, options["format"])
+        self.stdout.write(
+            f"적재 시작: {source} → {name} ({db_path}), 인코더={encoder_kind}, "
+            f"워커={options['workers']}, 전체 {total_rows if total_rows is not None else '?'}행"
+        )
+
+        started = time.time()
+        try:
+            processed = ingest_rows(
+                iter_source_rows(source, options["format"]),
+                collection,
+                preset,
+                encoder_kind,
+                checkpoint,
+                workers=options["workers"],
+                encode_batch_size=options["encode_batch_size"],
+                write_chunk_size=options["chunk_size"],
+                total_rows=total_rows,
+                log=self.stdout.write,
+            )
+        finally:
+            # 중단돼도 이미 upsert 된 청크가 있으므로 항상 버전을 올림
+            # → 서빙 워커의 결과 캐시 키 / 파생 인덱스(IPC 계층·사전, BM25, 메타 저장소) 재로드
+            version = VersionFile(version_file_path(db_path)).bump(name)
+        elapsed = time.time() - started
+        rate = processed / elapsed if elapsed > 0 else 0.0
+
+        # 완료되면 체크포인트 삭제 (같은 파일을 다시 적재하면 처음부터)
+        checkpoint.clear()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"적재 완료: {processed:,}행 ({elapsed:.1f}s, {rate:,.1f} claims/s), "
+                f"컬렉션 {collection.count():,}개, 버전 {version}"
+            )
+        )
+        if name == "patent_claims":
+            self.stdout.write("BM25 인덱스 / 특허 메타 저장소는 build_bm25_index / build_patent_meta_store 로 다시 만드세요.")
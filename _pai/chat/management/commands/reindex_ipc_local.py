@@ -0,0 +1,153 @@
+import json
+import os
+
+import chromadb
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.collection_versions import CollectionValueFile, threshold_file_path
+from llm_module.ipc_reindex import (
+    DEFAULT_EVAL_K,
+    REINDEX_BATCH_SIZE,
+    compare_ipc_indexes,
+    default_local_max_distance,
+    reindex_ipc_collection,
+)
+from llm_module.onnx_encoder import SAMPLE_TEXTS
+
+REPORT_FILE = "ipc_local_report.json"
+
+
+def _format_distance(value):
+    return "없음" if value is None else f"{value:.4f}"
+
+
+def _current_max_distance(thresholds, target):
+    # 검색 서비스(_ipc_max_distance)와 같은 순서: 사이드카 → 컬렉션 메타데이터
+    value = thresholds.get(target.name)
+    return value if value is not None else (target.metadata or {}).get("pai:max_distance")
+
+
+class Command(BaseCommand):
+    help = (
+        "ipc_clean 컬렉션을 로컬 문서 인코더(BGE-m3-ko)로 다시 임베딩해 ipc_clean_local 컬렉션을 만들고, "
+        "기존(OpenAI 임베딩) 인덱스와 top-k 겹침 / 거리 분포를 비교합니다. (IPC_EMBEDDING=local 로 전환)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--db-path",
+            default=os.path.join(settings.BASE_DIR, "db_search", "ipc_db"),
+            help="IPC Chroma DB 경로 (원본/대상 컬렉션 모두 이 DB 에 있음)",
+        )
+        parser.add_argument("--batch-size", type=int, default=REINDEX_BATCH_SIZE)
+        parser.add_argument("--start-offset", type=int, default=0, help="중단된 재색인을 이어서 진행할 위치")
+        parser.add_argument("--recreate", action="store_true", help="대상 컬렉션을 지우고 처음부터 다시 만듦")
+        parser.add_argument("--skip-build", action="store_true", help="이미 만든 컬렉션으로 비교만 수행")
+        parser.add_argument("--skip-eval", action="store_true", help="비교 생략 (OpenAI API 키 불필요)")
+        parser.add_argument("--queries-file", help="비교용 질의 파일 (한 줄에 한 문장)")
+        parser.add_argument("--k", type=int, default=DEFAULT_EVAL_K)
+        parser.add_argument(
+            "--write-threshold",
+            action="store_true",
+            help="비교 결과의 제안 컷오프를 DB 경로의 pai_thresholds.json 에 기록 (컬렉션 메타데이터는 건드리지 않음)",
+        )
+
+    def handle(self, *args, **options):
+        from llm_module import retrieval_service
+
+        client = chromadb.PersistentClient(path=options["db_path"])
+        source = client.get_collection(name=retrieval_service.IPC_COLLECTION_NAME)
+        target_name = retrieval_service.IPC_LOCAL_COLLECTION_NAME
+
+        # 재색인은 캐시/마이크로배치 없이 원본 인코더를 직접 사용
+        encoder, encoder_id = retrieval_service.load_doc_encoder()
+        source_space = (source.metadata or {}).get("hnsw:space", "l2")
+
+        # 1. 재색인
+        if not options["skip_build"]:
+            if options["recreate"]:
+                try:
+                    client.delete_collection(name=target_name)
+                except Exception:
+                    pass  # 없으면 무시
+            target = client.get_or_create_collection(
+                name=target_name,
+                metadata={
+                    "hnsw:space": "cosine",
+                    "pai:embedding": encoder_id,
+                    "pai:max_distance": default_local_max_distance(source_space),
+                },
+            )
+            self.stdout.write(f"재색인: {source.name} → {target_name} ({encoder_id})")
+            reindex_ipc_collection(
+                source,
+                target,
+                encoder,
+                batch_size=options["batch_size"],
+                start_offset=options["start_offset"],
+                log=self.stdout.write,
+            )
+        target = client.get_collection(name=target_name)
+        if target.count() != source.count():
+            self.stdout.write(
+                self.style.WARNING(f"항목 수 불일치: {source.name}={source.count()}, {target_name}={target.count()}")
+            )
+
+        if options["skip_eval"]:
+            self.stdout.write(self.style.SUCCESS(f"완료: {target_name} ({target.count()}개)"))
+            return
+
+        # 2. 기존 인덱스와 비교 (기존 쪽은 OpenAI 임베딩 필요)
+        if not retrieval_service.OPENAI_API_KEY:
+            raise CommandError("비교에는 OPENAI_API_KEY 가 필요합니다. (--skip-eval 로 생략 가능)")
+        from chromadb.utils import embedding_functions
+
+        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
+            api_key=retrieval_service.OPENAI_API_KEY,
+            model_name=retrieval_service.IPC_MODEL_NAME,
+            api_base=retrieval_service.OPENAI_BASE_URL,
+        )
+
+        queries = SAMPLE_TEXTS
+        if options["queries_file"]:
+            with open(options["queries_file"], encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+
+        thresholds = CollectionValueFile(threshold_file_path(options["db_path"]))
+        report = compare_ipc_indexes(
+            queries,
+            openai_ef,
+            source,
+            encoder.encode,
+            target,
+            k=options["k"],
+            cand_max_distance=_current_max_distance(thresholds, target),
+        )
+        report["encoder"] = encoder_id
+
+        self.stdout.write(
+            f"top-{report['k']} 겹침: raw={report['raw_overlap']:.3f} "
+            f"pipeline={report['pipeline_overlap']:.3f} ({report['queries']}개 질의)"
+        )
+        self.stdout.write(
+            f"거리 컷오프: 현재 {report['candidate_max_distance']} / "
+            f"제안 {_format_distance(report['suggested_max_distance'])} "
+            f"(기존 인덱스 통과 비율 {report['reference_keep_ratio']:.2f})"
+        )
+
+        report_path = os.path.join(settings.BASE_DIR, "db_search", REPORT_FILE)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        suggested = report["suggested_max_distance"]
+        if options["write_threshold"]:
+            if suggested is None:
+                raise CommandError("로컬 인덱스 검색 결과가 없어 제안 컷오프를 계산하지 못했습니다.")
+            # modify(metadata=...) 는 hnsw:space 를 함께 넘길 수 없어 cosine 컬렉션이 l2 로 바뀔 수 있으므로 사이드카에 기록
+            thresholds.set(target_name, suggested)
+            self.stdout.write(f"{target_name} 거리 컷오프 {_format_distance(suggested)} 기록: {thresholds.path}")
+        elif suggested is not None:
+            self.stdout.write(f"적용하려면 --write-threshold 또는 IPC_MAX_DISTANCE={suggested:.4f}")
+
+        self.stdout.write(self.style.SUCCESS(f"비교 결과 저장: {report_path}"))
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_module.cassette import (
+    CASSETTE_PATH,
+    CASSETTE_SPEED,
+    Cassette,
+    install_cassette,
+    recorded_turns,
+    replay_turn,
+)
+from llm_module.chat_loadtest import percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "PAI_CASSETTE_MODE=record 로 기록한 카세트의 대화 턴을 LLM API / 검색 인덱스 없이 에이전트 그래프로 "
+        "다시 실행해, 턴별 경과 시간과 재생 대기를 뺀 LangGraph·도구 오버헤드를 측정합니다."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cassette", default=CASSETTE_PATH, help="카세트 파일 (JSONL)")
+        parser.add_argument("--speed", type=float, default=CASSETTE_SPEED, help="재생 배속 (0 = 대기 없이)")
+        parser.add_argument("--repeat", type=int, default=1, help="전체 턴 반복 횟수")
+        parser.add_argument("--json", dest="json_out", help="턴별 결과를 JSON 파일로 저장")
+
+    def handle(self, *args, **options):
+        try:
+            cassette = Cassette(options["cassette"], "replay", speed=options["speed"])
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        turns = recorded_turns(cassette)
+        if not turns:
+            raise CommandError(f"카세트에 기록된 대화 턴이 없습니다: {options['cassette']}")
+        install_cassette(cassette)
+        self.stdout.write(f"카세트 {options['cassette']}: 기록 {len(cassette):,}건, 턴 {len(turns)}개, {options['speed']}배속")
+
+        results = []
+        for round_no in range(options["repeat"]):
+            for i, messages in enumerate(turns):
+                result = replay_turn(cassette, messages)
+                result["turn"] = i
+                results.append(result)
+                line = (
+                    f"[{round_no + 1}/{options['repeat']}] 턴 {i:3d} 경과 {result['wall_ms']:9.1f}ms "
+                    f"대기 {result['wait_ms']:9.1f}ms 오버헤드 {result['overhead_ms']:8.1f}ms "
+                    f"(LLM {result['llm_calls']}, 도구 {result['tool_calls']})"
+                )
+                if result["error"]:
+                    self.stdout.write(self.style.WARNING(f"{line} 오류: {result['error']}"))
+                else:
+                    self.stdout.write(line)
+
+        ok = [r for r in results if not r["error"]]
+        summary = {key: percentiles([r[key] for r in ok]) for key in ("wall_ms", "wait_ms", "overhead_ms")}
+        summary["errors"] = len(results) - len(ok)
+        summary["cassette"] = cassette.snapshot()
+        for key in ("wall_ms", "overhead_ms"):
+            if summary[key]:
+                self.stdout.write(f"{key:12s} p50={summary[key]['p50']:.1f} p95={summary[key]['p95']:.1f} mean={summary[key]['mean']:.1f}")
+        if summary["errors"]:
+            self.stdout.write(self.style.WARNING(f"실패한 턴 {summary['errors']}개 (기록에 없는 요청이면 CassetteMiss)"))
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "turns": results}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"결과 저장: {options['json_out']}"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from llm_module.openai_stub import load_stub_config, make_stub_server
+
+
+class Command(BaseCommand):
+    help = (
+        "부하 테스트용 OpenAI 호환 스텁 서버(/v1/chat/completions 스트리밍·도구 호출, /v1/embeddings)를 띄웁니다. "
+        "웹 서버는 OPENAI_BASE_URL=http://HOST:PORT/v1 OPENAI_API_KEY=stub PAI_STREAM_STATS=1 로 실행하세요."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--config", help="스텁 동작 JSON (DEFAULT_STUB_CONFIG 키를 덮어씀, tool_rounds 등)")
+        parser.add_argument("--ttft-ms", type=float, help="첫 청크까지 지연 (ms)")
+        parser.add_argument("--tokens-per-second", type=float, help="스트리밍 토큰 속도")
+        parser.add_argument("--answer-tokens", type=int, help="최종 답변 토큰 수")
+        parser.add_argument("--error-rate", type=float, help="500 응답 비율 (0~1)")
+
+    def handle(self, *args, **options):
+        config = load_stub_config(
+            options["config"],
+            ttft_ms=options["ttft_ms"],
+            tokens_per_second=options["tokens_per_second"],
+            answer_tokens=options["answer_tokens"],
+            error_rate=options["error_rate"],
+        )
+        server = make_stub_server(options["host"], options["port"], config)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"OpenAI 스텁 서버: http://{options['host']}:{options['port']}/v1 "
+                f"(ttft {config['ttft_ms']}ms, {config['tokens_per_second']} tok/s, "
+                f"도구 라운드 {len(config['tool_rounds'])}, 오류율 {config['error_rate']})"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"요청 통계: {server.behavior.stats.snapshot()}")
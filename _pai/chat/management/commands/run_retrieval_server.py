@@ -0,0 +1,48 @@
+import os
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "문서 인코더/벡터 인덱스를 이 프로세스에만 로드하고, 특허·IPC 검색 연산을 "
+        "Unix 소켓으로 제공합니다. (Django 워커는 RETRIEVAL_SERVER_SOCKET 으로 연결)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=os.getenv("RETRIEVAL_SERVER_SOCKET") or "/tmp/pai_retrieval.sock",
+            help="Unix 소켓 경로",
+        )
+
+    def handle(self, *args, **options):
+        started = time.time()
+        # 서버 자신은 반드시 로컬 연산을 사용 (클라이언트 모드로 자기 자신에 연결하지 않도록)
+        from llm_module import retrieval_service
+        from llm_module.retrieval_server import RetrievalServer
+
+        # 모델/인덱스 로드 + 더미 질의로 첫 요청 전에 미리 데워 둠
+        timings = retrieval_service.warm_up()
+        detail = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items())
+        self.stdout.write(f"리소스 로드 완료 ({time.time() - started:.1f}s): {detail}")
+
+        server = RetrievalServer(options["socket"], retrieval_service.OPERATIONS)
+        os.chmod(options["socket"], 0o660)
+
+        def shutdown(signum, frame):
+            # serve_forever 를 돌리는 스레드가 아닌 곳에서 shutdown() 호출
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(self.style.SUCCESS(f"검색 서버 시작: {options['socket']}"))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.stdout.write("검색 서버 종료")
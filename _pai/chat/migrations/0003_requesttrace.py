@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_chathistory_is_pinned'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestTrace',
+            fields=[
+                ('trace_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('history_id', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('status', models.CharField(choices=[('ok', 'OK'), ('error', 'Error')], default='ok', max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('span_count', models.IntegerField(default=0)),
+                ('tree', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'request_trace',
+                'ordering': ['-trace_id'],
+            },
+        ),
+    ]
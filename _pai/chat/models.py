@@ -55,3 +55,28 @@ class Chat(models.Model):
     class Meta:
         db_table = "chat"
         ordering = ["order_num"]
+
+
+class RequestTrace(models.Model):
+    """
+    채팅 요청 하나의 span 트리 (llm_module.tracing). 최근 PAI_TRACE_KEEP 개만 남기는 링 버퍼로 사용하며
+    관리자 페이지에서 단계별 소요 시간을 봅니다.
+    """
+
+    STATUS_CHOICES = (("ok", "OK"), ("error", "Error"))
+    trace_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    # 대화방이 지워져도 trace 는 링 버퍼 정리 때까지 남도록 FK 대신 번호만 저장
+    history_id = models.IntegerField(null=True, blank=True, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ok")
+    duration_ms = models.FloatField()
+    span_count = models.IntegerField(default=0)
+    tree = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "request_trace"
+        ordering = ["-trace_id"]
+
+    def __str__(self):
+        return f"#{self.trace_id} {self.name} {self.duration_ms:.0f}ms"
@@ -1,3 +1,1727 @@
-from django.test import TestCase
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from rank_bm25 import BM25Okapi
+
+from llm_module import onnx_encoder, tracing
+from llm_module.batch_encoder import MicroBatchEncoder
+from llm_module.bm25_index import BM25Index, build_bm25_index, tokenize
+from llm_module.cassette import Cassette, CassetteMiss, recorded_turns
+from llm_module.collection_versions import CollectionValueFile, VersionFile
+from llm_module.embedding_cache import CachedEncoder, EmbeddingFunctionEncoder
+from llm_module.incremental import apply_patent_updates
+from llm_module.ingest import COLLECTION_PRESETS, IngestCheckpoint, to_record
+from llm_module.ipc_func import _merge_ipc_hierarchy, get_combined_ipc_codes
+from llm_module.ipc_reindex import compare_ipc_indexes, reindex_ipc_collection
+from llm_module.ipc_dictionary import build_ipc_dictionary, load_or_build_ipc_dictionary, normalize_ipc_code
+from llm_module.ipc_hierarchy import IpcHierarchy, load_or_build_ipc_hierarchy
+from llm_module.doc_func import (
+    _aggregate_patents,
+    _aggregate_patents_reference,
+    _fuse_multi_query_results,
+    _merge_lexical_candidates,
+    patent_hybrid_search,
+    search_with_growing_pool,
+)
+from llm_module.metrics import MetricsRegistry, clear_snapshot_dir, render_prometheus
+from llm_module.openai_stub import embedding_from_response, load_stub_config, start_stub_server
+from llm_module.patent_meta_store import PatentMetaStore, build_patent_meta_store
+from llm_module.result_cache import RetrievalCache, collection_version
+from llm_module.resources import ResourceRegistry
+from llm_module.retrieval_server import (
+    RESULT_SCHEMAS,
+    RetrievalClient,
+    RetrievalServer,
+    RetrievalServerError,
+    _dump,
+    _load,
+)
+from llm_module.synthetic_corpus import HashingEncoder, SyntheticCollection, SyntheticCorpus
+from llm_module.total_schemas import IPCDetailInfo, IPCMainDescription, PatentByIdOutput, PatentSearchOutput
+from llm_module.vector_backend import (
+    ChromaBackend,
+    MmapBackend,
+    build_ivf,
+    detach_chroma_system,
+    export_chroma_collection,
+)
+from llm_module.vector_compress import CompressedCodes, build_compressed_codes
+
+
+class BM25IndexParityTest(SimpleTestCase):
+    """
+    전역 BM25 역색인 점수가 같은 코퍼스로 만든 BM25Okapi 와 같고,
+    어휘 후보 병합이 벡터 후보에 없던 청구항만 (제외 특허는 빼고) 거리와 함께 덧붙이는지 확인합니다.
+    """
+
+    class FakeCollection:
+        name = "patent_claims"
+        metadata = {"hnsw:space": "l2"}
+
+        def __init__(self, rows):
+            self.rows = rows  # [(id, document, metadata, embedding)]
+            self.get_calls = []
+
+        def count(self):
+            return len(self.rows)
+
+        def get(self, include, limit=None, offset=0, ids=None):
+            if ids is not None:
+                self.get_calls.append(list(ids))
+                by_id = {row[0]: row for row in self.rows}
+                rows = [by_id[i] for i in ids if i in by_id]
+            else:
+                rows = self.rows[offset:offset + limit]
+            return {
+                "ids": [row[0] for row in rows],
+                "documents": [row[1] for row in rows],
+                "metadatas": [row[2] for row in rows],
+                "embeddings": [row[3] for row in rows],
+            }
+
+    def make_collection(self, seed=5):
+        rng = random.Random(seed)
+        words = [f"w{i}" for i in range(30)] + ["흔한", "흔한", "흔한"]
+        rows = []
+        for i in range(60):
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(0 if i == 7 else 2, 14)))
+            rows.append((f"claim-{i}", text, {"patent_id": f"P{i % 15}", "claim_no": i // 15 + 1},
+                         [rng.random(), rng.random()]))
+        return self.FakeCollection(rows)
+
+    def test_scores_match_bm25okapi(self):
+        collection = self.make_collection()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "bm25")
+            build_bm25_index(collection, index_dir, batch_size=7, log=lambda *_: None)
+            index = BM25Index.load(index_dir)
+            reference = BM25Okapi([tokenize(row[1]) for row in collection.rows])
+
+            self.assertEqual(index.doc_ids, [row[0] for row in collection.rows])
+            for query in ["w1 w2", "흔한 w3 w3", "없는용어", "w29 흔한 w0 w0 w0"]:
+                np.testing.assert_allclose(index.get_scores(tokenize(query)), reference.get_scores(tokenize(query)),
+                                           rtol=1e-9, atol=1e-12)
+
+            rows = index.rows_for_patents(["P1", "P3", "없는특허"])
+            self.assertEqual(sorted(rows.tolist()), [i for i in range(60) if i % 15 in (1, 3)])
+            self.assertEqual(index.rows_for_ids(["claim-4", "없음"]).tolist(), [4, -1])
+
+    def test_merge_lexical_candidates(self):
+        collection = self.make_collection()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "bm25")
+            build_bm25_index(collection, index_dir, log=lambda *_: None)
+            index = BM25Index.load(index_dir)
+        scores = index.get_scores(tokenize("w1 w2 w3"))
+        top = [index.doc_ids[row] for row in index.top_n(scores, 60)]  # 점수 > 0 인 청구항 전부
+
+        by_id = {row[0]: row for row in collection.rows}
+        excluded_patent = by_id[top[1]][2]["patent_id"]
+
+        # 벡터 후보: 어휘 상위 1위 청구항 + 어휘 점수가 없는 청구항
+        ids = [top[0], "claim-7"]
+        query_embs = [[0.0, 0.0], [1.0, 1.0]]
+        merged_ids, merged_docs, _, merged_dist = _merge_lexical_candidates(
+            collection, index, scores, query_embs,
+            ids, ["d0", "d7"], [{}, {}], [0.1, 0.2], lexical_top_k=60,
+            exclude_patent_ids=[excluded_patent],
+        )
+
+        self.assertEqual(merged_ids[:2], ids)
+        self.assertEqual(merged_docs[:2], ["d0", "d7"])
+        self.assertEqual(len(collection.get_calls), 1)
+        added = merged_ids[2:]
+        self.assertEqual(added, [i for i in top if i not in ids and by_id[i][2]["patent_id"] != excluded_patent])
+        for claim_id, dist in zip(added, merged_dist[2:]):
+            embedding = np.asarray(by_id[claim_id][3])
+            expected = min(((embedding - np.asarray(q)) ** 2).sum() for q in query_embs)
+            self.assertAlmostEqual(dist, expected, places=9)
+
+    def test_rebuild_swaps_in_new_version(self):
+        old_collection, new_collection = self.make_collection(seed=5), self.make_collection(seed=9)
+        query = tokenize("w1 흔한 w2")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "bm25")
+            os.makedirs(index_dir)  # 이전 형식: 실제 디렉토리에 바로 빌드돼 있던 인덱스
+            with open(os.path.join(index_dir, "meta.json"), "w") as f:
+                f.write("{}")
+
+            build_bm25_index(old_collection, index_dir, log=lambda *_: None)
+            old_index = BM25Index.load(index_dir)
+            old_scores = old_index.get_scores(query)
+            for _ in range(2):
+                build_bm25_index(new_collection, index_dir, log=lambda *_: None)
+
+            # 이미 매핑한 인덱스는 옛 버전 그대로, 새로 로드하면 새 버전
+            np.testing.assert_array_equal(old_index.get_scores(query), old_scores)
+            reference = BM25Okapi([tokenize(row[1]) for row in new_collection.rows])
+            np.testing.assert_allclose(BM25Index.load(index_dir).get_scores(query), reference.get_scores(query),
+                                       rtol=1e-9, atol=1e-12)
+
+            self.assertTrue(os.path.islink(index_dir))
+            self.assertEqual(len([e for e in os.listdir(tmp_dir) if e.startswith(".bm25.v-")]), 2)
+            self.assertFalse([e for e in os.listdir(tmp_dir) if ".tmp-" in e])
+
+
+class MultiQueryFusionTest(SimpleTestCase):
+    """
+    다중 쿼리 검색이 Chroma 질의 1회로 처리되고, 쿼리별 z-score 융합 결과에서
+    여러 쿼리에 걸린 청구항은 가장 좋은 z-score 하나만 남는지 확인합니다.
+    """
+
+    ROWS = {
+        # 쿼리별 (id, distance) — claim-b 는 두 쿼리에 모두 걸림
+        0: [("claim-a", 0.1), ("claim-b", 0.3), ("claim-c", 0.5)],
+        1: [("claim-b", 0.2), ("claim-d", 0.6), ("claim-e", 0.7), ("claim-f", 0.9)],
+    }
+
+    class FakeCollection:
+        def __init__(self, rows):
+            self.rows = rows
+            self.calls = []
+
+        def query(self, query_embeddings, n_results, **kwargs):
+            self.calls.append((len(query_embeddings), n_results, kwargs))
+            result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for row in range(len(query_embeddings)):
+                hits = self.rows[row][:n_results]
+                result["ids"].append([claim_id for claim_id, _ in hits])
+                result["documents"].append([f"{claim_id} 본문" for claim_id, _ in hits])
+                result["metadatas"].append([{"patent_id": claim_id[-1], "claim_no": 1} for claim_id, _ in hits])
+                result["distances"].append([distance for _, distance in hits])
+            return result
+
+    class FakeModel:
+        def encode(self, texts):
+            return np.asarray([[float(i), 0.0] for i in range(len(texts))], dtype=np.float32)
+
+    def z_scores(self, row):
+        dist = np.asarray([d for _, d in self.ROWS[row]], dtype=np.float64)
+        return dict(zip([i for i, _ in self.ROWS[row]], (dist - dist.mean()) / (dist.std() + 1e-9)))
+
+    def test_fusion_dedups_by_best_z_score(self):
+        batch = self.FakeCollection(self.ROWS).query([[0.0], [1.0]], n_results=10)
+        fused = _fuse_multi_query_results(batch, final_top_k=4)
+
+        best = {}
+        for row in self.ROWS:
+            for claim_id, z in self.z_scores(row).items():
+                best[claim_id] = min(z, best.get(claim_id, np.inf))
+        expected = sorted(best, key=best.get)[:4]
+        self.assertEqual(fused["ids"], [expected])
+        self.assertEqual(len(set(fused["ids"][0])), 4)
+        # claim-b 는 z-score 가 더 좋은 쪽(두 번째 쿼리)의 거리를 가짐
+        self.assertEqual(fused["distances"][0][fused["ids"][0].index("claim-b")], 0.2)
+        self.assertEqual(fused["documents"][0], [f"{claim_id} 본문" for claim_id in expected])
+
+    def test_single_batched_query(self):
+        collection = self.FakeCollection(self.ROWS)
+        patents = patent_hybrid_search(
+            collection, self.FakeModel(), ["첫 질의", "둘째 질의"], per_query_top_k=10,
+            final_top_k=5, exclude_patent_ids=["z"],
+        )
+        self.assertEqual(collection.calls, [(2, 10, {"where": {"patent_id": {"$nin": ["z"]}}})])
+        found = [claim["id"] for patent in patents for claim in patent["claims"]]
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(len(found), 5)
+
+
+class PatentAggregationParityTest(SimpleTestCase):
+    """
+    NumPy 그룹화/점수 커널(_aggregate_patents)이
+    기존 순수 Python 구현과 점수·정렬·청구항 선택까지 완전히 같은지 확인합니다.
+    """
+
+    def make_candidates(self, n, n_patents, seed):
+        rng = random.Random(seed)
+        ids, docs, metas, distances, bm25_scores = [], [], [], [], []
+        for i in range(n):
+            patent_no = rng.randrange(n_patents)
+            ids.append(f"claim-{i}")
+            docs.append(f"청구항 본문 {i}")
+            metas.append({
+                "patent_id": f"10{patent_no:011d}",
+                "claim_no": rng.randint(1, 30),
+                "title": f"발명 {patent_no}",
+            })
+            # 동점 처리까지 검증하기 위해 일부러 값이 겹치도록 생성
+            distances.append(rng.choice([0.25, 0.5, rng.random()]))
+            bm25_scores.append(rng.choice([0.0, 1.5, rng.random() * 10]))
+        return ids, docs, metas, distances, bm25_scores
+
+    def test_matches_reference(self):
+        for seed in range(20):
+            candidates = self.make_candidates(n=300, n_patents=40, seed=seed)
+            for top_k, max_claims in [(5, 3), (30, 5), (100, 1)]:
+                expected = _aggregate_patents_reference(
+                    *candidates, top_k=top_k, max_claims_per_patent=max_claims
+                )
+                actual = _aggregate_patents(
+                    *candidates, top_k=top_k, max_claims_per_patent=max_claims
+                )
+                self.assertEqual(actual, expected)
+
+    def test_empty_candidates(self):
+        self.assertEqual(_aggregate_patents([], [], [], [], []), [])
+
+
+class CachedEncoderTest(SimpleTestCase):
+    """
+    정규화된 같은 문장은 한 번만 인코딩하고, SQLite 캐시가 재시작 후에도 재사용되며
+    max_disk_entries 를 넘으면 가장 오래 쓰이지 않은 행부터 지워지는지,
+    디스크 적중은 LRU 잠금 밖에서 읽고 다시 쓰지 않는지 확인합니다.
+    """
+
+    class CountingModel:
+        def __init__(self):
+            self.calls = []
+
+        def encode(self, texts, **kwargs):
+            self.calls.append(list(texts))
+            return np.asarray([[len(t), kwargs.get("scale", 1)] for t in texts], dtype=np.float32)
+
+    def test_memory_and_disk_cache(self):
+        model = self.CountingModel()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            encoder = CachedEncoder(model, model_id="m", max_entries=2, persist_path=path, max_disk_entries=3)
+
+            self.assertEqual(encoder.encode(["가나", " 가나 ", "다"]).tolist(), [[2, 1], [2, 1], [1, 1]])
+            self.assertEqual(model.calls, [["가나", "다"]])
+            self.assertEqual(encoder.encode("가나").tolist(), [2, 1])
+            self.assertEqual(encoder.encode("가나", scale=2).tolist(), [2, 2])  # 옵션이 다르면 다른 키
+            self.assertEqual(len(model.calls), 2)
+            self.assertEqual(encoder.stats()["size"], 2)
+
+            # 새 인스턴스(재시작)는 디스크에서 읽음: "다" 를 다시 쓰면 가장 오래된 행은 "가나"
+            restarted = CachedEncoder(model, model_id="m", persist_path=path, max_disk_entries=3)
+            restarted.encode("다")
+            restarted.encode("라마바")
+            self.assertEqual(len(model.calls), 3)
+            self.assertEqual(restarted.stats()["disk_hits"], 1)
+            rows = restarted._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self.assertEqual(rows, 3)
+
+            fresh = CachedEncoder(model, model_id="m", persist_path=path, max_disk_entries=3)
+            fresh.encode(["다", "라마바"])
+            self.assertEqual(len(model.calls), 3)
+            fresh.encode("가나")
+            self.assertEqual(model.calls[-1], ["가나"])
+            for cached in (encoder, restarted, fresh):
+                cached._db.close()
+
+    def test_disk_hits_do_not_write_or_hold_lru_lock(self):
+        model = self.CountingModel()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            writer = CachedEncoder(model, model_id="m", persist_path=path)
+            writer.encode(["가나", "다", "사"])
+            writer._db.close()
+
+            encoder = CachedEncoder(model, model_id="m", persist_path=path)
+            self.addCleanup(encoder._db.close)
+            lock_held = []
+            load_from_disk = encoder._load_from_disk
+
+            def checked_load(keys):
+                lock_held.append(encoder._lock.locked())
+                return load_from_disk(keys)
+
+            changes = encoder._db.total_changes
+            with mock.patch.object(encoder, "_load_from_disk", checked_load):
+                encoder.encode("가나")
+            self.assertEqual(lock_held, [False])
+            self.assertEqual(encoder._db.total_changes, changes)  # 적중만으로는 다시 쓰지 않음
+            self.assertEqual(encoder.stats()["disk_hits"], 1)
+
+            encoder.encode("라마바")  # 다음 저장 때 적중 행("가나")의 rowid 도 함께 갱신
+            order = [row[0] for row in encoder._db.execute("SELECT key FROM embeddings ORDER BY rowid")]
+            self.assertEqual(order, [encoder._make_key(t, {}) for t in ("다", "사", "가나", "라마바")])
+
+
+class RetrievalCacheTest(SimpleTestCase):
+    """
+    같은 키의 동시 미스가 (프로세스 안 / 워커 간 모두) 한 번만 계산되고,
+    TTL 이 지난 결과는 다시 계산하며, 만료된 lease 는 인계되고 살아 있는 lease 는 기다리는지,
+    lease 를 기다리는 동안 다른 키는 막히지 않는지 확인합니다.
+    """
+
+    class Collection:
+        def __init__(self, metadata=None, marker=None):
+            self.metadata = metadata
+            self.marker = marker
+
+        def count(self):
+            return 5
+
+        def content_marker(self):
+            return self.marker
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "cache.sqlite3")
+
+    def test_single_flight(self):
+        workers = [RetrievalCache(self.path), RetrievalCache(self.path)]  # 서로 다른 owner = 다른 워커
+        computed = []
+
+        def compute():
+            computed.append(1)
+            time.sleep(0.2)
+            return {"patents": [1, 2]}
+
+        def call(i):
+            return workers[i % 2].get_or_compute("search", {"q": "배터리"}, "v1", compute)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(call, range(8)))
+        self.assertEqual(len(computed), 1)
+        self.assertEqual(results, [{"patents": [1, 2]}] * 8)
+        stats = [worker.stats() for worker in workers]
+        self.assertEqual(sum(s["misses"] for s in stats), 1)
+        self.assertEqual(sum(s["hits"] for s in stats), 7)
+
+    def test_ttl_expiry(self):
+        cache = RetrievalCache(self.path, ttl_seconds=0.3)
+        values = iter(["첫 결과", "새 결과"])
+        self.assertEqual(cache.get_or_compute("search", {"q": "a"}, "v1", lambda: next(values)), "첫 결과")
+        self.assertEqual(cache.get_or_compute("search", {"q": " a "}, "v1", lambda: next(values)), "첫 결과")
+        time.sleep(0.35)
+        self.assertEqual(cache.get_or_compute("search", {"q": "a"}, "v1", lambda: next(values)), "새 결과")
+
+    def test_lease_takeover_and_wait(self):
+        cache = RetrievalCache(self.path)
+        other = RetrievalCache(self.path)
+
+        # 죽은 워커가 남긴 만료 lease 는 바로 인계
+        key = cache.make_key("search", "v1", {"q": "dead"})
+        cache._conn().execute("INSERT INTO inflight VALUES (?, 'dead-worker', ?)", (key, time.time() - 1))
+        self.assertEqual(cache.get_or_compute("search", {"q": "dead"}, "v1", lambda: "인계"), "인계")
+
+        # 살아 있는 lease 는 결과가 저장될 때까지 기다렸다가 그 결과를 사용
+        key = cache.make_key("search", "v1", {"q": "live"})
+        self.assertTrue(other._try_acquire(key))
+        result = {}
+        waiter = threading.Thread(target=lambda: result.update(
+            value=cache.get_or_compute("search", {"q": "live"}, "v1", lambda: "중복 계산")
+        ))
+        waiter.start()
+        time.sleep(0.2)
+        other._store(key, "search", "다른 워커 결과")
+        other._release(key)
+        waiter.join(timeout=5)
+        self.assertEqual(result["value"], "다른 워커 결과")
+        self.assertGreater(cache.stats()["waits"], 0)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_waiting_on_lease_does_not_block_other_keys(self):
+        cache = RetrievalCache(self.path)
+        other = RetrievalCache(self.path)
+        key = cache.make_key("search", "v1", {"q": "slow"})
+        self.assertTrue(other._try_acquire(key))
+        self.addCleanup(other._release, key)
+
+        waiters = [threading.Thread(target=cache.get_or_compute, args=("search", {"q": "slow"}, "v1", lambda: "x"))
+                   for _ in range(2)]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.1)
+
+        # 같은 프로세스에서 다른 키 여러 개는 lease 대기와 상관없이 바로 계산
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            values = list(pool.map(
+                lambda i: cache.get_or_compute("search", {"q": f"fast-{i}"}, "v1", lambda: i), range(100)
+            ))
+        self.assertEqual(values, list(range(100)))
+        self.assertLess(time.time() - started, 5)
+        self.assertTrue(all(waiter.is_alive() for waiter in waiters))
+
+        other._store(key, "search", "done")
+        other._release(key)
+        for waiter in waiters:
+            waiter.join(timeout=5)
+        self.assertEqual(cache._key_locks, {})
+
+    def test_collection_version(self):
+        self.assertEqual(collection_version(self.Collection({"pai:version": 3}, marker="m")), "v3")
+        self.assertEqual(collection_version(self.Collection(None, marker="123")), "m123")
+        self.assertEqual(collection_version(self.Collection(None)), "n5")
+
+        # Chroma: 행 수가 같아도 DB 파일이 바뀌면 버전이 달라짐
+        chroma_dir = os.path.dirname(self.path)
+        collection = self.Collection(None)
+        collection.name = "patent_claims"
+        backend = ChromaBackend(collection, path=chroma_dir)
+        self.assertEqual(collection_version(backend), "n5")
+        db_file = os.path.join(chroma_dir, "chroma.sqlite3")
+        with open(db_file, "w") as f:
+            f.write("v1")
+        os.utime(db_file, ns=(1, 1_000_000_000))
+        before = collection_version(backend)
+        os.utime(db_file, ns=(1, 2_000_000_000))
+        self.assertNotEqual(collection_version(backend), before)
+
+
+class MmapBackendParityTest(SimpleTestCase):
+    """
+    메모리 매핑 백엔드의 exact / IVF(nprobe = 전체 리스트) 검색이 l2 / cosine / ip 공간과 where 필터에서
+    numpy 전수 계산과 같은 순위·거리를 내고, get(ids=/where=) 가 Chroma 와 같은 형태로 동작하며,
+    다시 내보내거나 IVF / 압축 코드를 추가해도 이미 매핑한 파일은 바뀌지 않는지 확인합니다.
+    """
+
+    class FakeCollection:
+        name = "patent_claims"
+
+        def __init__(self, space, n=120, dim=8, seed=0):
+            rng = np.random.default_rng(seed)
+            self.metadata = {"hnsw:space": space}
+            self.vectors = rng.normal(size=(n, dim)).astype(np.float32)
+            self.ids = [f"claim-{i}" for i in range(n)]
+            self.metas = [{"patent_id": f"P{i % 17}", "kind": "ab"[i % 2], "claim_no": i} for i in range(n)]
+
+        def count(self):
+            return len(self.ids)
+
+        def get(self, include, limit, offset):
+            end = offset + limit
+            return {
+                "ids": self.ids[offset:end],
+                "documents": [f"문서 {i}" for i in self.ids[offset:end]],
+                "metadatas": self.metas[offset:end],
+                "embeddings": self.vectors[offset:end].tolist(),
+            }
+
+    WHERES = [
+        (None, lambda m: True),
+        ({"kind": "a"}, lambda m: m["kind"] == "a"),
+        ({"kind": {"$ne": "a"}}, lambda m: m["kind"] != "a"),
+        ({"patent_id": {"$in": ["P1", "P2", "P16"]}}, lambda m: m["patent_id"] in ("P1", "P2", "P16")),
+        ({"patent_id": {"$nin": ["P1", "P3"]}}, lambda m: m["patent_id"] not in ("P1", "P3")),
+        ({"$and": [{"kind": {"$eq": "b"}}, {"patent_id": {"$nin": ["P5"]}}]},
+         lambda m: m["kind"] == "b" and m["patent_id"] != "P5"),
+        ({"$or": [{"patent_id": "P4"}, {"claim_no": {"$in": [7, 8]}}]},
+         lambda m: m["patent_id"] == "P4" or m["claim_no"] in (7, 8)),
+    ]
+
+    def brute_force(self, collection, queries, space, n, keep):
+        x = collection.vectors.astype(np.float64)
+        q = np.asarray(queries, dtype=np.float64)
+        if space == "l2":
+            dist = ((q[:, None, :] - x[None, :, :]) ** 2).sum(axis=2)
+        elif space == "cosine":
+            dist = 1.0 - (q @ x.T) / (np.linalg.norm(q, axis=1)[:, None] * np.linalg.norm(x, axis=1)[None, :])
+        else:
+            dist = 1.0 - q @ x.T
+        rows = [i for i, meta in enumerate(collection.metas) if keep(meta)]
+        expected = []
+        for row_dist in dist:
+            order = sorted(rows, key=lambda i: row_dist[i])[:n]
+            expected.append(([collection.ids[i] for i in order], [row_dist[i] for i in order]))
+        return expected
+
+    def test_exact_and_ivf_match_brute_force(self):
+        queries = np.random.default_rng(1).normal(size=(3, 8)).astype(np.float32)
+        for space in ("l2", "cosine", "ip"):
+            collection = self.FakeCollection(space)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                index_dir = os.path.join(tmp_dir, "mmap")
+                export_chroma_collection(collection, index_dir, batch_size=50, log=lambda *_: None)
+                exact = MmapBackend(index_dir, block_size=32)
+                build_ivf(index_dir, n_lists=6, iterations=3, log=lambda *_: None)
+                ivf = MmapBackend(index_dir, nprobe=6)
+                self.assertIsNotNone(ivf.ivf_centroids)
+
+                for where, keep in self.WHERES:
+                    expected = self.brute_force(collection, queries, space, 10, keep)
+                    for backend in (exact, ivf):
+                        result = backend.query(queries.tolist(), n_results=10, where=where)
+                        for row, (ids, distances) in enumerate(expected):
+                            msg = f"{space} {where} {'ivf' if backend is ivf else 'exact'}"
+                            self.assertEqual(result["ids"][row], ids, msg)
+                            np.testing.assert_allclose(result["distances"][row], distances, rtol=1e-4, atol=1e-4)
+                            self.assertEqual(result["documents"][row], [f"문서 {i}" for i in ids])
+
+    def test_get(self):
+        collection = self.FakeCollection("l2")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "mmap")
+            export_chroma_collection(collection, index_dir, log=lambda *_: None)
+            backend = MmapBackend(index_dir)
+
+            got = backend.get(ids=["claim-5", "없는 id", "claim-2"], include=["metadatas", "embeddings"])
+            self.assertEqual(got["ids"], ["claim-5", "claim-2"])
+            self.assertEqual([m["claim_no"] for m in got["metadatas"]], [5, 2])
+            np.testing.assert_array_equal(got["embeddings"], collection.vectors[[5, 2]])
+
+            page = backend.get(where={"patent_id": "P3"}, limit=2, offset=1)
+            self.assertEqual(page["ids"], ["claim-20", "claim-37"])
+            self.assertEqual(page["documents"], ["문서 claim-20", "문서 claim-37"])
+            with self.assertRaises(ValueError):
+                backend.get(where={"kind": {"$gt": "a"}})
+
+
+    def test_rebuilds_do_not_touch_mapped_files(self):
+        collection = self.FakeCollection("l2")
+        queries = collection.vectors[:2].tolist()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "mmap")
+            export_chroma_collection(collection, index_dir, log=lambda *_: None)
+            first = MmapBackend(index_dir)
+            expected = first.query(queries, n_results=5)
+            inode = os.stat(os.path.join(first.index_dir, "embeddings.npy")).st_ino
+
+            # IVF / 압축 코드 추가는 기존 파일을 하드 링크한 새 버전으로 게시
+            build_ivf(index_dir, n_lists=4, iterations=2, log=lambda *_: None)
+            build_compressed_codes(index_dir, "int8", log=lambda *_: None)
+            with_ivf = MmapBackend(index_dir, compression="int8")
+            self.assertIsNotNone(with_ivf.ivf_centroids)
+            self.assertEqual(os.stat(os.path.join(with_ivf.index_dir, "embeddings.npy")).st_ino, inode)
+
+            # 행 수가 줄어든 재내보내기: 이미 연 백엔드는 옛 버전 그대로, 새로 열면 새 버전 (IVF 없음)
+            smaller = self.FakeCollection("l2", n=40, seed=3)
+            export_chroma_collection(smaller, index_dir, log=lambda *_: None)
+            self.assertEqual(first.query(queries, n_results=5), expected)
+            self.assertEqual(with_ivf.count(), 120)
+            reexported = MmapBackend(index_dir)
+            self.assertEqual(reexported.count(), 40)
+            self.assertIsNone(reexported.ivf_centroids)
+            self.assertEqual(len([e for e in os.listdir(tmp_dir) if e.startswith(".mmap.v-")]), 2)
+
+
+class VectorCompressionRecallTest(SimpleTestCase):
+    """
+    압축 코드(pca / int8 / binary) 1차 검색 + full 벡터 재점수화의 recall@10 이 exact 검색 대비 기준 이상이고,
+    ip 공간 pca 근사 거리가 행별 x·μ 항을 빠뜨리지 않는지(전체 차원이면 exact 와 상수 차이) 확인합니다.
+    """
+
+    MIN_RECALL = {"pca": 0.95, "int8": 0.95, "binary": 0.3}  # binary 는 해밍 거리라 후보 품질이 낮음
+
+    def make_collection(self, space, rng):
+        # 저차원 구조 + 평균이 0 이 아닌 벡터 (평균 제거를 잘못 다루면 ip 순위가 틀어짐)
+        collection = MmapBackendParityTest.FakeCollection(space, n=600, dim=16)
+        latent, weights = rng.normal(size=(600, 4)), rng.normal(size=(4, 16))
+        offset = np.linspace(0.5, 2.0, 16)
+        collection.vectors = (latent @ weights + 0.1 * rng.normal(size=(600, 16)) + offset).astype(np.float32)
+        queries = (rng.normal(size=(20, 4)) @ weights + offset).astype(np.float32)
+        return collection, queries
+
+    def test_recall_against_exact(self):
+        rng = np.random.default_rng(0)
+        for space in ("l2", "cosine", "ip"):
+            collection, queries = self.make_collection(space, rng)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                index_dir = os.path.join(tmp_dir, "mmap")
+                export_chroma_collection(collection, index_dir, log=lambda *_: None)
+                exact = MmapBackend(index_dir).query(queries.tolist(), n_results=10)["ids"]
+                for method, min_recall in self.MIN_RECALL.items():
+                    build_compressed_codes(index_dir, method, pca_dim=6, log=lambda *_: None)
+                    backend = MmapBackend(index_dir, compression=method, rescore_factor=4)
+                    found = backend.query(queries.tolist(), n_results=10)["ids"]
+                    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact, found)])
+                    self.assertGreaterEqual(recall, min_recall, f"{space} {method}")
+
+    def test_pca_ip_keeps_mean_term(self):
+        collection, queries = self.make_collection("ip", np.random.default_rng(1))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index_dir = os.path.join(tmp_dir, "mmap")
+            export_chroma_collection(collection, index_dir, log=lambda *_: None)
+            build_compressed_codes(index_dir, "pca", pca_dim=16, log=lambda *_: None)
+            codes = CompressedCodes.load(index_dir, "pca")
+            approx = codes.block_distances(codes.prepare_queries(queries), 0, 600)
+            exact = 1.0 - queries.astype(np.float64) @ collection.vectors.astype(np.float64).T
+            # 차이는 쿼리별 상수(q·μ - μ·μ - 1)뿐이어야 순위가 같음
+            self.assertLess(float((approx - exact).std(axis=1).max()), 1e-3)
+
+
+class AdaptivePoolTest(SimpleTestCase):
+    """
+    서로 다른 특허가 top_k 개보다 적을 때만 후보 풀을 넓히되 상한/컬렉션 크기에서 멈추고,
+    제외 특허는 벡터 질의 where($nin)로 내려가 어떤 풀 크기에서도 후보/결과에 나오지 않는지 확인합니다.
+    """
+
+    N_PATENTS, CLAIMS_PER_PATENT, DIM = 20, 100, 8
+
+    class RecordingBackend:
+        # 질의마다 (n_results, where, 후보 특허 집합) 기록
+        def __init__(self, backend):
+            self.backend = backend
+            self.metadata = backend.metadata
+            self.calls = []
+            self.counts = 0
+
+        def count(self):
+            self.counts += 1
+            return self.backend.count()
+
+        def query(self, query_embeddings, n_results, where=None, **kwargs):
+            result = self.backend.query(query_embeddings, n_results=n_results, where=where)
+            patents = {meta["patent_id"] for row in result["metadatas"] for meta in row}
+            self.calls.append((n_results, where, patents))
+            return result
+
+    class QueryModel:
+        def __init__(self, vector):
+            self.vector = vector
+
+        def encode(self, texts):
+            return np.asarray([self.vector] * len(texts), dtype=np.float32)
+
+    def setUp(self):
+        # 특허마다 멀리 떨어진 중심 + 작은 잡음 → 가까운 청구항은 가까운 특허부터 100개씩 채워짐
+        rng = np.random.default_rng(0)
+        centers = np.zeros((self.N_PATENTS, self.DIM), dtype=np.float32)
+        centers[:, 0] = np.arange(self.N_PATENTS) * 10.0
+        collection = MmapBackendParityTest.FakeCollection("l2", n=self.N_PATENTS * self.CLAIMS_PER_PATENT, dim=self.DIM)
+        patent_of = np.arange(len(collection.ids)) // self.CLAIMS_PER_PATENT
+        collection.vectors = (centers[patent_of] + 0.1 * rng.normal(size=(len(patent_of), self.DIM))).astype(np.float32)
+        collection.metas = [{"patent_id": f"P{p}", "claim_no": i % self.CLAIMS_PER_PATENT + 1}
+                            for i, p in enumerate(patent_of)]
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index_dir = os.path.join(tmp.name, "mmap")
+        export_chroma_collection(collection, index_dir, log=lambda *_: None)
+        self.backend = self.RecordingBackend(MmapBackend(index_dir))
+        self.model = self.QueryModel(centers[0])
+
+    def search(self, top_k, max_pool_size, exclude_patent_ids=None):
+        def run(pool_size):
+            return patent_hybrid_search(
+                self.backend, self.model, "배터리", per_query_top_k=pool_size, final_top_k=pool_size,
+                top_k=top_k, exclude_patent_ids=exclude_patent_ids,
+            )
+        return search_with_growing_pool(run, top_k=top_k, pool_size=50, max_pool_size=max_pool_size,
+                                        growth=2, collection_size=self.backend.count)
+
+    def test_growth_stops_at_max_pool(self):
+        results, pool_size = self.search(top_k=10, max_pool_size=300)
+        self.assertEqual(pool_size, 300)
+        self.assertEqual([call[0] for call in self.backend.calls], [50, 100, 200, 300])
+        self.assertEqual([r["patent_id"] for r in results], ["P0", "P1", "P2"])
+
+    def test_growth_stops_at_collection_size(self):
+        results, _ = self.search(top_k=30, max_pool_size=100_000)
+        self.assertEqual([call[0] for call in self.backend.calls], [50, 100, 200, 400, 800, 1600, 3200])
+        self.assertEqual(self.backend.counts, 1)
+        self.assertEqual(len(results), self.N_PATENTS)
+
+    def test_excluded_patents_never_appear(self):
+        excluded = ["P0", "P2"]
+        results, _ = self.search(top_k=3, max_pool_size=800, exclude_patent_ids=excluded)
+        self.assertEqual([r["patent_id"] for r in results], ["P1", "P3", "P4"])
+        for n_results, where, patents in self.backend.calls:
+            self.assertEqual(where, {"patent_id": {"$nin": excluded}})
+            self.assertFalse(patents & set(excluded))
+        # 제외 특허가 풀을 차지하지 않으므로 P1, P3, P4 의 청구항 300개 → 풀 50 → 100 → 200 → 400
+        self.assertEqual([call[0] for call in self.backend.calls], [50, 100, 200, 400])
+
+
+class OnnxEncoderTest(SimpleTestCase):
+    """
+    ONNX 인코더의 배치/패딩/풀링/정규화가 문장 하나씩 (패딩 없이) 계산한 SentenceTransformer 식 결과와 같은지,
+    가짜 토크나이저와 가짜 onnxruntime 세션으로 확인합니다.
+    """
+
+    DIM, MAX_SEQ_LENGTH = 4, 6
+    TABLE = np.random.default_rng(0).normal(size=(100, 4)).astype(np.float32)  # 토큰 id → hidden (pad 행도 0 아님)
+
+    class FakeTokenizer:
+        def __init__(self, max_length, pad_id):
+            self.max_length = max_length
+            self.pad_id = pad_id
+
+        def enable_truncation(self, max_length):
+            self.max_length = max_length
+
+        def enable_padding(self, pad_id, pad_token):
+            self.pad_id = pad_id
+
+        def token_ids(self, text):
+            return [1] + [ord(ch) % 97 + 2 for ch in text][:self.max_length - 1]  # 1 = [CLS]
+
+        def encode_batch(self, texts):
+            ids = [self.token_ids(text) for text in texts]
+            width = max(len(row) for row in ids)
+            return [
+                SimpleNamespace(ids=row + [self.pad_id] * (width - len(row)),
+                                attention_mask=[1] * len(row) + [0] * (width - len(row)))
+                for row in ids
+            ]
+
+    class FakeSession:
+        def __init__(self, table, with_token_type):
+            self.table = table
+            self.names = ["input_ids", "attention_mask"] + (["token_type_ids"] if with_token_type else [])
+            self.feeds = []
+
+        def get_inputs(self):
+            return [SimpleNamespace(name=name) for name in self.names]
+
+        def run(self, output_names, feeds):
+            self.feeds.append(sorted(feeds))
+            return [self.table[feeds["input_ids"]]]
+
+    def open_encoder(self, model_dir, pooling, normalize, with_token_type=False):
+        with open(os.path.join(model_dir, onnx_encoder.ENCODER_CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump({"pooling": pooling, "normalize": normalize, "dim": self.DIM,
+                       "max_seq_length": self.MAX_SEQ_LENGTH, "pad_token": "<pad>", "pad_token_id": 0}, f)
+        session = self.FakeSession(self.TABLE, with_token_type)
+        tokenizer = self.FakeTokenizer(max_length=None, pad_id=None)  # 설정은 OnnxEncoder 가 채움
+        with mock.patch.object(onnx_encoder, "_open_session", return_value=session), \
+                mock.patch.object(onnx_encoder, "_load_tokenizer", return_value=tokenizer):
+            return onnx_encoder.OnnxEncoder(model_dir, quantized=False), session, tokenizer
+
+    def test_pooling_and_normalisation(self):
+        texts = ["배터리", "카메라 모듈 손떨림 보정 구조", "a", "드론 배터리 교체"]
+        with tempfile.TemporaryDirectory() as model_dir:
+            for pooling in ("mean", "cls"):
+                for normalize in (True, False):
+                    encoder, session, tokenizer = self.open_encoder(model_dir, pooling, normalize, with_token_type=True)
+                    expected = []
+                    for text in texts:
+                        hidden = self.TABLE[tokenizer.token_ids(text)].astype(np.float64)
+                        vector = hidden[0] if pooling == "cls" else hidden.mean(axis=0)
+                        expected.append(vector / np.linalg.norm(vector) if normalize else vector)
+
+                    np.testing.assert_allclose(encoder.encode(texts, batch_size=3), expected, rtol=1e-5, atol=1e-6)
+                    np.testing.assert_allclose(encoder.encode(texts[1]), expected[1], rtol=1e-5, atol=1e-6)
+                    self.assertEqual(session.feeds[0], ["attention_mask", "input_ids", "token_type_ids"])
+
+            encoder, session, _ = self.open_encoder(model_dir, "mean", True)
+            self.assertEqual(encoder.encode([]).shape, (0, self.DIM))
+            encoder.encode(["x"])
+            self.assertEqual(session.feeds[-1], ["attention_mask", "input_ids"])
+            with self.assertRaises(FileNotFoundError):
+                onnx_encoder.OnnxEncoder(model_dir, quantized=True)
+
+
+class MicroBatchEncoderTest(SimpleTestCase):
+    """
+    동시 encode() 요청이 배치로 묶이더라도 각 호출자가 자기 문장의 행을 그대로 돌려받는지 확인합니다.
+    """
+
+    class LengthModel:
+        # 문장 길이를 임베딩으로 돌려주는 가짜 모델 (호출된 배치 크기 기록)
+        def __init__(self):
+            self.calls = []
+
+        def encode(self, texts, **kwargs):
+            self.calls.append(len(texts))
+            return np.asarray([[len(t), kwargs.get("scale", 1)] for t in texts], dtype=np.float32)
+
+    def test_concurrent_callers_get_own_rows(self):
+        model = self.LengthModel()
+        encoder = MicroBatchEncoder(model, max_batch_size=8, max_wait_ms=50)
+        results = {}
+
+        def call(i):
+            text = "가" * (i + 1)
+            results[i] = encoder.encode(text if i % 2 else [text, text + "나"])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for i, vector in results.items():
+            if i % 2:
+                self.assertEqual(vector.tolist(), [i + 1, 1])
+            else:
+                self.assertEqual(vector.tolist(), [[i + 1, 1], [i + 2, 1]])
+
+        stats = encoder.stats()
+        self.assertEqual(stats["texts"], 18)
+        self.assertLess(stats["batches"], 12)
+        self.assertTrue(all(size <= 8 for size in model.calls))
+
+    def test_different_options_are_not_mixed(self):
+        model = self.LengthModel()
+        encoder = MicroBatchEncoder(model, max_wait_ms=20)
+        results = {}
+
+        def call(scale):
+            results[scale] = encoder.encode(["abc"], scale=scale)
+
+        threads = [threading.Thread(target=call, args=(scale,)) for scale in (1, 2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results[1].tolist(), [[3, 1]])
+        self.assertEqual(results[2].tolist(), [[3, 2]])
+
+    def test_worker_restarts_in_forked_child(self):
+        # 부모에서 워커 스레드를 띄운 뒤 fork → 자식은 스레드 없이 시작하므로 새로 띄워야 함
+        encoder = MicroBatchEncoder(self.LengthModel(), max_wait_ms=1, timeout=5)
+        self.assertEqual(encoder.encode("부모").tolist(), [2, 1])
+
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = 0 if encoder.encode("자식 프로세스").tolist() == [7, 1] else 2
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(encoder.encode("부모 다시").tolist(), [5, 1])
+
+    def test_timeout(self):
+        release = threading.Event()
+
+        class BlockingModel:
+            def encode(self, texts, **kwargs):
+                release.wait(5)
+                return np.zeros((len(texts), 2), dtype=np.float32)
+
+        self.addCleanup(release.set)
+        encoder = MicroBatchEncoder(BlockingModel(), max_wait_ms=1, timeout=0.1)
+        with self.assertRaises(TimeoutError):
+            encoder.encode("멈춘 모델")
+
+
+class RetrievalServerTest(SimpleTestCase):
+    """
+    검색 서버의 줄 단위 JSON 프로토콜: 연산별 결과 스키마가 _dump/_load 왕복 후 바이트 단위로 같고,
+    서버 예외는 RetrievalServerError 로 전달되며, 끊긴 연결은 한 번 재연결 후 재시도하는지 확인합니다.
+    """
+
+    SAMPLES = {
+        "search_patents": PatentSearchOutput(query_text="배터리 냉각 \"장치\"", top_k=1, results=[{
+            "patent_id": "1020200001234", "score": 0.1 + 0.2, "top_claim": "청구항 1\n본문", "top_claim_no": 1,
+            "claims_found": 2, "result_index": 1,
+            "claims": [{"id": "1020200001234_1", "document": "본문", "title": "발명", "distance": 1e-7,
+                        "hybrid_score": 0.7312345678901234}],
+        }]),
+        "get_patent_detail": PatentByIdOutput(
+            patent_id="1020200001234", found=True, title="발명", priority="", register_status="등록",
+            ipc_raw="H01M 10/613", ipc_codes=["H01M 10/613"], link="", num_claims=1,
+            claims=[{"claim_no": 1, "text": "청구항 😀"}],
+        ),
+        "search_ipc_codes": IPCMainDescription(
+            mains=[{"ids": "H01M", "description": "전지"}], subs=[{"ids": "H01M 10/613", "description": "냉각"}],
+        ),
+        "get_ipc_details": [IPCDetailInfo(ids="H01M", description="전지", type="m", ancestors="H > H01")],
+    }
+
+    def test_dump_load_round_trip(self):
+        self.assertEqual(set(self.SAMPLES), set(RESULT_SCHEMAS))
+        for op, value in self.SAMPLES.items():
+            wire = json.dumps(_dump(value), ensure_ascii=False)
+            loaded = _load(op, json.loads(wire))
+            self.assertEqual(loaded, value, op)
+            self.assertEqual(json.dumps(_dump(loaded), ensure_ascii=False), wire, op)
+
+    def test_client_server(self):
+        calls = []
+
+        def operation(op):
+            def run(**kwargs):
+                calls.append((op, kwargs))
+                if kwargs.get("fail"):
+                    raise ValueError("잘못된 인자")
+                return self.SAMPLES[op]
+            return run
+
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "retrieval.sock")
+            server = RetrievalServer(socket_path, {op: operation(op) for op in self.SAMPLES})
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            client = RetrievalClient(socket_path, timeout=10)
+
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda op: (op, client.call(op, top_k=3)), list(self.SAMPLES) * 3))
+            for op, value in results:
+                self.assertEqual(value, self.SAMPLES[op])
+            self.assertEqual(calls[0][1], {"top_k": 3})
+
+            with self.assertRaisesRegex(RetrievalServerError, r"search_patents 실패 \(ValueError\): 잘못된 인자"):
+                client.search_patents(fail=True)
+            with self.assertRaisesRegex(RetrievalServerError, "KeyError"):
+                client.call("unknown_op")
+
+            # 같은 연결로 계속 쓰다가, 끊긴 연결은 재연결 후 재시도
+            sock, _ = client._connection()
+            sock.close()
+            self.assertEqual(client.get_ipc_details(codes=["H01M"]), self.SAMPLES["get_ipc_details"])
+
+
+class ResourceRegistryTest(SimpleTestCase):
+    """
+    동시 첫 요청에서도 리소스를 한 번만 로드하고 reset 후에는 다시 로드하며,
+    preload 된 SQLite 캐시가 fork 된 워커에서 자기 연결/owner 로 동작하는지 확인합니다.
+    """
+
+    def test_loads_once_under_concurrency(self):
+        registry = ResourceRegistry()
+        loads = []
+
+        @registry.resource("model")
+        def _load_model():
+            loads.append(1)
+            time.sleep(0.1)
+            return object()
+
+        registry.register("none", lambda: loads.append("none"))  # None 반환도 로드 완료
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            values = list(executor.map(lambda _: registry.get("model"), range(8)))
+        self.assertEqual(loads.count(1), 1)
+        self.assertTrue(all(value is values[0] for value in values))
+        self.assertIsNone(registry.get("none"))
+        self.assertIsNone(registry.get("none"))
+        self.assertEqual(loads.count("none"), 1)
+        self.assertEqual(set(registry.warm_up()), {"model", "none"})
+
+        registry.reset("model")
+        self.assertFalse(registry.is_loaded("model"))
+        self.assertTrue(registry.is_loaded("none"))
+        self.assertIsNot(registry.get("model"), values[0])
+        self.assertEqual(loads.count(1), 2)
+        registry.reset()
+        self.assertFalse(registry.is_loaded("none"))
+        with self.assertRaises(KeyError):
+            registry.get("missing")
+
+    def test_sqlite_caches_reopen_after_fork(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            encoder = CachedEncoder(CachedEncoderTest.CountingModel(), model_id="m",
+                                    persist_path=os.path.join(tmp, "embed.sqlite3"))
+            cache = RetrievalCache(os.path.join(tmp, "result.sqlite3"))
+            encoder.encode("부모")
+            cache.get_or_compute("ns", {"q": "부모"}, "v1", lambda: [1])
+            parent_db, parent_conn, parent_owner = encoder._db, cache._conn(), cache.owner
+
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    reopened = (encoder._db is not parent_db and cache._conn() is not parent_conn
+                                and cache.owner != parent_owner)
+                    encoder.encode("자식")
+                    value = cache.get_or_compute("ns", {"q": "자식"}, "v1", lambda: [2])
+                    code = 0 if reopened and value == [2] else 2
+                finally:
+                    os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+            # 자식이 쓴 결과를 부모가 그대로 읽음 (부모 연결은 손상되지 않음)
+            self.assertEqual(cache.get_or_compute("ns", {"q": "자식"}, "v1", lambda: [3]), [2])
+            self.assertEqual(encoder.encode("자식").tolist(), [2, 1])
+            self.assertEqual(encoder.stats()["disk_hits"], 1)
+
+
+class BatchedIpcSearchTest(SimpleTestCase):
+    """
+    여러 키워드의 IPC 검색이 임베딩 1회 + 벡터 DB 질의 1회로 처리되고,
+    같은 키워드를 다시 검색하면 원격 임베딩을 호출하지 않으며,
+    계층 인덱스가 있으면 부모가 결과에 없는 형제도 한 번만 남는지 확인합니다.
+    """
+
+    class FakeCollection:
+        def __init__(self):
+            self.query_sizes = []
+
+        def query(self, query_embeddings, n_results, where, include):
+            self.query_sizes.append(len(query_embeddings))
+            ids, distances, metadatas = [], [], []
+            for vector in query_embeddings:
+                code = f"H01M {int(vector[0])}/00"
+                ids.append([code])
+                distances.append([0.1 * vector[0]])
+                metadatas.append([{"kind": "m", "path": f"H > H01 > H01M > {code}"}])
+            return {"ids": ids, "distances": distances, "metadatas": metadatas}
+
+    def test_single_batched_call_and_cache(self):
+        embed_calls = []
+
+        def embed(texts):
+            embed_calls.append(list(texts))
+            return [[len(t), 0.0] for t in texts]
+
+        encoder = CachedEncoder(EmbeddingFunctionEncoder(embed), model_id="fake")
+        collection = self.FakeCollection()
+        queries = ["가", "가나", "가나다"]
+
+        result = get_combined_ipc_codes(encoder, collection, queries, total_top_k=5)
+        self.assertEqual([item["main"] for item in result], ["H01M 1/00", "H01M 2/00", "H01M 3/00"])
+        self.assertEqual([item["source_query"] for item in result], queries)
+        self.assertEqual(embed_calls, [queries])
+        self.assertEqual(collection.query_sizes, [3])
+
+        get_combined_ipc_codes(encoder, collection, queries, total_top_k=5)
+        self.assertEqual(len(embed_calls), 1)
+
+    def test_concurrent_matches_batched(self):
+        def embed(texts):
+            return [[len(t), 0.0] for t in texts]
+
+        queries = ["가" * n for n in range(1, 7)]
+        batched = get_combined_ipc_codes(embed, self.FakeCollection(), queries, max_workers=1)
+        collection = self.FakeCollection()
+        concurrent = get_combined_ipc_codes(embed, collection, queries, max_workers=4)
+        self.assertEqual(concurrent, batched)
+        self.assertEqual(collection.query_sizes, [1] * len(queries))
+
+    def test_siblings_dedup_on_hierarchy_parent(self):
+        # H01M 1/00, 2/00, 3/00 은 형제지만 부모 H01M 은 검색 결과에 없음
+        def embed(texts):
+            return [[len(t), 0.0] for t in texts]
+
+        codes = [f"H01M {n}/00" for n in (1, 2, 3)]
+        hierarchy = IpcHierarchy.from_paths((code, f"H > H01 > H01M > {code}") for code in codes)
+        queries = ["가", "가나", "가나다"]
+
+        result = get_combined_ipc_codes(embed, self.FakeCollection(), queries, total_top_k=5, hierarchy=hierarchy)
+        self.assertEqual([item["main"] for item in result], ["H01M 1/00"])
+        without = get_combined_ipc_codes(embed, self.FakeCollection(), queries, total_top_k=5)
+        self.assertEqual([item["main"] for item in without], codes)  # IPC_HIERARCHY=0: sub 로만 판정
+
+
+class IpcHierarchyTest(SimpleTestCase):
+    """
+    path 메타데이터로 만든 계층 인덱스의 탐색 결과와, 인덱스를 쓴 조상 병합이 path 파싱 결과와 같은지 확인합니다.
+    """
+
+    PATHS = {
+        "H01M 10/00": "H > H01 > H01M > H01M 10/00",
+        "H01M 10/42": "H > H01 > H01M > H01M 10/00 > H01M 10/42",
+        "H01M 10/44": "H > H01 > H01M > H01M 10/00 > H01M 10/44",
+        "H01M 10/613": "H > H01 > H01M > H01M 10/00 > H01M 10/44 > H01M 10/613",
+    }
+
+    def test_navigation_and_merge(self):
+        hierarchy = IpcHierarchy.from_paths(self.PATHS.items())
+
+        self.assertEqual(hierarchy.ancestors("H01M 10/613"), ["H", "H01", "H01M", "H01M 10/00", "H01M 10/44"])
+        self.assertEqual(hierarchy.children("H01M 10/00"), ["H01M 10/42", "H01M 10/44"])
+        self.assertEqual(hierarchy.siblings("H01M 10/42"), ["H01M 10/44"])
+        self.assertEqual(hierarchy.depth_of("H01M 10/613"), 5)
+        self.assertEqual(hierarchy.parent_of("H"), None)
+
+        ids = ["H01M 10/613", "H01M 10/44", "H01M 10/42", "H01M 10/00"]
+        distances = [0.50, 0.52, 0.70, 0.53]
+        metadatas = [{"path": self.PATHS[code]} for code in ids]
+        expected = _merge_ipc_hierarchy(ids, distances, metadatas, top_k=5)
+        self.assertEqual(expected[0]["sub"], ["H01M 10/00", "H01M 10/44"])
+        self.assertEqual(_merge_ipc_hierarchy(ids, distances, None, top_k=5, hierarchy=hierarchy), expected)
+
+    def test_cache_rebuilds_when_content_changes(self):
+        class FakeCollection:
+            metadata = None
+
+            def __init__(self, paths, marker):
+                self.paths, self.marker, self.gets = paths, marker, 0
+
+            def count(self):
+                return len(self.paths)
+
+            def content_marker(self):
+                return self.marker
+
+            def get(self, include, limit, offset):
+                self.gets += 1
+                codes = list(self.paths)[offset:offset + limit]
+                return {"ids": codes, "metadatas": [{"path": self.paths[code]} for code in codes]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "ipc_hierarchy.npz")
+            collection = FakeCollection(self.PATHS, marker="t1")
+            built = load_or_build_ipc_hierarchy(collection, cache_path, log=lambda msg: None)
+            self.assertEqual(os.listdir(tmp), ["ipc_hierarchy.npz"])  # 임시 파일은 교체 후 남지 않음
+
+            cached = load_or_build_ipc_hierarchy(collection, cache_path, log=lambda msg: None)
+            self.assertEqual(collection.gets, 2)  # 두 번째는 컬렉션을 읽지 않음
+            self.assertEqual(cached.codes, built.codes)
+
+            # 행 수가 같은 재색인(내용만 바뀜)도 다시 빌드
+            renamed = {code.replace("H01M", "H01G"): path.replace("H01M", "H01G") for code, path in self.PATHS.items()}
+            rebuilt = load_or_build_ipc_hierarchy(FakeCollection(renamed, marker="t2"), cache_path, log=lambda msg: None)
+            self.assertIn("H01G 10/613", rebuilt)
+            self.assertIn("H01G 10/613", IpcHierarchy.load(cache_path))
+
+
+class IpcDictionaryTest(SimpleTestCase):
+    """
+    컬렉션에서 만든 IPC 코드 사전이 표기 차이를 정규화해 조회하고, 입력 순서대로 중복 없이 반환하는지 확인합니다.
+    """
+
+    class FakeCollection:
+        name = "ipc_clean"
+        ids = ["G06T", "G06T7/00", "G06T7/10"]
+
+        def count(self):
+            return len(self.ids)
+
+        def get(self, include, limit, offset):
+            ids = self.ids[offset:offset + limit]
+            return {
+                "ids": ids,
+                "documents": [f"{code} 설명" for code in ids],
+                "metadatas": [{"kind": "m", "path": f"G > G06 > {code}"} for code in ids],
+            }
+
+    def test_lookup_with_code_variants(self):
+        self.assertEqual(normalize_ipc_code(" g06t  007/00 "), "G06T7/00")
+        self.assertEqual(normalize_ipc_code("G06T 7/00"), normalize_ipc_code("G06T7/00"))
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            dictionary = build_ipc_dictionary(self.FakeCollection(), out_dir, batch_size=2, log=lambda msg: None)
+            self.assertEqual(len(dictionary), 3)
+
+            details = dictionary.details_of(["G06T 7/10", "없는코드", "g06t7/10", "G06T"])
+            self.assertEqual([d["ids"] for d in details], ["G06T7/10", "G06T"])
+            self.assertEqual(details[0]["description"], "G06T7/10 설명")
+            self.assertEqual(details[0]["ancestors"], "G > G06 > G06T7/10")
+            self.assertEqual(dictionary.descriptions_of(["G06T 7/00"]), [{"ids": "G06T7/00", "description": "G06T7/00 설명"}])
+
+    def test_versioned_rebuild_keeps_mapped_dictionary(self):
+        class VersionedCollection(self.FakeCollection):
+            def __init__(self, marker, suffix):
+                self.metadata, self.marker, self.suffix, self.gets = None, marker, suffix, 0
+
+            def content_marker(self):
+                return self.marker
+
+            def get(self, include, limit, offset):
+                self.gets += 1
+                batch = super().get(include, limit, offset)
+                batch["documents"] = [doc + self.suffix for doc in batch["documents"]]
+                return batch
+
+        with tempfile.TemporaryDirectory() as store_dir:
+            first = VersionedCollection("t1", "")
+            old = load_or_build_ipc_dictionary(first, store_dir, log=lambda msg: None)
+            self.assertEqual(len(load_or_build_ipc_dictionary(first, store_dir, log=lambda msg: None)), 3)
+            self.assertEqual(first.gets, 2)  # 두 번째는 빌드된 사전을 그대로 읽음
+
+            # 행 수가 같은 재색인: 새 버전 디렉터리로 빌드, 이전 사전을 매핑 중인 쪽은 이전 내용을 계속 읽음
+            new = load_or_build_ipc_dictionary(VersionedCollection("t2", " (개정)"), store_dir, log=lambda msg: None)
+            self.assertEqual(new.descriptions_of(["G06T"])[0]["description"], "G06T 설명 (개정)")
+            self.assertEqual(old.descriptions_of(["G06T"])[0]["description"], "G06T 설명")
+            self.assertEqual(len(os.listdir(store_dir)), 1)  # 이전 버전/임시 디렉터리는 남지 않음
+
+
+class IpcReindexTest(SimpleTestCase):
+    """
+    재색인이 ids/문서/메타데이터를 유지한 채 새 임베딩으로 upsert 하고(중간 재시작 포함),
+    같은 임베딩의 두 인덱스 비교에서 겹침이 1 이며, 후보 결과가 없으면 제안 컷오프가 None 인지 확인합니다.
+    """
+
+    class FakeCollection:
+        def __init__(self, name, space="l2"):
+            self.name = name
+            self.metadata = {"hnsw:space": space}
+            self.rows = {}  # id → (document, metadata, vector)
+            self.upserts = []
+
+        def count(self):
+            return len(self.rows)
+
+        def upsert(self, ids, embeddings, documents, metadatas):
+            self.upserts.append(list(ids))
+            for i, code in enumerate(ids):
+                self.rows[code] = (documents[i], metadatas[i], np.asarray(embeddings[i], dtype=np.float32))
+
+        def get(self, include, limit, offset):
+            codes = list(self.rows)[offset:offset + limit]
+            return {
+                "ids": codes,
+                "documents": [self.rows[code][0] for code in codes],
+                "metadatas": [self.rows[code][1] for code in codes],
+            }
+
+        def query(self, query_embeddings, n_results, where, include):
+            kinds = set(where["kind"]["$in"])
+            codes = [code for code, row in self.rows.items() if row[1]["kind"] in kinds]
+            result = {"ids": [], "distances": [], "metadatas": []}
+            for vector in np.asarray(query_embeddings, dtype=np.float32):
+                if self.metadata["hnsw:space"] == "cosine":
+                    dists = [1.0 - float(self.rows[code][2] @ vector) for code in codes]
+                else:
+                    dists = [float(((self.rows[code][2] - vector) ** 2).sum()) for code in codes]
+                order = np.argsort(dists, kind="stable")[:n_results]
+                result["ids"].append([codes[i] for i in order])
+                result["distances"].append([dists[i] for i in order])
+                result["metadatas"].append([self.rows[codes[i]][1] for i in order])
+            return result
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = {}
+        self.source = self.FakeCollection("ipc_clean")
+        codes = [f"H01M {group}/{sub:02d}" for group in range(1, 5) for sub in (0, 10, 20)]
+        for code in codes:
+            vector = rng.normal(size=6).astype(np.float32)
+            self.vectors[f"{code} 설명"] = vector / np.linalg.norm(vector)
+            group = code.split("/")[0] + "/00"
+            path = f"H > H01 > H01M > {group}" + ("" if code == group else f" > {code}")
+            self.source.upsert([code], [self.vectors[f"{code} 설명"] * 2.0], [f"{code} 설명"],
+                               [{"kind": "m" if code == group else "1", "path": path}])
+        self.source.upserts.clear()
+
+    def encode(self, texts):
+        return np.stack([self.vectors[text] for text in texts])
+
+    def test_reindex_and_compare(self):
+        target = self.FakeCollection("ipc_clean_local", space="cosine")
+        self.assertEqual(reindex_ipc_collection(self.source, target, self, batch_size=5, start_offset=10,
+                                                log=lambda msg: None), 12)
+        self.assertEqual(target.upserts, [["H01M 4/10", "H01M 4/20"]])  # --start-offset 부터 이어서
+        self.assertEqual(reindex_ipc_collection(self.source, target, self, batch_size=5, log=lambda msg: None), 12)
+        self.assertEqual([len(ids) for ids in target.upserts[1:]], [5, 5, 2])
+        self.assertEqual(sorted(target.rows), sorted(self.source.rows))
+        for code, (doc, meta, vector) in target.rows.items():
+            self.assertEqual((doc, meta), self.source.rows[code][:2])
+            np.testing.assert_allclose(vector, self.vectors[doc])
+
+        queries = list(self.vectors)[:4]
+        report = compare_ipc_indexes(queries, self.encode, self.source, self.encode, target, k=3)
+        self.assertEqual((report["raw_overlap"], report["pipeline_overlap"]), (1.0, 1.0))
+        self.assertIsNotNone(report["suggested_max_distance"])
+        self.assertEqual(report["candidate_max_distance"], report["suggested_max_distance"])
+
+        empty = compare_ipc_indexes(queries, self.encode, self.source, self.encode,
+                                    self.FakeCollection("empty", space="cosine"), k=3)
+        self.assertIsNone(empty["suggested_max_distance"])
+        self.assertEqual(empty["pipeline_overlap"], 0.0)
+
+    def test_threshold_sidecar(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pai_thresholds.json")
+            thresholds = CollectionValueFile(path)
+            self.assertIsNone(thresholds.get("ipc_clean_local"))
+            thresholds.set("ipc_clean_local", 0.3125)
+            self.assertEqual(CollectionValueFile(path).get("ipc_clean_local"), 0.3125)
+            # 임시 파일은 남지 않음 (.lock 은 읽기-수정-쓰기 직렬화용으로 계속 둠)
+            self.assertEqual(sorted(os.listdir(tmp)), ["pai_thresholds.json", "pai_thresholds.json.lock"])
+
+
+class IngestRecordTest(SimpleTestCase):
+    """
+    적재 입력 행이 (id, 문서, 메타데이터)로 변환되고, 체크포인트가 같은 입력 파일에서만 이어지는지 확인합니다.
+    """
+
+    def test_record_and_checkpoint(self):
+        preset = COLLECTION_PRESETS["patent_claims"]
+        row = {"patent_id": "1020200001234", "claim_no": "3", "document": "청구항 본문", "ipc": "", "title": "발명"}
+        self.assertEqual(
+            to_record(row, preset),
+            ("1020200001234_3", "청구항 본문", {"patent_id": "1020200001234", "claim_no": 3, "title": "발명"}),
+        )
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "claims.jsonl")
+            with open(source, "w", encoding="utf-8") as f:
+                f.write("{}\n")
+            path = os.path.join(tmp_dir, "checkpoint.json")
+
+            IngestCheckpoint(path, source, "patent_claims").save(2048)
+            self.assertEqual(IngestCheckpoint(path, source, "patent_claims").rows_done, 2048)
+            self.assertEqual(IngestCheckpoint(path, source, "ipc_clean").rows_done, 0)
+
+
+class IncrementalUpdateTest(SimpleTestCase):
+    """
+    특허 단위 증분 반영 후 BM25 delta 점수가 전체 재빌드와 같고,
+    메타 저장소 overlay / 컬렉션 버전이 함께 갱신되며, 메타 저장소를 다시 빌드하면
+    이미 연 저장소는 그대로 두고 새 base 와 빈 delta 가 한 번에 바뀌는지,
+    여러 프로세스/스레드의 동시 bump() 가 사라지지 않는지 확인합니다.
+    """
+
+    class FakeCollection:
+        name = "patent_claims"
+
+        def __init__(self):
+            self.rows = {}  # id -> (document, metadata)
+
+        def count(self):
+            return len(self.rows)
+
+        def get(self, include, limit=None, offset=0, ids=None):
+            keys = list(ids) if ids is not None else sorted(self.rows)[offset:offset + limit]
+            keys = [key for key in keys if key in self.rows]
+            return {
+                "ids": keys,
+                "documents": [self.rows[key][0] for key in keys],
+                "metadatas": [self.rows[key][1] for key in keys],
+            }
+
+        def delete(self, where):
+            patent_ids = set(where["patent_id"]["$in"])
+            self.rows = {k: v for k, v in self.rows.items() if v[1]["patent_id"] not in patent_ids}
+
+        def upsert(self, ids, embeddings, documents, metadatas):
+            for record_id, document, metadata in zip(ids, documents, metadatas):
+                self.rows[record_id] = (document, metadata)
+
+    class FakeEncoder:
+        def encode(self, texts):
+            return np.zeros((len(texts), 2), dtype=np.float32)
+
+    def claims(self, patent_id, texts, title):
+        preset = COLLECTION_PRESETS["patent_claims"]
+        return [
+            to_record({"patent_id": patent_id, "claim_no": no, "document": text, "title": title}, preset)
+            for no, text in enumerate(texts, start=1)
+        ]
+
+    def test_delta_matches_rebuild(self):
+        rng = random.Random(3)
+        words = [f"w{i}" for i in range(40)]
+
+        def text():
+            return " ".join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+
+        collection = self.FakeCollection()
+        for p in range(30):
+            for record_id, document, metadata in self.claims(f"P{p}", [text() for _ in range(3)], f"발명 {p}"):
+                collection.rows[record_id] = (document, metadata)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bm25_dir = os.path.join(tmp_dir, "bm25")
+            meta_dir = os.path.join(tmp_dir, "meta")
+            build_bm25_index(collection, bm25_dir, log=lambda *_: None)
+            build_patent_meta_store(collection, meta_dir, log=lambda *_: None)
+            versions = VersionFile(os.path.join(tmp_dir, "versions.json"))
+
+            # 1차: 특허 교체 + 신규 추가 + 삭제, 2차: 1차에 추가한 특허를 다시 교체
+            updates = self.claims("P1", [text(), "신규용어 w1"], "바뀐 발명") + self.claims("N1", [text()], "신규")
+            apply_patent_updates(collection, updates, self.FakeEncoder(), versions,
+                                 deleted_patent_ids=["P2"], bm25_dir=bm25_dir, meta_dir=meta_dir,
+                                 log=lambda *_: None)
+            summary = apply_patent_updates(collection, self.claims("N1", [text(), text()], "신규"),
+                                           self.FakeEncoder(), versions, bm25_dir=bm25_dir,
+                                           meta_dir=meta_dir, log=lambda *_: None)
+            self.assertEqual(summary["version"], 2)
+            self.assertEqual(versions.get("patent_claims"), 2)
+
+            incremental = BM25Index.load(bm25_dir)
+            rebuilt_dir = os.path.join(tmp_dir, "rebuilt")
+            build_bm25_index(collection, rebuilt_dir, log=lambda *_: None)
+            rebuilt = BM25Index.load(rebuilt_dir)
+
+            for query in ["w1 w2 w3", "신규용어", "w5 w5 w7 w39"]:
+                scores = incremental.get_scores(tokenize(query))
+                expected = rebuilt.get_scores(tokenize(query))
+                got = {incremental.doc_ids[row]: round(float(scores[row]), 9) for row in np.flatnonzero(scores)}
+                want = {rebuilt.doc_ids[row]: round(float(expected[row]), 9) for row in np.flatnonzero(expected)}
+                self.assertEqual(got, want)
+
+            store = PatentMetaStore.load(meta_dir)
+            self.assertEqual(len(store), 30)
+            self.assertNotIn("P2", store)
+            self.assertEqual(store.field("P1", "title"), "바뀐 발명")
+            self.assertEqual(store.claims("N1"), (["N1_1", "N1_2"], [1, 2]))
+
+    def test_meta_store_rebuild_swaps_base_and_delta_together(self):
+        collection = self.FakeCollection()
+        for p in range(5):
+            for record_id, document, metadata in self.claims(f"P{p}", ["w1", "w2"], f"발명 {p}"):
+                collection.rows[record_id] = (document, metadata)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            meta_dir = os.path.join(tmp_dir, "meta")
+            build_patent_meta_store(collection, meta_dir, log=lambda *_: None)
+            versions = VersionFile(os.path.join(tmp_dir, "versions.json"))
+            apply_patent_updates(collection, self.claims("P1", ["w3"], "바뀐 발명"), self.FakeEncoder(), versions,
+                                 deleted_patent_ids=["P2"], meta_dir=meta_dir, log=lambda *_: None)
+            before = PatentMetaStore.load(meta_dir)
+
+            for record_id, document, metadata in self.claims("P9", ["w4"], "재빌드 전 추가"):
+                collection.rows[record_id] = (document, metadata)
+            build_patent_meta_store(collection, meta_dir, log=lambda *_: None)
+
+            # 이미 연 저장소는 옛 base + delta 그대로, 새로 열면 새 base 만 (delta 없음)
+            self.assertEqual(before.version, 1)
+            self.assertEqual(before.field("P1", "title"), "바뀐 발명")
+            self.assertNotIn("P9", before)
+            after = PatentMetaStore.load(meta_dir)
+            self.assertIsNone(after.version)
+            self.assertEqual(after.field("P1", "title"), "바뀐 발명")
+            self.assertNotIn("P2", after)
+            self.assertIn("P9", after)
+            self.assertFalse(os.path.exists(os.path.join(meta_dir, "delta.json")))
+
+    def test_concurrent_bumps_are_not_lost(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pai_versions.json")
+
+            def bump_many():
+                versions = VersionFile(path)
+                for _ in range(25):
+                    versions.bump("patent_claims")
+
+            pids = []
+            for _ in range(2):
+                pid = os.fork()
+                if pid == 0:
+                    code = 1
+                    try:
+                        bump_many()
+                        code = 0
+                    finally:
+                        os._exit(code)
+                pids.append(pid)
+            threads = [threading.Thread(target=bump_many) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for pid in pids:
+                _, status = os.waitpid(pid, 0)
+                self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+            self.assertEqual(VersionFile(path).get("patent_claims"), 150)
+
+            # reserve() 중에는 다른 bump() 가 기다렸다가 그다음 버전을 받음
+            versions = VersionFile(path)
+            bumped = []
+            with versions.reserve("patent_claims") as version:
+                waiter = threading.Thread(target=lambda: bumped.append(VersionFile(path).bump("patent_claims")))
+                waiter.start()
+                time.sleep(0.1)
+                self.assertEqual(bumped, [])
+                self.assertEqual(versions.get("patent_claims"), 150)
+            waiter.join(timeout=5)
+            self.assertEqual((version, bumped), (151, [152]))
+
+    def test_mmap_export_carries_version(self):
+        # 내보낸 시점의 버전이 mmap 백엔드에 남아 결과 캐시 키가 증분 반영/재내보내기와 함께 바뀜
+        with tempfile.TemporaryDirectory() as tmp:
+            versions = VersionFile(os.path.join(tmp, "pai_versions.json"))
+            versions.bump("patent_claims")
+            source = ChromaBackend(MmapBackendParityTest.FakeCollection("l2", n=10), version_file=versions)
+            export_chroma_collection(source, os.path.join(tmp, "v1"), log=lambda *_: None)
+            versions.bump("patent_claims")
+            export_chroma_collection(source, os.path.join(tmp, "v2"), log=lambda *_: None)
+
+            old, new = MmapBackend(os.path.join(tmp, "v1")), MmapBackend(os.path.join(tmp, "v2"))
+            self.assertEqual((old.source_version, new.source_version), (1, 2))
+            self.assertEqual((collection_version(old), collection_version(new)), ("v1", "v2"))
+            self.assertEqual(old.metadata["hnsw:space"], "l2")
+
+    def test_detach_chroma_system_keeps_old_system_running(self):
+        class System:
+            stopped = False
+
+            def stop(self):
+                self.stopped = True
+
+        class SharedSystemClient:
+            _identifier_to_system = {"/db/doc_db": System(), "/db/ipc_db": System()}
+
+        old = SharedSystemClient._identifier_to_system["/db/doc_db"]
+        modules = {
+            "chromadb": SimpleNamespace(),
+            "chromadb.api": SimpleNamespace(),
+            "chromadb.api.client": SimpleNamespace(SharedSystemClient=SharedSystemClient),
+        }
+        with mock.patch.dict(sys.modules, modules):
+            self.assertTrue(detach_chroma_system("/db/doc_db"))
+            self.assertFalse(detach_chroma_system("/db/doc_db"))
+        self.assertEqual(list(SharedSystemClient._identifier_to_system), ["/db/ipc_db"])  # 다른 DB 는 그대로
+        self.assertFalse(old.stopped)  # 진행 중인 질의가 쓰는 System 은 멈추지 않음
+
+
+class SyntheticCorpusTest(SimpleTestCase):
+    """
+    벤치마크용 합성 코퍼스가 읽는 배치 크기와 무관하게 같은 청구항을 만들고,
+    해싱 임베더가 결정적으로 정규화된 벡터를 반환하는지 확인합니다.
+    """
+
+    def test_deterministic_batches(self):
+        corpus = SyntheticCorpus(95, claims_per_patent=10, vocab_size=500, n_subclasses=4, seed=7)
+        collection = SyntheticCollection.claims(corpus, HashingEncoder(dim=32, seed=7))
+        whole = collection.get(include=["documents", "metadatas"], limit=95, offset=0)
+        parts = [collection.get(include=["documents", "metadatas"], limit=13, offset=o) for o in range(0, 95, 13)]
+        self.assertEqual(len(whole["ids"]), 95)
+        self.assertEqual(whole["ids"], [i for part in parts for i in part["ids"]])
+        self.assertEqual(whole["documents"], [d for part in parts for d in part["documents"]])
+        self.assertEqual(whole["metadatas"][-1]["claim_no"], 5)  # 마지막 특허는 청구항 5개
+
+        vectors = HashingEncoder(dim=32, seed=7).encode(whole["documents"][:3])
+        np.testing.assert_array_equal(vectors, HashingEncoder(dim=32, seed=7).encode(whole["documents"][:3]))
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+
+class OpenAIStubTest(SimpleTestCase):
+    """
+    부하 테스트용 스텁이 도구를 넘긴 요청에는 스크립트된 도구 호출 라운드 뒤에 답변을,
+    도구 없는 요청(제목 생성)에는 바로 답변을 돌려주는지 확인합니다.
+    """
+
+    def post(self, server, path, payload):
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{server.server_port}/v1{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            return json.loads(resp.read())
+
+    def test_tool_round_then_answer(self):
+        server = start_stub_server(port=0, config=load_stub_config(ttft_ms=0, answer_tokens=5, embedding_dim=16))
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        tools = [{"type": "function", "function": {"name": "tool_search_patent_with_description"}}]
+        messages = [{"role": "user", "content": "배터리 냉각"}]
+
+        first = self.post(server, "/chat/completions", {"messages": messages, "tools": tools})["choices"][0]
+        self.assertEqual(first["finish_reason"], "tool_calls")
+        call = first["message"]["tool_calls"][0]
+        self.assertEqual(json.loads(call["function"]["arguments"])["query_text"], "배터리 냉각")
+
+        messages += [first["message"], {"role": "tool", "tool_call_id": call["id"], "content": "[]"}]
+        second = self.post(server, "/chat/completions", {"messages": messages, "tools": tools})["choices"][0]
+        self.assertEqual(second["finish_reason"], "stop")
+        self.assertEqual(len(second["message"]["content"].split()), 5)
+
+        title = self.post(server, "/chat/completions", {"messages": messages[:1], "max_tokens": 3})["choices"][0]
+        self.assertEqual(title["finish_reason"], "stop")
+
+        data = self.post(server, "/embeddings", {"input": ["a", "b"], "encoding_format": "base64"})["data"]
+        self.assertEqual(embedding_from_response(data[1]).shape, (16,))
+        self.assertEqual(server.behavior.stats.snapshot()["tool_rounds"], 1)
+
+
+class CassetteTest(SimpleTestCase):
+    """
+    카세트가 잘린 UTF-8 청크를 그대로 복원하고, 같은 요청을 기록 순서대로(다 쓰면 처음부터) 돌려주며,
+    제목 생성 요청을 제외한 대화 턴만 골라내는지 확인합니다.
+    """
+
+    def test_record_then_replay(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "agent.jsonl")
+            raw = "특허 검색".encode("utf-8")
+            recorder = Cassette(path, "record")
+            turn = {"tools": [{}], "messages": [{"role": "system", "content": "s"}, {"role": "user", "content": "q"}]}
+            for i, (request, chunk) in enumerate([(turn, raw[:4]), (turn, raw[4:]), ({"messages": turn["messages"]}, b"t")]):
+                recorder.append({
+                    "kind": "llm", "key": "k" if "tools" in request else "title", "name": "/v1/chat/completions",
+                    "request": request, "chunks": [[0.0, chunk.decode("utf-8", "surrogateescape")]], "recorded_at": i,
+                })
+
+            player = Cassette(path, "replay", speed=0)
+            self.assertEqual(len(player), 3)
+            self.assertEqual(recorded_turns(player), [turn["messages"], turn["messages"]])
+            replayed = [player.take("llm", "k", "x")["chunks"][0][1] for _ in range(3)]
+            self.assertEqual(b"".join(t.encode("utf-8", "surrogateescape") for t in replayed[:2]), raw)
+            self.assertEqual(replayed[2], replayed[0])
+            with self.assertRaises(CassetteMiss):
+                player.take("tool", "missing", "search_patents")
+
+
+class MetricsTest(SimpleTestCase):
+    """
+    워커별 스냅샷 파일을 합산한 히스토그램/카운터가 Prometheus 텍스트 형식(누적 버킷)으로 나오는지 확인합니다.
+    """
+
+    def test_merge_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            other = MetricsRegistry(enabled=True, directory=tmp)  # 다른 워커 (같은 pid 여도 파일 이름이 다름)
+            other.observe("pai_stage_duration_seconds", 0.02, stage="hybrid_encode")
+            other.inc("pai_chat_requests_total")
+            other.flush()
+
+            local = MetricsRegistry(enabled=True, directory=tmp)
+            for registry in (other, local):
+                self.addCleanup(setattr, registry, "directory", "")  # 종료 시 flush 가 임시 디렉토리를 다시 만들지 않게
+            local.observe("pai_stage_duration_seconds", 0.2, stage="hybrid_encode")
+            local.inc("pai_chat_requests_total", 2)
+            with self.assertRaises(ValueError):
+                with local.stage("llm_call"):
+                    raise ValueError("boom")
+
+            text = render_prometheus(local.collect())
+            self.assertIn('pai_stage_duration_seconds_bucket{stage="hybrid_encode",le="0.025"} 1', text)
+            self.assertIn('pai_stage_duration_seconds_bucket{stage="hybrid_encode",le="+Inf"} 2', text)
+            self.assertIn('pai_stage_duration_seconds_count{stage="hybrid_encode"} 2', text)
+            self.assertIn("pai_chat_requests_total 3", text)
+            self.assertIn('pai_stage_errors_total{metric="pai_stage_duration_seconds",stage="llm_call"} 1', text)
+            self.assertIn("# TYPE pai_chat_requests_total counter", text)
+
+            self.assertEqual(clear_snapshot_dir(tmp), 1)  # master 시작 시 이전 파일 정리
+            self.assertEqual(render_prometheus(local.collect()).count("pai_chat_requests_total 2"), 1)
+
+    def test_forked_worker_has_own_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            master = MetricsRegistry(enabled=True, directory=tmp, flush_interval=3600)
+            self.addCleanup(setattr, master, "directory", "")
+            master.inc("pai_chat_requests_total", 5)  # preload 된 master 에서 flush 스레드 시작
+            master.flush()
+            self.assertIsNotNone(master._flusher)
+
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    code = 2 if master._flusher is not None or master.snapshot()["counters"] else 0
+                    master.inc("pai_chat_requests_total")
+                    code = code or (0 if master._flusher.is_alive() else 3)
+                    master.flush()
+                finally:
+                    os._exit(code)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+            self.assertEqual(len(os.listdir(tmp)), 2)
+            self.assertIn("pai_chat_requests_total 6", render_prometheus(master.collect()))
+
+
+class RequestTraceTest(SimpleTestCase):
+    """
+    스레드 풀 작업(bind)과 에이전트 단계가 요청 trace 의 올바른 부모 아래에 붙고,
+    활성 trace 가 없으면 span 이 기록되지 않는지 확인합니다.
+    """
+
+    def test_span_tree(self):
+        trace = tracing.Trace("chat_request", history_id=1)
+        with trace.activate():
+            with tracing.span("db_save", what="user_message"):
+                pass
+            trace.begin_step(messages=2)
+            with tracing.span("llm_call") as sp:
+                sp.set(prompt_tokens=12)
+            with tracing.span("tool:search"):
+                def score():
+                    with tracing.span("hybrid_bm25"):
+                        pass
+                bound = tracing.bind(score)  # 제출하는 스레드에서 감싸고, 두 작업이 동시에 호출
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    list(executor.map(lambda _: bound(), range(2)))
+            trace.end_step()
+            with self.assertRaises(ValueError):
+                with tracing.span("db_save", what="final_answer"):
+                    raise ValueError("boom")
+        self.assertIsNone(tracing.current_trace())
+        trace.finish()
+
+        tree = trace.to_dict()
+        self.assertEqual([c["name"] for c in tree["children"]], ["db_save", "agent_step", "db_save"])
+        step = tree["children"][1]
+        self.assertEqual([c["name"] for c in step["children"]], ["llm_call", "tool:search"])
+        self.assertEqual(step["children"][0]["attrs"], {"prompt_tokens": 12})
+        self.assertEqual([c["name"] for c in step["children"][1]["children"]], ["hybrid_bm25", "hybrid_bm25"])
+        self.assertEqual(tree["children"][2]["error"], "ValueError: boom")
+        self.assertEqual(trace.span_count, 8)
+
+        with tracing.span("orphan") as sp:
+            self.assertIs(sp, tracing.NULL_SPAN)
@@ -1,26 +1,75 @@
 # chat/views.py
 
+import contextlib
 import json
+import os
+import threading
 import time
 import concurrent.futures  # [추가] 비동기 작업을 위한 모듈
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import StreamingHttpResponse, JsonResponse
+from django.http import HttpResponse, Http404, StreamingHttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.db import connection
 from django.db.models import Max
 
 # [주의] login_required 제거함 (비회원 접근 허용을 위해)
-from .models import ChatHistory, Chat
+from .models import ChatHistory, Chat, RequestTrace
 
 # LLM 모듈
-from llm_module.main import get_graph_agent
+from llm_module.main import OPENAI_BASE_URL, get_graph_agent
 from llm_module.SYSTEM_PROMPT import SYSTEM_PROMPT
 from llm_module.memory_utils import convert_db_chats_to_langchain
+from llm_module import tracing
+from llm_module.metrics import metrics, render_prometheus
+from llm_module.cassette import cassette_api_key, cassette_http_client
+from llm_module.resources import registry
 from openai import OpenAI
 from django.conf import settings
 
-agent_executor = get_graph_agent()
 
-client = OpenAI(api_key=getattr(settings, "OPENAI_API_KEY", None))
+# ✅ 상수 설정
+# 1 이면 스트림 끝에 {"type": "stats"} 이벤트(응답 하나의 DB 쿼리/쓰기 수)를 보냄 (chat_loadtest 용)
+STREAM_STATS_ENABLED = os.getenv("PAI_STREAM_STATS", "0") == "1"
+# trace 저장(_save_request_trace)의 쓰기 수: RequestTrace INSERT + 링 버퍼 DELETE
+# 스트림이 끝난 뒤 실행되므로 stats 이벤트의 db_writes 에 미리 더해 보냄 (PAI_TRACE=0 이면 0)
+TRACE_SAVE_WRITES = 2
+
+
+class _DbWriteCounter:
+    """
+    connection.execute_wrapper 로 응답 하나가 실행한 쿼리 수 / 쓰기(INSERT·UPDATE·DELETE) 수를 셉니다.
+    제목 생성 스레드도 같은 카운터를 쓰므로 잠금으로 보호합니다.
+    """
+
+    WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.queries += 1
+            if sql.lstrip().upper().startswith(self.WRITE_PREFIXES):
+                self.writes += 1
+        return execute(sql, params, many, context)
+
+    def watch(self):
+        # 현재 스레드의 DB 연결에만 적용 (꺼져 있으면 아무것도 하지 않음)
+        if not STREAM_STATS_ENABLED:
+            return contextlib.nullcontext()
+        return connection.execute_wrapper(self)
+
+
+# 제목 생성용 OpenAI 클라이언트 (첫 사용 시 생성)
+@registry.resource("title_client")
+def _load_title_client():
+    return OpenAI(
+        api_key=getattr(settings, "OPENAI_API_KEY", None) or os.getenv("OPENAI_API_KEY") or cassette_api_key(),
+        base_url=OPENAI_BASE_URL,
+        http_client=cassette_http_client(),
+    )
 
 
 def generate_history_title_by_llm(first_message: str) -> str:
@@ -34,7 +83,7 @@ def generate_history_title_by_llm(first_message: str) -> str:
             f"질문: {first_message}"
         )
 
-        resp = client.chat.completions.create(
+        resp = registry.get("title_client").chat.completions.create(
             model="gpt-4o-mini",  # 필요하면 모델 이름 바꿔도 됨
             messages=[
                 {"role": "system", "content": "너는 채팅방 제목을 짧게 요약해주는 도우미야."},
@@ -167,12 +216,35 @@ def chat_interface(request):
     return render(request, "chat/chat_interface.html", context)
 
 
+def _save_request_trace(trace, error=None):
+    """
+    요청 trace 를 request_trace 테이블에 저장하고 최근 TRACE_KEEP 개만 남깁니다. (실패해도 응답에는 영향 없음)
+    """
+    if trace is None:
+        return
+    trace.finish(error)
+    try:
+        saved = RequestTrace.objects.create(
+            name=trace.root.name,
+            history_id=trace.root.attrs.get("history_id"),
+            status="error" if error else "ok",
+            duration_ms=trace.duration_ms,
+            span_count=trace.span_count,
+            tree=trace.to_dict(),
+        )
+        # 링 버퍼: 번호가 TRACE_KEEP 이상 뒤처진 trace 삭제
+        RequestTrace.objects.filter(trace_id__lte=saved.trace_id - tracing.TRACE_KEEP).delete()
+    except Exception:
+        pass
+
+
 # =========================================================
 # API: 채팅 스트리밍 (비동기 제목 생성 적용)
 # =========================================================
 @csrf_exempt
 def chat_stream_api(request):
     if request.method == "POST":
+        request_started = time.perf_counter()
         try:
             data = json.loads(request.body)
             user_input = data.get("message", "")
@@ -200,19 +272,26 @@ def chat_stream_api(request):
         # ------------------------------------------------------------------
         # [순서 관리]
         # ------------------------------------------------------------------
-        last_order = history.chats.aggregate(Max("order_num"))["order_num__max"] or 0
-        current_save_order = last_order + 1
-
-        # 👉 첫 메시지인지 여부 체크
-        is_first_message = (last_order == 0)
-
-        # 2. [사용자 메시지 저장]
-        user_chat = Chat.objects.create(
-            history=history,
-            type="HUMAN",
-            content=user_input,
-            order_num=current_save_order,
+        db_counter = _DbWriteCounter()
+        trace = tracing.start_trace(
+            "chat_request", history_id=history.history_id, message_chars=len(user_input)
         )
+        with db_counter.watch(), tracing.activate(trace):
+            last_order = history.chats.aggregate(Max("order_num"))["order_num__max"] or 0
+            current_save_order = last_order + 1
+
+            # 👉 첫 메시지인지 여부 체크
+            is_first_message = (last_order == 0)
+
+            # 2. [사용자 메시지 저장]
+            with tracing.stage("db_save", what="user_message"):
+                user_chat = Chat.objects.create(
+                    history=history,
+                    type="HUMAN",
+                    content=user_input,
+                    order_num=current_save_order,
+                )
+        metrics.inc("pai_chat_requests_total")
 
         current_save_order += 1
 
@@ -256,6 +335,16 @@ def chat_stream_api(request):
 
             # [수정] DB 객체를 미리 잡아두기 위한 변수
             ai_message_obj = None
+            final_saved = False  # 5번에서 최종 저장했으면 finally 에서 다시 저장하지 않음
+            tool_call_count = 0
+            token_events = 0
+
+            # 스트림이 끝날 때(정상/오류/클라이언트 중단)까지 이 응답의 쿼리를 셈
+            db_watch = contextlib.ExitStack()
+            db_watch.enter_context(db_counter.watch())
+            # 이 스트림에서 실행되는 그래프 노드 / 도구 / DB 저장을 요청 trace 아래에 기록
+            trace_token = tracing.attach(trace)
+            stream_error = None
 
             last_save_time = time.time()
 
@@ -268,16 +357,18 @@ def chat_stream_api(request):
 
             # (내부 함수) 제목 생성 및 DB 저장 작업
             def title_task():
-                generated_title = generate_history_title_by_llm(user_input)
+                with tracing.stage("title_generation"):
+                    generated_title = generate_history_title_by_llm(user_input)
                 # DB 저장도 스레드 안에서 처리
-                history.description = generated_title
-                history.save(update_fields=["description"])
+                with db_counter.watch(), tracing.stage("db_save", what="title"):
+                    history.description = generated_title
+                    history.save(update_fields=["description"])
                 return generated_title
 
             try:
                 # 1. 첫 메시지라면, 제목 생성 '숙제'를 백그라운드 스레드에 던져놓고 바로 다음 줄로 진행!
                 if is_first_message:
-                    title_future = executor.submit(title_task)
+                    title_future = executor.submit(tracing.bind(title_task))
 
                 # 2. 사용자 메시지 ID 전송 (삭제 버튼용)
                 yield json.dumps(
@@ -285,7 +376,7 @@ def chat_stream_api(request):
                 ) + "\n"
 
                 # 3. LangGraph 스트리밍 시작 (답변 생성)
-                for msg, metadata in agent_executor.stream(
+                for msg, metadata in get_graph_agent().stream(
                     {"messages": langchain_messages},
                     config=config,
                     stream_mode="messages",
@@ -308,6 +399,12 @@ def chat_stream_api(request):
                     if curr_node == "agent" and msg.content:
                         if not msg.tool_calls:
                             full_ai_response += msg.content
+                            token_events += 1
+                            if token_events == 1:
+                                ttft = time.perf_counter() - request_started
+                                metrics.observe("pai_chat_ttft_seconds", ttft)
+                                if trace is not None:
+                                    trace.root.set(ttft_ms=round(ttft * 1000.0, 1))
                             yield json.dumps(
                                 {"type": "token", "content": msg.content}
                             ) + "\n"
@@ -319,18 +416,19 @@ def chat_stream_api(request):
                             # 마지막 저장 후 1.5초가 지났다면?
                             if (current_time - last_save_time) > 1.5:
                                 try:
-                                    if ai_message_obj is None:
-                                        # 아직 DB에 줄이 안 그어졌다면 -> 새로 생성 (Create)
-                                        ai_message_obj = Chat.objects.create(
-                                            history=history,
-                                            type="AI",
-                                            content=full_ai_response,
-                                            order_num=current_save_order,
-                                        )
-                                    else:
-                                        # 이미 DB에 줄이 있다면 -> 내용만 업데이트 (Update)
-                                        ai_message_obj.content = full_ai_response
-                                        ai_message_obj.save(update_fields=['content'])
+                                    with tracing.stage("db_checkpoint", chars=len(full_ai_response)):
+                                        if ai_message_obj is None:
+                                            # 아직 DB에 줄이 안 그어졌다면 -> 새로 생성 (Create)
+                                            ai_message_obj = Chat.objects.create(
+                                                history=history,
+                                                type="AI",
+                                                content=full_ai_response,
+                                                order_num=current_save_order,
+                                            )
+                                        else:
+                                            # 이미 DB에 줄이 있다면 -> 내용만 업데이트 (Update)
+                                            ai_message_obj.content = full_ai_response
+                                            ai_message_obj.save(update_fields=['content'])
                                     
                                     # 저장 시계 리셋
                                     last_save_time = current_time
@@ -344,6 +442,7 @@ def chat_stream_api(request):
                             t_name = tool_call.get("name")
                             if t_id not in seen_tool_ids:
                                 seen_tool_ids.add(t_id)
+                                tool_call_count += 1
                                 yield json.dumps(
                                     {"type": "tool_call", "tool_name": t_name}
                                 ) + "\n"
@@ -355,14 +454,19 @@ def chat_stream_api(request):
                             {"type": "tool_result", "length": len(content_str)}
                         ) + "\n"
 
-                        Chat.objects.create(
-                            history=history,
-                            type="TOOLS",
-                            content=content_str,
-                            order_num=current_save_order,
-                        )
+                        with tracing.stage("db_save", what="tool_result", chars=len(content_str)):
+                            Chat.objects.create(
+                                history=history,
+                                type="TOOLS",
+                                content=content_str,
+                                order_num=current_save_order,
+                            )
                         current_save_order += 1
 
+                # 마지막 에이전트 단계(최종 답변) 닫기
+                if trace is not None:
+                    trace.end_step()
+
                 # 4. 스트리밍이 끝났는데 아직 제목이 안 갔다면? (답변이 너무 짧아서 제목보다 빨리 끝난 경우)
                 #    여기서 잠깐 기다렸다가 보내줍니다.
                 if title_future and not title_sent:
@@ -377,20 +481,38 @@ def chat_stream_api(request):
 
                 # 5. [AI 최종 답변 저장] - (수정됨)
                 if full_ai_response:
-                    if ai_message_obj is None:
-                        # 한 번도 저장 안 된 짧은 답변일 경우 생성
-                        Chat.objects.create(
-                            history=history,
-                            type="AI",
-                            content=full_ai_response,
-                            order_num=current_save_order,
-                        )
-                    else:
-                        # 중간 저장이 된 경우 마지막으로 확실하게 업데이트
-                        ai_message_obj.content = full_ai_response
-                        ai_message_obj.save(update_fields=['content'])
+                    with tracing.stage("db_save", what="final_answer", chars=len(full_ai_response)):
+                        if ai_message_obj is None:
+                            # 한 번도 저장 안 된 짧은 답변일 경우 생성
+                            Chat.objects.create(
+                                history=history,
+                                type="AI",
+                                content=full_ai_response,
+                                order_num=current_save_order,
+                            )
+                        else:
+                            # 중간 저장이 된 경우 마지막으로 확실하게 업데이트
+                            ai_message_obj.content = full_ai_response
+                            ai_message_obj.save(update_fields=['content'])
+                final_saved = True
+
+                # 6. 응답 통계 (PAI_STREAM_STATS=1 일 때만)
+                if STREAM_STATS_ENABLED:
+                    trace_writes = TRACE_SAVE_WRITES if trace is not None else 0
+                    yield json.dumps(
+                        {
+                            "type": "stats",
+                            "db_writes": db_counter.writes + trace_writes,
+                            "db_queries": db_counter.queries + trace_writes,
+                            "trace_writes": trace_writes,
+                            "tool_calls": tool_call_count,
+                            "token_events": token_events,
+                        }
+                    ) + "\n"
 
             except Exception as e:
+                metrics.inc("pai_chat_errors_total")
+                stream_error = f"{type(e).__name__}: {e}"
                 yield json.dumps({"type": "error", "message": str(e)}) + "\n"
             
             finally:
@@ -399,7 +521,7 @@ def chat_stream_api(request):
                 # =========================================================
                 try:
                     # 혹시나 에러/중단으로 루프를 빠져나왔을 때, 마지막 잔여물 저장
-                    if full_ai_response:
+                    if full_ai_response and not final_saved:
                         if ai_message_obj is None:
                             Chat.objects.create(
                                 history=history,
@@ -415,6 +537,13 @@ def chat_stream_api(request):
                     pass
                 
                 executor.shutdown(wait=False)
+                metrics.observe("pai_chat_stream_duration_seconds", time.perf_counter() - request_started)
+
+                tracing.detach(trace_token)
+                if trace is not None:
+                    trace.root.set(tokens=token_events, tool_calls=tool_call_count, answer_chars=len(full_ai_response))
+                _save_request_trace(trace, stream_error)
+                db_watch.close()  # trace 저장 쓰기까지 같은 카운터로 셈
 
         return StreamingHttpResponse(
             event_stream(), content_type="application/x-ndjson"
@@ -423,6 +552,18 @@ def chat_stream_api(request):
     return JsonResponse({"error": "Method not allowed"}, status=405)
 
 
+# =========================================================
+# 모니터링: Prometheus 형식 지표 (PAI_METRICS_DIR 이 있으면 모든 워커 합산)
+# =========================================================
+def metrics_view(request):
+    if not metrics.enabled:
+        raise Http404("metrics disabled")
+    return HttpResponse(
+        render_prometheus(metrics.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 # =========================================================
 # API: 삭제 기능 (비회원 지원)
 # =========================================================
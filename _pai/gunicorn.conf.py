@@ -0,0 +1,7 @@
+# gunicorn 설정 (manage.py 와 같은 디렉토리에서 gunicorn 을 실행하면 자동으로 읽힘)
+from llm_module.metrics import clear_snapshot_dir
+
+
+def on_starting(server):
+    # 이전 배포의 워커별 지표 스냅샷(PAI_METRICS_DIR)이 /metrics 합산에 남지 않도록 master 시작 시 비움
+    clear_snapshot_dir()
@@ -240,6 +240,9 @@ SYSTEM_PROMPT = """
    - 너무 많은 결과가 있을 때는:
      - 상위 몇 건을 자세히 설명하고,
      - 나머지는 간략 요약으로 묶어서 정리해 줍니다.
+   - 사용자의 아이디어가 여러 방식으로 표현될 수 있다면,
+     query_text 외에 관점을 바꾼 문장 1~3개를 query_variants 로 함께 넘기십시오.
+     (예: 구성요소 중심 표현, 효과/목적 중심 표현, 동의어 치환 표현)
 
 3) IPC 후보 검색 도구(tool_search_ipc_code_with_description)를 사용할 때 (중요 업데이트):
    - **항상 도구에서 반환된 IPC 후보들을 먼저 정리**한 뒤,
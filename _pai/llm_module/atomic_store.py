@@ -0,0 +1,127 @@
+import contextlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# =========================================================
+# 메모리 매핑 인덱스 디렉토리의 원자적 교체
+# =========================================================
+# 서빙 워커가 np.load(mmap_mode="r") 로 매핑 중인 파일을 그 자리에서 다시 쓰면
+# 읽는 쪽이 찢어진 값을 보거나(행 수가 줄면 SIGBUS) 파일끼리 버전이 어긋납니다. 그래서
+# - 디렉토리 전체를 새로 만드는 빌드(BM25 / 메타 저장소 / mmap 내보내기)는 build_store_dir() 로
+#   형제 디렉토리 .<이름>.v-<토큰> 에 만든 뒤, <이름> 심볼릭 링크를 os.replace 로 한 번에 바꿈
+# - 로더는 resolve_store_dir() 로 링크를 한 번만 풀어 모든 파일을 같은 버전 디렉토리에서 읽음
+# - 이전 버전 디렉토리는 하나 남겨 두고(교체 직전에 경로를 푼 로더용) 그보다 오래된 것만 삭제
+#   (삭제돼도 이미 매핑한 워커는 inode 를 계속 읽음)
+# - 게시된 디렉토리에 파일을 더하는 빌드(IVF, 압축 코드)는 extend_store_dir() 로 현재 파일을 하드 링크한
+#   새 버전을 만들어 같은 방식으로 게시 (파일 단위 교체는 replacing() / save_npy())
+
+# ✅ 상수 설정
+BUILD_MARK = ".tmp-"  # 빌드 중인 디렉토리 (정리 대상 아님)
+VERSION_MARK = ".v-"  # 게시된 버전 디렉토리
+KEEP_PREVIOUS = 1  # 현재 버전 외에 남겨 둘 이전 버전 수
+
+
+def resolve_store_dir(path):
+    """
+    심볼릭 링크를 풀어 지금 게시된 버전 디렉토리의 실제 경로를 반환합니다.
+    """
+    return os.path.realpath(path)
+
+
+def _split(out_dir):
+    out_dir = os.path.abspath(out_dir.rstrip(os.sep))
+    return out_dir, os.path.dirname(out_dir), os.path.basename(out_dir)
+
+
+def _published_versions(parent, name):
+    prefix = f".{name}{VERSION_MARK}"
+    paths = [os.path.join(parent, entry) for entry in os.listdir(parent) if entry.startswith(prefix)]
+    return sorted((p for p in paths if os.path.isdir(p) and not os.path.islink(p)), key=os.path.getmtime)
+
+
+def publish_store_dir(build_dir, out_dir):
+    """
+    다 만든 build_dir 를 out_dir 로 게시합니다. (out_dir 는 새 버전 디렉토리를 가리키는 심볼릭 링크가 됨)
+    """
+    out_dir, parent, name = _split(out_dir)
+    token = os.path.basename(build_dir).rsplit(BUILD_MARK, 1)[-1]
+    version_dir = os.path.join(parent, f".{name}{VERSION_MARK}{token}")
+    os.chmod(build_dir, 0o755)  # mkdtemp 는 0700 으로 만듦
+    os.rename(build_dir, version_dir)
+    os.utime(version_dir)
+
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # 이전 형식(실제 디렉토리)은 버전 디렉토리로 한 번 옮김 (이 두 rename 사이에만 경로가 잠깐 비어 있음)
+        legacy_dir = tempfile.mkdtemp(dir=parent, prefix=f".{name}{VERSION_MARK}legacy-")
+        os.rename(out_dir, legacy_dir)
+        os.utime(legacy_dir, (0, 0))
+
+    link_tmp = f"{version_dir}.link"
+    os.symlink(os.path.basename(version_dir), link_tmp)
+    os.replace(link_tmp, out_dir)
+
+    current = os.path.realpath(out_dir)
+    older = [p for p in _published_versions(parent, name) if os.path.realpath(p) != current]
+    for path in older[:max(0, len(older) - KEEP_PREVIOUS)]:
+        shutil.rmtree(path, ignore_errors=True)
+    return version_dir
+
+
+@contextlib.contextmanager
+def build_store_dir(out_dir):
+    """
+    with build_store_dir(out_dir) as build_dir: ... 로 build_dir 에 모든 파일을 쓰면,
+    블록이 정상 종료될 때 out_dir 로 원자적으로 게시합니다. (예외면 build_dir 삭제, out_dir 는 그대로)
+    """
+    out_dir, parent, name = _split(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=parent, prefix=f".{name}{BUILD_MARK}")
+    try:
+        yield build_dir
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+    publish_store_dir(build_dir, out_dir)
+
+
+@contextlib.contextmanager
+def extend_store_dir(out_dir):
+    """
+    게시된 out_dir 에 파일을 더하거나 바꾸는 빌드용 build_store_dir.
+    build_dir 에는 현재 버전의 파일이 하드 링크로 들어 있으므로(현재 버전과 inode 공유)
+    기존 파일을 그 자리에서 고치지 말고 replacing() / save_npy() 로 바꿔야 합니다.
+    """
+    current = resolve_store_dir(out_dir)
+    with build_store_dir(out_dir) as build_dir:
+        for entry in os.listdir(current):
+            source = os.path.join(current, entry)
+            if os.path.isfile(source):
+                os.link(source, os.path.join(build_dir, entry))
+        yield build_dir
+
+
+@contextlib.contextmanager
+def replacing(path):
+    """
+    with replacing(path) as tmp_path: ... 로 tmp_path 에 쓰면 끝날 때 os.replace 로 path 를 교체합니다.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def save_npy(path, array):
+    """
+    np.save 의 원자적 버전 (path 는 .npy 로 끝나야 함)
+    """
+    with replacing(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
@@ -0,0 +1,176 @@
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import numpy as np
+
+# ✅ 상수 설정
+DEFAULT_MAX_BATCH_SIZE = 32  # 한 번의 forward 에 묶을 최대 문장 수
+DEFAULT_MAX_WAIT_MS = 5  # 첫 요청 도착 후 다른 요청을 기다리는 최대 시간(ms)
+DEFAULT_TIMEOUT = 60.0  # encode() 가 배치 결과를 기다리는 최대 시간(초)
+
+
+class _Request:
+    __slots__ = ("texts", "kwargs", "options", "future", "enqueued_at")
+
+    def __init__(self, texts, kwargs):
+        self.texts = texts
+        self.kwargs = kwargs
+        # 같은 encode 옵션끼리만 한 배치로 묶을 수 있음
+        self.options = tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _reset_in_child(encoder_ref):
+    encoder = encoder_ref()
+    if encoder is not None:
+        encoder._reset_worker_state()
+
+
+class MicroBatchEncoder:
+    """
+    동시에 들어오는 encode() 요청을 잠깐(max_wait_ms) 모아 한 번의 배치 forward 로 처리하는 인코더.
+
+    - 호출 스레드는 Future 로 자신의 행만 돌려받으므로 SentenceTransformer.encode 와 동일하게 사용
+    - 백그라운드 워커 스레드 하나가 큐에서 요청을 꺼내 max_batch_size 까지 채운 뒤 모델을 호출
+    - 모델이 바쁜 동안 쌓인 요청은 다음 배치에 대기 없이 바로 묶이므로, 동시 사용자가 늘수록 배치가 커짐
+    - stats() 로 배치 수 / 평균 배치 크기(fill) / 대기 시간 등을 확인
+    - fork 된 자식(gunicorn --preload 워커 등)에는 워커 스레드가 따라오지 않으므로
+      자식에서 큐/잠금/워커를 새로 만들고 첫 encode() 때 스레드를 다시 띄움
+    """
+
+    def __init__(self, model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 timeout=DEFAULT_TIMEOUT):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.timeout = timeout
+
+        self._reset_worker_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_in_child(ref))
+
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.wait_seconds = 0.0
+        self.batch_size_counts = {}  # 배치 크기 → 횟수
+
+    def __getattr__(self, name):
+        # encode 외의 속성은 원본 모델로 위임
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    # ---------------------------------------------------------
+    # 내부 helper
+    # ---------------------------------------------------------
+    def _reset_worker_state(self):
+        # fork 직후 자식에서도 호출됨: 부모의 잠금은 fork 시점에 잡혀 있었을 수 있으므로 새로 만듦
+        self._queue = queue.Queue()
+        self._carry = None  # 직전 배치에 들어가지 못하고 남은 요청
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                worker = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+                worker.start()
+                self._worker = worker
+
+    def _next_request(self, timeout=None):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return self._queue.get(timeout=timeout) if timeout is not None else self._queue.get()
+
+    def _collect(self):
+        """
+        첫 요청을 기다린 뒤, 마감 시간까지 같은 옵션의 요청을 max_batch_size 문장까지 모읍니다.
+        """
+        first = self._next_request()
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    request = self._next_request(timeout=remaining)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request.options != first.options or size + len(request.texts) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            started = time.perf_counter()
+
+            try:
+                vectors = np.asarray(self.model.encode(texts, **batch[0].kwargs))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.texts += len(texts)
+                self.wait_seconds += sum(started - request.enqueued_at for request in batch)
+                self.batch_size_counts[len(texts)] = self.batch_size_counts.get(len(texts), 0) + 1
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+    # ---------------------------------------------------------
+    # 공개 인터페이스
+    # ---------------------------------------------------------
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.asarray(self.model.encode(texts, **kwargs))
+
+        self._ensure_worker()
+        request = _Request(texts, kwargs)
+        self._queue.put(request)
+        try:
+            vectors = request.future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise TimeoutError(f"배치 인코딩 결과를 {self.timeout}초 안에 받지 못했습니다.") from None
+        return vectors[0] if single else vectors
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "avg_fill": self.texts / (self.batches * self.max_batch_size) if self.batches else 0.0,
+                "avg_wait_ms": 1000.0 * self.wait_seconds / self.requests if self.requests else 0.0,
+                "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "worker_alive": self._worker is not None and self._worker.is_alive(),
+            }
@@ -0,0 +1,291 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .bm25_index import BM25Index, build_bm25_index, tokenize
+from .doc_func import patent_hybrid_search
+from .ipc_func import get_combined_ipc_codes
+from .ipc_hierarchy import IpcHierarchy
+from .synthetic_corpus import (
+    CLAIMS_PER_PATENT,
+    DEFAULT_DIM,
+    DEFAULT_VOCAB_SIZE,
+    HashingEncoder,
+    SyntheticCollection,
+    SyntheticCorpus,
+)
+from .vector_backend import MmapBackend, build_ivf, export_chroma_collection
+from .vector_compress import build_compressed_codes
+
+# ✅ 상수 설정
+DEFAULT_QUERIES = 200
+DEFAULT_K = 10
+HYBRID_POOL = 200  # patent_hybrid_search 의 per_query_top_k / final_top_k (search_patents 최소 풀과 비슷하게)
+CORPUS_FILE = "bench_corpus.json"  # 작업 디렉토리에 만든 인덱스의 코퍼스 설정 (--reuse 판단용)
+
+
+def latency_summary(latencies, wall_seconds):
+    arr = np.asarray(latencies, dtype=np.float64) * 1000.0
+    return {
+        "queries": len(arr),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+        "qps": float(len(arr) / wall_seconds) if wall_seconds > 0 else None,
+    }
+
+
+def _recall(found, truth, k):
+    truth = list(truth)[:k]
+    if not truth:
+        return None
+    return len(set(list(found)[:k]) & set(truth)) / len(truth)
+
+
+def run_stage(fn, inputs, threads=1):
+    """
+    inputs 각각에 fn 을 호출해 (결과 리스트, 질의별 지연시간, 전체 경과 시간)을 반환합니다.
+    threads > 1 이면 스레드 풀로 동시에 호출합니다. (처리량 측정용, 결과 순서는 입력 순서)
+    """
+    def timed(item):
+        started = time.perf_counter()
+        result = fn(item)
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            pairs = list(executor.map(timed, inputs))
+    else:
+        pairs = [timed(item) for item in inputs]
+    wall = time.perf_counter() - started
+    return [result for result, _ in pairs], [latency for _, latency in pairs], wall
+
+
+def git_commit(path):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+# =========================================================
+# 인덱스 빌드
+# =========================================================
+def build_bench_indexes(corpus, encoder, work_dir, ivf_lists=0, compressions=(), log=print):
+    """
+    합성 코퍼스로 기존 빌더(mmap 내보내기, IVF, 압축 코드, BM25, IPC)를 그대로 실행합니다.
+    단계별 빌드 시간(초)을 반환합니다.
+    """
+    timings = {}
+
+    def timed(name, fn):
+        started = time.perf_counter()
+        fn()
+        timings[name] = time.perf_counter() - started
+        log(f"[bench] {name} 빌드 {timings[name]:.1f}s")
+
+    claims = SyntheticCollection.claims(corpus, encoder)
+    ipc = SyntheticCollection.ipc(corpus, encoder)
+    doc_dir = os.path.join(work_dir, "doc_mmap")
+
+    def quiet(*_):
+        pass  # 빌더 진행 로그 생략
+
+    timed("doc_export", lambda: export_chroma_collection(claims, doc_dir, log=quiet))
+    if ivf_lists > 0:
+        timed("doc_ivf", lambda: build_ivf(doc_dir, ivf_lists, log=quiet))
+    for method in compressions:
+        timed(f"doc_{method}", lambda method=method: build_compressed_codes(doc_dir, method, log=quiet))
+    timed("bm25", lambda: build_bm25_index(claims, os.path.join(work_dir, "bm25_index"), log=quiet))
+    timed("ipc_export", lambda: export_chroma_collection(ipc, os.path.join(work_dir, "ipc_mmap"), log=quiet))
+    return timings
+
+
+# =========================================================
+# 측정
+# =========================================================
+def run_benchmark(corpus, encoder, work_dir, queries, k=DEFAULT_K, nprobe=16, compressions=(),
+                  rescore_factor=4, threads=1, log=print):
+    """
+    단계별 지연시간(p50/p95/p99)·처리량과 exact 검색 대비 recall@k 를 측정합니다.
+
+    - encode: 해싱 임베더 질의 인코딩
+    - vector_*: 청구항 벡터 검색 (vector_exact 가 정답, IVF / 압축 코드는 recall 측정)
+    - bm25_global: 전역 BM25 점수 + top-k (자체가 exact)
+    - hybrid_*: patent_hybrid_search 최종 특허 top-k (vector_exact 를 쓴 같은 lexical 모드가 정답,
+      source_hit 은 질의를 만든 특허가 top-k 에 든 비율)
+    - ipc_combined: get_combined_ipc_codes (계층 인덱스 사용, path 파싱 결과가 정답)
+    """
+    doc_dir = os.path.join(work_dir, "doc_mmap")
+    texts = [q["text"] for q in queries]
+    stages = {}
+
+    def record(name, latencies, wall, recalls=None, source_hits=None):
+        stats = latency_summary(latencies, wall)
+        if recalls is not None:
+            values = [r for r in recalls if r is not None]
+            stats[f"recall@{k}"] = float(np.mean(values)) if values else None
+        if source_hits is not None:
+            stats[f"source_hit@{k}"] = float(np.mean(source_hits))
+        stages[name] = stats
+        recall = stats.get(f"recall@{k}")
+        log(
+            f"{name:22s} p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms "
+            f"p99={stats['p99_ms']:8.2f}ms qps={stats['qps']:9.1f}"
+            + (f" recall@{k}={recall:.4f}" if recall is not None else "")
+        )
+
+    # 1. 인코딩
+    vectors, latencies, wall = run_stage(lambda text: encoder.encode([text])[0], texts, threads)
+    record("encode", latencies, wall)
+
+    # 2. 벡터 검색
+    backends = {"exact": MmapBackend(doc_dir, use_ivf=False)}
+    ivf = MmapBackend(doc_dir, nprobe=nprobe)
+    if ivf.ivf_centroids is not None:
+        backends["ivf"] = ivf
+    for method in compressions:
+        backends[method] = MmapBackend(doc_dir, use_ivf=False, compression=method, rescore_factor=rescore_factor)
+
+    truth = None
+    for name, backend in backends.items():
+        results, latencies, wall = run_stage(
+            lambda vector, backend=backend: backend.query([vector.tolist()], n_results=k, include=["distances"])["ids"][0],
+            vectors,
+            threads,
+        )
+        if truth is None:
+            truth = results
+        record(f"vector_{name}", latencies, wall, [_recall(r, t, k) for r, t in zip(results, truth)])
+
+    # 3. 전역 BM25
+    bm25_index = BM25Index.load(os.path.join(work_dir, "bm25_index"))
+    _, latencies, wall = run_stage(
+        lambda text: bm25_index.top_n(bm25_index.get_scores(tokenize(text)), k), texts, threads
+    )
+    record("bm25_global", latencies, wall)
+
+    # 4. 하이브리드 (특허 단위 최종 결과)
+    for lexical, index in (("local", None), ("global", bm25_index)):
+        truth = None
+        for name, backend in backends.items():
+            def search(text, backend=backend, index=index):
+                found = patent_hybrid_search(
+                    collection=backend,
+                    model=encoder,
+                    query_list=[text],
+                    per_query_top_k=HYBRID_POOL,
+                    final_top_k=HYBRID_POOL,
+                    top_k=k,
+                    bm25_index=index,
+                )
+                return [item["patent_id"] for item in found]
+
+            results, latencies, wall = run_stage(search, texts, threads)
+            if truth is None:
+                truth = results
+            record(
+                f"hybrid_{lexical}_{name}", latencies, wall,
+                [_recall(r, t, k) for r, t in zip(results, truth)],
+                [q["patent_id"] in r for q, r in zip(queries, results)],
+            )
+
+    # 5. IPC (키워드 3개 통합 검색)
+    ipc_backend = MmapBackend(os.path.join(work_dir, "ipc_mmap"), use_ivf=False)
+    hierarchy = IpcHierarchy.from_collection(ipc_backend)
+    keyword_sets = [q["keywords"] for q in queries]
+
+    def ipc_codes(keywords, hierarchy=None):
+        found = get_combined_ipc_codes(
+            encoder, ipc_backend, keywords, total_top_k=k, max_workers=1, hierarchy=hierarchy
+        )
+        return [item["main"] for item in found]
+
+    truth, _, _ = run_stage(ipc_codes, keyword_sets)
+    results, latencies, wall = run_stage(lambda kw: ipc_codes(kw, hierarchy), keyword_sets, threads)
+    record("ipc_combined", latencies, wall, [_recall(r, t, k) for r, t in zip(results, truth)])
+
+    return stages
+
+
+def compare_reports(current, baseline):
+    """
+    기준(이전 커밋) 결과 대비 단계별 p50/p95 변화율과 recall 차이.
+    """
+    rows = {}
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        row = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base.get(key):
+                row[key] = (stats[key] - base[key]) / base[key]
+        recall_key = next((key for key in stats if key.startswith("recall@")), None)
+        if recall_key and stats.get(recall_key) is not None and base.get(recall_key) is not None:
+            row[recall_key] = stats[recall_key] - base[recall_key]
+        rows[name] = row
+    return rows
+
+
+def corpus_config(n_claims, claims_per_patent=CLAIMS_PER_PATENT, vocab_size=DEFAULT_VOCAB_SIZE,
+                  dim=DEFAULT_DIM, seed=0, ivf_lists=0, compressions=()):
+    return {
+        "claims": n_claims,
+        "claims_per_patent": claims_per_patent,
+        "vocab_size": vocab_size,
+        "dim": dim,
+        "seed": seed,
+        "ivf_lists": ivf_lists,
+        "compressions": sorted(compressions),
+    }
+
+
+def prepare_corpus(config, work_dir, reuse=False, log=print):
+    """
+    설정대로 코퍼스/임베더를 만들고 인덱스를 빌드합니다.
+    reuse 이고 work_dir 에 같은 설정으로 만든 인덱스가 있으면 빌드를 건너뜁니다.
+    """
+    corpus = SyntheticCorpus(
+        config["claims"],
+        claims_per_patent=config["claims_per_patent"],
+        vocab_size=config["vocab_size"],
+        seed=config["seed"],
+    )
+    encoder = HashingEncoder(dim=config["dim"], seed=config["seed"])
+
+    config_path = os.path.join(work_dir, CORPUS_FILE)
+    if reuse and os.path.exists(config_path):
+        with open(config_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("config") == config:
+            log(f"[bench] 기존 인덱스 재사용: {work_dir}")
+            return corpus, encoder, saved.get("build", {})
+
+    os.makedirs(work_dir, exist_ok=True)
+    build = build_bench_indexes(
+        corpus, encoder, work_dir,
+        ivf_lists=config["ivf_lists"], compressions=config["compressions"], log=log,
+    )
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump({"config": config, "build": build}, f, ensure_ascii=False, indent=2)
+    return corpus, encoder, build
+
+
+def environment(repo_path):
+    return {
+        "git_commit": git_commit(repo_path),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
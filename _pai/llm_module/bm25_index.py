@@ -0,0 +1,464 @@
+import os
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+from .atomic_store import build_store_dir, resolve_store_dir
+
+# ✅ 상수 설정 (rank_bm25.BM25Okapi 기본값과 동일하게 맞춤)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+BUILD_BATCH_SIZE = 5000  # 인덱스 빌드 시 collection.get 한 번에 가져올 청구항 수
+
+# 인덱스 디렉토리 구성 파일
+META_FILE = "meta.json"
+VOCAB_FILE = "vocab.json"
+DOC_IDS_FILE = "doc_ids.json"
+DOC_PATENT_IDS_FILE = "doc_patent_ids.json"
+TERM_OFFSETS_FILE = "term_offsets.npy"
+POSTINGS_DOCS_FILE = "postings_docs.npy"
+POSTINGS_TF_FILE = "postings_tf.npy"
+IDF_FILE = "idf.npy"
+DOC_NORM_FILE = "doc_norm.npy"
+DELTA_FILE = "delta.json"  # 증분 반영분 (추가 청구항 + 삭제된 base row), 전체 재빌드 시 삭제
+
+
+def tokenize(text):
+    """
+    기존 patent_hybrid_search 와 동일한 공백 기준 토큰화.
+    (인덱스 빌드/질의 양쪽에서 반드시 같은 함수를 사용해야 함)
+    """
+    return (text or "").split()
+
+
+class BM25Index:
+    """
+    patent_claims 컬렉션 전체에 대한 영속(persistent) BM25 역색인.
+
+    - 빌드 시점에 postings(문서 row, tf)와 IDF 배열을 미리 계산해서 .npy 로 저장하고,
+    - 로딩 시에는 np.load(mmap_mode="r") 로 메모리 매핑만 하므로
+      여러 워커 프로세스가 OS 페이지 캐시를 공유합니다.
+    - 점수 계산식은 rank_bm25.BM25Okapi 와 동일합니다.
+    - delta.json(BM25Delta)이 있으면 로딩 시 추가 청구항을 메모리 postings 로 붙이고,
+      삭제된 row 는 점수 0 으로 막은 뒤 N / avgdl / df / IDF / 길이 정규화 항을 다시 계산합니다.
+      (재빌드한 인덱스와 같은 점수, row 번호만 다름)
+    """
+
+    def __init__(self, index_dir, meta, vocab, doc_ids, doc_patent_ids,
+                 term_offsets, postings_docs, postings_tf, idf, doc_norm):
+        self.index_dir = index_dir
+        self.meta = meta
+        self.k1 = meta.get("k1", BM25_K1)
+        self.b = meta.get("b", BM25_B)
+        self.n_docs = meta["n_docs"]
+
+        self.term_to_id = {term: i for i, term in enumerate(vocab)}
+        self.doc_ids = doc_ids
+        self.doc_patent_ids = doc_patent_ids
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        self._patent_rows = None  # patent_id → row 배열 (제외 필터용, 필요할 때 생성)
+
+        self.term_offsets = term_offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.idf = idf
+        self.doc_norm = doc_norm
+
+        # 증분 반영분 (apply_delta 에서 채움)
+        self.n_base_docs = self.n_docs
+        self.n_base_terms = len(vocab)
+        self.delta_postings = {}  # term_id → (rows, tf)
+        self.tombstones = np.array([], dtype=np.int64)
+        self.version = meta.get("collection_version")
+
+    # ---------------------------------------------------------
+    # 로딩
+    # ---------------------------------------------------------
+    @classmethod
+    def load(cls, index_dir, mmap=True, apply_delta=True):
+        mmap_mode = "r" if mmap else None
+        index_dir = resolve_store_dir(index_dir)  # 재빌드 중에도 한 버전의 파일만 읽도록 링크를 한 번만 풂
+
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, VOCAB_FILE), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(index_dir, DOC_IDS_FILE), encoding="utf-8") as f:
+            doc_ids = json.load(f)
+        with open(os.path.join(index_dir, DOC_PATENT_IDS_FILE), encoding="utf-8") as f:
+            doc_patent_ids = json.load(f)
+
+        def _load(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode=mmap_mode)
+
+        index = cls(
+            index_dir=index_dir,
+            meta=meta,
+            vocab=vocab,
+            doc_ids=doc_ids,
+            doc_patent_ids=doc_patent_ids,
+            term_offsets=_load(TERM_OFFSETS_FILE),
+            postings_docs=_load(POSTINGS_DOCS_FILE),
+            postings_tf=_load(POSTINGS_TF_FILE),
+            idf=_load(IDF_FILE),
+            doc_norm=_load(DOC_NORM_FILE),
+        )
+        delta_path = os.path.join(index_dir, DELTA_FILE)
+        if apply_delta and os.path.exists(delta_path):
+            with open(delta_path, encoding="utf-8") as f:
+                index.apply_delta(json.load(f))
+        return index
+
+    def apply_delta(self, delta):
+        """
+        BM25Delta 파일 내용을 반영합니다. base 문서 길이는 저장된 doc_norm 에서 역산합니다.
+        """
+        k1, b = self.k1, self.b
+        epsilon = self.meta.get("epsilon", BM25_EPSILON)
+        n_base = self.n_base_docs
+        base_avgdl = self.meta.get("avgdl", 0.0)
+
+        base_norm = np.asarray(self.doc_norm, dtype=np.float64)
+        if b > 0 and base_avgdl > 0:
+            base_lens = np.rint((base_norm / k1 - (1 - b)) * base_avgdl / b)
+        else:
+            base_lens = np.zeros(n_base, dtype=np.float64)
+
+        tombstones = np.asarray(delta.get("tombstones", []), dtype=np.int64)
+        alive = np.ones(n_base, dtype=bool)
+        alive[tombstones] = False
+
+        # 추가 청구항 postings (새 용어는 vocab 뒤에 id 부여)
+        docs = delta.get("docs", [])
+        delta_lens = np.zeros(len(docs), dtype=np.float64)
+        postings = {}
+        for j, doc in enumerate(docs):
+            tokens = tokenize(doc["text"])
+            delta_lens[j] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_id = self.term_to_id.setdefault(term, len(self.term_to_id))
+                postings.setdefault(term_id, []).append((n_base + j, tf))
+        self.delta_postings = {
+            term_id: (
+                np.array([row for row, _ in plist], dtype=np.int64),
+                np.array([tf for _, tf in plist], dtype=np.float64),
+            )
+            for term_id, plist in postings.items()
+        }
+
+        # df: base df - 삭제된 row 의 df + 추가 청구항 df
+        df = np.zeros(len(self.term_to_id), dtype=np.float64)
+        df[:self.n_base_terms] = np.diff(np.asarray(self.term_offsets))
+        for term, count in delta.get("tombstone_df", {}).items():
+            term_id = self.term_to_id.get(term)
+            if term_id is not None and term_id < self.n_base_terms:
+                df[term_id] -= count
+        for term_id, (rows, _) in self.delta_postings.items():
+            df[term_id] += len(rows)
+
+        n_docs = int(alive.sum()) + len(docs)
+        total_len = float(base_lens[alive].sum() + delta_lens.sum())
+        avgdl = total_len / n_docs if n_docs else 0.0
+
+        # IDF (build_bm25_index 와 같은 식, 평균은 실제 코퍼스에 남은 용어 기준)
+        present = df > 0
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        idf[~present] = 0.0
+        if present.any():
+            average_idf = idf[present].sum() / present.sum()
+            idf[present & (idf < 0)] = epsilon * average_idf
+
+        lens = np.concatenate([base_lens, delta_lens])
+        if avgdl > 0:
+            doc_norm = k1 * (1 - b + b * lens / avgdl)
+        else:
+            doc_norm = np.full(len(lens), k1, dtype=np.float64)
+
+        self.idf = idf
+        self.doc_norm = doc_norm
+        self.tombstones = tombstones
+        self.n_docs = n_base + len(docs)
+        self.doc_ids = list(self.doc_ids) + [doc["id"] for doc in docs]
+        self.doc_patent_ids = list(self.doc_patent_ids) + [doc["patent_id"] for doc in docs]
+        self.id_to_row = {
+            doc_id: row for row, doc_id in enumerate(self.doc_ids) if row >= n_base or alive[row]
+        }
+        self._patent_rows = None
+        self.version = delta.get("version", self.version)
+
+    # ---------------------------------------------------------
+    # 질의
+    # ---------------------------------------------------------
+    def get_scores(self, tokenized_query):
+        """
+        코퍼스 전체 문서에 대한 BM25 점수 배열(길이 n_docs)을 반환합니다.
+        BM25Okapi.get_scores 와 마찬가지로 중복 토큰은 중복해서 더합니다.
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float64)
+
+        for token in tokenized_query:
+            term_id = self.term_to_id.get(token)
+            if term_id is None:
+                continue
+
+            if term_id < self.n_base_terms:
+                start = self.term_offsets[term_id]
+                end = self.term_offsets[term_id + 1]
+                rows = self.postings_docs[start:end]
+                tf = self.postings_tf[start:end].astype(np.float64)
+
+                # 같은 term 안에서 row는 유일하므로 fancy-index 누적이 안전함
+                scores[rows] += self.idf[term_id] * (
+                    tf * (self.k1 + 1) / (tf + self.doc_norm[rows])
+                )
+
+            delta = self.delta_postings.get(term_id)
+            if delta is not None:
+                rows, tf = delta
+                scores[rows] += self.idf[term_id] * (
+                    tf * (self.k1 + 1) / (tf + self.doc_norm[rows])
+                )
+
+        # 증분 반영으로 삭제/교체된 청구항은 후보에서 제외 (top_n 은 0 보다 큰 점수만 반환)
+        if len(self.tombstones):
+            scores[self.tombstones] = 0.0
+        return scores
+
+    def top_n(self, scores, n):
+        """
+        점수 배열에서 0보다 큰 상위 n개 row를 점수 내림차순으로 반환합니다.
+        """
+        nonzero = np.flatnonzero(scores > 0)
+        if len(nonzero) == 0 or n <= 0:
+            return np.array([], dtype=np.int64)
+
+        if len(nonzero) > n:
+            part = np.argpartition(-scores[nonzero], n - 1)[:n]
+            nonzero = nonzero[part]
+
+        order = np.argsort(-scores[nonzero], kind="stable")
+        return nonzero[order]
+
+    def rows_for_patents(self, patent_ids):
+        """
+        주어진 특허들에 속한 모든 청구항 row 배열을 반환합니다.
+        """
+        if self._patent_rows is None:
+            groups = {}
+            for row, patent_id in enumerate(self.doc_patent_ids):
+                groups.setdefault(patent_id, []).append(row)
+            self._patent_rows = {
+                patent_id: np.asarray(rows, dtype=np.int64) for patent_id, rows in groups.items()
+            }
+        rows = [self._patent_rows[pid] for pid in patent_ids if pid in self._patent_rows]
+        return np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+
+    def rows_for_ids(self, ids):
+        """
+        청구항 id 리스트를 인덱스 row 배열로 변환합니다. (인덱스에 없는 id는 -1)
+        """
+        return np.array([self.id_to_row.get(i, -1) for i in ids], dtype=np.int64)
+
+
+# =========================================================
+# 증분 반영 (delta.json)
+# =========================================================
+class BM25Delta:
+    """
+    base 인덱스를 다시 빌드하지 않고 특허 단위 추가/교체/삭제를 기록하는 delta 파일.
+
+    - docs: 추가(교체)된 청구항 {"id", "patent_id", "text"} — 로딩 시 토큰화해서 postings 를 만듦
+    - tombstones: 삭제/교체된 base row 번호
+    - tombstone_df: tombstone row 들의 용어별 문서 수 (df 보정용)
+    base 인덱스를 다시 빌드하면(build_bm25_index) 새 버전 디렉토리에는 따라오지 않습니다.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = resolve_store_dir(index_dir)
+        self.path = os.path.join(self.index_dir, DELTA_FILE)
+        self.base = BM25Index.load(self.index_dir, apply_delta=False)
+
+        delta = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                delta = json.load(f)
+        self.docs = delta.get("docs", [])
+        self.tombstones = set(delta.get("tombstones", []))
+        self.tombstone_df = Counter(delta.get("tombstone_df", {}))
+
+    def remove_patents(self, patent_ids, fetch_documents):
+        """
+        특허들의 청구항을 (base / 이전 delta 모두에서) 제거합니다.
+        fetch_documents(ids) 는 청구항 id → 본문 dict 를 반환해야 합니다. (벡터 DB 에서 지우기 전에 호출)
+        """
+        patent_ids = set(patent_ids)
+        self.docs = [doc for doc in self.docs if doc["patent_id"] not in patent_ids]
+
+        rows = [
+            int(row) for row in self.base.rows_for_patents(sorted(patent_ids))
+            if int(row) not in self.tombstones
+        ]
+        if not rows:
+            return 0
+        texts = fetch_documents([self.base.doc_ids[row] for row in rows])
+        for row in rows:
+            self.tombstones.add(row)
+            terms = set(tokenize(texts.get(self.base.doc_ids[row], "")))
+            self.tombstone_df.update(term for term in terms if term in self.base.term_to_id)
+        return len(rows)
+
+    def add_documents(self, records):
+        """
+        records: (청구항 id, 본문, 메타데이터) 리스트
+        """
+        for doc_id, text, metadata in records:
+            self.docs.append({
+                "id": doc_id,
+                "patent_id": str((metadata or {}).get("patent_id", "")),
+                "text": text or "",
+            })
+
+    def save(self, version=None):
+        delta = {
+            "version": version,
+            "docs": self.docs,
+            "tombstones": sorted(self.tombstones),
+            "tombstone_df": dict(self.tombstone_df),
+            "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(delta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+# =========================================================
+# 인덱스 빌드
+# =========================================================
+def build_bm25_index(collection, index_dir, batch_size=BUILD_BATCH_SIZE,
+                     k1=BM25_K1, b=BM25_B, epsilon=BM25_EPSILON, log=print):
+    """
+    Chroma 컬렉션 전체를 순회하며 BM25 역색인을 만들어 index_dir 에 저장합니다.
+
+    IDF 계산은 rank_bm25.BM25Okapi._calc_idf 와 동일합니다.
+    (음수 IDF는 epsilon * 평균 IDF 로 대체)
+    파일은 형제 임시 디렉토리에 쓴 뒤 index_dir 로 원자적으로 교체합니다. (atomic_store.build_store_dir)
+    서빙 중인 워커가 매핑한 이전 파일은 그대로 남고, 이전 delta.json 은 새 버전에 따라오지 않습니다.
+    """
+    started = time.time()
+
+    doc_ids = []
+    doc_patent_ids = []
+    doc_lens = []
+    term_to_id = {}
+    postings = []  # term_id -> [(row, tf), ...]
+
+    total = collection.count()
+    offset = 0
+
+    # 1. 컬렉션 전체 순회하며 postings 수집
+    while offset < total:
+        batch = collection.get(
+            include=["documents", "metadatas"],
+            limit=batch_size,
+            offset=offset,
+        )
+        ids = batch.get("ids", [])
+        if not ids:
+            break
+
+        docs = batch.get("documents", [])
+        metas = batch.get("metadatas", [])
+
+        for doc_id, doc, meta in zip(ids, docs, metas):
+            row = len(doc_ids)
+            tokens = tokenize(doc)
+
+            doc_ids.append(doc_id)
+            doc_patent_ids.append((meta or {}).get("patent_id", ""))
+            doc_lens.append(len(tokens))
+
+            for term, tf in Counter(tokens).items():
+                term_id = term_to_id.get(term)
+                if term_id is None:
+                    term_id = len(postings)
+                    term_to_id[term] = term_id
+                    postings.append([])
+                postings[term_id].append((row, tf))
+
+        offset += len(ids)
+        log(f"[BM25] {offset}/{total} 청구항 처리 ({time.time() - started:.1f}s)")
+
+    n_docs = len(doc_ids)
+    doc_lens = np.array(doc_lens, dtype=np.float64)
+    avgdl = float(doc_lens.mean()) if n_docs else 0.0
+
+    # 2. CSR 형태로 평탄화
+    term_offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+    for term_id, plist in enumerate(postings):
+        term_offsets[term_id + 1] = term_offsets[term_id] + len(plist)
+
+    postings_docs = np.empty(term_offsets[-1], dtype=np.int32)
+    postings_tf = np.empty(term_offsets[-1], dtype=np.float32)
+    for term_id, plist in enumerate(postings):
+        start = term_offsets[term_id]
+        for j, (row, tf) in enumerate(plist):
+            postings_docs[start + j] = row
+            postings_tf[start + j] = tf
+
+    # 3. IDF (BM25Okapi 와 동일)
+    df = np.diff(term_offsets).astype(np.float64)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        average_idf = idf.sum() / len(idf)
+        idf[idf < 0] = epsilon * average_idf
+
+    # 4. 문서 길이 정규화 항 미리 계산
+    if avgdl > 0:
+        doc_norm = k1 * (1 - b + b * doc_lens / avgdl)
+    else:
+        doc_norm = np.full(n_docs, k1, dtype=np.float64)
+
+    # 5. 저장
+    vocab = [None] * len(term_to_id)
+    for term, term_id in term_to_id.items():
+        vocab[term_id] = term
+
+    meta = {
+        "n_docs": n_docs,
+        "n_terms": len(vocab),
+        "n_postings": int(term_offsets[-1]),
+        "avgdl": avgdl,
+        "k1": k1,
+        "b": b,
+        "epsilon": epsilon,
+        "collection": getattr(collection, "name", ""),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    # 이전 증분 반영분(delta.json)은 새 base 에 이미 포함되므로 새 버전 디렉토리에는 두지 않음
+    with build_store_dir(index_dir) as build_dir:
+        np.save(os.path.join(build_dir, TERM_OFFSETS_FILE), term_offsets)
+        np.save(os.path.join(build_dir, POSTINGS_DOCS_FILE), postings_docs)
+        np.save(os.path.join(build_dir, POSTINGS_TF_FILE), postings_tf)
+        np.save(os.path.join(build_dir, IDF_FILE), idf)
+        np.save(os.path.join(build_dir, DOC_NORM_FILE), doc_norm)
+
+        with open(os.path.join(build_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(build_dir, DOC_IDS_FILE), "w", encoding="utf-8") as f:
+            json.dump(doc_ids, f, ensure_ascii=False)
+        with open(os.path.join(build_dir, DOC_PATENT_IDS_FILE), "w", encoding="utf-8") as f:
+            json.dump(doc_patent_ids, f, ensure_ascii=False)
+        with open(os.path.join(build_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    log(
+        f"[BM25] 완료: 문서 {n_docs}개, 용어 {len(vocab)}개, "
+        f"postings {int(term_offsets[-1])}개 ({time.time() - started:.1f}s)"
+    )
+    return meta
@@ -0,0 +1,367 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .resources import registry
+
+# =========================================================
+# 녹화/재생 카세트 (LangGraph 에이전트 성능 분석용)
+# =========================================================
+# PAI_CASSETTE_MODE=record : 실제 LLM 요청/응답(스트리밍 청크 + 도착 시각)과 도구(검색 연산) 입출력을 JSONL 로 기록
+# PAI_CASSETTE_MODE=replay : 같은 요청에 기록된 응답을 원래 시각(또는 PAI_CASSETTE_SPEED 배속)으로 돌려줌
+#                            (LLM API / 모델 / 인덱스 없이 Django·LangGraph·도구 오버헤드만 재현)
+#
+# - LLM 은 OpenAI 클라이언트의 httpx transport 에서, 도구는 검색 연산(search_patents 등) 단위에서 가로챕니다.
+# - 요청 키 = 요청 본문(정렬된 JSON)의 해시. 같은 키가 여러 번 기록되면 기록 순서대로, 다 쓰면 처음부터 다시 돌려줌
+# - 재생 중 기록에 없는 요청은 CassetteMiss (실제 API 로 넘기지 않음)
+# - 요청 본문이 달라지면 키도 달라짐: main.py 에서 stream_usage=True(요청에 stream_options.include_usage 추가)를
+#   켜기 전에 녹화한 카세트는 모든 LLM 요청이 CassetteMiss 가 되므로 다시 녹화해야 함
+
+# ✅ 상수 설정
+CASSETTE_MODES = ("off", "record", "replay")
+CASSETTE_MODE = os.getenv("PAI_CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv("PAI_CASSETTE_PATH") or os.path.join(
+    settings.BASE_DIR, "db_search", "cassettes", "agent.jsonl"
+)
+CASSETTE_SPEED = float(os.getenv("PAI_CASSETTE_SPEED", "1"))  # 2 = 두 배 빠르게, 0 = 대기 없이
+REPLAY_API_KEY = "cassette-replay"  # 재생 시 OpenAI 클라이언트 생성용 (실제로 전송되지 않음)
+
+
+class CassetteMiss(LookupError):
+    """
+    재생 모드에서 기록에 없는 요청이 들어온 경우
+    """
+
+
+def request_key(kind, name, payload):
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(f"{kind}\n{name}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    기록 파일 하나 (JSONL, 줄마다 LLM 호출 또는 도구 호출 하나).
+
+    LLM: {"kind": "llm", "key", "name": URL 경로, "request": 본문, "status", "headers",
+          "chunks": [[요청 시작 후 초, 텍스트], ...], "elapsed"}
+    도구: {"kind": "tool", "key", "name": 연산 이름, "request": 인자, "result" 또는 "error", "elapsed"}
+    """
+
+    def __init__(self, path, mode, speed=CASSETTE_SPEED):
+        if mode not in CASSETTE_MODES[1:]:
+            raise ValueError(f"PAI_CASSETTE_MODE 는 record / replay 중 하나여야 합니다: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.entries = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self.stats = {"llm_calls": 0, "tool_calls": 0, "llm_wait_seconds": 0.0, "tool_wait_seconds": 0.0, "misses": 0}
+
+        if mode == "replay":
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"카세트 파일이 없습니다: {path}")
+            with open(path, encoding="utf-8", errors="surrogatepass") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries.setdefault(entry["key"], []).append(entry)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def iter_entries(self, kind=None):
+        for entries in self.entries.values():
+            for entry in entries:
+                if kind is None or entry["kind"] == kind:
+                    yield entry
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            # 스트리밍 청크의 잘린 UTF-8(서로게이트)도 기록/복원되도록 surrogatepass
+            with open(self.path, "a", encoding="utf-8", errors="surrogatepass") as f:
+                f.write(line)
+            self.stats[f"{entry['kind']}_calls"] += 1
+
+    def take(self, kind, key, name):
+        with self._lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"카세트에 기록되지 않은 {kind} 요청입니다: {name} ({key[:12]})")
+            cursor = self._cursor.get(key, 0)
+            self._cursor[key] = cursor + 1
+            self.stats[f"{kind}_calls"] += 1
+            return entries[cursor % len(entries)]
+
+    def wait_until(self, kind, started, offset):
+        # 기록된 시각(요청 시작 후 offset 초)까지 대기, speed 배속
+        if self.speed <= 0:
+            return
+        remaining = started + offset / self.speed - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+            with self._lock:
+                self.stats[f"{kind}_wait_seconds"] += remaining
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def http_client(self):
+        import httpx
+
+        return httpx.Client(transport=_transport_class()(self), timeout=None)
+
+    def retrieval(self, backend):
+        return CassetteRetrieval(self, backend)
+
+
+# =========================================================
+# LLM: httpx transport
+# =========================================================
+_transport_cls = None
+
+
+def _transport_class():
+    """
+    httpx 는 openai 패키지 의존성이라 카세트를 켤 때만 import 합니다.
+    """
+    global _transport_cls
+    if _transport_cls is not None:
+        return _transport_cls
+
+    import httpx
+
+    class RecordingStream(httpx.SyncByteStream):
+        def __init__(self, cassette, entry, response, started):
+            self.cassette = cassette
+            self.entry = entry
+            self.response = response
+            self.started = started
+            self._saved = False
+
+        def __iter__(self):
+            for chunk in self.response.stream:
+                # 청크 경계에서 잘린 UTF-8 도 그대로 보존 (surrogateescape)
+                self.entry["chunks"].append(
+                    [time.perf_counter() - self.started, chunk.decode("utf-8", "surrogateescape")]
+                )
+                yield chunk
+
+        def close(self):
+            self.response.close()
+            if not self._saved:
+                self._saved = True
+                self.entry["elapsed"] = time.perf_counter() - self.started
+                self.cassette.append(self.entry)
+
+    class ReplayStream(httpx.SyncByteStream):
+        def __init__(self, cassette, chunks, started):
+            self.cassette = cassette
+            self.chunks = chunks
+            self.started = started
+
+        def __iter__(self):
+            for offset, text in self.chunks:
+                self.cassette.wait_until("llm", self.started, offset)
+                yield text.encode("utf-8", "surrogateescape")
+
+    class CassetteTransport(httpx.BaseTransport):
+        def __init__(self, cassette):
+            self.cassette = cassette
+            self.inner = httpx.HTTPTransport() if cassette.mode == "record" else None
+
+        def handle_request(self, request):
+            started = time.perf_counter()
+            body = request.read()
+            try:
+                payload = json.loads(body) if body else None
+            except ValueError:
+                payload = body.decode("utf-8", "replace")
+            key = request_key("llm", request.url.path, payload)
+
+            if self.cassette.mode == "replay":
+                entry = self.cassette.take("llm", key, request.url.path)
+                return httpx.Response(
+                    entry["status"],
+                    headers=entry["headers"],
+                    stream=ReplayStream(self.cassette, entry["chunks"], started),
+                    request=request,
+                )
+
+            # 기록 파일을 읽을 수 있도록 압축 없이 받음
+            request.headers["Accept-Encoding"] = "identity"
+            response = self.inner.handle_request(request)
+            entry = {
+                "kind": "llm",
+                "key": key,
+                "name": request.url.path,
+                "request": payload,
+                "status": response.status_code,
+                "headers": [
+                    [k, v] for k, v in response.headers.items() if k.lower() not in ("content-encoding", "set-cookie")
+                ],
+                "chunks": [],
+                "recorded_at": time.time(),
+            }
+            return httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=RecordingStream(self.cassette, entry, response, started),
+                request=request,
+                extensions=response.extensions,
+            )
+
+        def close(self):
+            if self.inner is not None:
+                self.inner.close()
+
+    _transport_cls = CassetteTransport
+    return _transport_cls
+
+
+# =========================================================
+# 도구: 검색 연산 (retrieval_service / RetrievalClient 와 같은 함수 이름)
+# =========================================================
+class CassetteRetrieval:
+    """
+    검색 연산 제공자를 감싸 입력/출력을 기록하거나, 기록된 결과를 같은 스키마 객체로 돌려줍니다.
+    (RetrievalClient 와 같은 직렬화를 써서 재생 결과 → ToolMessage 내용이 기록 때와 같음)
+    """
+
+    def __init__(self, cassette, backend):
+        self.cassette = cassette
+        self.backend = backend
+
+    def call(self, op, **args):
+        from .retrieval_server import _dump, _load
+
+        cassette = self.cassette
+        key = request_key("tool", op, args)
+        started = time.perf_counter()
+
+        if cassette.mode == "replay":
+            entry = cassette.take("tool", key, op)
+            cassette.wait_until("tool", started, entry["elapsed"])
+            if "error" in entry:
+                raise RuntimeError(entry["error"])
+            return _load(op, entry["result"])
+
+        entry = {"kind": "tool", "key": key, "name": op, "request": args, "recorded_at": time.time()}
+        try:
+            result = getattr(self.backend, op)(**args)
+        except Exception as e:
+            entry.update(error=f"{type(e).__name__}: {e}", elapsed=time.perf_counter() - started)
+            cassette.append(entry)
+            raise
+        entry.update(result=_dump(result), elapsed=time.perf_counter() - started)
+        cassette.append(entry)
+        return result
+
+    def search_patents(self, **kwargs):
+        return self.call("search_patents", **kwargs)
+
+    def get_patent_detail(self, **kwargs):
+        return self.call("get_patent_detail", **kwargs)
+
+    def search_ipc_codes(self, **kwargs):
+        return self.call("search_ipc_codes", **kwargs)
+
+    def get_ipc_details(self, **kwargs):
+        return self.call("get_ipc_details", **kwargs)
+
+
+# =========================================================
+# 프로세스 전역 카세트
+# =========================================================
+@registry.resource("cassette")
+def _load_cassette():
+    if CASSETTE_MODE == "off":
+        return None
+    return Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_SPEED)
+
+
+def get_cassette():
+    return registry.get("cassette")
+
+
+def cassette_http_client():
+    """
+    OpenAI 클라이언트에 넘길 http_client (카세트가 꺼져 있으면 None = 기본 클라이언트)
+    """
+    cassette = get_cassette()
+    return cassette.http_client() if cassette is not None else None
+
+
+def cassette_api_key():
+    # 재생 모드에서는 API 키 없이도 클라이언트를 만들 수 있게 함
+    cassette = get_cassette()
+    return REPLAY_API_KEY if cassette is not None and cassette.mode == "replay" else None
+
+
+def install_cassette(cassette):
+    """
+    환경 변수 대신 지정한 카세트를 쓰도록 바꾸고, 카세트를 물고 있는 리소스(LLM, 그래프, 제목 클라이언트)를 다시 만들게 합니다.
+    (replay_agent_cassette 명령 등)
+    """
+    registry.register("cassette", lambda: cassette)
+    for name in ("cassette", "llm_with_tools", "graph_agent", "title_client"):
+        registry.reset(name)
+
+
+# =========================================================
+# 기록된 대화 턴을 그래프로 다시 실행 (Django HTTP 없이 LangGraph·도구 오버헤드 측정)
+# =========================================================
+def recorded_turns(cassette):
+    """
+    턴을 시작한 LLM 요청(도구가 바인딩되어 있고 마지막 메시지가 user)의 메시지 목록을 기록 순서대로 반환합니다.
+    (제목 생성 요청처럼 tools 가 없는 요청은 제외)
+    """
+    starts = []
+    for entry in cassette.iter_entries("llm"):
+        request = entry.get("request") or {}
+        messages = request.get("messages") or []
+        if request.get("tools") and messages and messages[-1].get("role") == "user":
+            starts.append((entry.get("recorded_at", 0), messages))
+    starts.sort(key=lambda item: item[0])
+    return [messages for _, messages in starts]
+
+
+def replay_turn(cassette, messages):
+    """
+    턴 하나를 에이전트 그래프로 실행하고 경과 시간 / 재생 대기 시간 / 오버헤드(ms)를 반환합니다.
+    """
+    from langchain_core.messages import convert_to_messages
+
+    from .main import get_graph_agent
+
+    before = cassette.snapshot()
+    started = time.perf_counter()
+    result = {"error": None, "chunks": 0}
+    try:
+        for _ in get_graph_agent().stream(
+            {"messages": convert_to_messages(messages)}, stream_mode="messages"
+        ):
+            result["chunks"] += 1
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - started
+
+    after = cassette.snapshot()
+    wait = sum(after[k] - before[k] for k in ("llm_wait_seconds", "tool_wait_seconds"))
+    result.update(
+        wall_ms=wall * 1000.0,
+        wait_ms=wait * 1000.0,
+        overhead_ms=(wall - wait) * 1000.0,
+        llm_calls=after["llm_calls"] - before["llm_calls"],
+        tool_calls=after["tool_calls"] - before["tool_calls"],
+    )
+    return result
@@ -0,0 +1,198 @@
+import json
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+import numpy as np
+
+# ✅ 상수 설정
+DEFAULT_MESSAGES = [
+    "배터리 셀의 열폭주를 감지해서 냉각수를 분사하는 장치와 비슷한 특허를 찾아줘",
+    "스마트폰 카메라 모듈의 손떨림 보정 구조 관련 특허 알려줘",
+    "음식물 쓰레기를 발효시켜 비료로 만드는 장치의 IPC 코드가 뭐야?",
+    "드론 배터리를 자동으로 교체하는 스테이션 특허를 검색해줘",
+]
+DEFAULT_TIMEOUT = 120.0
+HISTORY_ID_RE = re.compile(r'id="current-history-id"\s+value="(\d+)"')
+
+
+def percentiles(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "count": len(arr),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "mean": float(arr.mean()),
+    }
+
+
+def fetch_stub_stats(stub_url, timeout=5.0):
+    # 스텁 서버 GET /stats (없거나 실패하면 None)
+    if not stub_url:
+        return None
+    try:
+        with urllib.request.urlopen(stub_url.rstrip("/") + "/stats", timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except (OSError, ValueError):
+        return None
+
+
+class ChatSession:
+    """
+    가상 사용자 하나 (쿠키로 비회원 세션 유지). 새 대화방을 만들고 스트리밍 API 로 메시지를 보냅니다.
+    """
+
+    def __init__(self, base_url, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        self.history_id = None
+
+    def new_history(self):
+        # /chat/new/ → /chat/chat/ 로 리다이렉트된 화면에서 선택된 대화방 번호를 읽음
+        with self.opener.open(f"{self.base_url}/chat/new/", timeout=self.timeout) as resp:
+            html = resp.read().decode("utf-8", "replace")
+        match = HISTORY_ID_RE.search(html)
+        if not match:
+            raise RuntimeError("채팅 화면에서 current-history-id 를 찾지 못했습니다.")
+        self.history_id = int(match.group(1))
+        return self.history_id
+
+    def send(self, message):
+        """
+        메시지 하나를 보내고 NDJSON 스트림을 끝까지 읽어 측정값을 반환합니다.
+
+        - ttft_ms: 요청 시작부터 첫 token 이벤트까지
+        - tokens_per_second: 첫 token 이후 token 이벤트 수 / 경과 시간
+        - tool_latency_ms: tool_call → tool_result 이벤트 간격 (순서대로 짝지음)
+        - db_writes / db_queries: 서버의 stats 이벤트 (PAI_STREAM_STATS=1 일 때만, 스트림 뒤의 trace 저장 쓰기 포함)
+        """
+        result = {
+            "ok": False,
+            "error": None,
+            "ttft_ms": None,
+            "tokens": 0,
+            "tokens_per_second": None,
+            "tool_latency_ms": [],
+            "db_writes": None,
+            "db_queries": None,
+            "total_ms": None,
+        }
+        body = json.dumps({"message": message, "history_id": self.history_id}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/api/stream/",
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+
+        started = time.perf_counter()
+        first_token = last_token = None
+        pending_tools = []
+        try:
+            with self.opener.open(request, timeout=self.timeout) as resp:
+                for line in resp:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    now = time.perf_counter()
+                    event = json.loads(line)
+                    kind = event.get("type")
+                    if kind == "token":
+                        if first_token is None:
+                            first_token = now
+                            result["ttft_ms"] = (now - started) * 1000.0
+                        last_token = now
+                        result["tokens"] += 1
+                    elif kind == "tool_call":
+                        pending_tools.append(now)
+                    elif kind == "tool_result" and pending_tools:
+                        result["tool_latency_ms"].append((now - pending_tools.pop(0)) * 1000.0)
+                    elif kind == "stats":
+                        result["db_writes"] = event.get("db_writes")
+                        result["db_queries"] = event.get("db_queries")
+                    elif kind == "error":
+                        result["error"] = event.get("message") or "error event"
+        except urllib.error.HTTPError as e:
+            result["error"] = f"HTTP {e.code}"
+        except (OSError, ValueError) as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+        result["total_ms"] = (time.perf_counter() - started) * 1000.0
+        if first_token is not None and last_token > first_token and result["tokens"] > 1:
+            result["tokens_per_second"] = (result["tokens"] - 1) / (last_token - first_token)
+        if result["error"] is None and first_token is None:
+            result["error"] = "no tokens"
+        result["ok"] = result["error"] is None
+        return result
+
+
+def run_virtual_user(base_url, messages, requests, turns, timeout=DEFAULT_TIMEOUT, offset=0):
+    """
+    가상 사용자 하나: turns 턴짜리 대화를 만들며 requests 개의 메시지를 보냅니다.
+    """
+    results = []
+    session = ChatSession(base_url, timeout=timeout)
+    for i in range(requests):
+        if i % turns == 0:
+            try:
+                session.new_history()
+            except (OSError, RuntimeError) as e:
+                results.append({"ok": False, "error": f"new_history: {e}"})
+                continue
+        results.append(session.send(messages[(offset + i) % len(messages)]))
+    return results
+
+
+def summarize(results, wall_seconds):
+    ok = [r for r in results if r.get("ok")]
+    errors = {}
+    for r in results:
+        if not r.get("ok"):
+            errors[r.get("error") or "unknown"] = errors.get(r.get("error") or "unknown", 0) + 1
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": (len(results) - len(ok)) / len(results) if results else None,
+        "error_kinds": errors,
+        "throughput_rps": len(ok) / wall_seconds if wall_seconds > 0 else None,
+        "ttft_ms": percentiles([r["ttft_ms"] for r in ok]),
+        "tokens_per_second": percentiles([r["tokens_per_second"] for r in ok]),
+        "total_ms": percentiles([r["total_ms"] for r in ok]),
+        "tool_latency_ms": percentiles([ms for r in ok for ms in r["tool_latency_ms"]]),
+        "db_writes_per_response": percentiles([r["db_writes"] for r in ok]),
+        "db_queries_per_response": percentiles([r["db_queries"] for r in ok]),
+    }
+
+
+def run_load(base_url, concurrency, requests_per_user, turns=1, messages=None, timeout=DEFAULT_TIMEOUT,
+             stub_url=None):
+    """
+    concurrency 명의 가상 사용자가 동시에 NDJSON 스트림을 열어 각자 requests_per_user 개씩 보냅니다.
+    스텁 서버 주소가 있으면 전후 /stats 차이(LLM/임베딩 호출 수)도 함께 기록합니다.
+    """
+    messages = messages or DEFAULT_MESSAGES
+    turns = max(1, turns)
+    stub_before = fetch_stub_stats(stub_url)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(run_virtual_user, base_url, messages, requests_per_user, turns, timeout, user)
+            for user in range(concurrency)
+        ]
+        results = [r for future in futures for r in future.result()]
+    wall = time.perf_counter() - started
+
+    summary = summarize(results, wall)
+    summary.update({"concurrency": concurrency, "wall_seconds": wall})
+    stub_after = fetch_stub_stats(stub_url)
+    if stub_before is not None and stub_after is not None:
+        summary["stub"] = {key: value - stub_before.get(key, 0) for key, value in stub_after.items()}
+    return summary
@@ -0,0 +1,101 @@
+import contextlib
+import fcntl
+import json
+import os
+
+# ✅ 상수 설정
+VERSION_FILE = "pai_versions.json"  # Chroma DB 디렉토리 안에 두는 컬렉션별 버전 파일
+THRESHOLD_FILE = "pai_thresholds.json"  # 컬렉션별 거리 컷오프 (reindex_ipc_local --write-threshold)
+LOCK_SUFFIX = ".lock"  # 읽기-수정-쓰기를 직렬화하는 flock 파일 (값 파일은 os.replace 로 바뀌므로 따로 둠)
+
+
+def version_file_path(chroma_path):
+    return os.path.join(chroma_path, VERSION_FILE)
+
+
+def threshold_file_path(chroma_path):
+    return os.path.join(chroma_path, THRESHOLD_FILE)
+
+
+class CollectionValueFile:
+    """
+    컬렉션 이름별 값({"ipc_clean_local": 0.31, ...})을 Chroma DB 디렉토리 안에 담는 작은 JSON 사이드카.
+
+    - 파일 mtime 이 바뀌었을 때만 다시 읽으므로 질의마다 호출해도 stat 한 번 비용
+    - 쓰기는 임시 파일 + os.replace 로 교체, 읽기-수정-쓰기는 <파일>.lock 의 fcntl.flock 으로 프로세스 간 직렬화
+    - Chroma 컬렉션 메타데이터를 고치지 않는 이유: modify() 는 hnsw:* 설정을 함께 넘길 수 없어
+      거리 공간 정보가 사라질 수 있음
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._versions = {}
+
+    def _read(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._mtime, self._versions = None, {}
+            return self._versions
+        if mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as f:
+                self._versions = json.load(f)
+            self._mtime = mtime
+        return self._versions
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # flock 은 열린 파일 단위라 같은 프로세스의 다른 스레드끼리도 서로 기다림
+        with open(self.path + LOCK_SUFFIX, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._mtime = None  # 잠금 안에서는 캐시 대신 파일을 다시 읽음
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, collection_name, value):
+        values = dict(self._read())
+        values[collection_name] = value
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(values, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime, self._versions = None, {}
+        return value
+
+    def get(self, collection_name):
+        """
+        컬렉션의 값. 기록이 없으면 None.
+        """
+        return self._read().get(collection_name)
+
+    def set(self, collection_name, value):
+        with self._locked():
+            return self._write(collection_name, value)
+
+
+class VersionFile(CollectionValueFile):
+    """
+    컬렉션별 단조 증가 버전({"patent_claims": 3, ...})을 담는 파일.
+
+    - 증분 반영(apply_patent_updates)은 reserve() 로 다음 버전을 잡고 끝날 때 기록, 적재(ingest)는 bump()
+    - 검색 쪽은 get() 으로 읽어 결과 캐시 키 / 파생 인덱스(BM25, 메타 저장소) 갱신 여부를 판단
+      (증분 반영 기록이 없으면 None)
+    """
+
+    @contextlib.contextmanager
+    def reserve(self, collection_name):
+        """
+        with reserve(name) as version: ... 로 다음 버전을 잡아 두고, 블록이 정상 종료되면 그 값을 기록합니다.
+        블록 동안 잠금을 쥐고 있으므로 다른 reserve() / bump() 는 기다립니다. (예외면 기록하지 않음)
+        """
+        with self._locked():
+            version = int(self._read().get(collection_name) or 0) + 1
+            yield version
+            self._write(collection_name, version)
+
+    def bump(self, collection_name):
+        with self.reserve(collection_name) as version:
+            return version
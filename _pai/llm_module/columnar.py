@@ -0,0 +1,94 @@
+import json
+import os
+
+import numpy as np
+
+# 문자열 컬럼 파일 구성: <prefix>.bin (UTF-8 바이트 연결) + <prefix>.offsets.npy (int64, 길이 N+1)
+BIN_SUFFIX = ".bin"
+OFFSETS_SUFFIX = ".offsets.npy"
+TMP_SUFFIX = ".tmp"
+
+
+class StringColumnWriter:
+    """
+    문자열 값을 순서대로 이어 붙여 쓰는 writer.
+    전체 개수를 미리 몰라도 스트리밍으로 기록할 수 있습니다.
+    임시 파일에 쓴 뒤 close() 에서 os.replace 로 교체하므로, 기존 파일을 메모리 매핑 중인 프로세스는
+    잘린 파일 대신 이전 내용을 계속 봅니다.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._f = open(prefix + BIN_SUFFIX + TMP_SUFFIX, "wb")
+        self._offsets = [0]
+
+    def append(self, value):
+        data = (value or "").encode("utf-8")
+        self._f.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def close(self):
+        self._f.close()
+        with open(self.prefix + OFFSETS_SUFFIX + TMP_SUFFIX, "wb") as f:
+            np.save(f, np.asarray(self._offsets, dtype=np.int64))
+        os.replace(self.prefix + BIN_SUFFIX + TMP_SUFFIX, self.prefix + BIN_SUFFIX)
+        os.replace(self.prefix + OFFSETS_SUFFIX + TMP_SUFFIX, self.prefix + OFFSETS_SUFFIX)
+
+
+class StringColumn:
+    """
+    메모리 매핑된 문자열 컬럼. 행 단위로 필요할 때만 디코딩합니다.
+    (워커 프로세스들이 OS 페이지 캐시를 공유하므로 RSS 가 늘지 않음)
+    """
+
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    @classmethod
+    def load(cls, prefix):
+        offsets = np.load(prefix + OFFSETS_SUFFIX, mmap_mode="r")
+        if offsets[-1] > 0:
+            data = np.memmap(prefix + BIN_SUFFIX, dtype=np.uint8, mode="r")
+        else:
+            data = np.zeros(0, dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        start = int(self._offsets[row])
+        end = int(self._offsets[row + 1])
+        return bytes(self._data[start:end]).decode("utf-8")
+
+    def take(self, rows):
+        return [self[int(row)] for row in rows]
+
+    def to_list(self):
+        return [self[row] for row in range(len(self))]
+
+
+def write_string_column(prefix, values):
+    writer = StringColumnWriter(prefix)
+    writer.extend(values)
+    writer.close()
+
+
+class JsonColumn(StringColumn):
+    """
+    행마다 JSON 객체(메타데이터 dict 등)를 담는 컬럼.
+    """
+
+    def __getitem__(self, row):
+        raw = super().__getitem__(row)
+        return json.loads(raw) if raw else {}
+
+
+class JsonColumnWriter(StringColumnWriter):
+    def append(self, value):
+        super().append(json.dumps(value or {}, ensure_ascii=False))
@@ -1,8 +1,133 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from rank_bm25 import BM25Okapi
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from chromadb.utils import embedding_functions
+
+from .bm25_index import tokenize
+from .tracing import bind, stage
+
+LEXICAL_TOP_K = 200  # 전역 BM25 인덱스에서 가져올 어휘(lexical) 후보 수
+
+# 전역 BM25 점수 계산을 Chroma 질의와 병렬로 돌리기 위한 스레드 풀
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+
+def _global_bm25_scores(bm25_index, tokenized_query):
+    # 스레드 풀에서 실행 (단계 시간은 대기 시간이 아닌 실제 점수 계산 시간)
+    with stage("hybrid_bm25", lexical="global", query_tokens=len(tokenized_query)) as sp:
+        scores = bm25_index.get_scores(tokenized_query)
+        sp.set(candidates_scored=len(scores))
+        return scores
+
+
+def _vector_distance(query_embs, embeddings, space):
+    """
+    Chroma 컬렉션의 거리 공간(hnsw:space)과 동일한 방식으로 거리를 계산합니다.
+    다중 쿼리인 경우 쿼리별 거리 중 최솟값을 사용합니다.
+    """
+    q = np.asarray(query_embs, dtype=np.float64)
+    e = np.asarray(embeddings, dtype=np.float64)
+
+    if space == "cosine":
+        qn = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
+        en = e / (np.linalg.norm(e, axis=1, keepdims=True) + 1e-12)
+        dist = 1.0 - en @ qn.T
+    elif space == "ip":
+        dist = 1.0 - e @ q.T
+    else:  # l2 (Chroma 기본값, 제곱 거리)
+        dist = (
+            (e ** 2).sum(axis=1, keepdims=True)
+            - 2 * e @ q.T
+            + (q ** 2).sum(axis=1)[None, :]
+        )
+        dist = np.maximum(dist, 0.0)
+
+    return dist.min(axis=1)
+
+
+def _merge_lexical_candidates(collection, bm25_index, corpus_scores, query_embs,
+                              ids, docs, metas, distances, lexical_top_k,
+                              exclude_patent_ids=None):
+    """
+    전역 BM25 상위 후보 중 벡터 단계에서 누락된 청구항을 후보군에 합칩니다.
+    누락된 청구항의 벡터 거리는 저장된 임베딩으로 직접 계산합니다.
+    exclude_patent_ids 에 속한 특허의 청구항은 어휘 후보에서도 제외합니다.
+    """
+    if exclude_patent_ids:
+        # top_n 은 점수 0 이하를 건너뛰므로 제외 특허의 row 점수를 0으로
+        excluded_rows = bm25_index.rows_for_patents(exclude_patent_ids)
+        if len(excluded_rows):
+            corpus_scores = corpus_scores.copy()
+            corpus_scores[excluded_rows] = 0.0
+
+    seen = set(ids)
+    lexical_rows = bm25_index.top_n(corpus_scores, lexical_top_k)
+    missing = [
+        bm25_index.doc_ids[row]
+        for row in lexical_rows
+        if bm25_index.doc_ids[row] not in seen
+    ]
+
+    if not missing:
+        return ids, docs, metas, distances
+
+    fetched = collection.get(
+        ids=missing,
+        include=["documents", "metadatas", "embeddings"],
+    )
+    fetched_ids = fetched.get("ids", [])
+    if len(fetched_ids) == 0:
+        return ids, docs, metas, distances
+
+    space = (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+    fetched_dist = _vector_distance(query_embs, fetched["embeddings"], space)
+
+    return (
+        list(ids) + list(fetched_ids),
+        list(docs) + list(fetched["documents"]),
+        list(metas) + list(fetched["metadatas"]),
+        list(distances) + [float(d) for d in fetched_dist],
+    )
+
+
+def _fuse_multi_query_results(batch_results, final_top_k):
+    """
+    배치 질의 결과(쿼리별 row)를 쿼리 단위 z-score 로 정규화한 뒤
+    z-score 오름차순으로 상위 final_top_k 개를 골라 collection.query 형식으로 반환합니다.
+    여러 쿼리에 동시에 걸린 청구항은 가장 좋은 z-score 하나만 남깁니다.
+    """
+    ids, docs, metas, distances, z_scores = [], [], [], [], []
+
+    for row in range(len(batch_results["ids"])):
+        row_dist = np.asarray(batch_results["distances"][row], dtype=np.float64)
+        if len(row_dist) == 0:
+            continue
+
+        z_scores.append((row_dist - row_dist.mean()) / (row_dist.std() + 1e-9))
+        ids.extend(batch_results["ids"][row])
+        docs.extend(batch_results["documents"][row])
+        metas.extend(batch_results["metadatas"][row])
+        distances.extend(batch_results["distances"][row])
+
+    picked = []
+    if z_scores:
+        order = np.argsort(np.concatenate(z_scores), kind="stable")
+        seen = set()
+        for i in order:
+            if ids[i] in seen:
+                continue
+            seen.add(ids[i])
+            picked.append(i)
+            if len(picked) >= final_top_k:
+                break
+
+    return {
+        "ids": [[ids[i] for i in picked]],
+        "documents": [[docs[i] for i in picked]],
+        "distances": [[distances[i] for i in picked]],
+        "metadatas": [[metas[i] for i in picked]],
+    }
+
 
 def patent_hybrid_search(
     collection,
@@ -13,8 +138,17 @@ def patent_hybrid_search(
     top_k=30,
     max_claims_per_patent=3,
     vector_weight=0.7,
-    bm25_weight=0.3
+    bm25_weight=0.3,
+    bm25_index=None,
+    lexical_top_k=LEXICAL_TOP_K,
+    exclude_patent_ids=None,
 ):
+    """
+    bm25_index 가 None 이면 기존처럼 벡터 후보(~200개)만으로 BM25Okapi 를 만들고,
+    BM25Index(전역 인덱스)가 주어지면 코퍼스 전체 BM25 점수를 Chroma 질의와 병렬로 계산해
+    벡터 후보 + 어휘 후보를 합친 양방향(two-sided) 하이브리드 검색을 수행합니다.
+    exclude_patent_ids 는 벡터 질의의 where 필터($nin)와 어휘 후보 선택에 함께 반영됩니다.
+    """
     
     # ========================================
     # 1. Multi-query rerank
@@ -24,50 +158,39 @@ def patent_hybrid_search(
     if isinstance(query_list, str):
         query_list = [query_list]
     
+    # 쿼리 토큰화 (BM25 용)
+    combined_query = " ".join(query_list)
+    tokenized_query = tokenize(combined_query)
+    
+    # 전역 BM25 점수 계산은 벡터 검색과 병렬로 시작
+    lexical_future = None
+    if bm25_index is not None:
+        lexical_future = _lexical_executor.submit(bind(_global_bm25_scores), bm25_index, tokenized_query)
+    
     # 쿼리 임베딩
-    query_embs = model.encode(query_list).tolist()
+    with stage("hybrid_encode", queries=len(query_list)):
+        query_embs = model.encode(query_list).tolist()
+    
+    # 제외 특허는 후보 단계에서 바로 걸러냄 (결과 후처리로 빼면 top_k 가 덜 채워짐)
+    query_kwargs = {}
+    if exclude_patent_ids:
+        query_kwargs["where"] = {"patent_id": {"$nin": list(exclude_patent_ids)}}
     
-    # 단일 쿼리인 경우 바로 검색
+    # 모든 쿼리 임베딩을 한 번의 Chroma 질의로 검색 (N번 왕복 → 1번)
+    with stage("hybrid_vector", queries=len(query_embs), n_results=per_query_top_k) as sp:
+        batch_results = collection.query(
+            query_embeddings=query_embs,
+            n_results=per_query_top_k,
+            **query_kwargs,
+        )
+        sp.set(candidates=sum(len(ids) for ids in batch_results["ids"]))
+    
+    # 단일 쿼리인 경우 그대로 사용
     if len(query_list) == 1:
-        results = collection.query(query_embeddings=query_embs, n_results=per_query_top_k)
+        results = batch_results
     else:
-        # 다중 쿼리 rerank
-        candidates = []
-        for emb in query_embs:
-            r = collection.query(
-                query_embeddings=[emb],
-                n_results=per_query_top_k
-            )
-            
-            distances = np.array(r["distances"][0])
-            mean = distances.mean()
-            std = distances.std() + 1e-9
-            z_scores = (distances - mean) / std
-            
-            ids = r["ids"][0]
-            docs = r["documents"][0]
-            distances = r["distances"][0]
-            metas = r["metadatas"][0]
-            
-            for pid, doc, meta, z, dist in zip(ids, docs, metas, z_scores, distances):
-                candidates.append({
-                    "id": pid,
-                    "document": doc,
-                    "metadatas": meta,
-                    "distance": dist,
-                    "z-score": z
-                })
-        
-        # z-score 기준 정렬 후 상위 선택
-        top_candidates = sorted(candidates, key=lambda x: x["z-score"])[:final_top_k]
-        
-        # collection.query 형식으로 재구성
-        results = {
-            "ids": [[c["id"] for c in top_candidates]],
-            "documents": [[c["document"] for c in top_candidates]],
-            "distances": [[c["distance"] for c in top_candidates]],
-            "metadatas": [[c["metadatas"] for c in top_candidates]]
-        }
+        # 다중 쿼리 rerank (쿼리별 z-score 융합)
+        results = _fuse_multi_query_results(batch_results, final_top_k)
     
     # ========================================
     # 2. Hybrid search (Vector + BM25)
@@ -77,17 +200,148 @@ def patent_hybrid_search(
     metas = results["metadatas"][0]
     distances = results["distances"][0]
     
-    # BM25 초기화
-    tokenized_docs = [doc.split() for doc in docs]
-    bm25 = BM25Okapi(tokenized_docs)
-    
-    # 쿼리 토큰화
-    combined_query = " ".join(query_list)
-    tokenized_query = combined_query.split()
-    
-    # BM25 점수 계산
-    bm25_scores = bm25.get_scores(tokenized_query)
+    if lexical_future is None:
+        with stage("hybrid_bm25", lexical="local", query_tokens=len(tokenized_query), candidates_scored=len(docs)):
+            # BM25 초기화 (벡터 후보만으로 구성)
+            tokenized_docs = [tokenize(doc) for doc in docs]
+            bm25 = BM25Okapi(tokenized_docs)
+            
+            # BM25 점수 계산
+            bm25_scores = bm25.get_scores(tokenized_query)
+    else:
+        # 전역 BM25 인덱스: 어휘 후보 병합 후 코퍼스 기준 점수 사용
+        corpus_scores = lexical_future.result()
+        with stage("hybrid_lexical_merge", vector_candidates=len(ids)) as sp:
+            ids, docs, metas, distances = _merge_lexical_candidates(
+                collection, bm25_index, corpus_scores, query_embs,
+                ids, docs, metas, distances, lexical_top_k,
+                exclude_patent_ids=exclude_patent_ids,
+            )
+            sp.set(candidates=len(ids))
+        rows = bm25_index.rows_for_ids(ids)
+        bm25_scores = np.where(rows >= 0, corpus_scores[np.maximum(rows, 0)], 0.0)
     
+    # ========================================
+    # 3~6. 하이브리드 점수 → 특허 단위 그룹화/점수화 → 상위 top_k
+    # ========================================
+    with stage("hybrid_aggregate", candidates=len(ids)) as sp:
+        patents = _aggregate_patents(
+            ids, docs, metas, distances, bm25_scores,
+            top_k=top_k,
+            max_claims_per_patent=max_claims_per_patent,
+            vector_weight=vector_weight,
+            bm25_weight=bm25_weight,
+        )
+        sp.set(patents=len(patents))
+        return patents
+
+
+def search_with_growing_pool(search, top_k, pool_size, max_pool_size, growth, collection_size):
+    """
+    search(pool_size) 로 검색하고, 서로 다른 특허가 top_k 개보다 적으면 후보 풀을 growth 배씩 넓혀 다시 검색합니다.
+    max_pool_size 또는 컬렉션 크기(collection_size(), 처음 필요할 때 한 번만 호출)에 닿으면 멈춥니다.
+    (결과, 마지막 풀 크기) 를 반환합니다.
+    """
+    total = None
+    while True:
+        results = search(pool_size)
+        if len(results) >= top_k or pool_size >= max_pool_size:
+            return results, pool_size
+        if total is None:
+            total = collection_size()
+        if pool_size >= total:
+            return results, pool_size
+        pool_size = min(pool_size * growth, max_pool_size)
+
+
+def _aggregate_patents(
+    ids, docs, metas, distances, bm25_scores,
+    top_k=30, max_claims_per_patent=3, vector_weight=0.7, bm25_weight=0.3,
+):
+    """
+    3~6단계의 NumPy 벡터화 커널.
+
+    - 후보 청구항을 평행 배열로 두고 np.unique / lexsort 로 patent_id 별 구간(segment)을 만든 뒤,
+      top3 평균 / 최댓값 / 청구항 수 보너스를 구간 단위 reduction 으로 계산합니다.
+    - dict 는 최종 top_k 특허에 대해서만 만듭니다.
+    - 점수와 정렬(동점 순서 포함)은 _aggregate_patents_reference 와 동일합니다.
+    """
+    n = len(ids)
+    if n == 0:
+        return []
+
+    # 3. 하이브리드 점수 (기존과 같은 연산 순서)
+    vector_scores = 1 - np.asarray(distances, dtype=np.float64)
+    hybrid = vector_weight * vector_scores + bm25_weight * np.asarray(bm25_scores, dtype=np.float64)
+
+    # patent_id 기준 그룹 번호 + 그룹별 최초 등장 위치(= 기존 dict 삽입 순서)
+    patent_ids = [meta["patent_id"] for meta in metas]
+    _, first_idx, group, counts = np.unique(
+        np.asarray(patent_ids, dtype=str),
+        return_index=True,
+        return_inverse=True,
+        return_counts=True,
+    )
+    group = group.reshape(-1)
+
+    # 그룹 → hybrid 내림차순 → 원래 순서(안정 정렬과 동일한 동점 처리)
+    order = np.lexsort((np.arange(n), -hybrid, group))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_group = group[order]
+    sorted_hybrid = hybrid[order]
+    rank_in_group = np.arange(n) - starts[sorted_group]
+
+    # 4. 특허 단위 점수 (구간 reduction)
+    top3_sum = np.bincount(
+        sorted_group,
+        weights=np.where(rank_in_group < 3, sorted_hybrid, 0.0),
+        minlength=len(counts),
+    )
+    top3_avg = top3_sum / np.minimum(counts, 3)
+    max_score = sorted_hybrid[starts]
+    count_bonus = np.minimum(1.0, counts / 10.0)
+    patent_scores = top3_avg * 0.6 + max_score * 0.3 + count_bonus * 0.1
+
+    # 6. 점수 내림차순 (동점은 최초 등장 순서) 상위 top_k 그룹
+    top_groups = np.lexsort((first_idx, -patent_scores))[:top_k]
+
+    # 5. 선택된 특허만 dict 로 구성
+    aggregated = []
+    for g in top_groups:
+        segment = order[starts[g]:starts[g] + counts[g]]
+        rep = segment[0]
+
+        top_claims = [
+            {
+                "id": ids[i],
+                "document": docs[i],
+                "title": metas[i].get("title", ""),
+                "distance": distances[i],
+                "hybrid_score": float(hybrid[i]),
+            }
+            for i in segment[:max_claims_per_patent]
+        ]
+
+        aggregated.append({
+            "patent_id": patent_ids[first_idx[g]],
+            "score": float(patent_scores[g]),
+            "top_claim": docs[rep],
+            "top_claim_no": metas[rep]["claim_no"],
+            "claims_found": int(counts[g]),
+            "claims": top_claims,
+        })
+
+    return aggregated
+
+
+def _aggregate_patents_reference(
+    ids, docs, metas, distances, bm25_scores,
+    top_k=30, max_claims_per_patent=3, vector_weight=0.7, bm25_weight=0.3,
+):
+    """
+    3~6단계의 순수 Python 구현 (기존 코드 그대로).
+    _aggregate_patents 와 결과가 완전히 같아야 하며, 패리티 테스트의 기준으로 사용합니다.
+    """
     # ========================================
     # 3. 하이브리드 점수 계산 및 그룹화
     # ========================================
@@ -167,4 +421,3 @@ def patent_hybrid_search(
     aggregated = sorted(aggregated, key=lambda x: x["score"], reverse=True)
     
     return aggregated[:top_k]
-
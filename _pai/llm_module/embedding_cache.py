@@ -0,0 +1,247 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# ✅ 상수 설정
+DEFAULT_MAX_ENTRIES = 4096  # 메모리 LRU 최대 항목 수
+DEFAULT_MAX_DISK_ENTRIES = 50_000  # SQLite 최대 행 수 (1024차원 float32 기준 약 200MB)
+
+# encode 결과에 영향을 주지 않는 인자 (캐시 키에서 제외)
+_KEY_IGNORED_KWARGS = {"batch_size", "show_progress_bar", "device"}
+
+# fork 로 물려받은 SQLite 연결은 자식에서 쓰지도 닫지도 않음
+# (닫으면 부모가 쓰는 WAL/잠금 상태를 건드릴 수 있으므로 참조만 남겨 GC 로 닫히지 않게 함)
+_INHERITED_CONNECTIONS = []
+
+
+def abandon_inherited_connection(conn):
+    if conn is not None:
+        _INHERITED_CONNECTIONS.append(conn)
+
+
+def _reset_in_child(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache._reset_after_fork()
+
+
+def normalize_text(text):
+    """
+    캐시 키용 텍스트 정규화: 유니코드 NFC + 연속 공백 축약 + 앞뒤 공백 제거.
+    """
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class EmbeddingFunctionEncoder:
+    """
+    chromadb EmbeddingFunction 처럼 `fn(texts) -> 벡터 리스트` 형태의 callable 을
+    encode() 인터페이스로 감싸는 어댑터. (OpenAI 임베딩 등을 CachedEncoder 뒤에 두기 위함)
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.asarray(self.fn(texts), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+
+class CachedEncoder:
+    """
+    SentenceTransformer 같은 encode() 인터페이스 앞에 두는 임베딩 캐시.
+
+    - 키: (model_id, encode 옵션, 정규화된 텍스트)의 sha1
+    - 메모리: OrderedDict 기반 LRU (max_entries 초과 시 가장 오래된 항목 제거)
+    - 디스크(선택): persist_path 가 주어지면 SQLite 에 저장해 재시작 후에도 재사용
+      max_disk_entries 를 넘으면 rowid 가 오래된 행부터 삭제 (근사 LRU)
+      디스크에서 다시 읽은 행은 바로 다시 쓰지 않고 모아 두었다가, 삭제가 일어날 수 있는 다음 저장 때
+      함께 rowid 를 갱신 (적중만 이어지는 동안에는 SQLite 쓰기가 없음)
+    - 잠금: _lock 은 메모리 LRU / 통계만, SQLite 읽기·쓰기는 _lock 밖에서 연결 전용 _db_lock 으로 보호
+    - 통계: stats() 로 hits / disk_hits / misses / size 확인
+    - fork 된 자식(gunicorn --preload 워커 등)은 부모의 SQLite 연결 대신 자기 연결을 새로 엶
+    """
+
+    def __init__(self, model, model_id, max_entries=DEFAULT_MAX_ENTRIES, persist_path=None,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.model = model
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.persist_path = persist_path
+
+        self._lru = OrderedDict()
+        self._touched = OrderedDict()  # 디스크 적중 후 아직 rowid 를 갱신하지 않은 항목
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = self._open_db() if persist_path else None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_in_child(ref))
+
+    def __getattr__(self, name):
+        # encode 외의 속성(device, tokenizer 등)은 원본 모델로 위임
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    # ---------------------------------------------------------
+    # 내부 helper
+    # ---------------------------------------------------------
+    def _open_db(self):
+        db = sqlite3.connect(self.persist_path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        db.commit()
+        return db
+
+    def _reset_after_fork(self):
+        # fork 직후 자식에서 호출됨: 잠금은 fork 시점에 잡혀 있었을 수 있으므로 새로 만들고 연결은 다시 엶
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._touched = OrderedDict()
+        if self._db is not None:
+            abandon_inherited_connection(self._db)
+            self._db = self._open_db()
+
+    def _make_key(self, text, kwargs):
+        options = sorted(
+            (k, repr(v)) for k, v in kwargs.items() if k not in _KEY_IGNORED_KWARGS
+        )
+        raw = f"{self.model_id}\0{options}\0{text}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _load_from_disk(self, keys):
+        if self._db is None or not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+        return {
+            key: np.frombuffer(blob, dtype=np.dtype(dtype))
+            for key, dtype, blob in rows
+        }
+
+    def _save_to_disk(self, items):
+        if self._db is None or not items:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dtype, vector) VALUES (?, ?, ?)",
+                [(key, vec.dtype.str, vec.tobytes()) for key, vec in items],
+            )
+            # INSERT OR REPLACE 는 항상 새 rowid(최댓값 + 1)를 받으므로 rowid 가 작을수록 오래된 행
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                (self.max_disk_entries,),
+            )
+            self._db.commit()
+
+    # ---------------------------------------------------------
+    # 공개 인터페이스
+    # ---------------------------------------------------------
+    def encode(self, sentences, **kwargs):
+        """
+        SentenceTransformer.encode 와 동일하게 str 이면 1차원, list 면 2차원 ndarray 를 반환합니다.
+        캐시에 없는 텍스트만 모아서 원본 모델을 한 번 호출합니다.
+        """
+        single = isinstance(sentences, str)
+        texts = [normalize_text(t) for t in ([sentences] if single else sentences)]
+        keys = [self._make_key(t, kwargs) for t in texts]
+
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+
+            pending = [k for k in dict.fromkeys(keys) if k not in found]
+
+        from_disk = self._load_from_disk(pending)
+        if from_disk:
+            with self._lock:
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                    # rowid 갱신(삭제 순서에서 뒤로)은 다음 저장 때 한꺼번에: 삭제는 저장할 때만 일어나므로 충분
+                    self._touched[key] = vector
+                    self._touched.move_to_end(key)
+                while len(self._touched) > self.max_entries:
+                    self._touched.popitem(last=False)
+            found.update(from_disk)
+
+        # 캐시 미스 텍스트만 한 번에 인코딩 (중복 제거)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = np.asarray(self.model.encode(list(missing.values()), **kwargs))
+            new_items = []
+            with self._lock:
+                for key, vector in zip(missing.keys(), vectors):
+                    vector = np.array(vector, copy=True)
+                    vector.setflags(write=False)
+                    self._remember(key, vector)
+                    found[key] = vector
+                    new_items.append((key, vector))
+                touched = list(self._touched.items())
+                self._touched.clear()
+            self._save_to_disk(touched + new_items)
+
+        with self._lock:
+            for key in keys:
+                if key in missing:
+                    self.misses += 1
+                elif key in from_disk:
+                    self.disk_hits += 1
+                else:
+                    self.hits += 1
+
+        result = np.stack([found[key] for key in keys])
+        return result[0] if single else result
+
+    def __call__(self, input):
+        """
+        chromadb EmbeddingFunction 과 같은 호출 방식: 텍스트 리스트 → 2차원 ndarray
+        """
+        return self.encode(list(input))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "model_id": self.model_id,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+                "size": len(self._lru),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "max_disk_entries": self.max_disk_entries,
+            }
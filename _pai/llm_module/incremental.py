@@ -0,0 +1,117 @@
+import os
+import time
+
+import numpy as np
+
+from .bm25_index import BM25Delta, META_FILE as BM25_META_FILE
+from .ingest import ENCODE_BATCH_SIZE, iter_chunks
+from .patent_meta_store import META_FILE as PATENT_META_FILE, update_patent_meta_delta
+
+# ✅ 상수 설정
+DELETE_CHUNK_SIZE = 500  # where patent_id $in 필터 한 번에 넣을 특허 수
+FETCH_CHUNK_SIZE = 2000  # BM25 tombstone 용 기존 청구항 본문을 한 번에 가져올 수
+
+
+def group_by_patent(records):
+    """
+    (청구항 id, 본문, 메타데이터) 리스트를 patent_id 별로 묶습니다. patent_id 가 없으면 ValueError.
+    """
+    grouped = {}
+    for record_id, text, metadata in records:
+        patent_id = str((metadata or {}).get("patent_id", "") or "")
+        if not patent_id:
+            raise ValueError(f"patent_id 가 없는 청구항입니다: {record_id}")
+        metadata["patent_id"] = patent_id
+        grouped.setdefault(patent_id, []).append((record_id, text, metadata))
+    return grouped
+
+
+def _fetch_documents(collection, ids):
+    texts = {}
+    for chunk in iter_chunks(ids, FETCH_CHUNK_SIZE):
+        batch = collection.get(ids=chunk, include=["documents"])
+        texts.update(zip(batch.get("ids") or [], batch.get("documents") or []))
+    return texts
+
+
+def apply_patent_updates(
+    collection,
+    records,
+    encoder,
+    version_file,
+    deleted_patent_ids=(),
+    bm25_dir=None,
+    meta_dir=None,
+    encode_batch_size=ENCODE_BATCH_SIZE,
+    log=print,
+):
+    """
+    새/변경/삭제 특허를 전체 재빌드 없이 청구항 컬렉션과 파생 인덱스에 함께 반영합니다.
+
+    1) records 에 나온 특허는 청구항 전체를 교체 (기존 청구항 삭제 후 upsert), deleted_patent_ids 는 삭제
+    2) BM25 인덱스(bm25_dir) 는 delta.json 에 추가 청구항 / tombstone 을 누적
+    3) 특허 메타 저장소(meta_dir) 는 delta.json overlay 를 갱신
+    4) 마지막에 버전 파일을 올림 → 검색 쪽 결과 캐시 키가 바뀌고 인덱스를 다시 로드
+    인코딩은 쓰기 전에 끝내므로 인코더 오류로 중간에 멈추지 않습니다.
+    버전은 쓰기 전에 version_file.reserve() 로 한 번 잡아 delta 기록과 버전 파일에 같은 값을 쓰고,
+    그동안 잠금을 쥐므로 동시에 도는 증분 반영 / 적재의 bump() 와 버전이 섞이거나 사라지지 않습니다.
+    """
+    started = time.time()
+    grouped = group_by_patent(records)
+    records = [record for patent_records in grouped.values() for record in patent_records]
+    touched = sorted(set(grouped) | set(deleted_patent_ids))
+    if not touched:
+        return {"version": version_file.get(collection.name), "patents": 0, "claims": 0}
+
+    texts = [text for _, text, _ in records]
+    embeddings = [
+        np.asarray(encoder.encode(batch), dtype=np.float32)
+        for batch in iter_chunks(texts, encode_batch_size)
+    ]
+    log(f"[incremental] 인코딩 {len(records):,}개 청구항 ({time.time() - started:.1f}s)")
+
+    # 버전은 기록이 끝나야 올라감 (여기까지 성공해야 검색 쪽이 새 상태를 봄)
+    with version_file.reserve(collection.name) as version:
+        # BM25 tombstone 에는 지워질 청구항 본문이 필요하므로 벡터 DB 를 고치기 전에 계산
+        bm25_delta = None
+        if bm25_dir and os.path.exists(os.path.join(bm25_dir, BM25_META_FILE)):
+            bm25_delta = BM25Delta(bm25_dir)
+            removed_rows = bm25_delta.remove_patents(touched, lambda ids: _fetch_documents(collection, ids))
+            bm25_delta.add_documents(records)
+            log(f"[incremental] BM25 tombstone {removed_rows:,}개")
+
+        count_before = collection.count()
+        for chunk in iter_chunks(touched, DELETE_CHUNK_SIZE):
+            collection.delete(where={"patent_id": {"$in": chunk}})
+        if records:
+            embeddings = np.concatenate(embeddings)
+            for start in range(0, len(records), encode_batch_size):
+                batch = records[start:start + encode_batch_size]
+                collection.upsert(
+                    ids=[record_id for record_id, _, _ in batch],
+                    embeddings=embeddings[start:start + len(batch)].tolist(),
+                    documents=[text for _, text, _ in batch],
+                    metadatas=[metadata or None for _, _, metadata in batch],
+                )
+        count_after = collection.count()
+
+        if bm25_delta is not None:
+            bm25_delta.save(version)
+        if meta_dir and os.path.exists(os.path.join(meta_dir, PATENT_META_FILE)):
+            update_patent_meta_delta(meta_dir, records, deleted_patent_ids, version=version)
+
+    summary = {
+        "version": version,
+        "patents": len(touched),
+        "updated_patents": len(grouped),
+        "deleted_patents": len(set(deleted_patent_ids) - set(grouped)),
+        "claims": len(records),
+        "count_before": count_before,
+        "count_after": count_after,
+        "elapsed": time.time() - started,
+    }
+    log(
+        f"[incremental] 완료: 버전 {version}, 특허 {len(touched):,}개, 청구항 {count_before:,} → "
+        f"{count_after:,} ({summary['elapsed']:.1f}s)"
+    )
+    return summary
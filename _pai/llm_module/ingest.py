@@ -0,0 +1,281 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+# ✅ 상수 설정
+ENCODE_BATCH_SIZE = 256  # 워커 한 번의 인코딩 단위 (문장 수)
+WRITE_CHUNK_SIZE = 2048  # 벡터 DB 에 한 번에 upsert 할 항목 수 (체크포인트 단위)
+CHECKPOINT_SUFFIX = ".ingest_checkpoint.json"
+
+# 컬렉션별 기본 입력 형식
+#   id_field 가 없으면 id_template 로 id 를 만듦, 나머지 필드는 모두 메타데이터로 저장
+#   encoder: doc = 문서 인코더(BGE-m3-ko), openai = OpenAI 임베딩 (retrieval_service 와 같은 모델)
+COLLECTION_PRESETS = {
+    "patent_claims": {
+        "db_dir": "doc_db",
+        "id_field": "id",
+        "id_template": "{patent_id}_{claim_no}",
+        "text_field": "document",
+        "int_fields": ("claim_no",),
+        "encoder": "doc",
+    },
+    "ipc_clean": {
+        "db_dir": "ipc_db",
+        "id_field": "id",
+        "id_template": "{code}",
+        "text_field": "document",
+        "int_fields": (),
+        "encoder": "openai",
+    },
+    "ipc_clean_local": {
+        "db_dir": "ipc_db",
+        "id_field": "id",
+        "id_template": "{code}",
+        "text_field": "document",
+        "int_fields": (),
+        "encoder": "doc",
+    },
+}
+
+
+# =========================================================
+# 입력 읽기
+# =========================================================
+def iter_source_rows(path, fmt=None):
+    """
+    JSONL(한 줄에 JSON 객체 하나) 또는 CSV(헤더 포함) 파일을 한 행씩 dict 로 읽습니다.
+    fmt 가 없으면 확장자로 판단합니다.
+    """
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def count_source_rows(path, fmt=None):
+    # 진행률/ETA 용 (CSV 는 헤더와 따옴표 안 줄바꿈 때문에 파싱해서 셈)
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    if fmt == "csv":
+        return sum(1 for _ in iter_source_rows(path, fmt))
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _metadata_value(value):
+    # Chroma 메타데이터는 str / int / float / bool 만 허용
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def to_record(row, preset):
+    """
+    입력 행 → (id, 문서, 메타데이터)
+    """
+    row = dict(row)
+    extra = row.pop("metadata", None) or {}
+    text = row.pop(preset["text_field"], "") or ""
+    metadata = {**row, **extra}
+
+    for field in preset["int_fields"]:
+        try:
+            metadata[field] = int(metadata[field])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    record_id = metadata.pop(preset["id_field"], None)
+    if not record_id:
+        record_id = preset["id_template"].format(**metadata)
+
+    metadata = {k: _metadata_value(v) for k, v in metadata.items() if v is not None and v != ""}
+    return str(record_id), text, metadata
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# =========================================================
+# 체크포인트
+# =========================================================
+class IngestCheckpoint:
+    """
+    입력 파일(경로/크기/수정 시각)별로 upsert 가 끝난 행 수를 기록하는 JSON 파일.
+    upsert 는 같은 id 를 덮어쓰므로, 기록 직전에 중단돼도 마지막 청크만 다시 쓰면 됩니다.
+    """
+
+    def __init__(self, path, source_path, collection_name):
+        self.path = path
+        stat = os.stat(source_path)
+        self.source = {
+            "path": os.path.abspath(source_path),
+            "size": stat.st_size,
+            "mtime": int(stat.st_mtime),
+            "collection": collection_name,
+        }
+        self.rows_done = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("source") == self.source:
+                self.rows_done = int(saved.get("rows_done", 0))
+
+    def save(self, rows_done):
+        self.rows_done = rows_done
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "rows_done": rows_done}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# =========================================================
+# 인코딩 워커 (프로세스 풀)
+# =========================================================
+_worker_encoder = None
+
+
+def load_ingest_encoder(kind):
+    """
+    캐시/마이크로배치 없이 원본 인코더를 엽니다. (대량 인코딩 전용)
+    """
+    from . import retrieval_service
+
+    if kind == "openai":
+        from chromadb.utils import embedding_functions
+
+        from .embedding_cache import EmbeddingFunctionEncoder
+
+        return EmbeddingFunctionEncoder(
+            embedding_functions.OpenAIEmbeddingFunction(
+                api_key=retrieval_service.OPENAI_API_KEY,
+                model_name=retrieval_service.IPC_MODEL_NAME,
+                api_base=retrieval_service.OPENAI_BASE_URL,
+            )
+        )
+    encoder, _ = retrieval_service.load_doc_encoder()
+    return encoder
+
+
+def _init_worker(kind):
+    global _worker_encoder
+    import django
+
+    from django.conf import settings
+
+    if not settings.configured:
+        django.setup()
+    _worker_encoder = load_ingest_encoder(kind)
+
+
+def _encode_in_worker(texts):
+    return np.asarray(_worker_encoder.encode(texts), dtype=np.float32)
+
+
+# =========================================================
+# 적재
+# =========================================================
+def ingest_rows(
+    rows,
+    collection,
+    preset,
+    encoder_kind,
+    checkpoint,
+    workers=0,
+    encode_batch_size=ENCODE_BATCH_SIZE,
+    write_chunk_size=WRITE_CHUNK_SIZE,
+    total_rows=None,
+    log=print,
+):
+    """
+    rows 를 write_chunk_size 단위로 나눠
+    1) encode_batch_size 단위로 인코딩 (workers > 0 이면 프로세스 풀, 순서 유지)
+    2) 청크 단위로 upsert 후 체크포인트 기록
+    을 반복합니다. 체크포인트에 기록된 행 수만큼은 건너뜁니다. 처리한 행 수를 반환합니다.
+    """
+    skip = checkpoint.rows_done
+    if skip:
+        log(f"체크포인트에서 이어서 진행: {skip:,}행 건너뜀")
+
+    def pending_rows():
+        for index, row in enumerate(rows):
+            if index >= skip:
+                yield row
+
+    pool = None
+    encoder = None
+    if workers > 0:
+        import multiprocessing
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        pool = context.Pool(workers, initializer=_init_worker, initargs=(encoder_kind,))
+    else:
+        encoder = load_ingest_encoder(encoder_kind)
+
+    def submit(texts):
+        # 풀이 있으면 비동기로 제출 (이전 청크를 upsert 하는 동안 워커들이 인코딩)
+        batches = [texts[i:i + encode_batch_size] for i in range(0, len(texts), encode_batch_size)]
+        if pool is not None:
+            return pool.map_async(_encode_in_worker, batches)
+        return [np.asarray(encoder.encode(batch), dtype=np.float32) for batch in batches]
+
+    def result_of(pending):
+        return pending.get() if pool is not None else pending
+
+    started = time.time()
+    state = {"done": skip, "processed": 0}
+
+    def write(records, pending):
+        embeddings = np.concatenate(result_of(pending))
+        collection.upsert(
+            ids=[record_id for record_id, _, _ in records],
+            embeddings=embeddings.tolist(),
+            documents=[text for _, text, _ in records],
+            metadatas=[metadata or None for _, _, metadata in records],
+        )
+        state["done"] += len(records)
+        state["processed"] += len(records)
+        checkpoint.save(state["done"])
+
+        elapsed = time.time() - started
+        rate = state["processed"] / elapsed if elapsed > 0 else 0.0
+        line = f"  {state['done']:,}행 적재 ({rate:,.1f} claims/s"
+        if total_rows and rate > 0:
+            line += f", {state['done'] / total_rows:.1%}, 남은 시간 {(total_rows - state['done']) / rate:,.0f}s"
+        log(line + ")")
+
+    try:
+        previous = None
+        for chunk in iter_chunks(pending_rows(), write_chunk_size):
+            records = [to_record(row, preset) for row in chunk]
+            pending = submit([text for _, text, _ in records])
+            if previous is not None:
+                write(*previous)
+            previous = (records, pending)
+        if previous is not None:
+            write(*previous)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return state["processed"]
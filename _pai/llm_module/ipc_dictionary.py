@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from .columnar import StringColumn, StringColumnWriter
+from .result_cache import collection_version
+
+# ✅ 상수 설정
+BUILD_BATCH_SIZE = 5000  # 컬렉션을 페이지 단위로 읽을 크기
+META_FILE = "meta.json"
+BUILD_PREFIX = "build-"  # store_dir 아래 버전별 사전 디렉터리 이름 접두사
+TMP_PREFIX = ".tmp-"  # 빌드 중인 임시 디렉터리 접두사
+
+# "G06T 7/00", "g06t7/00", "G06T 007/00" → 서브클래스 + 메인그룹 + 서브그룹
+_GROUP_CODE_RE = re.compile(r"^([A-H]\d{2}[A-Z])0*(\d+)/(\d+)$")
+
+
+def normalize_ipc_code(raw_code):
+    """
+    IPC 코드 표기 차이(공백, 대소문자, 메인그룹 앞의 0)를 없앤 조회용 키를 만듭니다.
+    예: "G06T 7/00", "G06T7/00", "g06t  007/00" → "G06T7/00"
+    """
+    compact = "".join((raw_code or "").split()).upper()
+    match = _GROUP_CODE_RE.match(compact)
+    if match:
+        subclass, group, subgroup = match.groups()
+        return f"{subclass}{group}/{subgroup}"
+    return compact
+
+
+class IpcDictionary:
+    """
+    ipc_clean 컬렉션의 코드 테이블(설명, kind, path)을 메모리 매핑 사이드카로 올려 두는 사전.
+
+    - 정규화 키(normalize_ipc_code) → 행 번호 dict 로 O(1) 조회
+    - 설명/path 문자열은 컬럼 파일에서 필요한 행만 디코딩 (워커 간 페이지 캐시 공유)
+    - 코드 설명/상세 조회에 벡터 DB I/O 가 필요 없음 (정적인 텍스트이므로)
+    - 반환하는 코드 문자열은 컬렉션에 저장된 원래 표기(ids) 그대로
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+        with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        columns = {
+            name: StringColumn.load(os.path.join(store_dir, name))
+            for name in ("codes", "descriptions", "kinds", "paths")
+        }
+        self.codes = columns["codes"].to_list()
+        self.descriptions = columns["descriptions"]
+        self.kinds = columns["kinds"]
+        self.paths = columns["paths"]
+        self.key_to_row = {normalize_ipc_code(code): row for row, code in enumerate(self.codes)}
+
+    @classmethod
+    def load(cls, store_dir):
+        return cls(store_dir)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return normalize_ipc_code(code) in self.key_to_row
+
+    def row_of(self, code):
+        return self.key_to_row.get(normalize_ipc_code(code))
+
+    def _rows(self, codes):
+        # 입력 순서 유지 + 중복/미등록 코드 제외
+        rows, seen = [], set()
+        for code in codes:
+            row = self.row_of(code)
+            if row is not None and row not in seen:
+                seen.add(row)
+                rows.append(row)
+        return rows
+
+    def descriptions_of(self, codes):
+        """
+        get_ipc_description_from_code 와 같은 형태: [{"ids", "description"}, ...]
+        """
+        return [
+            {"ids": self.codes[row], "description": self.descriptions[row]}
+            for row in self._rows(codes)
+        ]
+
+    def details_of(self, codes):
+        """
+        get_ipc_detail_data_from_code 와 같은 형태: [{"ids", "description", "type", "ancestors"}, ...]
+        """
+        return [
+            {
+                "ids": self.codes[row],
+                "description": self.descriptions[row],
+                "type": self.kinds[row],
+                "ancestors": self.paths[row],
+            }
+            for row in self._rows(codes)
+        ]
+
+
+def build_ipc_dictionary(collection, out_dir, batch_size=BUILD_BATCH_SIZE, log=print, source_version=None):
+    """
+    ipc_clean 컬렉션을 페이지 단위로 읽어 코드/설명/kind/path 컬럼 파일을 만듭니다.
+    """
+    started = time.time()
+    os.makedirs(out_dir, exist_ok=True)
+
+    writers = {
+        name: StringColumnWriter(os.path.join(out_dir, name))
+        for name in ("codes", "descriptions", "kinds", "paths")
+    }
+    count, offset = 0, 0
+    while True:
+        batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        docs = batch.get("documents") or [""] * len(ids)
+        metas = batch.get("metadatas") or [{}] * len(ids)
+        for code, doc, meta in zip(ids, docs, metas):
+            meta = meta or {}
+            writers["codes"].append(code)
+            writers["descriptions"].append(doc)
+            writers["kinds"].append(meta.get("kind", ""))
+            writers["paths"].append(meta.get("path", ""))
+        count += len(ids)
+        offset += len(ids)
+
+    for writer in writers.values():
+        writer.close()
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {"count": count, "source_version": source_version, "collection": collection.name},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    log(f"IPC 코드 사전 빌드: {count:,}개 코드 ({time.time() - started:.1f}s)")
+    return IpcDictionary.load(out_dir)
+
+
+def _version_dir_name(source_version):
+    return BUILD_PREFIX + hashlib.sha1(source_version.encode("utf-8")).hexdigest()[:16]
+
+
+def load_or_build_ipc_dictionary(collection, store_dir, log=print):
+    """
+    컬렉션 버전(collection_version: 증분 버전 / DB 파일 mtime 등)별 하위 디렉터리에 사전을 두고,
+    있으면 불러오고 없으면 컬렉션에서 빌드합니다. (시작 시 한 번만 컬렉션에 접근하고, 이후 조회는 사전만 사용)
+
+    - 빌드는 store_dir 안의 임시 디렉터리에서 하고 끝난 뒤 버전 디렉터리 이름으로 rename
+      → 다른 워커가 메모리 매핑 중인 파일을 덮어쓰지 않고, 쓰다 만 사전을 읽지 않음
+    - 여러 워커가 동시에 빌드하면 먼저 rename 한 쪽을 쓰고 나머지는 자기 임시 디렉터리를 버림
+    - 이전 버전 디렉터리는 새 버전이 자리 잡은 뒤 삭제 (매핑 중인 워커는 삭제된 inode 를 계속 읽음)
+    """
+    source_version = collection_version(collection)
+    target_dir = os.path.join(store_dir, _version_dir_name(source_version))
+
+    if not os.path.exists(os.path.join(target_dir, META_FILE)):
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=store_dir, prefix=TMP_PREFIX)
+        try:
+            build_ipc_dictionary(collection, tmp_dir, log=log, source_version=source_version)
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            if not os.path.exists(os.path.join(target_dir, META_FILE)):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        for name in os.listdir(store_dir):
+            if name.startswith(BUILD_PREFIX) and name != os.path.basename(target_dir):
+                shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+    return IpcDictionary.load(target_dir)
@@ -1,61 +1,73 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+from .ipc_hierarchy import parse_ipc_path
+from .tracing import bind, stage
+
 # ✅ 상수 설정
 MERGE_THRESHOLD_RATIO = 6.64  # 통합 임계값 (비율 %)
 TOP_K = 50  # 검색 개수 (Oversampling)
 MAX_DISTANCE_THRESHOLD = (
     1.4  # ⛔ 거리 컷오프 (이 값보다 멀면 노이즈로 간주하고 즉시 폐기)
 )
+IPC_KIND_FILTER = {"kind": {"$in": ["m", "1", "2", "3", "4", "5"]}}
 
+# 키워드별 검색(벡터 DB 질의 + 필터링/병합) 동시 실행 스레드 수
+#   1 이하: 모든 키워드를 한 번의 배치 질의로 처리 (로컬 Chroma/mmap 기본값)
+#   2 이상: 키워드마다 질의를 나눠 제한된 스레드 풀에서 동시에 실행 (원격 Chroma 서버 등)
+IPC_SEARCH_WORKERS = int(os.getenv("IPC_SEARCH_WORKERS", "1"))
 
-def get_ipc_codes_by_query(ipc_model, ipc_collection, query_text, top_k=5):
-    """
-    단일 쿼리 텍스트를 받아 ChromaDB에서 검색 후,
-    1. 거리(Distance) 기반 노이즈 필터링
-    2. 계층적 중복 제거(병합)
-    를 수행하여 구조화된 리스트를 반환합니다.
-    """
-
-    # ---------------------------------------------------------
-    # 1. 임베딩 생성
-    # ---------------------------------------------------------
-    try:
-        # ipc_model이 리스트 입력을 기대하므로 리스트로 감싸서 전달
-        query_vector = ipc_model([query_text])[0]
+_executor = None
+_executor_lock = threading.Lock()
 
-        if hasattr(query_vector, "tolist"):
-            query_vector = query_vector.tolist()
 
-    except Exception as e:
-        print(f"❌ 임베딩 생성 중 오류 발생: {e}")
-        return []
+def _get_executor(max_workers):
+    # 프로세스 전역 풀 (요청마다 스레드를 만들지 않도록, 동시 요청 수와 무관하게 상한 유지)
+    # 크기는 처음 생성할 때의 max_workers 로 고정
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="ipc-search"
+                )
+    return _executor
 
-    try:
-        results = ipc_collection.query(
-            query_embeddings=[query_vector],
-            n_results=TOP_K,
-            # 'kind'가 m(Main Group), 1~5(Subgroup)인 것만 검색
-            where={"kind": {"$in": ["m", "1", "2", "3", "4", "5"]}},
-            include=["metadatas", "distances"],
-        )
-    except Exception as e:
-        print(f"❌ ChromaDB 검색 중 오류 발생: {e}")
-        return []
 
-    if not results["ids"] or not results["ids"][0]:
-        return []
+def _ancestor_codes(code, meta, hierarchy):
+    """
+    조상 코드 리스트 (루트 → 부모 순). 계층 인덱스가 있으면 O(depth) 조회,
+    없거나 인덱스에 없는 코드면 메타데이터 path 를 파싱합니다.
+    """
+    if hierarchy is not None and code in hierarchy:
+        return hierarchy.ancestors(code)
+    return parse_ipc_path(code, (meta or {}).get("path", ""))
 
-    raw_ids = results["ids"][0]
-    raw_distances = results["distances"][0]
-    raw_metadatas = results["metadatas"][0]
 
+def _merge_ipc_hierarchy(
+    raw_ids, raw_distances, raw_metadatas, top_k, hierarchy=None, max_distance=None
+):
+    """
+    한 쿼리의 검색 결과에 대해
+    1. 거리(Distance) 기반 노이즈 필터링
+    2. 계층적 중복 제거(병합)
+    를 수행하여 구조화된 리스트를 반환합니다.
+    hierarchy(IpcHierarchy)가 있으면 raw_metadatas 없이(None) 호출해도 됩니다.
+    max_distance: 거리 컷오프 (기본: MAX_DISTANCE_THRESHOLD, 임베딩 모델마다 거리 분포가 다름)
+    """
+    if max_distance is None:
+        max_distance = MAX_DISTANCE_THRESHOLD
+    if raw_metadatas is None:
+        raw_metadatas = [None] * len(raw_ids)
 
     code_map = {}
     valid_ids = []  # 순서 유지를 위한 리스트
 
     for code, dist, meta in zip(raw_ids, raw_distances, raw_metadatas):
-        if dist > MAX_DISTANCE_THRESHOLD:
+        if dist > max_distance:
             continue
 
         valid_ids.append(code)
@@ -71,16 +83,8 @@ def get_ipc_codes_by_query(ipc_model, ipc_collection, query_text, top_k=5):
         if child_item["is_absorbed"]:
             continue
 
-        path_str = child_item["meta"].get("path", "")
-        if not path_str:
-            continue
-
-        # 조상 코드 파싱
-        ancestors = [
-            x.strip() for x in path_str.replace(">", " > ").split(">") if x.strip()
-        ]
-        if current_code in ancestors:
-            ancestors.remove(current_code)
+        # 조상 코드 (검색 결과에 함께 나온 조상만 병합 대상)
+        ancestors = _ancestor_codes(current_code, child_item["meta"], hierarchy)
 
         for parent_code in ancestors:
             if parent_code in code_map:
@@ -116,18 +120,181 @@ def get_ipc_codes_by_query(ipc_model, ipc_collection, query_text, top_k=5):
     return final_output[:top_k]
 
 
-def get_combined_ipc_codes(ipc_model, ipc_collection, queries, total_top_k=5):
+def _query_include(hierarchy):
+    # 계층 인덱스가 있으면 path 메타데이터를 가져올 필요가 없음
+    return ["distances"] if hierarchy is not None else ["metadatas", "distances"]
+
+
+def _search_one_query(ipc_collection, query_vector, top_k, hierarchy=None, max_distance=None):
+    """
+    키워드 하나의 벡터 DB 질의 + 필터링/병합 (동시 실행 경로에서 스레드 풀 작업 단위)
+    """
+    try:
+        with stage("ipc_query", queries=1):
+            results = ipc_collection.query(
+                query_embeddings=[query_vector],
+                n_results=TOP_K,
+                where=IPC_KIND_FILTER,
+                include=_query_include(hierarchy),
+            )
+    except Exception as e:
+        print(f"❌ ChromaDB 검색 중 오류 발생: {e}")
+        return []
+
+    if not results["ids"] or not results["ids"][0]:
+        return []
+    metadatas = results.get("metadatas")
+    return _merge_ipc_hierarchy(
+        results["ids"][0],
+        results["distances"][0],
+        metadatas[0] if metadatas else None,
+        top_k,
+        hierarchy,
+        max_distance,
+    )
+
+
+def get_ipc_codes_by_queries(
+    ipc_model,
+    ipc_collection,
+    query_texts,
+    top_k=5,
+    max_workers=None,
+    hierarchy=None,
+    max_distance=None,
+):
+    """
+    여러 쿼리 텍스트를 한 번의 임베딩 호출로 인코딩한 뒤 검색하고,
+    쿼리별로 _merge_ipc_hierarchy 를 적용한 결과 리스트를 query_texts 순서대로 반환합니다.
+
+    max_workers(기본: IPC_SEARCH_WORKERS) 가 1 이하면 한 번의 ChromaDB 배치 질의로,
+    2 이상이면 키워드별 질의를 스레드 풀에서 동시에 실행합니다. (결과는 두 경로가 동일)
+    hierarchy(IpcHierarchy)가 있으면 조상 병합에 path 파싱 대신 계층 인덱스를 사용합니다.
+    """
+    query_texts = list(query_texts)
+    if not query_texts:
+        return []
+    if max_workers is None:
+        max_workers = IPC_SEARCH_WORKERS
+
+    # ---------------------------------------------------------
+    # 1. 임베딩 생성 (모든 쿼리를 한 번에)
+    # ---------------------------------------------------------
+    try:
+        with stage("ipc_embed", texts=len(query_texts)):
+            query_vectors = ipc_model(query_texts)
+
+        if hasattr(query_vectors, "tolist"):
+            query_vectors = query_vectors.tolist()
+        else:
+            query_vectors = [v.tolist() if hasattr(v, "tolist") else v for v in query_vectors]
+
+    except Exception as e:
+        print(f"❌ 임베딩 생성 중 오류 발생: {e}")
+        return [[] for _ in query_texts]
+
+    # ---------------------------------------------------------
+    # 2-a. 키워드별 동시 검색 (map 은 입력 순서대로 결과를 돌려주므로 순서가 결정적)
+    # ---------------------------------------------------------
+    if max_workers > 1 and len(query_vectors) > 1:
+        return list(
+            _get_executor(max_workers).map(
+                bind(
+                    lambda vector: _search_one_query(
+                        ipc_collection, vector, top_k, hierarchy, max_distance
+                    )
+                ),
+                query_vectors,
+            )
+        )
+
+    # ---------------------------------------------------------
+    # 2-b. 한 번의 배치 질의
+    # ---------------------------------------------------------
+    try:
+        with stage("ipc_query", queries=len(query_vectors)):
+            results = ipc_collection.query(
+                query_embeddings=query_vectors,
+                n_results=TOP_K,
+                # 'kind'가 m(Main Group), 1~5(Subgroup)인 것만 검색
+                where=IPC_KIND_FILTER,
+                include=_query_include(hierarchy),
+            )
+    except Exception as e:
+        print(f"❌ ChromaDB 검색 중 오류 발생: {e}")
+        return [[] for _ in query_texts]
+
+    metadatas = results.get("metadatas")
+    outputs = []
+    for i in range(len(query_texts)):
+        if not results["ids"] or i >= len(results["ids"]) or not results["ids"][i]:
+            outputs.append([])
+            continue
+        outputs.append(
+            _merge_ipc_hierarchy(
+                results["ids"][i],
+                results["distances"][i],
+                metadatas[i] if metadatas else None,
+                top_k,
+                hierarchy,
+                max_distance,
+            )
+        )
+    return outputs
+
+
+def get_ipc_codes_by_query(
+    ipc_model, ipc_collection, query_text, top_k=5, hierarchy=None, max_distance=None
+):
+    """
+    단일 쿼리 텍스트를 받아 ChromaDB에서 검색 후,
+    1. 거리(Distance) 기반 노이즈 필터링
+    2. 계층적 중복 제거(병합)
+    를 수행하여 구조화된 리스트를 반환합니다.
+    """
+    return get_ipc_codes_by_queries(
+        ipc_model,
+        ipc_collection,
+        [query_text],
+        top_k=top_k,
+        hierarchy=hierarchy,
+        max_distance=max_distance,
+    )[0]
+
+
+def get_combined_ipc_codes(
+    ipc_model,
+    ipc_collection,
+    queries,
+    total_top_k=5,
+    max_workers=None,
+    hierarchy=None,
+    max_distance=None,
+):
     """
     여러 개의 쿼리 문자열을 받아 통합된 IPC 코드 리스트를 반환합니다.
     (품질 우선 라운드 로빈 + 형제 노드 중복 제거 적용)
+    형제 판정은 hierarchy 가 있으면 계층 인덱스의 부모 코드(parent_of)로 하고,
+    없으면(IPC_HIERARCHY=0) 검색 결과에 함께 걸린 상위 코드(sub)로 근사합니다.
     """
 
     # 1. 쿼리별 결과 수집 및 그룹 품질 평가
+    queries = list(queries)
     query_groups = []
 
-    for query in queries:
-        raw_results = get_ipc_codes_by_query(ipc_model, ipc_collection, query, top_k=total_top_k * 10)
-
+    # 모든 쿼리를 한 번에 임베딩한 뒤 배치 질의 또는 키워드별 동시 질의로 검색
+    # (쿼리 수만큼의 순차 왕복 제거 → 지연시간은 가장 느린 키워드 수준)
+    batched_results = get_ipc_codes_by_queries(
+        ipc_model,
+        ipc_collection,
+        queries,
+        top_k=total_top_k * 10,
+        max_workers=max_workers,
+        hierarchy=hierarchy,
+        max_distance=max_distance,
+    )
+
+    for query, raw_results in zip(queries, batched_results):
         if not raw_results:
             continue
 
@@ -160,6 +327,13 @@ def get_combined_ipc_codes(ipc_model, ipc_collection, queries, total_top_k=5):
     inserted_main_codes = set()   # 이미 선택된 메인 코드 (완전 중복 방지)
     inserted_parents = set()      # 이미 선택된 코드들의 부모들 (형제 중복 방지)
 
+    def parents_of(candidate):
+        if hierarchy is not None:
+            # 부모가 검색 결과에 없었던 형제도 같은 부모로 묶임
+            parent = hierarchy.parent_of(candidate["main"])
+            return [parent] if parent is not None else []
+        return candidate["sub"]
+
     # 3. 라운드 로빈으로 추출
     while len(final_list) < total_top_k:
         added_in_this_round = False
@@ -185,7 +359,7 @@ def get_combined_ipc_codes(ipc_model, ipc_collection, queries, total_top_k=5):
                 # "내 형제가 이미 등록되었다"는 뜻이므로 나는 스킵함.
                 # (큐가 거리순 정렬되어 있으므로, 먼저 등록된 형제가 더 좋은 형제임)
                 is_sibling = False
-                for parent in candidate["sub"]:
+                for parent in parents_of(candidate):
                     if parent in inserted_parents:
                         is_sibling = True
                         break
@@ -202,7 +376,7 @@ def get_combined_ipc_codes(ipc_model, ipc_collection, queries, total_top_k=5):
                 inserted_main_codes.add(candidate["main"])
                 
                 # 내 부모들도 '사용됨'으로 등록 -> 이후에 나올 내 형제들을 막음
-                for parent in candidate["sub"]:
+                for parent in parents_of(candidate):
                     inserted_parents.add(parent)
                 
                 added_in_this_round = True
@@ -213,7 +387,11 @@ def get_combined_ipc_codes(ipc_model, ipc_collection, queries, total_top_k=5):
     return final_list
 
 
-def get_ipc_detail_data_from_code(ipc_collection, codes):
+def get_ipc_detail_data_from_code(ipc_collection, codes, dictionary=None):
+    # 코드 사전(IpcDictionary)이 있으면 벡터 DB 조회 없이 처리 (코드 표기 정규화 포함)
+    if dictionary is not None:
+        return dictionary.details_of(codes)
+
     results = ipc_collection.get(ids=list(codes))
     
     found_ids = results.get("ids", [])
@@ -233,7 +411,10 @@ def get_ipc_detail_data_from_code(ipc_collection, codes):
         returns.append(temp)
     return returns
 
-def get_ipc_description_from_code(ipc_collection, codes):
+def get_ipc_description_from_code(ipc_collection, codes, dictionary=None):
+    if dictionary is not None:
+        return dictionary.descriptions_of(codes)
+
     results = ipc_collection.get(ids=list(codes))
     
     found_ids = results.get("ids", [])
@@ -249,16 +430,31 @@ def get_ipc_description_from_code(ipc_collection, codes):
     return returns
 
 
-def search_ipc_with_query(ipc_model, ipc_collection, queries, top_k=5):
-    search_output = get_combined_ipc_codes(ipc_model, ipc_collection, queries, top_k)
+def search_ipc_with_query(
+    ipc_model,
+    ipc_collection,
+    queries,
+    top_k=5,
+    hierarchy=None,
+    dictionary=None,
+    max_distance=None,
+):
+    search_output = get_combined_ipc_codes(
+        ipc_model, ipc_collection, queries, top_k, hierarchy=hierarchy, max_distance=max_distance
+    )
     temp_codes = {"mains": [], "subs": []}
     for i in search_output:
         temp_codes["mains"].append(i.get("main"))
         if len(i.get("sub")) > 0:
             for ii in i.get("sub"):
                 temp_codes["subs"].append(ii)
+    # 중복 제거 (추천 순서 유지)
     returns = {
-        "mains": get_ipc_description_from_code(ipc_collection,set(temp_codes["mains"])),
-        "subs": get_ipc_description_from_code(ipc_collection,set(temp_codes["subs"])),
+        "mains": get_ipc_description_from_code(
+            ipc_collection, list(dict.fromkeys(temp_codes["mains"])), dictionary
+        ),
+        "subs": get_ipc_description_from_code(
+            ipc_collection, list(dict.fromkeys(temp_codes["subs"])), dictionary
+        ),
     }
     return returns
\ No newline at end of file
@@ -0,0 +1,214 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from .result_cache import collection_version
+
+# ✅ 상수 설정
+BUILD_BATCH_SIZE = 5000  # 컬렉션 메타데이터를 페이지 단위로 읽을 크기
+NO_PARENT = -1
+
+
+def parse_ipc_path(code, path_str):
+    """
+    메타데이터 path 문자열("A > A01 > A01B > A01B 1/00")에서 자기 자신을 뺀 조상 코드 리스트(루트 → 부모 순)를 반환합니다.
+    """
+    ancestors = [x.strip() for x in (path_str or "").replace(">", " > ").split(">") if x.strip()]
+    if code in ancestors:
+        ancestors.remove(code)
+    return ancestors
+
+
+class IpcHierarchy:
+    """
+    ipc_clean 컬렉션의 path 메타데이터로 한 번만 만들어 두는 IPC 계층 인덱스.
+
+    - 코드 ↔ 정수 id (code_to_id dict / codes 배열)
+    - parent[id]: 부모 id (루트/경로 없음: -1), depth[id]: 루트로부터의 깊이
+    - 자식 목록은 CSR (child_offsets, child_ids) — 정렬된 id 순
+    - 조상 조회는 parent 를 따라 올라가므로 O(depth), 쿼리마다 path 문자열을 파싱하지 않음
+    - in_collection[id]: 실제 컬렉션 항목인지 (path 에만 등장하는 상위 코드는 False)
+    """
+
+    def __init__(self, codes, parent, in_collection):
+        self.codes = list(codes)
+        self.code_to_id = {code: i for i, code in enumerate(self.codes)}
+        self.parent = np.asarray(parent, dtype=np.int32)
+        self.in_collection = np.asarray(in_collection, dtype=bool)
+
+        n = len(self.codes)
+        self.depth = np.zeros(n, dtype=np.int16)
+        for i in range(n):
+            depth, node = 0, int(self.parent[i])
+            while node != NO_PARENT and depth <= n:
+                depth += 1
+                node = int(self.parent[node])
+            self.depth[i] = depth
+
+        # 자식 CSR
+        has_parent = np.flatnonzero(self.parent != NO_PARENT)
+        order = has_parent[np.argsort(self.parent[has_parent], kind="stable")]
+        counts = np.bincount(self.parent[has_parent], minlength=n)
+        self.child_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.child_offsets[1:])
+        self.child_ids = order.astype(np.int32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.code_to_id
+
+    # ---------------------------------------------------------
+    # 빌드 / 저장
+    # ---------------------------------------------------------
+    @classmethod
+    def from_paths(cls, code_paths):
+        """
+        (code, path 문자열) 쌍들로 계층을 만듭니다. 부모는 각 코드 자신의 path 에서 가져옵니다.
+        """
+        code_to_id = {}
+        codes, parent, in_collection = [], [], []
+
+        def node_id(code):
+            if code not in code_to_id:
+                code_to_id[code] = len(codes)
+                codes.append(code)
+                parent.append(NO_PARENT)
+                in_collection.append(False)
+            return code_to_id[code]
+
+        for code, path_str in code_paths:
+            i = node_id(code)
+            in_collection[i] = True
+            ancestors = parse_ipc_path(code, path_str)
+            if not ancestors:
+                continue
+            # path 에만 등장하는 상위 코드도 노드로 등록해 체인을 이어 둠
+            prev = NO_PARENT
+            for ancestor in ancestors:
+                a = node_id(ancestor)
+                if prev != NO_PARENT and parent[a] == NO_PARENT and a != prev:
+                    parent[a] = prev
+                prev = a
+            if prev != i:
+                parent[i] = prev
+
+        return cls(codes, parent, in_collection)
+
+    @classmethod
+    def from_collection(cls, collection, batch_size=BUILD_BATCH_SIZE):
+        def iter_paths():
+            offset = 0
+            while True:
+                batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                ids = batch.get("ids") or []
+                if not ids:
+                    break
+                for code, meta in zip(ids, batch.get("metadatas") or [{}] * len(ids)):
+                    yield code, (meta or {}).get("path", "")
+                offset += len(ids)
+
+        return cls.from_paths(iter_paths())
+
+    def save(self, path, source_version=None):
+        """
+        같은 디렉터리의 임시 파일에 쓴 뒤 os.replace 로 교체합니다.
+        (다른 워커가 동시에 load 해도 쓰다 만 파일을 읽지 않음)
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    codes=np.asarray(self.codes, dtype=str),
+                    parent=self.parent,
+                    in_collection=self.in_collection,
+                    source_version=np.asarray("" if source_version is None else source_version),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            hierarchy = cls(data["codes"].tolist(), data["parent"], data["in_collection"])
+            # source_version 이 없는 이전 형식 파일은 항상 다시 빌드
+            hierarchy.source_version = str(data["source_version"]) if "source_version" in data.files else None
+        return hierarchy
+
+    # ---------------------------------------------------------
+    # 조회
+    # ---------------------------------------------------------
+    def id_of(self, code):
+        return self.code_to_id.get(code)
+
+    def ancestor_ids(self, code_id):
+        """
+        조상 id 리스트 (루트 → 부모 순). O(depth)
+        """
+        result = []
+        node = int(self.parent[code_id])
+        while node != NO_PARENT and len(result) <= len(self.codes):
+            result.append(node)
+            node = int(self.parent[node])
+        result.reverse()
+        return result
+
+    def ancestors(self, code):
+        code_id = self.id_of(code)
+        if code_id is None:
+            return []
+        return [self.codes[i] for i in self.ancestor_ids(code_id)]
+
+    def parent_of(self, code):
+        code_id = self.id_of(code)
+        if code_id is None or self.parent[code_id] == NO_PARENT:
+            return None
+        return self.codes[self.parent[code_id]]
+
+    def child_ids_of(self, code_id):
+        return self.child_ids[self.child_offsets[code_id]:self.child_offsets[code_id + 1]]
+
+    def children(self, code):
+        code_id = self.id_of(code)
+        if code_id is None:
+            return []
+        return [self.codes[i] for i in self.child_ids_of(code_id)]
+
+    def siblings(self, code):
+        code_id = self.id_of(code)
+        if code_id is None or self.parent[code_id] == NO_PARENT:
+            return []
+        return [self.codes[i] for i in self.child_ids_of(self.parent[code_id]) if i != code_id]
+
+    def depth_of(self, code):
+        code_id = self.id_of(code)
+        return None if code_id is None else int(self.depth[code_id])
+
+
+def load_or_build_ipc_hierarchy(collection, cache_path, log=print):
+    """
+    cache_path(.npz)가 있고 컬렉션 버전(collection_version: 증분 버전 / DB 파일 mtime 등)이 같으면 불러오고,
+    아니면 컬렉션에서 빌드 후 저장합니다. (행 수가 같은 재색인도 버전이 바뀌므로 다시 빌드됨)
+    """
+    source_version = collection_version(collection)
+    if os.path.exists(cache_path):
+        hierarchy = IpcHierarchy.load(cache_path)
+        if hierarchy.source_version == source_version:
+            return hierarchy
+
+    started = time.time()
+    hierarchy = IpcHierarchy.from_collection(collection)
+    hierarchy.source_version = source_version
+    try:
+        hierarchy.save(cache_path, source_version=source_version)
+    except OSError as e:
+        log(f"⚠️ 경고: IPC 계층 인덱스를 저장하지 못했습니다: {e}")
+    log(f"IPC 계층 인덱스 빌드: {len(hierarchy):,}개 코드 ({time.time() - started:.1f}s)")
+    return hierarchy
@@ -0,0 +1,127 @@
+import time
+
+import numpy as np
+
+from .ipc_func import IPC_KIND_FILTER, MAX_DISTANCE_THRESHOLD, TOP_K, get_ipc_codes_by_queries
+
+# ✅ 상수 설정
+REINDEX_BATCH_SIZE = 256  # 한 번에 인코딩/업서트할 IPC 항목 수
+DEFAULT_EVAL_K = 10  # top-k 겹침 비교 기준
+
+
+def default_local_max_distance(source_space):
+    """
+    원본(OpenAI) 컬렉션의 거리 컷오프를 로컬(cosine) 컬렉션 기준으로 옮긴 초기값.
+    정규화된 벡터에서 l2 제곱 거리 = 2 × cosine 거리이므로 같은 각도 기준이 됩니다.
+    (모델마다 유사도 분포가 다르므로 compare_ipc_indexes 의 제안값으로 보정하는 것을 권장)
+    """
+    if source_space == "cosine":
+        return MAX_DISTANCE_THRESHOLD
+    return MAX_DISTANCE_THRESHOLD / 2.0
+
+
+def reindex_ipc_collection(source, target, encoder, batch_size=REINDEX_BATCH_SIZE, start_offset=0, log=print):
+    """
+    source 컬렉션(ipc_clean)의 ids/documents/metadatas 를 그대로 두고
+    encoder 로 문서를 다시 임베딩해 target 컬렉션에 upsert 합니다. (같은 id 는 덮어쓰므로 재실행 가능)
+    """
+    started = time.time()
+    total = source.count()
+    offset = start_offset
+    while offset < total:
+        batch = source.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        documents = [doc or "" for doc in (batch.get("documents") or [""] * len(ids))]
+        embeddings = np.asarray(encoder.encode(documents), dtype=np.float32)
+        target.upsert(
+            ids=ids,
+            embeddings=embeddings.tolist(),
+            documents=documents,
+            metadatas=batch.get("metadatas") or None,
+        )
+        offset += len(ids)
+        elapsed = time.time() - started
+        log(f"  {offset:,}/{total:,} ({offset / total:.0%}, {elapsed:.0f}s, 재시작: --start-offset {offset})")
+    return offset
+
+
+def _overlap(reference, candidate, k):
+    if not reference:
+        return None
+    return len(set(reference[:k]) & set(candidate[:k])) / min(k, len(reference))
+
+
+def compare_ipc_indexes(
+    queries,
+    ref_model,
+    ref_collection,
+    cand_model,
+    cand_collection,
+    k=DEFAULT_EVAL_K,
+    ref_max_distance=MAX_DISTANCE_THRESHOLD,
+    cand_max_distance=None,
+):
+    """
+    같은 질의로 기존(OpenAI) 인덱스와 로컬 인덱스를 검색해 비교합니다.
+
+    - raw_overlap: 두 인덱스의 원시 top-k 코드 겹침 비율
+    - pipeline_overlap: 거리 컷오프 + 계층 병합까지 거친 최종 main 코드 top-k 겹침 비율
+    - suggested_max_distance: 기존 인덱스에서 컷오프를 통과하는 비율과 같은 비율이 통과하도록 하는 로컬 컷오프
+    """
+    queries = list(queries)
+    ref_vectors = np.asarray(ref_model(queries), dtype=np.float32).tolist()
+    cand_vectors = np.asarray(cand_model(queries), dtype=np.float32).tolist()
+    query_args = {"n_results": TOP_K, "where": IPC_KIND_FILTER, "include": ["distances"]}
+    ref_raw = ref_collection.query(query_embeddings=ref_vectors, **query_args)
+    cand_raw = cand_collection.query(query_embeddings=cand_vectors, **query_args)
+
+    ref_dists = np.concatenate([np.asarray(d, dtype=np.float64) for d in ref_raw["distances"]] or [np.zeros(0)])
+    cand_dists = np.concatenate([np.asarray(d, dtype=np.float64) for d in cand_raw["distances"]] or [np.zeros(0)])
+    keep_ratio = float((ref_dists <= ref_max_distance).mean()) if len(ref_dists) else 1.0
+    suggested = float(np.quantile(cand_dists, keep_ratio)) if len(cand_dists) else None
+    if cand_max_distance is None:
+        cand_max_distance = suggested
+
+    ref_final = get_ipc_codes_by_queries(
+        ref_model, ref_collection, queries, top_k=k, max_workers=1, max_distance=ref_max_distance
+    )
+    cand_final = get_ipc_codes_by_queries(
+        cand_model, cand_collection, queries, top_k=k, max_workers=1, max_distance=cand_max_distance
+    )
+
+    per_query = []
+    for i, query in enumerate(queries):
+        ref_codes = [item["main"] for item in ref_final[i]]
+        cand_codes = [item["main"] for item in cand_final[i]]
+        per_query.append({
+            "query": query,
+            "raw_overlap": _overlap(ref_raw["ids"][i], cand_raw["ids"][i], k),
+            "pipeline_overlap": _overlap(ref_codes, cand_codes, k),
+            "reference": ref_codes,
+            "candidate": cand_codes,
+        })
+
+    def mean_of(key):
+        values = [row[key] for row in per_query if row[key] is not None]
+        return float(np.mean(values)) if values else None
+
+    def percentiles(dists):
+        if not len(dists):
+            return {}
+        return {f"p{p}": float(np.percentile(dists, p)) for p in (5, 25, 50, 75, 95)}
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "raw_overlap": mean_of("raw_overlap"),
+        "pipeline_overlap": mean_of("pipeline_overlap"),
+        "reference_max_distance": ref_max_distance,
+        "reference_keep_ratio": keep_ratio,
+        "candidate_max_distance": cand_max_distance,
+        "suggested_max_distance": suggested,
+        "reference_distances": percentiles(ref_dists),
+        "candidate_distances": percentiles(cand_dists),
+        "per_query": per_query,
+    }
@@ -11,6 +11,9 @@ from langgraph.graph import StateGraph, START, END, MessagesState
 # from langgraph.checkpoint.memory import MemorySaver
 
 from .SYSTEM_PROMPT import SYSTEM_PROMPT
+from .cassette import cassette_api_key, cassette_http_client
+from . import tracing
+from .resources import registry
 
 # 상대 경로 import 유지
 from .total_tools import (
@@ -22,9 +25,8 @@ from .total_tools import (
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY 가 설정되지 않았습니다.")
+# OpenAI 호환 서버 주소 (예: 부하 테스트용 스텁 http://127.0.0.1:8765/v1), 없으면 기본 API
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # 1. 모델 및 도구 설정
 tools = [
@@ -34,19 +36,46 @@ tools = [
     tool_search_detail_patent_by_id,
 ]
 
-llm = ChatOpenAI(
-    model="gpt-5.2",
-    temperature=0,
-    api_key=OPENAI_API_KEY,
-)
 
-llm_with_tools = llm.bind_tools(tools)
+@registry.resource("llm_with_tools")
+def _load_llm_with_tools():
+    # API 키 확인은 LLM 을 실제로 쓰는 시점에 (manage.py migrate 등은 키 없이도 동작)
+    # 카세트 재생 모드는 API 를 호출하지 않으므로 키가 없어도 됨
+    api_key = OPENAI_API_KEY or cassette_api_key()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY 가 설정되지 않았습니다.")
+
+    llm = ChatOpenAI(
+        model="gpt-5.2",
+        temperature=0,
+        api_key=api_key,
+        base_url=OPENAI_BASE_URL,
+        http_client=cassette_http_client(),  # 카세트 녹화/재생 (꺼져 있으면 기본 클라이언트)
+        stream_usage=True,  # 스트리밍 응답에도 토큰 사용량 포함 (trace 의 prompt_tokens)
+    )
+    return llm.bind_tools(tools)
 
 
 # 2. 노드 함수 정의
 def call_model(state: MessagesState):
     messages = state["messages"]
-    response = llm_with_tools.invoke(messages)
+
+    # 에이전트 반복 하나 = agent_step span (이 LLM 호출 + 이어지는 도구 호출들)
+    trace = tracing.current_trace()
+    if trace is not None:
+        trace.begin_step(messages=len(messages))
+
+    # LLM 왕복 한 번 (도구 호출 라운드마다 한 번씩 기록됨)
+    with tracing.stage(
+        "llm_call", messages=len(messages), prompt_chars=sum(len(str(m.content)) for m in messages)
+    ) as sp:
+        response = registry.get("llm_with_tools").invoke(messages)
+        usage = getattr(response, "usage_metadata", None) or {}
+        sp.set(
+            prompt_tokens=usage.get("input_tokens"),
+            completion_tokens=usage.get("output_tokens"),
+            tool_calls=[call.get("name") for call in response.tool_calls] or None,
+        )
     return {"messages": [response]}
 
 
@@ -58,10 +87,8 @@ def should_continue(state: MessagesState) -> Literal["tools"] | str:
 
 
 # 3. 그래프 생성 함수 (팩토리 패턴)
-def get_graph_agent():
-    """
-    호출 시점에 워크플로우를 컴파일하여 agent_executor를 반환합니다.
-    """
+@registry.resource("graph_agent")
+def _compile_graph_agent():
     workflow = StateGraph(MessagesState)
 
     workflow.add_node("agent", call_model)
@@ -77,10 +104,18 @@ def get_graph_agent():
     return workflow.compile()
 
 
-# ========================================================
-# agent_executor 전역 변수 생성
-# ========================================================
-agent_executor = get_graph_agent()
+def get_graph_agent():
+    """
+    컴파일된 agent_executor 를 반환합니다. (프로세스당 한 번만 컴파일)
+    """
+    return registry.get("graph_agent")
+
+
+def warm_up():
+    """
+    서빙 시작 시 호출: LLM 클라이언트 생성 + 그래프 컴파일. 단계별 소요 시간(초)을 반환합니다.
+    """
+    return registry.warm_up(["llm_with_tools", "graph_agent"])
 
 
 # ==========================================
@@ -100,8 +135,7 @@ def chat_with_memory(user_input: str, thread_id: str = "default-thread") -> None
 
     step_idx = 0
 
-    # 전역 변수 agent_executor 사용
-    for event in agent_executor.stream({"messages": messages}, config=config):
+    for event in get_graph_agent().stream({"messages": messages}, config=config):
         for node_name, value in event.items():
             messages_in_node = value.get("messages", [])
             if not messages_in_node:
@@ -0,0 +1,305 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+
+# =========================================================
+# 단계별 지연시간 히스토그램 / 카운터 (Prometheus 텍스트 형식으로 /metrics 에 노출)
+# =========================================================
+# - 프로세스마다 메모리에 누적하고, PAI_METRICS_DIR 이 있으면 주기적으로 프로세스별 스냅샷 파일을 씀
+#   (파일 이름 = pid + 프로세스 시작 시 만든 임의 토큰 → 재사용된 pid 가 이전 워커 파일을 덮어쓰지 않음)
+# - /metrics 를 받은 워커는 자기 값 + 다른 워커 스냅샷 파일을 합산해 응답 (gunicorn 등 멀티 워커)
+# - 종료된 워커의 파일도 합산에 남김 (카운터/히스토그램이 줄어들지 않도록)
+# - 이전 배포의 파일은 master 시작 시 clear_snapshot_dir() 로 비움 (gunicorn.conf.py 의 on_starting)
+# - fork 된 자식(gunicorn --preload 워커)은 부모 값을 물려받지 않고 자기 파일/flush 스레드로 새로 시작
+
+# ✅ 상수 설정
+METRICS_ENABLED = os.getenv("PAI_METRICS", "1") != "0"
+METRICS_DIR = os.getenv("PAI_METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("PAI_METRICS_FLUSH_INTERVAL", "5"))
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 이름 → (종류, 설명). 여기 없는 이름도 기록은 되지만 HELP 없이 노출됨
+METRIC_HELP = {
+    "pai_stage_duration_seconds": (
+        "histogram",
+        "파이프라인 단계별 소요 시간 (hybrid_encode / hybrid_vector / hybrid_bm25 / hybrid_aggregate / "
+        "ipc_embed / ipc_query / llm_call / db_checkpoint / db_save / title_generation)",
+    ),
+    "pai_tool_duration_seconds": ("histogram", "에이전트 도구 호출 소요 시간"),
+    "pai_chat_ttft_seconds": ("histogram", "채팅 요청부터 첫 토큰 전송까지"),
+    "pai_chat_stream_duration_seconds": ("histogram", "채팅 스트림 전체 소요 시간"),
+    "pai_stage_errors_total": ("counter", "예외로 끝난 단계 수"),
+    "pai_chat_requests_total": ("counter", "채팅 스트리밍 요청 수"),
+    "pai_chat_errors_total": ("counter", "오류 이벤트로 끝난 채팅 스트림 수"),
+}
+
+
+SNAPSHOT_PATTERN = "metrics_*.json"
+
+
+def _reset_in_child(registry_ref):
+    registry = registry_ref()
+    if registry is not None:
+        registry._reset_after_fork()
+
+
+def clear_snapshot_dir(directory=METRICS_DIR):
+    """
+    directory 의 스냅샷 파일(이전 배포 / 종료된 워커 것)을 지웁니다. 워커를 띄우기 전 master 에서 한 번 호출합니다.
+    """
+    if not directory:
+        return 0
+    removed = 0
+    for path in glob.glob(os.path.join(directory, SNAPSHOT_PATTERN)) + glob.glob(
+        os.path.join(directory, SNAPSHOT_PATTERN + ".tmp")
+    ):
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    프로세스 전역 히스토그램/카운터 저장소. (잠금 하나, 기록은 bisect + 덧셈)
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.enabled = enabled
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> [buckets, counts(+Inf 포함), sum, count]
+        self._counters = {}  # (name, labels) -> value
+        self._dirty = False
+        self._flusher = None
+        self._instance = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_in_child(ref))
+
+    def _reset_after_fork(self):
+        # fork 직후 자식에서 호출됨: flush 스레드는 따라오지 않고 잠금은 잡혀 있었을 수 있음.
+        # 부모 값은 부모 파일로 이미 집계되므로 물려받은 값을 비우고 새 파일 이름으로 시작
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._dirty = False
+        self._flusher = None
+        self._instance = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+
+    # ---------------------------------------------------------
+    # 기록
+    # ---------------------------------------------------------
+    def observe(self, name, seconds, buckets=DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [tuple(buckets), [0] * (len(buckets) + 1), 0.0, 0]
+            hist[1][bisect.bisect_left(hist[0], seconds)] += 1
+            hist[2] += seconds
+            hist[3] += 1
+            self._dirty = True
+        self._ensure_flusher()
+
+    def inc(self, name, n=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+            self._dirty = True
+        self._ensure_flusher()
+
+    def timer(self, name, **labels):
+        """
+        with metrics.timer("pai_stage_duration_seconds", stage="hybrid_encode"): ...
+        예외로 끝나면 시간은 그대로 기록하고 pai_stage_errors_total 도 올립니다.
+        """
+        return _Timer(self, name, labels)
+
+    def stage(self, stage):
+        return _Timer(self, "pai_stage_duration_seconds", {"stage": stage})
+
+    # ---------------------------------------------------------
+    # 스냅샷 / 멀티 프로세스 합산
+    # ---------------------------------------------------------
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "buckets": list(h[0]), "counts": list(h[1]),
+                     "sum": h[2], "count": h[3]}
+                    for (name, labels), h in self._histograms.items()
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+            }
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, f"metrics_{self._instance}.json")
+
+    def flush(self):
+        """
+        이 프로세스의 스냅샷을 METRICS_DIR/metrics_<pid>_<토큰>.json 에 씁니다. (임시 파일 → 교체)
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _ensure_flusher(self):
+        if not self.directory or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass  # 디스크 오류는 다음 주기에 다시 시도
+
+    def collect(self):
+        """
+        이 프로세스의 현재 값 + 다른 워커의 스냅샷 파일을 합산합니다.
+        """
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = os.path.abspath(self._snapshot_path())
+            for path in glob.glob(os.path.join(self.directory, SNAPSHOT_PATTERN)):
+                if os.path.abspath(path) == own:
+                    continue
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # 교체 중이거나 깨진 파일은 건너뜀
+        return merge_snapshots(snapshots)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._dirty = True
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "started")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            self.registry.inc("pai_stage_errors_total", metric=self.name, **self.labels)
+        return False
+
+
+def merge_snapshots(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for h in snapshot.get("histograms", []):
+            key = (h["name"], _label_key(h["labels"]), tuple(h["buckets"]))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {**h, "counts": list(h["counts"])}
+            else:
+                merged["counts"] = [a + b for a, b in zip(merged["counts"], h["counts"])]
+                merged["sum"] += h["sum"]
+                merged["count"] += h["count"]
+        for c in snapshot.get("counters", []):
+            key = (c["name"], _label_key(c["labels"]))
+            if key in counters:
+                counters[key]["value"] += c["value"]
+            else:
+                counters[key] = dict(c)
+    return {"histograms": list(histograms.values()), "counters": list(counters.values())}
+
+
+# =========================================================
+# Prometheus 텍스트 형식
+# =========================================================
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=None):
+    items = sorted(labels.items()) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshot):
+    lines = []
+    described = set()
+
+    def header(name, kind):
+        if name in described:
+            return
+        described.add(name)
+        help_kind, text = METRIC_HELP.get(name, (kind, ""))
+        if text:
+            lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {help_kind}")
+
+    for h in sorted(snapshot["histograms"], key=lambda h: (h["name"], _label_key(h["labels"]))):
+        header(h["name"], "histogram")
+        cumulative = 0
+        for bound, count in zip(list(h["buckets"]) + ["+Inf"], h["counts"]):
+            cumulative += count
+            le = bound if bound == "+Inf" else _format_value(float(bound))
+            lines.append(f"{h['name']}_bucket{_format_labels(h['labels'], [('le', le)])} {cumulative}")
+        lines.append(f"{h['name']}_sum{_format_labels(h['labels'])} {_format_value(float(h['sum']))}")
+        lines.append(f"{h['name']}_count{_format_labels(h['labels'])} {h['count']}")
+
+    for c in sorted(snapshot["counters"], key=lambda c: (c["name"], _label_key(c["labels"]))):
+        header(c["name"], "counter")
+        lines.append(f"{c['name']}{_format_labels(c['labels'])} {_format_value(c['value'])}")
+    return "\n".join(lines) + "\n"
+
+
+# 프로세스 전역 레지스트리
+metrics = MetricsRegistry()
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+
+import numpy as np
+
+# ✅ 상수 설정
+ENCODER_CONFIG_FILE = "encoder_config.json"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_OPSET = 17
+EXPORT_MAX_SEQ_LENGTH = 512  # 검색 쿼리/청구항 기준 충분한 길이 (BGE-m3 기본값 8192 는 CPU 에서 과함)
+
+# 패리티/지연시간 점검용 기본 문장 (--texts-file 미지정 시)
+SAMPLE_TEXTS = [
+    "사용자와의 거리 변화에 따라 자동으로 곡률이 바뀌는 디스플레이 장치",
+    "영상에서 객체를 검출하고 추적하는 딥러닝 기반 방법",
+    "차량 전방 카메라 영상을 이용한 차선 인식 시스템",
+    "얼굴 이미지의 특징점을 추출하여 사용자를 인증하는 장치",
+    "의료 영상에서 병변 영역을 분할하는 합성곱 신경망",
+    "스테레오 카메라를 이용한 깊이 정보 추정 방법",
+    "드론 촬영 영상의 흔들림을 보정하는 영상 안정화 기술",
+    "스마트폰 카메라로 촬영한 문서 이미지의 왜곡 보정",
+]
+
+
+def _open_session(model_path, intra_op_threads=None):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def _load_tokenizer(path):
+    from tokenizers import Tokenizer
+
+    return Tokenizer.from_file(path)
+
+
+def pool_hidden_states(hidden, attention_mask, pooling):
+    """
+    SentenceTransformer Pooling 과 같은 풀링: cls 는 첫 토큰, mean 은 패딩을 뺀 토큰 평균.
+    """
+    if pooling == "cls":
+        return hidden[:, 0]
+    mask = attention_mask[:, :, None].astype(np.float32)
+    return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+
+class OnnxEncoder:
+    """
+    export_onnx_encoder() 로 만든 ONNX 모델을 onnxruntime 으로 실행하는 인코더.
+
+    - SentenceTransformer.encode 와 같은 인터페이스 (str → 1차원, list → 2차원 ndarray)
+    - 토크나이저는 tokenizers(Rust) 라이브러리로 로드해 torch/transformers 없이 동작
+    - 풀링(cls/mean)과 정규화 여부는 내보낼 때의 SentenceTransformer 설정을 그대로 따름
+    """
+
+    def __init__(self, model_dir, quantized=True, intra_op_threads=None):
+        self.model_dir = model_dir
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        if quantized and not os.path.exists(os.path.join(model_dir, model_file)):
+            raise FileNotFoundError(f"int8 모델이 없습니다: {os.path.join(model_dir, model_file)}")
+        self.quantized = quantized
+
+        self.session = _open_session(os.path.join(model_dir, model_file), intra_op_threads)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = _load_tokenizer(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(
+            pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"]
+        )
+
+    def _forward(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        return pool_hidden_states(hidden, attention_mask, self.config["pooling"])
+
+    def encode(self, sentences, batch_size=DEFAULT_BATCH_SIZE, normalize_embeddings=None, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        normalize = self.config["normalize"] if normalize_embeddings is None else normalize_embeddings
+        chunks = [
+            self._forward(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]
+        embeddings = (
+            np.concatenate(chunks).astype(np.float32)
+            if chunks
+            else np.zeros((0, self.config["dim"]), dtype=np.float32)
+        )
+        if normalize:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+
+        return embeddings[0] if single else embeddings
+
+
+# =========================================================
+# 내보내기 (torch / sentence_transformers / onnxruntime 필요, 1회성)
+# =========================================================
+def export_onnx_encoder(model_name, out_dir, quantize=True, opset=DEFAULT_OPSET,
+                        max_seq_length=EXPORT_MAX_SEQ_LENGTH, log=print):
+    """
+    SentenceTransformer 모델의 transformer 부분을 ONNX 로 내보내고,
+    quantize=True 면 동적 int8 양자화 모델(model.int8.onnx)도 함께 만듭니다.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    started = time.time()
+    os.makedirs(out_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    pooling = "cls"
+    for module in st_model:
+        if isinstance(module, Pooling) and not module.pooling_mode_cls_token:
+            pooling = "mean"
+    normalize = any(isinstance(module, Normalize) for module in st_model)
+
+    # 1. transformer → ONNX (배치/길이 가변)
+    sample = tokenizer(["샘플 문장"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask"]
+    onnx_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model,
+            (sample["input_ids"], sample["attention_mask"]),
+            onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    log(f"[onnx] fp32 내보내기 완료: {onnx_path} ({time.time() - started:.1f}s)")
+
+    # 2. 동적 int8 양자화 (가중치 int8, 활성값은 실행 시 양자화)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            onnx_path,
+            os.path.join(out_dir, ONNX_INT8_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+            use_external_data_format=True,  # fp32 모델이 2GB 를 넘는 경우 대비
+        )
+        log(f"[onnx] int8 양자화 완료 ({time.time() - started:.1f}s)")
+
+    # 3. 토크나이저 + 설정 저장
+    tokenizer.save_pretrained(out_dir)
+    config = {
+        "model_name": model_name,
+        "pooling": pooling,
+        "normalize": normalize,
+        "max_seq_length": min(max_seq_length, st_model.max_seq_length),
+        "dim": st_model.get_sentence_embedding_dimension(),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+        "opset": opset,
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, ENCODER_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    return config
+
+
+# =========================================================
+# 패리티 / 지연시간 점검
+# =========================================================
+def compare_encoders(reference, candidates, texts, repeats=5):
+    """
+    reference(보통 torch SentenceTransformer)와 후보 인코더들의 임베딩 코사인 유사도와
+    단일 쿼리 인코딩 지연시간(p50/p95)을 비교합니다.
+    candidates: {이름: 인코더}
+    """
+
+    def latency(encoder):
+        samples = []
+        for _ in range(repeats):
+            for text in texts:
+                started = time.perf_counter()
+                encoder.encode([text])
+                samples.append(time.perf_counter() - started)
+        arr = np.asarray(samples) * 1000.0
+        return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95))}
+
+    def unit(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+    ref_vectors = unit(reference.encode(texts))
+    report = {"texts": len(texts), "reference": latency(reference), "candidates": {}}
+    for name, encoder in candidates.items():
+        cosine = (ref_vectors * unit(encoder.encode(texts))).sum(axis=1)
+        report["candidates"][name] = {
+            "cosine_min": float(cosine.min()),
+            "cosine_mean": float(cosine.mean()),
+            **latency(encoder),
+        }
+    return report
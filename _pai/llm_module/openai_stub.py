@@ -0,0 +1,336 @@
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .synthetic_corpus import HashingEncoder
+
+# ✅ 상수 설정 (부하 테스트용 기본 동작)
+DEFAULT_STUB_CONFIG = {
+    "ttft_ms": 400,  # 첫 청크까지 지연 (도구 호출 / 텍스트 답변 공통)
+    "tokens_per_second": 40,  # 스트리밍 텍스트 토큰 속도
+    "answer_tokens": 150,  # 최종 답변 토큰 수 (비스트리밍 요청은 max_tokens 로 제한)
+    # 사용자 메시지 이후 도구 호출 라운드 (라운드마다 호출 목록, 인자 문자열의 {user} 는 마지막 사용자 메시지)
+    "tool_rounds": [
+        [{"name": "tool_search_patent_with_description", "arguments": {"query_text": "{user}", "top_k": 5}}],
+    ],
+    "error_rate": 0.0,  # 이 확률로 500 응답 (클라이언트 재시도/오류 처리 확인용)
+    "embedding_dim": 1536,  # text-embedding-3-small 과 같은 차원
+    "seed": 0,
+}
+ANSWER_WORDS = (
+    "검색된 특허 중 가장 유사한 것은 청구항 구성이 질문하신 기술과 대부분 겹치며 "
+    "차이점은 세부 구현 방식에 있습니다 추가로 관련 IPC 분류를 함께 확인해 보시기 바랍니다"
+).split()
+
+
+def load_stub_config(path=None, **overrides):
+    config = json.loads(json.dumps(DEFAULT_STUB_CONFIG))
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    return config
+
+
+def _fill_user(value, user_text):
+    # 인자 템플릿의 "{user}" 를 마지막 사용자 메시지로 치환 (중첩 리스트/딕셔너리 포함)
+    if isinstance(value, str):
+        return value.replace("{user}", user_text)
+    if isinstance(value, list):
+        return [_fill_user(v, user_text) for v in value]
+    if isinstance(value, dict):
+        return {k: _fill_user(v, user_text) for k, v in value.items()}
+    return value
+
+
+def _message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+class StubStats:
+    """
+    엔드포인트별 요청 수 / 오류 수 / 도구 호출 라운드 수 (GET /stats)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, key, n=1):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class StubBehavior:
+    """
+    요청 메시지로 다음 응답(도구 호출 라운드 또는 최종 답변)을 정하는 스크립트.
+    마지막 user 메시지 이후 tool_calls 가 있는 assistant 메시지 수 = 지금까지 끝난 라운드 수.
+    요청에 tools 로 넘어온 도구만 호출합니다. (제목 생성처럼 도구 없는 요청은 바로 텍스트 답변)
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.encoder = HashingEncoder(dim=config["embedding_dim"], seed=config["seed"])
+        self.stats = StubStats()
+        self._rng = random.Random(config["seed"])
+        self._rng_lock = threading.Lock()
+
+    def should_fail(self):
+        with self._rng_lock:
+            return self._rng.random() < self.config["error_rate"]
+
+    def next_step(self, messages, tools=()):
+        offered = {(tool.get("function") or {}).get("name") for tool in tools or ()}
+        user_text, rounds_done = "", 0
+        for message in messages:
+            if message.get("role") == "user":
+                user_text, rounds_done = _message_text(message), 0
+            elif message.get("role") == "assistant" and message.get("tool_calls"):
+                rounds_done += 1
+
+        rounds = self.config["tool_rounds"]
+        calls = []
+        if rounds_done < len(rounds):
+            calls = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {
+                        "name": call["name"],
+                        "arguments": json.dumps(_fill_user(call.get("arguments", {}), user_text), ensure_ascii=False),
+                    },
+                }
+                for call in rounds[rounds_done]
+                if call["name"] in offered
+            ]
+        if calls:
+            return {"tool_calls": calls}
+        return {"text_tokens": self.answer_tokens(self.config["answer_tokens"])}
+
+    @staticmethod
+    def answer_tokens(n):
+        return [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(n)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    behavior = None  # make_stub_server 에서 주입
+    server_version = "PaiOpenAIStub/1.0"
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 로그를 찍으면 부하 측정에 영향
+
+    # ---------------------------------------------------------
+    # 공통
+    # ---------------------------------------------------------
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json({"error": {"message": message, "type": "stub_error", "code": status}}, status)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            self._send_json(self.behavior.stats.snapshot())
+        else:
+            self._send_error(404, f"not found: {self.path}")
+
+    def do_POST(self):
+        behavior = self.behavior
+        try:
+            request = self._read_json()
+        except ValueError:
+            self._send_error(400, "invalid JSON")
+            return
+
+        if self.path.endswith("/chat/completions"):
+            endpoint = "chat"
+        elif self.path.endswith("/embeddings"):
+            endpoint = "embeddings"
+        else:
+            self._send_error(404, f"not found: {self.path}")
+            return
+
+        behavior.stats.add(f"{endpoint}_requests")
+        if behavior.should_fail():
+            behavior.stats.add(f"{endpoint}_injected_errors")
+            self._send_error(500, "injected error")
+            return
+
+        if endpoint == "embeddings":
+            self._embeddings(request)
+        else:
+            self._chat(request)
+
+    # ---------------------------------------------------------
+    # /v1/embeddings
+    # ---------------------------------------------------------
+    def _embeddings(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        vectors = self.behavior.encoder.encode(texts)
+
+        data = []
+        for i, vector in enumerate(vectors):
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(text.split()) for text in texts)
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    # ---------------------------------------------------------
+    # /v1/chat/completions
+    # ---------------------------------------------------------
+    def _chat(self, request):
+        config = self.behavior.config
+        step = self.behavior.next_step(request.get("messages", []), request.get("tools"))
+        if "tool_calls" in step:
+            self.behavior.stats.add("tool_rounds")
+        tokens = step.get("text_tokens", [])
+        if not request.get("stream") and request.get("max_tokens"):
+            tokens = tokens[:int(request["max_tokens"])]
+
+        completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "stub")
+        usage = {
+            "prompt_tokens": sum(len(_message_text(m).split()) for m in request.get("messages", [])),
+            "completion_tokens": len(tokens) or len(step.get("tool_calls", [])),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        time.sleep(config["ttft_ms"] / 1000.0)
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": "".join(tokens).strip() or None}
+            if step.get("tool_calls"):
+                message["tool_calls"] = step["tool_calls"]
+            self._send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if step.get("tool_calls") else "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        # 스트리밍 (SSE), Content-Length 없이 연결 종료로 끝을 알림
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            if step.get("tool_calls"):
+                for index, call in enumerate(step["tool_calls"]):
+                    chunk({
+                        "role": "assistant",
+                        "content": None,
+                        "tool_calls": [{
+                            "index": index,
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {"name": call["function"]["name"], "arguments": ""},
+                        }],
+                    })
+                    chunk({"tool_calls": [{"index": index, "function": {"arguments": call["function"]["arguments"]}}]})
+                chunk({}, "tool_calls")
+            else:
+                interval = 1.0 / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0.0
+                chunk({"role": "assistant", "content": ""})
+                for i, token in enumerate(tokens):
+                    if i and interval:
+                        time.sleep(interval)
+                    chunk({"content": token})
+                chunk({}, "stop")
+
+            if (request.get("stream_options") or {}).get("include_usage"):
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.behavior.stats.add("client_disconnects")
+
+
+def make_stub_server(host="127.0.0.1", port=8765, config=None):
+    """
+    OpenAI 호환 스텁 서버(ThreadingHTTPServer)를 만듭니다. base_url 은 http://host:port/v1
+    """
+    behavior = StubBehavior(config or load_stub_config())
+    handler = type("BoundStubHandler", (StubHandler,), {"behavior": behavior})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.behavior = behavior
+    return server
+
+
+def start_stub_server(host="127.0.0.1", port=8765, config=None):
+    """
+    백그라운드 스레드에서 스텁 서버를 띄우고 server 를 반환합니다. (종료: server.shutdown())
+    """
+    server = make_stub_server(host, port, config)
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    return server
+
+
+def embedding_from_response(item):
+    # 테스트/확인용: base64 또는 float 리스트 임베딩을 float32 배열로
+    embedding = item["embedding"]
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype="<f4")
+    return np.asarray(embedding, dtype=np.float32)
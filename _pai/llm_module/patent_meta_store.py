@@ -0,0 +1,306 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from .atomic_store import build_store_dir, resolve_store_dir
+from .columnar import StringColumn, write_string_column
+
+# ✅ 상수 설정
+BUILD_BATCH_SIZE = 5000  # 컬렉션 메타데이터를 페이지 단위로 읽을 크기
+MISSING_CLAIM_NO = 999_999  # claim_no 가 없거나 형식이 이상할 때 (정렬 시 뒤로)
+
+# 특허 단위로 한 번만 저장하는 메타데이터 필드 (청구항마다 중복되던 값)
+PATENT_FIELDS = ("title", "priority", "register", "link", "ipc")
+
+# 저장소 디렉토리 구성 파일
+META_FILE = "meta.json"
+PATENT_IDS_PREFIX = "patent_ids"
+FIELD_PREFIX = "field_"
+CLAIM_IDS_PREFIX = "claim_ids"
+CLAIM_NOS_FILE = "claim_nos.npy"
+CLAIM_OFFSETS_FILE = "claim_offsets.npy"
+IPC_CODES_PREFIX = "ipc_codes"
+IPC_OFFSETS_FILE = "ipc_offsets.npy"
+DELTA_FILE = "delta.json"  # 증분 반영분 (교체/추가된 특허 + 삭제된 특허), 전체 재빌드한 새 버전에는 없음
+
+
+def parse_ipc_codes(ipc_raw):
+    """
+    ipc_raw 문자열을 개별 코드 리스트로 파싱합니다. (쉼표/세미콜론 구분 + 공백 정리)
+    예: "H04M 3/42, H04B   1/40" -> ["H04M 3/42", "H04B 1/40"]
+    """
+    codes = []
+    for part in (ipc_raw or "").replace(";", ",").split(","):
+        code = " ".join(part.split())
+        if code:
+            codes.append(code)
+    return codes
+
+
+def _parse_claim_no(raw_claim_no):
+    try:
+        return int(raw_claim_no)
+    except (TypeError, ValueError):
+        return MISSING_CLAIM_NO
+
+
+def _collect_claim(patents, claim_id, meta):
+    """
+    청구항 하나의 메타데이터를 특허 단위 entry 에 모읍니다. (빌드 / 증분 반영 공용)
+    특허 필드 값은 청구항들 중 첫 번째로 비어 있지 않은 값을 대표값으로 사용합니다.
+    """
+    meta = meta or {}
+    patent_id = str(meta.get("patent_id", "") or "")
+    if not patent_id:
+        return
+    entry = patents.setdefault(patent_id, {"fields": {}, "claims": []})
+    for field in PATENT_FIELDS:
+        value = meta.get(field, "")
+        if field not in entry["fields"] and isinstance(value, str) and value.strip():
+            entry["fields"][field] = value.strip()
+    entry["claims"].append((_parse_claim_no(meta.get("claim_no")), claim_id))
+
+
+class PatentMetaStore:
+    """
+    특허(patent_id) 단위 컬럼형 메타데이터 저장소 (메모리 매핑).
+
+    - patent_id → 행 번호 dict 로 O(1) 조회
+    - 특허별 청구항 id / claim_no 는 claim_no 순으로 정렬된 평탄 배열 + offsets(CSR) 범위로 보관
+    - title/priority/register/link/ipc 는 특허당 한 번만 저장 (청구항별 중복 제거)
+    - IPC 코드는 빌드 시 미리 파싱해 CSR 로 저장 (ipc_codes, ipc_offsets)
+    - delta.json(update_patent_meta_delta)이 있으면 그 특허들은 base 행 대신 delta 항목으로 조회하고,
+      삭제된 특허는 없는 것으로 취급
+    """
+
+    def __init__(self, store_dir):
+        store_dir = resolve_store_dir(store_dir)  # 재빌드 중에도 한 버전의 파일만 읽도록 링크를 한 번만 풂
+        self.store_dir = store_dir
+
+        with open(os.path.join(store_dir, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.patent_ids = StringColumn.load(os.path.join(store_dir, PATENT_IDS_PREFIX))
+        self.fields = {
+            field: StringColumn.load(os.path.join(store_dir, FIELD_PREFIX + field))
+            for field in self.meta["fields"]
+        }
+        self.claim_ids = StringColumn.load(os.path.join(store_dir, CLAIM_IDS_PREFIX))
+        self.claim_nos = np.load(os.path.join(store_dir, CLAIM_NOS_FILE), mmap_mode="r")
+        self.claim_offsets = np.load(os.path.join(store_dir, CLAIM_OFFSETS_FILE), mmap_mode="r")
+        self.ipc_codes = StringColumn.load(os.path.join(store_dir, IPC_CODES_PREFIX))
+        self.ipc_offsets = np.load(os.path.join(store_dir, IPC_OFFSETS_FILE), mmap_mode="r")
+
+        self.id_to_row = {pid: row for row, pid in enumerate(self.patent_ids.to_list())}
+        self._ipc_to_rows = None  # IPC 코드 → 특허 행 배열 (역색인, 필요할 때 생성)
+
+        # 증분 반영분: overlay 특허는 base 행을 가리고, removed 는 base 에서 삭제된 특허
+        delta = {}
+        delta_path = os.path.join(store_dir, DELTA_FILE)
+        if os.path.exists(delta_path):
+            with open(delta_path, encoding="utf-8") as f:
+                delta = json.load(f)
+        self.overlay = delta.get("patents", {})
+        self.removed = set(delta.get("removed", []))
+        self.version = delta.get("version")
+        for patent_id in self.removed.union(self.overlay):
+            self.id_to_row.pop(patent_id, None)
+
+    @classmethod
+    def load(cls, store_dir):
+        return cls(store_dir)
+
+    def __len__(self):
+        return len(self.id_to_row) + len(self.overlay)
+
+    def __contains__(self, patent_id):
+        return patent_id in self.id_to_row or patent_id in self.overlay
+
+    # ---------------------------------------------------------
+    # 특허 단위 조회
+    # ---------------------------------------------------------
+    def field(self, patent_id, name):
+        entry = self.overlay.get(patent_id)
+        if entry is not None:
+            return entry["fields"].get(name, "") if name in self.fields else ""
+        row = self.id_to_row.get(patent_id)
+        if row is None or name not in self.fields:
+            return ""
+        return self.fields[name][row]
+
+    def claims(self, patent_id):
+        """
+        (claim_ids, claim_nos) — claim_no 오름차순. 없는 특허면 빈 리스트.
+        """
+        entry = self.overlay.get(patent_id)
+        if entry is not None:
+            return [claim_id for _, claim_id in entry["claims"]], [no for no, _ in entry["claims"]]
+        row = self.id_to_row.get(patent_id)
+        if row is None:
+            return [], []
+        start, end = int(self.claim_offsets[row]), int(self.claim_offsets[row + 1])
+        return (
+            [self.claim_ids[i] for i in range(start, end)],
+            [int(no) for no in self.claim_nos[start:end]],
+        )
+
+    def ipc_list(self, patent_id):
+        entry = self.overlay.get(patent_id)
+        if entry is not None:
+            return parse_ipc_codes(entry["fields"].get("ipc", ""))
+        row = self.id_to_row.get(patent_id)
+        if row is None:
+            return []
+        start, end = int(self.ipc_offsets[row]), int(self.ipc_offsets[row + 1])
+        return [self.ipc_codes[i] for i in range(start, end)]
+
+    def get(self, patent_id):
+        """
+        특허 하나의 메타데이터 dict. 없으면 None.
+        """
+        if patent_id not in self:
+            return None
+        claim_ids, claim_nos = self.claims(patent_id)
+        info = {name: self.field(patent_id, name) for name in self.fields}
+        info.update(
+            patent_id=patent_id,
+            ipc_codes=self.ipc_list(patent_id),
+            claim_ids=claim_ids,
+            claim_nos=claim_nos,
+        )
+        return info
+
+    # ---------------------------------------------------------
+    # IPC 조인
+    # ---------------------------------------------------------
+    def patents_with_ipc(self, code):
+        """
+        해당 IPC 코드(정확히 일치)를 가진 patent_id 리스트.
+        """
+        if self._ipc_to_rows is None:
+            counts = np.diff(np.asarray(self.ipc_offsets))
+            owners = np.repeat(np.arange(len(self.patent_ids), dtype=np.int64), counts)
+            groups = {}
+            for owner, value in zip(owners, self.ipc_codes.to_list()):
+                groups.setdefault(value, []).append(int(owner))
+            self._ipc_to_rows = groups
+        code = " ".join(code.split())
+        patent_ids = [self.patent_ids[row] for row in self._ipc_to_rows.get(code, [])]
+        if self.overlay or self.removed:
+            patent_ids = [pid for pid in patent_ids if pid in self.id_to_row]
+            patent_ids.extend(pid for pid in self.overlay if code in self.ipc_list(pid))
+        return patent_ids
+
+
+# =========================================================
+# 빌드
+# =========================================================
+def build_patent_meta_store(collection, out_dir, batch_size=BUILD_BATCH_SIZE, log=print):
+    """
+    청구항 컬렉션의 메타데이터를 한 번 훑어 특허 단위 컬럼형 저장소를 만듭니다.
+    특허 필드 값은 청구항들 중 첫 번째로 비어 있지 않은 값을 대표값으로 사용합니다.
+    파일은 형제 임시 디렉토리에 쓴 뒤 out_dir 로 원자적으로 교체합니다. (atomic_store.build_store_dir)
+    서빙 중인 워커가 매핑한 이전 파일은 그대로 남고, 이전 delta.json 은 새 버전에 따라오지 않습니다.
+    """
+    started = time.time()
+
+    total = collection.count()
+    patents = {}  # patent_id -> {"fields": {...}, "claims": [(claim_no, claim_id), ...]}
+
+    offset = 0
+    while offset < total:
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids = batch.get("ids", [])
+        if not ids:
+            break
+
+        for claim_id, meta in zip(ids, batch["metadatas"]):
+            _collect_claim(patents, claim_id, meta)
+
+        offset += len(ids)
+        log(f"[patent_meta] {offset}/{total} ({time.time() - started:.1f}s)")
+
+    patent_ids = sorted(patents)
+    claim_ids, claim_nos, claim_offsets = [], [], [0]
+    ipc_codes, ipc_offsets = [], [0]
+    for patent_id in patent_ids:
+        entry = patents[patent_id]
+        for claim_no, claim_id in sorted(entry["claims"]):
+            claim_ids.append(claim_id)
+            claim_nos.append(claim_no)
+        claim_offsets.append(len(claim_ids))
+        ipc_codes.extend(parse_ipc_codes(entry["fields"].get("ipc", "")))
+        ipc_offsets.append(len(ipc_codes))
+
+    meta = {
+        "collection": collection.name,
+        "n_patents": len(patent_ids),
+        "n_claims": len(claim_ids),
+        "fields": list(PATENT_FIELDS),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    # 이전 증분 반영분(delta.json)은 새 저장소에 이미 포함되므로 새 버전 디렉토리에는 두지 않음
+    with build_store_dir(out_dir) as build_dir:
+        write_string_column(os.path.join(build_dir, PATENT_IDS_PREFIX), patent_ids)
+        for field in PATENT_FIELDS:
+            write_string_column(
+                os.path.join(build_dir, FIELD_PREFIX + field),
+                (patents[pid]["fields"].get(field, "") for pid in patent_ids),
+            )
+        write_string_column(os.path.join(build_dir, CLAIM_IDS_PREFIX), claim_ids)
+        np.save(os.path.join(build_dir, CLAIM_NOS_FILE), np.asarray(claim_nos, dtype=np.int32))
+        np.save(os.path.join(build_dir, CLAIM_OFFSETS_FILE), np.asarray(claim_offsets, dtype=np.int64))
+        write_string_column(os.path.join(build_dir, IPC_CODES_PREFIX), ipc_codes)
+        np.save(os.path.join(build_dir, IPC_OFFSETS_FILE), np.asarray(ipc_offsets, dtype=np.int64))
+        with open(os.path.join(build_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    log(
+        f"[patent_meta] 완료: 특허 {meta['n_patents']}개, 청구항 {meta['n_claims']}개 "
+        f"({time.time() - started:.1f}s)"
+    )
+    return meta
+
+
+# =========================================================
+# 증분 반영
+# =========================================================
+def update_patent_meta_delta(store_dir, records, deleted_patent_ids=(), version=None):
+    """
+    저장소를 다시 빌드하지 않고 delta.json 에 특허 단위 교체/삭제를 누적합니다.
+
+    - records: (청구항 id, 본문, 메타데이터) 리스트. 여기 나온 특허는 이 청구항들로 통째로 교체
+    - deleted_patent_ids: 삭제할 특허
+    """
+    delta_path = os.path.join(resolve_store_dir(store_dir), DELTA_FILE)
+    delta = {}
+    if os.path.exists(delta_path):
+        with open(delta_path, encoding="utf-8") as f:
+            delta = json.load(f)
+    overlay = delta.get("patents", {})
+    removed = set(delta.get("removed", []))
+
+    patents = {}
+    for claim_id, _, metadata in records:
+        _collect_claim(patents, claim_id, metadata)
+    for patent_id, entry in patents.items():
+        overlay[patent_id] = {"fields": entry["fields"], "claims": sorted(entry["claims"])}
+        removed.add(patent_id)
+    for patent_id in deleted_patent_ids:
+        overlay.pop(patent_id, None)
+        removed.add(patent_id)
+
+    delta = {
+        "version": version,
+        "patents": overlay,
+        "removed": sorted(removed),
+        "updated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    tmp_path = delta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(delta, f, ensure_ascii=False)
+    os.replace(tmp_path, delta_path)
+    return delta
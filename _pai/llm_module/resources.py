@@ -0,0 +1,79 @@
+import threading
+import time
+
+
+class ResourceRegistry:
+    """
+    무거운 공용 리소스(임베딩 모델, 벡터 DB, 인덱스, LLM 그래프 등)를 이름으로 등록해 두고
+    처음 get() 될 때 한 번만 로드하는 레지스트리.
+
+    - import 시점에는 로더만 등록하므로 manage.py migrate 같은 CLI 명령은 모델을 올리지 않음
+    - 서빙 시에는 warm_up() 으로 미리 로드해 첫 요청이 로딩 비용을 내지 않도록 함
+    - 이름별 잠금으로 동시 첫 요청에서도 한 번만 로드 (None 반환도 로드 완료로 취급)
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.load_seconds = {}
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def resource(self, name):
+        """
+        데코레이터: @registry.resource("doc_model")
+        """
+
+        def decorator(loader):
+            self.register(name, loader)
+            return loader
+
+        return decorator
+
+    def get(self, name):
+        if name in self._values:
+            return self._values[name]
+
+        lock = self._locks.get(name)
+        if lock is None:
+            raise KeyError(f"등록되지 않은 리소스입니다: {name}")
+
+        with lock:
+            if name not in self._values:
+                started = time.perf_counter()
+                value = self._loaders[name]()
+                self.load_seconds[name] = time.perf_counter() - started
+                self._values[name] = value
+        return self._values[name]
+
+    def is_loaded(self, name):
+        return name in self._values
+
+    def names(self):
+        return list(self._loaders)
+
+    def warm_up(self, names=None):
+        """
+        지정한(기본: 등록된 전체) 리소스를 미리 로드하고 이름별 로드 시간(초)을 반환합니다.
+        """
+        for name in names or self.names():
+            self.get(name)
+        return {name: self.load_seconds.get(name, 0.0) for name in names or self.names()}
+
+    def reset(self, name=None):
+        """
+        로드된 값을 버려 다음 get() 때 다시 로드되게 합니다. (인덱스 재빌드 후 등)
+        """
+        with self._lock:
+            for key in [name] if name else list(self._values):
+                self._values.pop(key, None)
+                self.load_seconds.pop(key, None)
+
+
+# 프로세스 전역 레지스트리
+registry = ResourceRegistry()
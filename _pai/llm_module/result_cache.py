@@ -0,0 +1,252 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+
+import numpy as np
+
+from .embedding_cache import abandon_inherited_connection, normalize_text
+
+# ✅ 상수 설정
+DEFAULT_TTL_SECONDS = 3600  # 캐시 결과 유효 시간
+DEFAULT_LEASE_SECONDS = 120  # 계산 중(in-flight) 표시의 최대 유지 시간 (계산 주체가 죽은 경우 대비)
+POLL_INTERVAL = 0.05  # 다른 워커의 계산 완료를 기다릴 때 폴링 간격(초)
+
+
+def collection_version(collection):
+    """
+    캐시 키에 들어갈 컬렉션 버전. (재색인 시 값이 바뀌므로 이전 캐시가 자연스럽게 무효화됨)
+    1) 컬렉션 메타데이터의 'pai:version' (증분 반영 버전)
+    2) 백엔드의 content_marker() (Chroma DB 파일 mtime, mmap 내보내기 시각)
+    3) 둘 다 없으면 청구항 수(count) — 행 수가 같은 재색인은 구분하지 못함
+    """
+    metadata = getattr(collection, "metadata", None) or {}
+    version = metadata.get("pai:version")
+    if version is not None:
+        return f"v{version}"
+    content_marker = getattr(collection, "content_marker", None)
+    marker = content_marker() if callable(content_marker) else None
+    if marker is not None:
+        return f"m{marker}"
+    return f"n{collection.count()}"
+
+
+def _reset_in_child(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache._reset_after_fork()
+
+
+def normalize_params(params):
+    """
+    캐시 키용 파라미터 정규화: 문자열은 normalize_text, 리스트/딕셔너리는 재귀 처리.
+    """
+    if isinstance(params, str):
+        return normalize_text(params)
+    if isinstance(params, dict):
+        return {str(k): normalize_params(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [normalize_params(v) for v in params]
+    return params
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"JSON 직렬화 불가 타입: {type(value)}")
+
+
+class RetrievalCache:
+    """
+    여러 워커 프로세스가 함께 쓰는 검색 결과 캐시 (SQLite, 외부 서비스 불필요).
+
+    - 키: namespace + 컬렉션 버전 + 정규화된 파라미터(JSON)의 sha256
+    - TTL: expires_at 이 지난 결과는 무시/정리
+    - single-flight: 같은 키의 동시 미스는 한 번만 계산
+        * 같은 프로세스 안에서는 키별 threading.Lock 으로 대기 (기다리는 스레드가 없으면 삭제)
+        * 프로세스 간에는 inflight 테이블의 lease 로 대기 (lease 만료 시 다른 워커가 인계)
+        * 키마다 잠금이 따로라 다른 워커의 lease 를 기다리는 동안에도 다른 키는 막히지 않음
+    - fork 된 자식(gunicorn --preload 워커 등)은 새 owner 와 자기 SQLite 연결/잠금을 사용
+    """
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self._reset_process_state()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_in_child(ref))
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS inflight ("
+            " key TEXT PRIMARY KEY, owner TEXT NOT NULL, lease_until REAL NOT NULL)"
+        )
+
+    # ---------------------------------------------------------
+    # 내부 helper
+    # ---------------------------------------------------------
+    def _reset_process_state(self):
+        # owner 는 프로세스마다 달라야 워커 간 lease 가 구분됨
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._key_locks = {}  # key -> [Lock, 사용 중인 스레드 수]
+        self._key_locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _reset_after_fork(self):
+        # fork 직후 자식에서 호출됨: fork 한 스레드의 연결은 부모 것이므로 쓰지 않고 새로 엶
+        abandon_inherited_connection(getattr(self._local, "conn", None))
+        self._reset_process_state()
+
+    def _conn(self):
+        # sqlite3 연결은 스레드별로 하나씩 (autocommit 모드)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def make_key(self, namespace, version, params):
+        payload = json.dumps(
+            [namespace, version, normalize_params(params)],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=_json_default,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _lookup(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM results WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None, False
+        return json.loads(row[0]), True
+
+    def _store(self, key, namespace, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, namespace, value, created_at, expires_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                key,
+                namespace,
+                json.dumps(value, ensure_ascii=False, default=_json_default),
+                now,
+                now + self.ttl_seconds,
+            ),
+        )
+        conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+
+    def _try_acquire(self, key):
+        """
+        inflight lease 획득 시도. 비어 있거나 lease 가 만료된 경우에만 성공합니다.
+        """
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute(
+                "INSERT INTO inflight (key, owner, lease_until) VALUES (?, ?, ?)",
+                (key, self.owner, now + self.lease_seconds),
+            )
+            return True
+        except sqlite3.IntegrityError:
+            taken = conn.execute(
+                "UPDATE inflight SET owner = ?, lease_until = ? WHERE key = ? AND lease_until < ?",
+                (self.owner, now + self.lease_seconds, key, now),
+            )
+            return taken.rowcount == 1
+
+    def _release(self, key):
+        self._conn().execute(
+            "DELETE FROM inflight WHERE key = ? AND owner = ?", (key, self.owner)
+        )
+
+    # ---------------------------------------------------------
+    # 공개 인터페이스
+    # ---------------------------------------------------------
+    def get_or_compute(self, namespace, params, version, compute):
+        """
+        캐시에 있으면 그대로 반환하고, 없으면 compute() 를 (키당 한 번만) 실행해 저장 후 반환합니다.
+        compute() 의 반환값은 JSON 직렬화 가능해야 합니다.
+        """
+        key = self.make_key(namespace, version, params)
+
+        value, found = self._lookup(key)
+        if found:
+            self._count("hits")
+            return value
+
+        with self._key_lock(key):
+            # 같은 프로세스의 다른 스레드가 방금 채웠을 수 있음
+            value, found = self._lookup(key)
+            if found:
+                self._count("hits")
+                return value
+
+            # 다른 워커가 계산 중이면 완료될 때까지 대기
+            while not self._try_acquire(key):
+                self._count("waits")
+                time.sleep(POLL_INTERVAL)
+                value, found = self._lookup(key)
+                if found:
+                    self._count("hits")
+                    return value
+
+            try:
+                value, found = self._lookup(key)
+                if found:
+                    self._count("hits")
+                    return value
+
+                self._count("misses")
+                value = compute()
+                self._store(key, namespace, value)
+            finally:
+                self._release(key)
+
+        # 저장된 형태(JSON 왕복)와 동일한 값을 반환해 히트/미스 결과 형태를 맞춤
+        return json.loads(json.dumps(value, ensure_ascii=False, default=_json_default))
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses, "waits": self.waits}
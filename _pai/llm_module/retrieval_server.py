@@ -0,0 +1,189 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from .total_schemas import (
+    IPCDetailInfo,
+    IPCMainDescription,
+    PatentByIdOutput,
+    PatentSearchOutput,
+)
+
+# ✅ 상수 설정
+DEFAULT_TIMEOUT = 60.0  # 클라이언트 응답 대기 시간(초)
+MAX_LINE_BYTES = 16 * 1024 * 1024  # 요청/응답 한 줄 최대 크기
+
+# 연산 이름 → 결과 스키마 (list 이면 항목 스키마의 리스트)
+RESULT_SCHEMAS = {
+    "search_patents": PatentSearchOutput,
+    "get_patent_detail": PatentByIdOutput,
+    "search_ipc_codes": IPCMainDescription,
+    "get_ipc_details": [IPCDetailInfo],
+}
+
+
+class RetrievalServerError(RuntimeError):
+    """
+    검색 서버가 연산 실패를 응답한 경우 (서버 측 예외 메시지를 그대로 전달)
+    """
+
+
+def _dump(value):
+    if isinstance(value, list):
+        return [_dump(v) for v in value]
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    return value
+
+
+def _load(op, value):
+    schema = RESULT_SCHEMAS[op]
+    if isinstance(schema, list):
+        return [schema[0].model_validate(v) for v in value]
+    return schema.model_validate(value)
+
+
+# =========================================================
+# 서버
+# =========================================================
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    줄 단위 JSON 프로토콜 (연결 하나로 여러 요청 처리)
+    요청: {"id": ..., "op": "search_patents", "args": {...}}
+    응답: {"id": ..., "ok": true, "result": ..., "elapsed_ms": ...}
+          {"id": ..., "ok": false, "error": "...", "error_type": "..."}
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_LINE_BYTES)
+            if not line:
+                break
+
+            started = time.perf_counter()
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                operation = self.server.operations[request["op"]]
+                result = operation(**(request.get("args") or {}))
+                response = {
+                    "id": request_id,
+                    "ok": True,
+                    "result": _dump(result),
+                    "elapsed_ms": (time.perf_counter() - started) * 1000.0,
+                }
+            except Exception as e:
+                response = {
+                    "id": request_id,
+                    "ok": False,
+                    "error": str(e),
+                    "error_type": type(e).__name__,
+                }
+
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class RetrievalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    모델/인덱스를 한 프로세스에만 올리고, Django 워커들이 Unix 소켓으로 검색 연산을 호출하는 서버.
+    operations: {연산 이름: 함수} (retrieval_service.OPERATIONS)
+    """
+
+    daemon_threads = True
+    request_queue_size = 128  # 워커 수 × 스레드 수만큼 동시 접속 대비 (기본값 5)
+
+    def __init__(self, socket_path, operations):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # 이전 실행이 남긴 소켓 파일
+        self.socket_path = socket_path
+        self.operations = operations
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+# =========================================================
+# 클라이언트
+# =========================================================
+class RetrievalClient:
+    """
+    RetrievalServer 용 얇은 클라이언트. retrieval_service 와 같은 함수 이름으로 호출합니다.
+    스레드별로 연결을 하나씩 유지하며, 연결이 끊겼으면 한 번 재연결 후 재시도합니다.
+    (검색 연산은 모두 읽기 전용이라 재시도해도 안전)
+    """
+
+    def __init__(self, socket_path, timeout=DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+            self._local.conn = None
+
+    def _roundtrip(self, payload):
+        sock, reader = self._connection()
+        sock.sendall(payload)
+        line = reader.readline(MAX_LINE_BYTES)
+        if not line:
+            raise ConnectionError("검색 서버가 연결을 닫았습니다.")
+        return json.loads(line)
+
+    def call(self, op, **args):
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+        payload = json.dumps(
+            {"id": request_id, "op": op, "args": args}, ensure_ascii=False
+        ).encode("utf-8") + b"\n"
+
+        try:
+            response = self._roundtrip(payload)
+        except socket.timeout:
+            # 응답 지연은 재시도하지 않음 (연결 상태를 알 수 없으므로 닫기만)
+            self._close()
+            raise
+        except (ConnectionError, OSError):
+            self._close()
+            response = self._roundtrip(payload)
+
+        if not response.get("ok"):
+            raise RetrievalServerError(
+                f"{op} 실패 ({response.get('error_type')}): {response.get('error')}"
+            )
+        return _load(op, response["result"])
+
+    def search_patents(self, **kwargs):
+        return self.call("search_patents", **kwargs)
+
+    def get_patent_detail(self, **kwargs):
+        return self.call("get_patent_detail", **kwargs)
+
+    def search_ipc_codes(self, **kwargs):
+        return self.call("search_ipc_codes", **kwargs)
+
+    def get_ipc_details(self, **kwargs):
+        return self.call("get_ipc_details", **kwargs)
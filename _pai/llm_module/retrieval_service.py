@@ -0,0 +1,870 @@
+from typing import List, Optional
+
+import os
+import re
+import threading
+import time
+from chromadb.utils import embedding_functions
+from dotenv import load_dotenv
+from django.conf import settings  # [추가] Django 설정 가져오기
+
+# [수정] 같은 패키지 내 파일들은 점(.)을 찍어서 상대 경로로 import
+from .total_schemas import (
+    IPCDetailInfo,
+    IPCMainDescription,
+    PatentClaimSnippet,
+    PatentSearchResult,
+    PatentSearchOutput,
+    PatentClaimFull,
+    PatentByIdOutput,
+)
+from .ipc_func import get_ipc_detail_data_from_code, search_ipc_with_query
+from .ipc_hierarchy import load_or_build_ipc_hierarchy
+from .ipc_dictionary import load_or_build_ipc_dictionary
+from .doc_func import patent_hybrid_search, search_with_growing_pool
+from .bm25_index import BM25Index
+from .embedding_cache import CachedEncoder, EmbeddingFunctionEncoder, normalize_text
+from .result_cache import RetrievalCache, collection_version
+from .vector_backend import MmapBackend, detach_chroma_system, open_vector_backend
+from .collection_versions import CollectionValueFile, VersionFile, threshold_file_path, version_file_path
+from .patent_meta_store import PatentMetaStore, parse_ipc_codes
+from .onnx_encoder import ENCODER_CONFIG_FILE, OnnxEncoder
+from .batch_encoder import MicroBatchEncoder
+from .resources import registry
+
+# 검색 연산(일반 함수)과 그에 필요한 모델/인덱스.
+# total_tools 의 LLM 툴이 같은 프로세스에서 직접 호출하거나,
+# 검색 서버(manage.py run_retrieval_server)가 한 번만 로드해 Unix 소켓으로 제공합니다.
+
+# =========================================================
+# 공용 리소스 (resources.registry 에 로더만 등록, 처음 사용할 때 로드)
+# =========================================================
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # OpenAI 호환 서버 (스텁 등)
+
+# [중요 수정] Django BASE_DIR을 기준으로 절대 경로 생성
+# 가정: manage.py와 같은 레벨에 'db_search' 폴더가 있음
+BASE_DB_PATH = os.path.join(settings.BASE_DIR, "db_search")
+
+# 특허 검색용 임베딩 모델 + 쿼리 임베딩 캐시
+# ("더 보여줘" 재검색처럼 같은 query_text 를 다시 인코딩하는 비용 제거)
+# EMBED_CACHE_PERSIST=0 이면 메모리 LRU 만 사용, EMBED_CACHE_DISK_MAX 는 SQLite 에 남길 최대 행 수
+DOC_MODEL_NAME = "dragonkue/BGE-m3-ko"
+IPC_MODEL_NAME = "text-embedding-3-small"  # IPC 검색용 (OpenAI 임베딩, 같은 캐시 사용)
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_PERSIST = os.getenv("EMBED_CACHE_PERSIST", "1") != "0"
+EMBED_CACHE_DISK_MAX = int(os.getenv("EMBED_CACHE_DISK_MAX", "50000"))
+
+# 문서 인코더 백엔드 선택 (DOC_ENCODER_BACKEND=torch | onnx)
+# onnx: manage.py export_onnx_encoder 로 만든 모델을 onnxruntime 으로 실행 (torch import 불필요)
+#       DOC_ONNX_QUANTIZED=0 이면 int8 대신 fp32 ONNX 모델 사용
+DOC_ENCODER_BACKEND = os.getenv("DOC_ENCODER_BACKEND", "torch")
+doc_onnx_path = os.path.join(BASE_DB_PATH, "doc_encoder_onnx")
+
+ipc_db_path = os.path.join(BASE_DB_PATH, "ipc_db")
+
+# IPC 검색 임베딩 선택 (IPC_EMBEDDING=openai | local)
+# local: manage.py reindex_ipc_local 로 문서 인코더(BGE-m3-ko)로 다시 임베딩한 컬렉션을 사용
+#        → 네트워크 호출 없이 검색하고, 특허 검색과 같은 쿼리 임베딩(캐시)을 재사용
+# IPC_MAX_DISTANCE 로 거리 컷오프를 직접 지정할 수 있음
+# (없으면 reindex_ipc_local --write-threshold 가 쓴 pai_thresholds.json → 컬렉션 메타데이터의 pai:max_distance
+#  → ipc_func 기본값 순)
+IPC_EMBEDDING = os.getenv("IPC_EMBEDDING", "openai")
+IPC_COLLECTION_NAME = "ipc_clean"
+IPC_LOCAL_COLLECTION_NAME = "ipc_clean_local"
+IPC_MAX_DISTANCE = os.getenv("IPC_MAX_DISTANCE")
+ipc_thresholds = CollectionValueFile(threshold_file_path(ipc_db_path))
+doc_db_path = os.path.join(BASE_DB_PATH, "doc_db")
+
+# 벡터 백엔드 선택 (VECTOR_BACKEND=chroma | mmap)
+# mmap: manage.py export_vector_backend 로 만든 메모리 매핑 인덱스를 인프로세스로 서빙
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+# 특허 청구항 벡터 압축 (VECTOR_BACKEND=mmap 일 때만 적용)
+# VECTOR_COMPRESSION=pca | int8 | binary 이면 manage.py compress_vector_backend 로 만든 코드로 1차 검색 후
+# 상위 n * VECTOR_RESCORE_FACTOR 개만 full 벡터로 재점수화 (기본값 none: 압축 미사용)
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+# 특허 청구항 전역 BM25 인덱스 (manage.py build_bm25_index 로 생성)
+# PATENT_LEXICAL_MODE=global 이면 코퍼스 전체 BM25 를 어휘 검색 leg 로 사용,
+# local(기본값)이면 기존처럼 벡터 후보 안에서만 BM25Okapi 를 계산
+bm25_index_path = os.path.join(BASE_DB_PATH, "bm25_index")
+PATENT_LEXICAL_MODE = os.getenv("PATENT_LEXICAL_MODE", "local")
+
+# 특허 단위 메타데이터 저장소 (manage.py build_patent_meta_store 로 생성)
+# 있으면 출원번호 상세 조회 / 검색 결과 보강을 patent_id → 행 O(1) 조회로 처리
+patent_meta_path = os.path.join(BASE_DB_PATH, "patent_meta")
+
+# IPC 계층 인덱스 (ipc_clean 의 path 메타데이터로 처음 로드 시 빌드, 이후 파일에서 로드)
+# IPC_HIERARCHY=0 이면 기존처럼 검색 결과의 path 문자열을 매번 파싱
+ipc_hierarchy_path = os.path.join(BASE_DB_PATH, "ipc_hierarchy.npz")
+IPC_HIERARCHY_ENABLED = os.getenv("IPC_HIERARCHY", "1") != "0"
+
+# IPC 코드 사전 (코드 → 설명/kind/path, 메모리 매핑 사이드카)
+# 코드 설명/상세 조회를 벡터 DB 없이 처리. IPC_DICTIONARY=0 이면 기존처럼 ipc_collection.get 사용
+ipc_dictionary_path = os.path.join(BASE_DB_PATH, "ipc_dictionary")
+IPC_DICTIONARY_ENABLED = os.getenv("IPC_DICTIONARY", "1") != "0"
+
+# 워커 간 공유 검색 결과 캐시 (SQLite, 같은 질의의 동시 미스는 한 번만 계산)
+# RESULT_CACHE=0 이면 비활성화
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") != "0"
+
+# 증분 반영(manage.py apply_patent_updates) 버전 파일
+# 버전이 바뀌면 청구항 컬렉션 핸들 / BM25 인덱스 / 메타 저장소를 다시 로드 (결과 캐시는 키의 버전으로 무효화)
+doc_versions = VersionFile(version_file_path(doc_db_path))
+_loaded_doc_version = {"value": None, "lock": threading.Lock()}
+
+
+def _embed_cache_path():
+    if not EMBED_CACHE_PERSIST:
+        return None
+    os.makedirs(BASE_DB_PATH, exist_ok=True)
+    return os.path.join(BASE_DB_PATH, "embedding_cache.sqlite3")
+
+
+@registry.resource("ipc_model")
+def _load_ipc_model():
+    if IPC_EMBEDDING == "local":
+        # 특허 검색과 같은 인코더/캐시 → 같은 문장은 한 번만 인코딩
+        return registry.get("doc_model")
+
+    # 원격 임베딩 호출 앞에 텍스트 기준 캐시를 둠 (같은 키워드는 다시 요청하지 않음)
+    openai_ef = embedding_functions.OpenAIEmbeddingFunction(
+        api_key=OPENAI_API_KEY,
+        model_name=IPC_MODEL_NAME,
+        api_base=OPENAI_BASE_URL,
+    )
+    return CachedEncoder(
+        EmbeddingFunctionEncoder(openai_ef),
+        model_id=f"openai:{IPC_MODEL_NAME}",
+        max_entries=EMBED_CACHE_SIZE,
+        persist_path=_embed_cache_path(),
+        max_disk_entries=EMBED_CACHE_DISK_MAX,
+    )
+
+
+def load_doc_encoder():
+    """
+    (인코더, 캐시용 model_id) 반환. 백엔드마다 임베딩이 미세하게 다르므로 model_id 를 구분합니다.
+    """
+    if DOC_ENCODER_BACKEND == "onnx":
+        if os.path.exists(os.path.join(doc_onnx_path, ENCODER_CONFIG_FILE)):
+            quantized = os.getenv("DOC_ONNX_QUANTIZED", "1") != "0"
+            encoder = OnnxEncoder(doc_onnx_path, quantized=quantized)
+            return encoder, f"{DOC_MODEL_NAME}:onnx-{'int8' if quantized else 'fp32'}"
+        print(f"⚠️ 경고: ONNX 인코더를 찾을 수 없어 torch 를 사용합니다: {doc_onnx_path}")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return SentenceTransformer(DOC_MODEL_NAME).to(device), DOC_MODEL_NAME
+
+
+@registry.resource("doc_model")
+def _load_doc_model():
+    doc_encoder, doc_encoder_id = load_doc_encoder()
+
+    # 동시 검색 요청의 인코딩을 잠깐 모아 한 번의 배치로 실행 (캐시 미스만 배치로 전달됨)
+    # ENCODER_MICROBATCH=0 이면 비활성화
+    if os.getenv("ENCODER_MICROBATCH", "1") != "0":
+        doc_encoder = MicroBatchEncoder(
+            doc_encoder,
+            max_batch_size=int(os.getenv("ENCODER_BATCH_MAX_SIZE", "32")),
+            max_wait_ms=float(os.getenv("ENCODER_BATCH_MAX_WAIT_MS", "5")),
+            timeout=float(os.getenv("ENCODER_BATCH_TIMEOUT", "60")),
+        )
+
+    return CachedEncoder(
+        doc_encoder,
+        model_id=doc_encoder_id,
+        max_entries=EMBED_CACHE_SIZE,
+        persist_path=_embed_cache_path(),
+        max_disk_entries=EMBED_CACHE_DISK_MAX,
+    )
+
+
+@registry.resource("ipc_collection")
+def _load_ipc_collection():
+    # 경로가 실제 존재하는지 체크 (디버깅용)
+    if not os.path.exists(ipc_db_path):
+        print(f"⚠️ 경고: IPC DB 경로를 찾을 수 없습니다: {ipc_db_path}")
+
+    # IPC 코드용 벡터 DB
+    if IPC_EMBEDDING == "local":
+        return open_vector_backend(
+            VECTOR_BACKEND,
+            chroma_path=ipc_db_path,
+            collection_name=IPC_LOCAL_COLLECTION_NAME,
+            mmap_path=os.path.join(BASE_DB_PATH, "ipc_local_mmap"),
+        )
+    return open_vector_backend(
+        VECTOR_BACKEND,
+        chroma_path=ipc_db_path,
+        collection_name=IPC_COLLECTION_NAME,
+        mmap_path=os.path.join(BASE_DB_PATH, "ipc_mmap"),
+    )
+
+
+def _ipc_max_distance(ipc_collection):
+    if IPC_MAX_DISTANCE:
+        return float(IPC_MAX_DISTANCE)
+    collection_name = IPC_LOCAL_COLLECTION_NAME if IPC_EMBEDDING == "local" else IPC_COLLECTION_NAME
+    max_distance = ipc_thresholds.get(collection_name)
+    if max_distance is not None:
+        return float(max_distance)
+    metadata = getattr(ipc_collection, "metadata", None) or {}
+    max_distance = metadata.get("pai:max_distance")
+    return float(max_distance) if max_distance is not None else None
+
+
+@registry.resource("doc_collection")
+def _load_doc_collection():
+    doc_mmap_options = {}
+    if VECTOR_COMPRESSION != "none":
+        doc_mmap_options = {
+            "compression": VECTOR_COMPRESSION,
+            "rescore_factor": VECTOR_RESCORE_FACTOR,
+        }
+
+    # 특허 청구항용 벡터 DB (열기 전 버전을 기록해 두고 _refresh_if_stale 에서 비교)
+    _loaded_doc_version["value"] = doc_versions.get("patent_claims")
+    doc_collection = open_vector_backend(
+        VECTOR_BACKEND,
+        chroma_path=doc_db_path,
+        collection_name="patent_claims",
+        mmap_path=os.path.join(BASE_DB_PATH, "doc_mmap"),
+        **doc_mmap_options,
+    )
+    if isinstance(doc_collection, MmapBackend) and doc_collection.source_version != _loaded_doc_version["value"]:
+        print(
+            f"⚠️ 경고: mmap 인덱스(버전 {doc_collection.source_version})가 patent_claims 버전 "
+            f"{_loaded_doc_version['value']} 보다 오래되었습니다. BM25/메타 저장소와 어긋날 수 있으니 다시 내보내세요."
+        )
+    return doc_collection
+
+
+@registry.resource("patent_bm25_index")
+def _load_patent_bm25_index():
+    if PATENT_LEXICAL_MODE != "global":
+        return None
+    if not os.path.exists(bm25_index_path):
+        print(f"⚠️ 경고: BM25 인덱스를 찾을 수 없어 local 모드로 동작합니다: {bm25_index_path}")
+        return None
+    return BM25Index.load(bm25_index_path)
+
+
+@registry.resource("ipc_hierarchy")
+def _load_ipc_hierarchy():
+    if not IPC_HIERARCHY_ENABLED:
+        return None
+    ipc_collection = registry.get("ipc_collection")
+    if ipc_collection.count() == 0:
+        return None
+    return load_or_build_ipc_hierarchy(ipc_collection, ipc_hierarchy_path)
+
+
+@registry.resource("ipc_dictionary")
+def _load_ipc_dictionary():
+    if not IPC_DICTIONARY_ENABLED:
+        return None
+    ipc_collection = registry.get("ipc_collection")
+    if ipc_collection.count() == 0:
+        return None
+    return load_or_build_ipc_dictionary(ipc_collection, ipc_dictionary_path)
+
+
+@registry.resource("patent_meta_store")
+def _load_patent_meta_store():
+    if not os.path.exists(patent_meta_path):
+        return None
+    return PatentMetaStore.load(patent_meta_path)
+
+
+@registry.resource("retrieval_cache")
+def _load_retrieval_cache():
+    if not RESULT_CACHE_ENABLED:
+        return None
+    os.makedirs(BASE_DB_PATH, exist_ok=True)
+    return RetrievalCache(
+        os.path.join(BASE_DB_PATH, "retrieval_cache.sqlite3"),
+        ttl_seconds=RESULT_CACHE_TTL,
+    )
+
+
+def _refresh_if_stale():
+    """
+    다른 프로세스가 patent_claims 에 증분 반영을 했으면 관련 리소스를 다음 사용 때 새로 로드하도록 비웁니다.
+    (버전 파일 stat 한 번, 바뀌지 않았으면 아무것도 하지 않음)
+    """
+    if not registry.is_loaded("doc_collection"):
+        return  # 처음 로드할 때 그 시점 버전을 기록함
+    version = doc_versions.get("patent_claims")
+    if version == _loaded_doc_version["value"]:
+        return
+    with _loaded_doc_version["lock"]:
+        if version == _loaded_doc_version["value"]:
+            return
+        _loaded_doc_version["value"] = version
+
+        doc_collection = registry.get("doc_collection")
+        if isinstance(doc_collection, MmapBackend):
+            # mmap 내보내기는 증분 반영이 들어가지 않는 스냅샷: BM25/메타만 새로 읽으면 벡터 쪽과 어긋나므로
+            # 세 인덱스 모두 내보낸 시점 그대로 서빙 (결과 캐시 키도 내보낸 버전 기준)
+            print(
+                f"⚠️ 경고: patent_claims 버전 {version} 이 mmap 인덱스(버전 {doc_collection.source_version})에 없습니다. "
+                "export_vector_backend 로 다시 내보낸 뒤 재시작해야 반영됩니다."
+            )
+            return
+
+        print(f"🔄 patent_claims 버전 {version}: 청구항 인덱스를 다시 로드합니다.")
+        # 로컬 Chroma 는 System 별로 HNSW 세그먼트를 캐시하므로 새 System 으로 열어야 새 청구항이 보임
+        # (기존 System 은 멈추지 않음 → 진행 중인 질의는 이전 핸들로 끝까지 실행)
+        detach_chroma_system(doc_db_path)
+        registry.reset("doc_collection")
+        registry.reset("patent_bm25_index")
+        registry.reset("patent_meta_store")
+
+
+def _doc_vector_mode(doc_collection):
+    # 결과 캐시 키 구분용 (압축 1차 검색 결과는 full 검색과 다를 수 있음)
+    doc_codes = getattr(doc_collection, "codes", None)
+    return doc_codes.method if doc_codes is not None else "full"
+
+
+def _cached_search(namespace, collection, params, compute):
+    """
+    retrieval_cache 가 켜져 있으면 (namespace, 컬렉션 버전, params) 기준으로 결과를 재사용합니다.
+    """
+    retrieval_cache = registry.get("retrieval_cache")
+    if retrieval_cache is None:
+        return compute()
+    return retrieval_cache.get_or_compute(
+        namespace, params, collection_version(collection), compute
+    )
+
+
+def warm_up():
+    """
+    서빙 시작 시 호출: 모든 리소스를 로드하고 더미 인코딩/질의로 모델과 인덱스 페이지를 미리 올립니다.
+    리소스별 로드 시간과 더미 질의 시간(초)을 반환합니다.
+    """
+    timings = registry.warm_up(
+        ["doc_model", "doc_collection", "ipc_collection", "patent_bm25_index",
+         "patent_meta_store", "retrieval_cache", "ipc_model", "ipc_hierarchy",
+         "ipc_dictionary"]
+    )
+
+    started = time.perf_counter()
+    query_emb = registry.get("doc_model").encode(["웜업"], show_progress_bar=False)
+    doc_collection = registry.get("doc_collection")
+    if doc_collection.count() > 0:
+        doc_collection.query(query_embeddings=query_emb.tolist(), n_results=1, include=["distances"])
+    registry.get("ipc_collection").count()
+    timings["dummy_query"] = time.perf_counter() - started
+    return timings
+
+
+# ---------------------------------------------------------
+# 1) 유사 특허 검색
+# ---------------------------------------------------------
+
+# 특허 검색 파라미터 안전 범위
+MAX_TOP_K = 30  # DB에서 가져올 최대 특허 수
+MAX_CLAIMS_PER_PATENT = 5  # 특허당 최대 청구항 수
+EXTRA_MARGIN = 10  # 검색 풀 크기를 조절하기 위한 여유분
+CLAIMS_PER_PATENT_POOL = 10  # 첫 후보 풀 크기 = top_k * 이 값 + EXTRA_MARGIN
+MIN_CANDIDATE_POOL = 50  # 첫 후보 풀 최소 청구항 수
+MAX_CANDIDATE_POOL = 800  # 후보 풀 확장 상한
+POOL_GROWTH = 2  # 서로 다른 특허가 top_k 개보다 적으면 후보 풀을 이 배수로 확장
+MAX_QUERY_VARIANTS = 3  # query_text 외에 함께 검색할 추가 표현 최대 개수
+
+
+# 재검색 안전장치 내부 helper 1
+def _normalize_top_k(raw_top_k: int | None) -> int:
+    """
+    top_k가 0이거나 너무 크더라도 안전한 범위 [1, MAX_TOP_K]로 잘라서 반환합니다.
+    """
+    if raw_top_k is None:
+        return 5
+    try:
+        value = int(raw_top_k)
+    except (TypeError, ValueError):
+        # 이상한 값이 들어오면 기본값
+        return 5
+
+    if value < 1:
+        return 1
+    if value > MAX_TOP_K:
+        return MAX_TOP_K
+    return value
+
+
+# 재검색 안전장치 내부 helper 2
+def _normalize_max_claims(raw_max_claims: int | None) -> int:
+    """
+    max_claims_per_patent를 [1, MAX_CLAIMS_PER_PATENT] 범위로 정규화합니다.
+    """
+    if raw_max_claims is None:
+        return 3
+    try:
+        value = int(raw_max_claims)
+    except (TypeError, ValueError):
+        return 3
+
+    if value < 1:
+        return 1
+    if value > MAX_CLAIMS_PER_PATENT:
+        return MAX_CLAIMS_PER_PATENT
+    return value
+
+
+# 재검색 안전장치 내부 helper 3
+def _build_query_list(query_text: str, query_variants: Optional[List[str]]) -> List[str]:
+    """
+    query_text + query_variants 를 정규화하고, 중복/빈 문자열 없이 합쳐 최대 1 + MAX_QUERY_VARIANTS 개로 자릅니다.
+    """
+    query_list = [normalize_text(query_text)]
+    seen = set(query_list)
+    for variant in query_variants or []:
+        if not isinstance(variant, str):
+            continue
+        cleaned = normalize_text(variant)
+        if not cleaned or cleaned in seen:
+            continue
+        seen.add(cleaned)
+        query_list.append(cleaned)
+        if len(query_list) > MAX_QUERY_VARIANTS:
+            break
+    return query_list
+
+
+def search_patents(
+    query_text: str,
+    query_variants: Optional[List[str]] = None,
+    top_k: int = 5,
+    max_claims_per_patent: int = 3,
+    exclude_patent_ids: Optional[List[str]] = None,
+) -> PatentSearchOutput:
+    """
+    특허 유사 검색 (툴: tool_search_patent_with_description)
+    """
+
+    # None 방지 (중복 제거 + 정렬해 캐시 키를 안정적으로)
+    exclude_patent_ids = sorted(set(exclude_patent_ids or []))
+    _refresh_if_stale()
+    doc_model = registry.get("doc_model")
+    doc_collection = registry.get("doc_collection")
+    patent_bm25_index = registry.get("patent_bm25_index")
+    patent_meta_store = registry.get("patent_meta_store")
+    safe_top_k = _normalize_top_k(top_k)
+    safe_max_claims = _normalize_max_claims(max_claims_per_patent)
+
+    # 1) 쿼리 리스트 구성 (원문 + 표현 변형)
+    query_list = _build_query_list(query_text, query_variants)
+
+    # 2) hybrid search 함수 호출
+    #    작은 후보 풀에서 시작해, 그룹화 후 서로 다른 특허가 top_k 개보다 적을 때만 풀을 넓힘
+    #    (제외 특허는 벡터 질의 where 필터로 내려보내므로 풀 크기에 더할 필요 없음)
+    def run_search(pool_size):
+        search_params = dict(
+            per_query_top_k=pool_size,
+            final_top_k=pool_size,
+            top_k=safe_top_k,
+            max_claims_per_patent=safe_max_claims,
+            vector_weight=0.7,
+            bm25_weight=0.3,
+        )
+        return _cached_search(
+            "patent_hybrid_search",
+            doc_collection,
+            {
+                "query_list": query_list,
+                "lexical": "global" if patent_bm25_index is not None else "local",
+                "vector": _doc_vector_mode(doc_collection),
+                "encoder": doc_model.model_id,
+                "exclude_patent_ids": exclude_patent_ids,
+                **search_params,
+            },
+            lambda: patent_hybrid_search(
+                collection=doc_collection,
+                model=doc_model,
+                query_list=query_list,
+                bm25_index=patent_bm25_index,
+                exclude_patent_ids=exclude_patent_ids,
+                **search_params,
+            ),
+        )
+
+    # raw_results: [{ "patent_id": ..., "score": ..., "top_claim": ...,
+    #                 "top_claim_no": ..., "claims_found": ..., "claims": [...] }, ...]
+    raw_results, _ = search_with_growing_pool(
+        run_search,
+        top_k=safe_top_k,
+        pool_size=max(MIN_CANDIDATE_POOL, safe_top_k * CLAIMS_PER_PATENT_POOL + EXTRA_MARGIN),
+        max_pool_size=MAX_CANDIDATE_POOL,
+        growth=POOL_GROWTH,
+        collection_size=doc_collection.count,
+    )
+
+    # 3) exclude_patent_ids 적용 (where 필터로 이미 제외되지만 안전장치로 한 번 더)
+    excluded = set(exclude_patent_ids)
+    filtered = [r for r in raw_results if r.get("patent_id") not in excluded]
+
+    # 4) 상위 top_k만 사용
+    filtered = filtered[:safe_top_k]
+
+    # 5) raw dict → Pydantic 스키마로 매핑
+    results: List[PatentSearchResult] = []
+
+    for idx, item in enumerate(filtered):
+        # 청구항 메타데이터에 title 이 없으면(특허 필드를 분리해 내보낸 경우) 저장소에서 보강
+        patent_title = ""
+        if patent_meta_store is not None:
+            patent_title = patent_meta_store.field(item.get("patent_id", ""), "title")
+
+        claim_snippets: List[PatentClaimSnippet] = []
+        for c in item.get("claims", []):
+            claim_snippets.append(
+                PatentClaimSnippet(
+                    id=c.get("id", ""),
+                    document=c.get("document", ""),
+                    title=c.get("title", "") or patent_title,
+                    distance=float(c.get("distance", 0.0)),
+                    hybrid_score=float(c.get("hybrid_score", 0.0)),
+                )
+            )
+
+        result_obj = PatentSearchResult(
+            patent_id=item.get("patent_id", ""),
+            score=float(item.get("score", 0.0)),
+            top_claim=item.get("top_claim", ""),
+            top_claim_no=int(item.get("top_claim_no", 0)),
+            claims_found=int(item.get("claims_found", len(claim_snippets))),
+            claims=claim_snippets,
+            result_index=idx + 1,
+        )
+        results.append(result_obj)
+
+    # 6) 최종 출력 스키마 구성
+    output = PatentSearchOutput(
+        query_text=query_text,
+        top_k=len(results),
+        results=results,
+    )
+
+    return output
+
+
+# ---------------------------------------------------------
+# 2) 출원번호로 특허 검색
+# ---------------------------------------------------------
+
+
+def normalize_korean_patent_id(patent_id: str) -> str:
+    """
+    한국 출원번호 입력을 DB에서 사용하는 형식으로 정규화합니다.
+
+    지원 예시:
+    - '1020050108060'          -> '1020050108060'
+    - '10-2005-0108060'        -> '1020050108060'
+    - '10 2005 0108060'        -> '1020050108060'
+    - '10/2005/0108060'        -> '1020050108060'
+
+    기본 규칙:
+    1) 먼저 'NN-YYYY-NNNNNNN' 패턴을 우선적으로 인식해서 13자리로 맞추고,
+    2) 그 외에는 숫자만 남기고, 13자리면 그대로 사용합니다.
+    3) 그 외 길이/형식은 그대로 반환하거나, 필요하면 빈 문자열을 반환해
+       "DB에 없다" 쪽으로 처리되게 할 수 있습니다.
+    """
+    if not patent_id:
+        return ""
+
+    s = patent_id.strip()
+
+    # 1) 정형 패턴: 2자리 + 구분자 + 4자리 + 구분자 + 5~7자리
+    #    예: '10-2005-0108060', '10 2005 108060', '10/2005/108060'
+    m = re.match(r"^\s*(\d{2})\D+(\d{4})\D+(\d{5,7})\s*$", s)
+    if m:
+        kind = m.group(1)  # 10, 20, 30 등
+        year = m.group(2)  # 2005
+        serial = m.group(3)  # 0108060 또는 108060 같은 것
+        # 일단 7자리로 zero-padding (선행 0이 빠졌을 가능성 고려)
+        serial = serial.zfill(7)
+        return f"{kind}{year}{serial}"
+
+    # 2) 그 외에는 숫자만 남긴다
+    digits = re.sub(r"\D", "", s)
+
+    # 13자리면 이미 우리가 쓰는 형식이라고 보고 그대로 사용
+    if len(digits) == 13:
+        return digits
+
+    # 그 외 길이는 애매하므로 그대로 돌려보내거나
+    # 필요하면 추가 규칙(예: 11자리면 앞에 '10' 붙이기 등)을 추가할 수 있다.
+    return digits
+
+
+def _patent_not_found(patent_id: str) -> PatentByIdOutput:
+    return PatentByIdOutput(
+        patent_id=patent_id,
+        found=False,
+        title="",
+        priority="",
+        register_status="",
+        ipc_raw="",
+        ipc_codes=[],
+        link="",
+        num_claims=0,
+        claims=[],
+    )
+
+
+def _detail_from_meta_store(patent_id: str, max_claims: int) -> PatentByIdOutput:
+    """
+    특허 메타데이터 저장소 기반 상세 조회.
+    메타데이터/IPC 코드/청구항 번호는 저장소에서, 청구항 본문은 id 로 필요한 개수만 가져옵니다.
+    """
+    info = registry.get("patent_meta_store").get(patent_id)
+    if info is None:
+        return _patent_not_found(patent_id)
+
+    claim_ids = info["claim_ids"]
+    claim_nos = info["claim_nos"]
+    # max_claims 적용 (0이면 전체) — claim_no 순으로 이미 정렬되어 있음
+    if max_claims > 0:
+        claim_ids = claim_ids[:max_claims]
+        claim_nos = claim_nos[:max_claims]
+
+    raw = registry.get("doc_collection").get(ids=claim_ids, include=["documents"])
+    doc_by_id = dict(zip(raw.get("ids", []), raw.get("documents", [])))
+
+    claim_models: List[PatentClaimFull] = [
+        PatentClaimFull(claim_no=claim_no, text=doc_by_id.get(claim_id) or "")
+        for claim_id, claim_no in zip(claim_ids, claim_nos)
+    ]
+
+    return PatentByIdOutput(
+        patent_id=patent_id,
+        found=True,
+        title=info.get("title", ""),
+        priority=info.get("priority", ""),
+        register_status=info.get("register", ""),
+        ipc_raw=info.get("ipc", ""),
+        ipc_codes=info["ipc_codes"],
+        link=info.get("link", ""),
+        num_claims=len(claim_models),
+        claims=claim_models,
+    )
+
+
+def get_patent_detail(
+    patent_id: str,
+    max_claims: int = 0,
+) -> PatentByIdOutput:
+    """
+    출원번호 기반 특허 상세 조회 (툴: tool_search_detail_patent_by_id)
+    """
+    # 1) 입력 출원번호 정규화 (공백 제거 등)
+    original_input = patent_id.strip()
+    normalized_id = normalize_korean_patent_id(original_input)
+
+    # 빈 문자열 방어
+    if not normalized_id:
+        return _patent_not_found(original_input)
+    _refresh_if_stale()
+
+    # 2-a) 메타데이터 저장소가 있으면 patent_id 로 바로 조회하고, 필요한 청구항 본문만 id 로 가져옴
+    if registry.get("patent_meta_store") is not None:
+        return _detail_from_meta_store(normalized_id, max_claims)
+
+    # 2-b) 저장소가 없으면 Chroma get() + where 필터로 메타데이터 기반 조회
+    raw = registry.get("doc_collection").get(
+        where={"patent_id": normalized_id},
+        include=["metadatas", "documents"],
+    )
+
+    ids = raw.get("ids", [])
+    docs = raw.get("documents", [])
+    metas = raw.get("metadatas", [])
+
+    if not ids:
+        # 이 DB 범위 안에 해당 출원번호가 없는 경우
+        return _patent_not_found(normalized_id)
+
+    # 3) 메타데이터에서 claim_no, title, priority, register, link, ipc 추출해서 정리
+    claim_items = []
+
+    title_candidates = []
+    priority_candidates = []
+    register_candidates = []
+    link_candidates = []
+    ipc_candidates = []
+
+    for doc_text, meta in zip(docs, metas):
+        # claim_no 파싱 (없거나 형식 이상하면 큰 숫자로 처리해서 뒤로 밀기)
+        raw_claim_no = meta.get("claim_no", None)
+        try:
+            claim_no = int(raw_claim_no)
+        except (TypeError, ValueError):
+            claim_no = 999_999
+
+        # 공통 메타데이터 후보 수집
+        title_val = meta.get("title", "")
+        if title_val:
+            title_candidates.append(title_val)
+
+        priority_val = meta.get("priority", "")
+        if priority_val:
+            priority_candidates.append(priority_val)
+
+        register_val = meta.get("register", "")
+        if register_val:
+            register_candidates.append(register_val)
+
+        link_val = meta.get("link", "")
+        if link_val:
+            link_candidates.append(link_val)
+
+        ipc_val = meta.get("ipc", "")
+        if ipc_val:
+            ipc_candidates.append(ipc_val)
+
+        claim_items.append(
+            {
+                "claim_no": claim_no,
+                "text": doc_text or "",
+            }
+        )
+
+    # 4) 대표 메타데이터 선택 함수
+    def pick_first_non_empty(values):
+        for v in values:
+            if isinstance(v, str) and v.strip():
+                return v.strip()
+        return ""
+
+    title_value = pick_first_non_empty(title_candidates)
+    priority_value = pick_first_non_empty(priority_candidates)
+    register_value = pick_first_non_empty(register_candidates)
+    link_value = pick_first_non_empty(link_candidates)
+    ipc_raw_value = pick_first_non_empty(ipc_candidates)
+
+    # 5) IPC 코드 파싱 (쉼표/세미콜론 기준 분리 + 공백 정리)
+    ipc_codes_list: List[str] = parse_ipc_codes(ipc_raw_value)
+
+    # 6) claim_no 기준으로 정렬
+    claim_items_sorted = sorted(
+        claim_items,
+        key=lambda x: x["claim_no"],
+    )
+
+    # 7) max_claims 적용 (0이면 전체)
+    if max_claims > 0:
+        claim_items_sorted = claim_items_sorted[:max_claims]
+
+    # 8) Pydantic 모델로 변환
+    claim_models: List[PatentClaimFull] = [
+        PatentClaimFull(
+            claim_no=item["claim_no"],
+            text=item["text"],
+        )
+        for item in claim_items_sorted
+    ]
+
+    return PatentByIdOutput(
+        patent_id=normalized_id,
+        found=True,
+        title=title_value,
+        priority=priority_value,
+        register_status=register_value,
+        ipc_raw=ipc_raw_value,
+        ipc_codes=ipc_codes_list,
+        link=link_value,
+        num_claims=len(claim_models),
+        claims=claim_models,
+    )
+
+
+# ---------------------------------------------------------
+# 3) 기술 설명 → IPC 추천
+# ---------------------------------------------------------
+
+
+def search_ipc_codes(
+    tech_texts: List[str],
+    top_k: int = 5,
+) -> IPCMainDescription:
+    """
+    기술 설명 → IPC 추천 (툴: tool_search_ipc_code_with_description)
+    """
+    ipc_collection = registry.get("ipc_collection")
+    max_distance = _ipc_max_distance(ipc_collection)
+    result = _cached_search(
+        "search_ipc_with_query",
+        ipc_collection,
+        # 컷오프가 바뀌면(--write-threshold) 이전 결과를 쓰지 않도록 키에 포함
+        {"tech_texts": tech_texts, "top_k": top_k, "embedding": IPC_EMBEDDING, "max_distance": max_distance},
+        lambda: search_ipc_with_query(
+            registry.get("ipc_model"),
+            ipc_collection,
+            tech_texts,
+            top_k,
+            hierarchy=registry.get("ipc_hierarchy"),
+            dictionary=registry.get("ipc_dictionary"),
+            max_distance=max_distance,
+        ),
+    )
+    # result는 {"mains": [...], "subs": [...]} 형태의 dict라고 가정
+    return IPCMainDescription(**result)
+
+
+# ---------------------------------------------------------
+# 4) IPC 코드 → 상세 설명
+# ---------------------------------------------------------
+
+
+def get_ipc_details(codes: List[str]) -> List[IPCDetailInfo]:
+    """
+    IPC 코드 → 상세 설명 (툴: tool_search_ipc_description_from_code)
+    """
+    # 1) 코드 문자열 전처리: 공백 제거, 빈 문자열 제거
+    #    (코드 사전이 있으면 "G06T 7/00" / "G06T7/00" 같은 표기 차이는 사전 조회 시 정규화됨)
+    cleaned_codes: List[str] = []
+    for c in codes:
+        if not c:
+            continue
+        normalized = c.strip().replace(" ", "")
+        if normalized:
+            cleaned_codes.append(normalized)
+
+    if not cleaned_codes:
+        # LLM이 잘못 호출한 경우에도 최소한 빈 리스트를 반환
+        return []
+
+    # 2) 코드 사전에서 조회 (없으면 벡터 DB 에서 상세 정보 조회)
+    ipc_dictionary = registry.get("ipc_dictionary")
+    if ipc_dictionary is not None:
+        raw_results = get_ipc_detail_data_from_code(None, cleaned_codes, ipc_dictionary)
+    else:
+        raw_results = get_ipc_detail_data_from_code(registry.get("ipc_collection"), cleaned_codes)
+
+    # 3) 결과를 Pydantic 모델로 감싸서 반환
+    parsed_results: List[IPCDetailInfo] = []
+    for item in raw_results:
+        parsed_results.append(IPCDetailInfo(**item))
+
+    return parsed_results
+
+
+# 검색 서버(run_retrieval_server)가 노출하는 연산 이름 → 함수
+OPERATIONS = {
+    "search_patents": search_patents,
+    "get_patent_detail": get_patent_detail,
+    "search_ipc_codes": search_ipc_codes,
+    "get_ipc_details": get_ipc_details,
+}
@@ -0,0 +1,258 @@
+import hashlib
+
+import numpy as np
+
+# ✅ 상수 설정
+DEFAULT_DIM = 256  # 해싱 임베더 차원
+DEFAULT_VOCAB_SIZE = 20000  # 전역 어휘 수
+CLAIMS_PER_PATENT = 10
+IPC_SUBCLASSES = 64  # 합성 IPC 서브클래스 수 (A01B 형태)
+GROUPS_PER_SUBCLASS = 6  # 서브클래스당 메인그룹 수 (kind "m")
+SUBGROUPS_PER_GROUP = 3  # 메인그룹당 서브그룹 수 (kind "1")
+LEAF_TOPIC_WORDS = 30  # IPC 코드(그룹/서브그룹)별 주제어 수
+SUBCLASS_TOPIC_WORDS = 60  # 서브클래스 공통 주제어 수
+CLAIM_LENGTH = (20, 60)  # 청구항 토큰 수 범위
+TOPIC_MIX = (0.5, 0.2)  # 청구항 토큰 중 (코드 주제어, 서브클래스 주제어) 비율, 나머지는 전역 Zipf 어휘
+ZIPF_EXPONENT = 1.1
+
+SECTIONS = "ABCDEFGH"
+SUBCLASS_LETTERS = "ABCDEFGHJKLMNPQRSTUVWXYZ"
+
+
+class HashingEncoder:
+    """
+    네트워크/GPU 없이 쓰는 결정적 대체 임베더 (벤치마크 전용).
+
+    토큰마다 해시로 두 개의 (차원, 부호)를 정해 더한 뒤 L2 정규화합니다. (feature hashing)
+    토큰이 많이 겹칠수록 가까워지므로 합성 코퍼스에서 의미 있는 최근접 이웃이 생깁니다.
+    문서 인코더와 같은 encode(texts, **kwargs) → float32 (n, dim) 인터페이스입니다.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM, seed=0):
+        self.dim = dim
+        self.seed = seed
+        self.model_id = f"hashing:{dim}:{seed}"
+        self._key = str(seed).encode("utf-8")
+        self._features = {}  # 토큰 → (차원1, 부호1, 차원2, 부호2)
+
+    def _token_features(self, token):
+        features = self._features.get(token)
+        if features is None:
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8, key=self._key).digest()
+            h = int.from_bytes(digest, "little")
+            features = (
+                h % self.dim,
+                1.0 if (h >> 31) & 1 else -1.0,
+                (h >> 32) % self.dim,
+                1.0 if (h >> 63) & 1 else -1.0,
+            )
+            self._features[token] = features
+        return features
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            for token in (text or "").split():
+                col1, sign1, col2, sign2 = self._token_features(token)
+                rows += (row, row)
+                cols += (col1, col2)
+                values += (sign1, sign2)
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)),
+                  np.asarray(values, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def __call__(self, input):
+        # chromadb 임베딩 함수 / ipc_func 의 ipc_model(texts) 호출 형태
+        return self.encode(list(input))
+
+
+def _subclass_code(index):
+    section = SECTIONS[index % len(SECTIONS)]
+    class_no = 1 + (index // len(SECTIONS)) % 99
+    letter = SUBCLASS_LETTERS[(index // (len(SECTIONS) * 99)) % len(SUBCLASS_LETTERS)]
+    return section, f"{section}{class_no:02d}", f"{section}{class_no:02d}{letter}"
+
+
+class SyntheticCorpus:
+    """
+    결정적 합성 특허 코퍼스 (청구항 + IPC 코드).
+
+    - IPC: 서브클래스 × 메인그룹(kind "m") × 서브그룹(kind "1") 트리, path 는 "A > A01 > A01B > A01B 1/00" 형식
+    - 특허마다 IPC 코드 하나(Zipf)를 정하고, 청구항은 그 코드의 주제어 / 서브클래스 주제어 / 전역 Zipf 어휘를 섞어 생성
+    - 특허 p 의 내용은 (seed, p) 만으로 정해지므로 어떤 순서/배치 크기로 읽어도 같은 코퍼스
+    """
+
+    def __init__(self, n_claims, claims_per_patent=CLAIMS_PER_PATENT, vocab_size=DEFAULT_VOCAB_SIZE,
+                 n_subclasses=IPC_SUBCLASSES, seed=0):
+        self.n_claims = n_claims
+        self.claims_per_patent = claims_per_patent
+        self.n_patents = -(-n_claims // claims_per_patent)
+        self.vocab_size = vocab_size
+        self.seed = seed
+
+        rng = np.random.default_rng([seed, 0])
+        self.vocab = np.array([f"w{i}" for i in range(vocab_size)], dtype=object)
+        ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+        self.zipf_p = ranks ** -ZIPF_EXPONENT
+        self.zipf_p /= self.zipf_p.sum()
+
+        # IPC 트리 + 코드별 주제어 (흔한 어휘 상위 10% 는 주제어에서 제외)
+        topic_pool = np.arange(vocab_size // 10, vocab_size)
+        self.ipc_codes, self.ipc_kinds, self.ipc_paths, self.ipc_topics = [], [], [], []
+        self.ipc_subclass_topics = []
+        self.ipc_subclass_of = []
+        for s in range(n_subclasses):
+            section, class_code, subclass = _subclass_code(s)
+            self.ipc_subclass_topics.append(rng.choice(topic_pool, size=SUBCLASS_TOPIC_WORDS, replace=False))
+            for g in range(1, GROUPS_PER_SUBCLASS + 1):
+                main = f"{subclass} {g}/00"
+                base_path = f"{section} > {class_code} > {subclass}"
+                group_topics = rng.choice(topic_pool, size=LEAF_TOPIC_WORDS, replace=False)
+                self._add_ipc(main, "m", f"{base_path} > {main}", group_topics, s)
+                for j in range(1, SUBGROUPS_PER_GROUP + 1):
+                    sub = f"{subclass} {g}/{j * 2:02d}"
+                    # 서브그룹 주제어 절반은 메인그룹과 공유 (계층 병합이 일어나도록)
+                    topics = np.concatenate([
+                        group_topics[:LEAF_TOPIC_WORDS // 2],
+                        rng.choice(topic_pool, size=LEAF_TOPIC_WORDS - LEAF_TOPIC_WORDS // 2, replace=False),
+                    ])
+                    self._add_ipc(sub, "1", f"{base_path} > {main} > {sub}", topics, s)
+
+        leaf_ranks = np.arange(1, len(self.ipc_codes) + 1, dtype=np.float64)
+        self.ipc_p = leaf_ranks ** -0.8
+        self.ipc_p /= self.ipc_p.sum()
+        self.ipc_p = self.ipc_p[rng.permutation(len(self.ipc_codes))]
+
+    def _add_ipc(self, code, kind, path, topics, subclass_index):
+        self.ipc_codes.append(code)
+        self.ipc_kinds.append(kind)
+        self.ipc_paths.append(path)
+        self.ipc_topics.append(topics)
+        self.ipc_subclass_of.append(subclass_index)
+
+    # ---------------------------------------------------------
+    # 특허 / 청구항
+    # ---------------------------------------------------------
+    def patent_id(self, p):
+        return f"9{self.seed % 100:02d}{p:010d}"
+
+    def patent(self, p):
+        """
+        특허 p 의 (patent_id, ipc 인덱스, 청구항 본문 리스트)
+        """
+        rng = np.random.default_rng([self.seed, 1, p])
+        ipc = int(rng.choice(len(self.ipc_codes), p=self.ipc_p))
+        leaf_topics = self.ipc_topics[ipc]
+        subclass_topics = self.ipc_subclass_topics[self.ipc_subclass_of[ipc]]
+
+        n_claims = min(self.claims_per_patent, self.n_claims - p * self.claims_per_patent)
+        lengths = rng.integers(CLAIM_LENGTH[0], CLAIM_LENGTH[1] + 1, size=n_claims)
+        total = int(lengths.sum())
+        source = rng.random(total)
+        tokens = np.where(
+            source < TOPIC_MIX[0],
+            rng.choice(leaf_topics, size=total),
+            np.where(
+                source < TOPIC_MIX[0] + TOPIC_MIX[1],
+                rng.choice(subclass_topics, size=total),
+                rng.choice(self.vocab_size, size=total, p=self.zipf_p),
+            ),
+        )
+        words = self.vocab[tokens]
+        bounds = np.concatenate(([0], np.cumsum(lengths)))
+        claims = [" ".join(words[bounds[i]:bounds[i + 1]]) for i in range(n_claims)]
+        return self.patent_id(p), ipc, claims
+
+    def iter_claims(self, start, stop):
+        """
+        청구항 row [start, stop) 를 (id, 본문, 메타데이터) 로 생성합니다.
+        """
+        cpp = self.claims_per_patent
+        for p in range(start // cpp, -(-stop // cpp)):
+            patent_id, ipc, claims = self.patent(p)
+            code = self.ipc_codes[ipc]
+            title = " ".join(self.vocab[self.ipc_topics[ipc][:4]])
+            for claim_no, text in enumerate(claims, start=1):
+                row = p * cpp + claim_no - 1
+                if start <= row < stop:
+                    yield f"{patent_id}_{claim_no}", text, {
+                        "patent_id": patent_id,
+                        "claim_no": claim_no,
+                        "title": title,
+                        "ipc": code,
+                    }
+
+    # ---------------------------------------------------------
+    # 질의
+    # ---------------------------------------------------------
+    def sample_queries(self, n, seed=1):
+        """
+        벤치마크 질의: 임의 특허 청구항의 일부 토큰 + 잡음 어휘 (patent_id 는 출처 특허),
+        IPC 키워드 3개는 출처 특허 IPC 코드의 주제어 묶음.
+        """
+        rng = np.random.default_rng([self.seed, 2, seed])
+        queries = []
+        for p in rng.choice(self.n_patents, size=n, replace=self.n_patents < n):
+            patent_id, ipc, claims = self.patent(int(p))
+            tokens = claims[int(rng.integers(len(claims)))].split()
+            keep = np.sort(rng.choice(len(tokens), size=max(4, int(len(tokens) * 0.4)), replace=False))
+            noise = self.vocab[rng.choice(self.vocab_size, size=2, p=self.zipf_p)]
+            topics = self.vocab[rng.permutation(self.ipc_topics[ipc])]
+            queries.append({
+                "text": " ".join([tokens[i] for i in keep] + list(noise)),
+                "patent_id": patent_id,
+                "keywords": [" ".join(topics[i:i + 3]) for i in (0, 3, 6)],
+            })
+        return queries
+
+
+class SyntheticCollection:
+    """
+    SyntheticCorpus 를 Chroma 컬렉션처럼 읽게 해 주는 어댑터.
+    (export_chroma_collection / build_bm25_index / IpcHierarchy.from_collection 등 기존 빌더에 그대로 전달)
+    embeddings 가 include 에 있으면 encoder 로 그때그때 인코딩합니다.
+    """
+
+    def __init__(self, name, count, rows_fn, encoder, space="cosine"):
+        self.name = name
+        self._count = count
+        self._rows_fn = rows_fn  # (start, stop) → (id, 본문, 메타데이터) iterator
+        self.encoder = encoder
+        self.metadata = {"hnsw:space": space}
+
+    @classmethod
+    def claims(cls, corpus, encoder, space="cosine"):
+        return cls("patent_claims", corpus.n_claims, corpus.iter_claims, encoder, space)
+
+    @classmethod
+    def ipc(cls, corpus, encoder, space="cosine"):
+        def rows(start, stop):
+            for i in range(start, min(stop, len(corpus.ipc_codes))):
+                topics = corpus.vocab[corpus.ipc_topics[i][:12]]
+                yield corpus.ipc_codes[i], " ".join(topics), {
+                    "kind": corpus.ipc_kinds[i],
+                    "path": corpus.ipc_paths[i],
+                }
+
+        return cls("ipc_clean", len(corpus.ipc_codes), rows, encoder, space)
+
+    def count(self):
+        return self._count
+
+    def get(self, ids=None, include=("metadatas", "documents"), limit=None, offset=None, **kwargs):
+        start = offset or 0
+        stop = self._count if limit is None else min(self._count, start + limit)
+        rows = list(self._rows_fn(start, stop))
+        batch = {"ids": [row[0] for row in rows]}
+        if "documents" in include:
+            batch["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            batch["metadatas"] = [row[2] for row in rows]
+        if "embeddings" in include:
+            batch["embeddings"] = self.encoder.encode(batch.get("documents") or [row[1] for row in rows])
+        return batch
@@ -23,6 +23,15 @@ class PatentSearchInput(BaseModel):
             "불필요한 배경 설명보다는 발명의 차별화 포인트가 잘 드러나도록 작성하는 것이 좋다."
         ),
     )
+    query_variants: List[str] = Field(
+        default_factory=list,
+        description=(
+            "query_text 와 같은 발명을 다른 표현으로 바꿔 쓴 추가 검색 문장 목록(선택). "
+            "예: 핵심 구성요소 위주 문장, 효과/목적 위주 문장, 동의어로 바꾼 문장 등. "
+            "query_text 와 함께 한 번에 임베딩·검색되며, 쿼리별 결과를 z-score 로 융합해 "
+            "표현 차이로 놓치는 특허를 줄인다. 최대 3개까지만 사용되며, 비어 있으면 query_text 만 사용한다."
+        ),
+    )
     top_k: int = Field(
         5,
         description=(
@@ -1,119 +1,93 @@
 from typing import List, Optional
 
+import contextlib
 import os
-import chromadb
-import re
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
 from langchain_core.tools import tool
-from dotenv import load_dotenv
-import torch
-from django.conf import settings  # [추가] Django 설정 가져오기
 
 # [수정] 같은 패키지 내 파일들은 점(.)을 찍어서 상대 경로로 import
+from .cassette import get_cassette
+from .metrics import metrics
+from .tracing import NULL_SPAN, span
 from .total_schemas import (
     IPCCodeInput,
     IPCDetailInfo,
     IPCKeywordInput,
     IPCMainDescription,
     PatentSearchInput,
-    PatentClaimSnippet,
-    PatentSearchResult,
     PatentSearchOutput,
     PatentByIdInput,
-    PatentClaimFull,
     PatentByIdOutput,
 )
-from .ipc_func import get_ipc_detail_data_from_code, search_ipc_with_query
-from .doc_func import patent_hybrid_search
 
 # =========================================================
-# 공용 리소스 초기화
+# 검색 연산 연결
 # =========================================================
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+# RETRIEVAL_SERVER_SOCKET 이 설정되면 모델/인덱스를 이 프로세스에 올리지 않고
+# manage.py run_retrieval_server 로 띄운 검색 서버(Unix 소켓)에 연산을 위임합니다.
+# 설정이 없으면 retrieval_service 를 같은 프로세스에서 직접 사용합니다.
+# (모델/인덱스는 첫 툴 호출 또는 서빙 시작 시 warm-up 에서 로드)
+RETRIEVAL_SERVER_SOCKET = os.getenv("RETRIEVAL_SERVER_SOCKET", "")
+RETRIEVAL_SERVER_TIMEOUT = float(os.getenv("RETRIEVAL_SERVER_TIMEOUT", "60"))
+TOOL_METRIC = "pai_tool_duration_seconds"  # 도구별 소요 시간 히스토그램 (/metrics)
 
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+_retrieval_backend = None
 
-ipc_model = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=OPENAI_API_KEY,
-    model_name="text-embedding-3-small",
-)
-
-doc_model = SentenceTransformer("dragonkue/BGE-m3-ko").to(device)
 
-# [중요 수정] Django BASE_DIR을 기준으로 절대 경로 생성
-# 가정: manage.py와 같은 레벨에 'db_search' 폴더가 있음
-BASE_DB_PATH = os.path.join(settings.BASE_DIR, "db_search")
+def _retrieval():
+    """
+    검색 연산 제공자 (RetrievalClient 또는 retrieval_service 모듈). 처음 호출될 때 한 번만 만듭니다.
+    PAI_CASSETTE_MODE 가 켜져 있으면 카세트로 감싸 기록/재생합니다. (재생 시에는 실제 검색을 만들지 않음)
+    """
+    global _retrieval_backend
+    cassette = get_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        return cassette.retrieval(None)
 
-ipc_db_path = os.path.join(BASE_DB_PATH, "ipc_db")
-doc_db_path = os.path.join(BASE_DB_PATH, "doc_db")
+    if _retrieval_backend is None:
+        if RETRIEVAL_SERVER_SOCKET:
+            from .retrieval_server import RetrievalClient
 
-# 경로가 실제 존재하는지 체크 (디버깅용)
-if not os.path.exists(ipc_db_path):
-    print(f"⚠️ 경고: IPC DB 경로를 찾을 수 없습니다: {ipc_db_path}")
+            _retrieval_backend = RetrievalClient(
+                RETRIEVAL_SERVER_SOCKET, timeout=RETRIEVAL_SERVER_TIMEOUT
+            )
+        else:
+            from . import retrieval_service
 
-# IPC 코드용 벡터 DB
-ipc_client = chromadb.PersistentClient(path=ipc_db_path)
-ipc_collection = ipc_client.get_collection(name="ipc_clean")
+            _retrieval_backend = retrieval_service
+    if cassette is not None:
+        return cassette.retrieval(_retrieval_backend)
+    return _retrieval_backend
 
-# 특허 청구항용 벡터 DB
-doc_client = chromadb.PersistentClient(path=doc_db_path)
-doc_collection = doc_client.get_collection(name="patent_claims")
 
-# ---------------------------------------------------------
-# 1) 유사 특허 검색 툴
-# ---------------------------------------------------------
+@contextlib.contextmanager
+def _traced_tool(name, **attrs):
+    """
+    /metrics 의 도구별 히스토그램 + 요청 trace 의 도구 span (출력 크기는 _record_output 으로 기록)
+    """
+    with metrics.timer(TOOL_METRIC, tool=name), span(f"tool:{name}", **attrs) as sp:
+        yield sp
 
-# 특허 검색 파라미터 안전 범위
-MAX_TOP_K = 30  # DB에서 가져올 최대 특허 수
-MAX_CLAIMS_PER_PATENT = 5  # 특허당 최대 청구항 수
-EXTRA_MARGIN = 10  # 검색 풀 크기를 조절하기 위한 여유분
 
+def _record_output(sp, result):
+    # ToolNode 가 LLM 에 넘길 JSON 크기 (trace 가 켜져 있을 때만 계산)
+    if sp is not NULL_SPAN:
+        items = result if isinstance(result, list) else [result]
+        sp.set(output_chars=sum(
+            len(item.model_dump_json()) if hasattr(item, "model_dump_json") else len(str(item)) for item in items
+        ))
+    return result
 
-# 재검색 안전장치 내부 helper 1
-def _normalize_top_k(raw_top_k: int | None) -> int:
-    """
-    top_k가 0이거나 너무 크더라도 안전한 범위 [1, MAX_TOP_K]로 잘라서 반환합니다.
-    """
-    if raw_top_k is None:
-        return 5
-    try:
-        value = int(raw_top_k)
-    except (TypeError, ValueError):
-        # 이상한 값이 들어오면 기본값
-        return 5
-
-    if value < 1:
-        return 1
-    if value > MAX_TOP_K:
-        return MAX_TOP_K
-    return value
-
-
-# 재검색 안전장치 내부 helper 2
-def _normalize_max_claims(raw_max_claims: int | None) -> int:
-    """
-    max_claims_per_patent를 [1, MAX_CLAIMS_PER_PATENT] 범위로 정규화합니다.
-    """
-    if raw_max_claims is None:
-        return 3
-    try:
-        value = int(raw_max_claims)
-    except (TypeError, ValueError):
-        return 3
 
-    if value < 1:
-        return 1
-    if value > MAX_CLAIMS_PER_PATENT:
-        return MAX_CLAIMS_PER_PATENT
-    return value
+# ---------------------------------------------------------
+# 1) 유사 특허 검색 툴
+# ---------------------------------------------------------
 
 
 @tool(args_schema=PatentSearchInput)
 def tool_search_patent_with_description(
     query_text: str,
+    query_variants: Optional[List[str]] = None,
     top_k: int = 5,
     max_claims_per_patent: int = 3,
     exclude_patent_ids: Optional[List[str]] = None,
@@ -136,6 +110,11 @@ def tool_search_patent_with_description(
         *이미 LLM이 추출/정제한 핵심 기술 문장*을 넣는 것을 권장합니다.
         (예: "사용자와의 거리 변화에 따라 자동으로 곡률이 바뀌는 디스플레이 장치")
 
+    - query_variants:
+        같은 아이디어를 다른 관점/표현으로 바꿔 쓴 추가 검색 문장들(선택, 최대 3개).
+        query_text 와 함께 한 번의 배치 질의로 검색되어 결과가 융합됩니다.
+        (예: ["곡률 가변형 디스플레이 패널", "시청 거리 기반 화면 휨 제어"])
+
     - top_k:
         최종적으로 사용자에게 보여줄 "특허 개수"입니다.
         사용자가 "상위 5개", "10개 정도"라고 말하면 그 값을 사용하고,
@@ -150,74 +129,16 @@ def tool_search_patent_with_description(
         이전 턴에서 이미 보여준 특허를 다시 보여주지 않거나,
         사용자가 "2번/4번은 빼고 다시 찾아줘"라고 했을 때 활용합니다.
     """
-
-    # None 방지
-    exclude_patent_ids = exclude_patent_ids or []
-    safe_top_k = _normalize_top_k(top_k)
-    safe_max_claims = _normalize_max_claims(max_claims_per_patent)
-    search_pool_size = safe_top_k + len(exclude_patent_ids) + EXTRA_MARGIN
-    per_query_top_k = max(200, search_pool_size)
-    final_top_k = max(200, search_pool_size)
-
-    # 1) 쿼리 리스트 구성
-    query_list = [query_text]
-
-    # 2) hybrid search 함수 호출
-    raw_results = patent_hybrid_search(
-        collection=doc_collection,
-        model=doc_model,
-        query_list=query_list,
-        per_query_top_k=per_query_top_k,
-        final_top_k=final_top_k,
-        top_k=top_k * 2,  # 먼저 넉넉히 가져와서 나중에 exclude + top_k 적용
-        max_claims_per_patent=safe_max_claims,
-        vector_weight=0.7,
-        bm25_weight=0.3,
-    )
-    # raw_results: [{ "patent_id": ..., "score": ..., "top_claim": ...,
-    #                 "top_claim_no": ..., "claims_found": ..., "claims": [...] }, ...]
-
-    # 3) exclude_patent_ids 적용
-    filtered = [r for r in raw_results if r.get("patent_id") not in exclude_patent_ids]
-
-    # 4) 상위 top_k만 사용
-    filtered = filtered[:safe_top_k]
-
-    # 5) raw dict → Pydantic 스키마로 매핑
-    results: List[PatentSearchResult] = []
-
-    for idx, item in enumerate(filtered):
-        claim_snippets: List[PatentClaimSnippet] = []
-        for c in item.get("claims", []):
-            claim_snippets.append(
-                PatentClaimSnippet(
-                    id=c.get("id", ""),
-                    document=c.get("document", ""),
-                    title=c.get("title", "") or "",
-                    distance=float(c.get("distance", 0.0)),
-                    hybrid_score=float(c.get("hybrid_score", 0.0)),
-                )
-            )
-
-        result_obj = PatentSearchResult(
-            patent_id=item.get("patent_id", ""),
-            score=float(item.get("score", 0.0)),
-            top_claim=item.get("top_claim", ""),
-            top_claim_no=int(item.get("top_claim_no", 0)),
-            claims_found=int(item.get("claims_found", len(claim_snippets))),
-            claims=claim_snippets,
-            result_index=idx + 1,
-        )
-        results.append(result_obj)
-
-    # 6) 최종 출력 스키마 구성
-    output = PatentSearchOutput(
-        query_text=query_text,
-        top_k=len(results),
-        results=results,
-    )
-
-    return output
+    with _traced_tool(
+        "tool_search_patent_with_description", queries=1 + len(query_variants or []), top_k=top_k
+    ) as sp:
+        return _record_output(sp, _retrieval().search_patents(
+            query_text=query_text,
+            query_variants=query_variants,
+            top_k=top_k,
+            max_claims_per_patent=max_claims_per_patent,
+            exclude_patent_ids=exclude_patent_ids,
+        ))
 
 
 # ---------------------------------------------------------
@@ -225,50 +146,6 @@ def tool_search_patent_with_description(
 # ---------------------------------------------------------
 
 
-def normalize_korean_patent_id(patent_id: str) -> str:
-    """
-    한국 출원번호 입력을 DB에서 사용하는 형식으로 정규화합니다.
-
-    지원 예시:
-    - '1020050108060'          -> '1020050108060'
-    - '10-2005-0108060'        -> '1020050108060'
-    - '10 2005 0108060'        -> '1020050108060'
-    - '10/2005/0108060'        -> '1020050108060'
-
-    기본 규칙:
-    1) 먼저 'NN-YYYY-NNNNNNN' 패턴을 우선적으로 인식해서 13자리로 맞추고,
-    2) 그 외에는 숫자만 남기고, 13자리면 그대로 사용합니다.
-    3) 그 외 길이/형식은 그대로 반환하거나, 필요하면 빈 문자열을 반환해
-       "DB에 없다" 쪽으로 처리되게 할 수 있습니다.
-    """
-    if not patent_id:
-        return ""
-
-    s = patent_id.strip()
-
-    # 1) 정형 패턴: 2자리 + 구분자 + 4자리 + 구분자 + 5~7자리
-    #    예: '10-2005-0108060', '10 2005 108060', '10/2005/108060'
-    m = re.match(r"^\s*(\d{2})\D+(\d{4})\D+(\d{5,7})\s*$", s)
-    if m:
-        kind = m.group(1)  # 10, 20, 30 등
-        year = m.group(2)  # 2005
-        serial = m.group(3)  # 0108060 또는 108060 같은 것
-        # 일단 7자리로 zero-padding (선행 0이 빠졌을 가능성 고려)
-        serial = serial.zfill(7)
-        return f"{kind}{year}{serial}"
-
-    # 2) 그 외에는 숫자만 남긴다
-    digits = re.sub(r"\D", "", s)
-
-    # 13자리면 이미 우리가 쓰는 형식이라고 보고 그대로 사용
-    if len(digits) == 13:
-        return digits
-
-    # 그 외 길이는 애매하므로 그대로 돌려보내거나
-    # 필요하면 추가 규칙(예: 11자리면 앞에 '10' 붙이기 등)을 추가할 수 있다.
-    return digits
-
-
 @tool(args_schema=PatentByIdInput)
 def tool_search_detail_patent_by_id(
     patent_id: str,
@@ -308,152 +185,8 @@ def tool_search_detail_patent_by_id(
       따라서, 출원번호가 실제로 존재하더라도, 이 벡터 DB 안에 없을 수 있습니다.
       그런 경우에는 found=False와 함께, KIPRIS/특허로 등 외부 서비스를 안내해야 합니다.
     """
-    # 1) 입력 출원번호 정규화 (공백 제거 등)
-    original_input = patent_id.strip()
-    normalized_id = normalize_korean_patent_id(original_input)
-
-    # 빈 문자열 방어
-    if not normalized_id:
-        return PatentByIdOutput(
-            patent_id=original_input,
-            found=False,
-            title="",
-            priority="",
-            register="",
-            ipc_raw="",
-            ipc_codes=[],
-            link="",
-            num_claims=0,
-            claims=[],
-        )
-
-    # 2) Chroma get() + where 필터로 메타데이터 기반 조회
-    raw = doc_collection.get(
-        where={"patent_id": normalized_id},
-        include=["metadatas", "documents"],
-    )
-
-    ids = raw.get("ids", [])
-    docs = raw.get("documents", [])
-    metas = raw.get("metadatas", [])
-
-    if not ids:
-        # 이 DB 범위 안에 해당 출원번호가 없는 경우
-        return PatentByIdOutput(
-            patent_id=normalized_id,
-            found=False,
-            title="",
-            priority="",
-            register="",
-            ipc_raw="",
-            ipc_codes=[],
-            link="",
-            num_claims=0,
-            claims=[],
-        )
-
-    # 3) 메타데이터에서 claim_no, title, priority, register, link, ipc 추출해서 정리
-    claim_items = []
-
-    title_candidates = []
-    priority_candidates = []
-    register_candidates = []
-    link_candidates = []
-    ipc_candidates = []
-
-    for doc_text, meta in zip(docs, metas):
-        # claim_no 파싱 (없거나 형식 이상하면 큰 숫자로 처리해서 뒤로 밀기)
-        raw_claim_no = meta.get("claim_no", None)
-        try:
-            claim_no = int(raw_claim_no)
-        except (TypeError, ValueError):
-            claim_no = 999_999
-
-        # 공통 메타데이터 후보 수집
-        title_val = meta.get("title", "")
-        if title_val:
-            title_candidates.append(title_val)
-
-        priority_val = meta.get("priority", "")
-        if priority_val:
-            priority_candidates.append(priority_val)
-
-        register_val = meta.get("register", "")
-        if register_val:
-            register_candidates.append(register_val)
-
-        link_val = meta.get("link", "")
-        if link_val:
-            link_candidates.append(link_val)
-
-        ipc_val = meta.get("ipc", "")
-        if ipc_val:
-            ipc_candidates.append(ipc_val)
-
-        claim_items.append(
-            {
-                "claim_no": claim_no,
-                "text": doc_text or "",
-            }
-        )
-
-    # 4) 대표 메타데이터 선택 함수
-    def pick_first_non_empty(values):
-        for v in values:
-            if isinstance(v, str) and v.strip():
-                return v.strip()
-        return ""
-
-    title_value = pick_first_non_empty(title_candidates)
-    priority_value = pick_first_non_empty(priority_candidates)
-    register_value = pick_first_non_empty(register_candidates)
-    link_value = pick_first_non_empty(link_candidates)
-    ipc_raw_value = pick_first_non_empty(ipc_candidates)
-
-    # 5) IPC 코드 파싱 (쉼표 기준 분리 + 공백 정리)
-    ipc_codes_list: List[str] = []
-    if ipc_raw_value:
-        # 혹시 세미콜론이 섞여 있어도 처리되도록 통일
-        raw_for_split = ipc_raw_value.replace(";", ",")
-        for part in raw_for_split.split(","):
-            code = part.strip()
-            if not code:
-                continue
-            # 여러 공백 정리 (예: "H04M   3/42")
-            code = " ".join(code.split())
-            ipc_codes_list.append(code)
-
-    # 6) claim_no 기준으로 정렬
-    claim_items_sorted = sorted(
-        claim_items,
-        key=lambda x: x["claim_no"],
-    )
-
-    # 7) max_claims 적용 (0이면 전체)
-    if max_claims > 0:
-        claim_items_sorted = claim_items_sorted[:max_claims]
-
-    # 8) Pydantic 모델로 변환
-    claim_models: List[PatentClaimFull] = [
-        PatentClaimFull(
-            claim_no=item["claim_no"],
-            text=item["text"],
-        )
-        for item in claim_items_sorted
-    ]
-
-    return PatentByIdOutput(
-        patent_id=normalized_id,
-        found=True,
-        title=title_value,
-        priority=priority_value,
-        register_status=register_value,
-        ipc_raw=ipc_raw_value,
-        ipc_codes=ipc_codes_list,
-        link=link_value,
-        num_claims=len(claim_models),
-        claims=claim_models,
-    )
+    with _traced_tool("tool_search_detail_patent_by_id", patent_id=patent_id) as sp:
+        return _record_output(sp, _retrieval().get_patent_detail(patent_id=patent_id, max_claims=max_claims))
 
 
 # ---------------------------------------------------------
@@ -495,14 +228,8 @@ def tool_search_ipc_code_with_description(
         - subs : mains 와 의미상 연관된 서브 코드들
         형태로 함께 제공됩니다.
     """
-    result = search_ipc_with_query(
-        ipc_model,
-        ipc_collection,
-        tech_texts,
-        top_k,
-    )
-    # result는 {"mains": [...], "subs": [...]} 형태의 dict라고 가정
-    return IPCMainDescription(**result)
+    with _traced_tool("tool_search_ipc_code_with_description", texts=len(tech_texts), top_k=top_k) as sp:
+        return _record_output(sp, _retrieval().search_ipc_codes(tech_texts=tech_texts, top_k=top_k))
 
 
 # ---------------------------------------------------------
@@ -531,25 +258,5 @@ def tool_search_ipc_description_from_code(codes: List[str]) -> List[IPCDetailInf
         공백이 섞여 있을 수 있으므로, 함수 내부에서
         공백 제거 및 간단한 정규화를 수행합니다.
     """
-    # 1) 코드 문자열 전처리: 공백 제거, 빈 문자열 제거
-    cleaned_codes: List[str] = []
-    for c in codes:
-        if not c:
-            continue
-        normalized = c.strip().replace(" ", "")
-        if normalized:
-            cleaned_codes.append(normalized)
-
-    if not cleaned_codes:
-        # LLM이 잘못 호출한 경우에도 최소한 빈 리스트를 반환
-        return []
-
-    # 2) 기존 함수 호출 (벡터 DB 또는 메타 DB에서 상세 정보 조회)
-    raw_results = get_ipc_detail_data_from_code(ipc_collection, cleaned_codes)
-
-    # 3) 결과를 Pydantic 모델로 감싸서 반환
-    parsed_results: List[IPCDetailInfo] = []
-    for item in raw_results:
-        parsed_results.append(IPCDetailInfo(**item))
-
-    return parsed_results
+    with _traced_tool("tool_search_ipc_description_from_code", codes=len(codes)) as sp:
+        return _record_output(sp, _retrieval().get_ipc_details(codes=codes))
@@ -0,0 +1,215 @@
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+from .metrics import metrics
+
+# =========================================================
+# 요청 단위 span 트리 (느린 답변 하나를 단계별로 분해해서 보기 위함)
+# =========================================================
+# chat_stream_api 요청 → agent_step(에이전트 반복) → llm_call / 도구 → encode·query·score 하위 단계 → DB 쓰기
+# - 현재 span 은 contextvars 로 전달 (LangGraph / ToolNode 는 컨텍스트를 복사해 노드를 실행)
+# - 직접 만든 스레드 풀 작업은 bind() 로 감싸 부모 span 을 넘김
+# - 활성 trace 가 없으면(검색 서버 프로세스, 벤치마크 등) span() 은 아무것도 하지 않음
+
+# ✅ 상수 설정
+TRACE_ENABLED = os.getenv("PAI_TRACE", "1") != "0"
+TRACE_KEEP = int(os.getenv("PAI_TRACE_KEEP", "500"))  # DB 에 남길 최근 요청 trace 수 (링 버퍼)
+TRACE_MAX_SPANS = int(os.getenv("PAI_TRACE_MAX_SPANS", "2000"))  # 요청 하나의 span 상한 (넘으면 버리고 개수만 셈)
+
+_current_span = contextvars.ContextVar("pai_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "started", "ended", "error", "children")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.ended = None
+        self.error = None
+        self.children = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin):
+        ended = self.ended if self.ended is not None else time.perf_counter()
+        node = {
+            "name": self.name,
+            "start_ms": round((self.started - origin) * 1000.0, 3),
+            "duration_ms": round((ended - self.started) * 1000.0, 3),
+        }
+        if self.attrs:
+            node["attrs"] = self.attrs
+        if self.error:
+            node["error"] = self.error
+        if self.children:
+            node["children"] = [child.to_dict(origin) for child in self.children]
+        return node
+
+
+class _NullSpan:
+    # 활성 trace 가 없을 때 쓰는 빈 span (set 호출만 받아줌)
+    def set(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    요청 하나의 span 트리. 여러 스레드(도구 노드, BM25 스레드 풀, 제목 생성)에서 span 이 붙으므로 잠금으로 보호합니다.
+    """
+
+    def __init__(self, name, **attrs):
+        self._lock = threading.Lock()
+        self.root = Span(self, name, attrs)
+        self.step = None  # 열려 있는 agent_step span
+        self.steps = 0
+        self.span_count = 1
+        self.dropped = 0
+
+    def _add(self, parent, name, attrs):
+        with self._lock:
+            if self.span_count >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return None
+            # 루트에 붙을 span 은 진행 중인 에이전트 단계 아래로 (노드마다 컨텍스트가 루트로 복사되므로)
+            if parent is self.root and self.step is not None:
+                parent = self.step
+            span = Span(self, name, attrs)
+            parent.children.append(span)
+            self.span_count += 1
+            return span
+
+    def begin_step(self, **attrs):
+        """
+        에이전트 반복(LLM 호출 + 그 도구 호출들)을 묶는 agent_step span 을 엽니다. (이전 단계는 닫음)
+        """
+        self.end_step()
+        with self._lock:
+            self.steps += 1
+            self.step = Span(self, "agent_step", {"step": self.steps, **attrs})
+            self.root.children.append(self.step)
+            self.span_count += 1
+
+    def end_step(self):
+        with self._lock:
+            if self.step is not None:
+                self.step.ended = time.perf_counter()
+                self.step = None
+
+    @contextlib.contextmanager
+    def activate(self):
+        token = attach(self)
+        try:
+            yield self.root
+        finally:
+            detach(token)
+
+    def finish(self, error=None):
+        self.end_step()
+        self.root.ended = time.perf_counter()
+        if error:
+            self.root.error = error
+
+    @property
+    def duration_ms(self):
+        ended = self.root.ended if self.root.ended is not None else time.perf_counter()
+        return (ended - self.root.started) * 1000.0
+
+    def to_dict(self):
+        with self._lock:
+            tree = self.root.to_dict(self.root.started)
+        if self.dropped:
+            tree.setdefault("attrs", {})["dropped_spans"] = self.dropped
+        return tree
+
+
+def start_trace(name, **attrs):
+    """
+    새 trace 를 만듭니다. (활성화는 attach / activate 로 따로)
+    PAI_TRACE=0 이면 None 을 반환하고, None 은 attach / activate 에서 그대로 무시됩니다.
+    """
+    return Trace(name, **attrs) if TRACE_ENABLED else None
+
+
+def attach(trace):
+    return _current_span.set(trace.root) if trace is not None else None
+
+
+def detach(token):
+    if token is None:
+        return
+    try:
+        _current_span.reset(token)
+    except ValueError:
+        # 스트리밍 응답을 다른 컨텍스트에서 마저 읽은 경우
+        _current_span.set(None)
+
+
+def current_trace():
+    span = _current_span.get()
+    return span.trace if span is not None else None
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    with span("hybrid_vector", queries=3) as sp: ...; sp.set(candidates=len(ids))
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NULL_SPAN
+        return
+    child = parent.trace._add(parent, name, attrs)
+    if child is None:
+        yield NULL_SPAN
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.ended = time.perf_counter()
+        _current_span.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name, **attrs):
+    """
+    파이프라인 단계: /metrics 의 pai_stage_duration_seconds{stage=name} + 현재 trace 의 span
+    """
+    with metrics.stage(name), span(name, **attrs) as sp:
+        yield sp
+
+
+def bind(fn):
+    """
+    스레드 풀에 넘길 함수가 지금의 span 아래에 기록되도록 감쌉니다. (여러 스레드에서 동시에 호출해도 안전)
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+
+    return run
+
+
+def activate(trace):
+    # trace 가 None(PAI_TRACE=0)이어도 with 문에 그대로 쓸 수 있게
+    return trace.activate() if trace is not None else contextlib.nullcontext()
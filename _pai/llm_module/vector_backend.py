@@ -0,0 +1,618 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from .atomic_store import build_store_dir, extend_store_dir, resolve_store_dir, save_npy
+from .collection_versions import VersionFile, version_file_path
+
+from .columnar import JsonColumn, JsonColumnWriter, StringColumn, StringColumnWriter
+from .vector_compress import DEFAULT_RESCORE_FACTOR, CompressedCodes
+
+# ✅ 상수 설정
+DEFAULT_BLOCK_SIZE = 65536  # exact 검색 시 한 번에 행렬곱할 행 수
+DEFAULT_NPROBE = 16  # IVF 검색 시 탐색할 리스트 수
+EXPORT_BATCH_SIZE = 2000  # Chroma → mmap 내보내기 시 배치 크기
+FILTER_FIELDS = ("patent_id", "kind")  # where 필터용으로 별도 컬럼을 만들 메타데이터 필드
+
+# 인덱스 디렉토리 구성 파일
+META_FILE = "meta.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+SQ_NORMS_FILE = "sq_norms.npy"
+IDS_PREFIX = "ids"
+DOCUMENTS_PREFIX = "documents"
+METADATAS_PREFIX = "metadatas"
+FIELD_PREFIX = "field_"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+IVF_ROWS_FILE = "ivf_rows.npy"
+
+CHROMA_DB_FILES = ("chroma.sqlite3", "chroma.sqlite3-wal")  # 쓰기가 있으면 mtime 이 바뀌는 Chroma 파일
+
+QUERY_DEFAULT_INCLUDE = ("metadatas", "documents", "distances")
+GET_DEFAULT_INCLUDE = ("metadatas", "documents")
+
+
+# =========================================================
+# 공통 인터페이스
+# =========================================================
+class VectorBackend:
+    """
+    doc_func / ipc_func 가 사용하는 벡터 저장소 인터페이스.
+    반환 형식은 Chroma 의 query()/get() 결과 dict 와 동일하게 맞춥니다.
+    """
+
+    name = ""
+    metadata = None
+
+    def count(self):
+        raise NotImplementedError
+
+    def content_marker(self):
+        """
+        내용이 바뀌면 달라지는 문자열 (pai:version 이 없을 때 결과 캐시 키에 사용). 모르면 None.
+        """
+        return None
+
+    def query(self, query_embeddings, n_results=10, where=None, include=QUERY_DEFAULT_INCLUDE):
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, include=GET_DEFAULT_INCLUDE, limit=None, offset=None):
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    """
+    기존 chromadb 컬렉션을 그대로 감싸는 구현.
+    version_file(VersionFile)이 있으면 증분 반영 버전을 메타데이터의 pai:version 으로 노출합니다.
+    path(PersistentClient 경로)가 있으면 DB 파일 mtime 을 content_marker 로 사용합니다.
+    """
+
+    def __init__(self, collection, version_file=None, path=None):
+        self.collection = collection
+        self.name = collection.name
+        self.version_file = version_file
+        self.path = path
+
+    def __getattr__(self, name):
+        # add / upsert / delete / modify 등 나머지는 원본 컬렉션으로 위임
+        if name == "collection":
+            raise AttributeError(name)
+        return getattr(self.collection, name)
+
+    @property
+    def metadata(self):
+        metadata = self.collection.metadata
+        version = self.version_file.get(self.name) if self.version_file is not None else None
+        if version is not None:
+            metadata = {**(metadata or {}), "pai:version": version}
+        return metadata
+
+    def count(self):
+        return self.collection.count()
+
+    def content_marker(self):
+        # 재색인/적재는 행 수가 같아도 sqlite(또는 WAL) 파일을 고치므로 mtime 으로 구분 (stat 두 번)
+        if not self.path:
+            return None
+        mtimes = []
+        for name in CHROMA_DB_FILES:
+            try:
+                mtimes.append(os.stat(os.path.join(self.path, name)).st_mtime_ns)
+            except FileNotFoundError:
+                continue
+        return f"{max(mtimes)}" if mtimes else None
+
+    def query(self, query_embeddings, n_results=10, where=None, include=QUERY_DEFAULT_INCLUDE):
+        kwargs = {"include": list(include)}
+        if where:
+            kwargs["where"] = where
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            **kwargs,
+        )
+
+    def get(self, ids=None, where=None, include=GET_DEFAULT_INCLUDE, limit=None, offset=None):
+        kwargs = {"include": list(include)}
+        if ids is not None:
+            kwargs["ids"] = list(ids)
+        if where:
+            kwargs["where"] = where
+        if limit is not None:
+            kwargs["limit"] = limit
+        if offset is not None:
+            kwargs["offset"] = offset
+        return self.collection.get(**kwargs)
+
+
+# =========================================================
+# 메모리 매핑 exact / IVF 구현
+# =========================================================
+def _pairwise_distances(queries, vectors, vector_sq_norms, space):
+    """
+    (m, D) 쿼리와 (n, D) 벡터 사이의 거리 행렬 (m, n).
+    Chroma 의 거리 정의와 동일: l2 = 제곱 거리, cosine = 1 - cos, ip = 1 - dot
+    """
+    dots = queries @ vectors.T
+    if space == "cosine":
+        q_norms = np.sqrt((queries ** 2).sum(axis=1))[:, None]
+        v_norms = np.sqrt(vector_sq_norms)[None, :]
+        return 1.0 - dots / (q_norms * v_norms + 1e-12)
+    if space == "ip":
+        return 1.0 - dots
+    q_sq = (queries ** 2).sum(axis=1)[:, None]
+    return np.maximum(q_sq - 2 * dots + vector_sq_norms[None, :], 0.0)
+
+
+def _merge_top_n(best_dist, best_rows, dist, rows, n):
+    """
+    쿼리별로 (기존 상위 n) + (새 블록) 을 합쳐 다시 상위 n개만 남깁니다.
+    """
+    cand_dist = np.concatenate([best_dist, dist], axis=1)
+    cand_rows = np.concatenate(
+        [best_rows, np.broadcast_to(rows, (dist.shape[0], len(rows)))], axis=1
+    )
+    if cand_dist.shape[1] > n:
+        part = np.argpartition(cand_dist, n - 1, axis=1)[:, :n]
+        cand_dist = np.take_along_axis(cand_dist, part, axis=1)
+        cand_rows = np.take_along_axis(cand_rows, part, axis=1)
+    return cand_dist, cand_rows
+
+
+class MmapBackend(VectorBackend):
+    """
+    임베딩을 메모리 매핑된 float32 행렬(embeddings.npy)로 서빙하는 인프로세스 엔진.
+
+    - 문서/메타데이터는 columnar 사이드카(.bin + offsets)로 두고 필요한 행만 디코딩합니다.
+    - 검색은 블록 단위 행렬곱 exact 검색이 기본이며,
+      build_ivf() 로 IVF 리스트를 만들어 두면 nprobe 개 리스트만 보는 ANN 검색을 사용합니다.
+    - compression 을 지정하면 압축 코드(pca/int8/binary, build_compressed_codes 로 생성)로 1차 검색해
+      n_results * rescore_factor 개 후보만 full 벡터로 재점수화합니다. (IVF 보다 우선)
+    - 여러 워커가 같은 파일을 매핑하므로 OS 페이지 캐시를 공유해 RSS 가 줄어듭니다.
+    """
+
+    def __init__(self, index_dir, nprobe=DEFAULT_NPROBE, block_size=DEFAULT_BLOCK_SIZE, use_ivf=True,
+                 compression=None, rescore_factor=DEFAULT_RESCORE_FACTOR):
+        index_dir = resolve_store_dir(index_dir)  # 다시 내보내는 중에도 한 버전의 파일만 읽도록 링크를 한 번만 풂
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self.block_size = block_size
+        self.rescore_factor = max(1, rescore_factor)
+
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.name = self.meta["name"]
+        self.space = self.meta["space"]
+        self.metadata = dict(self.meta.get("collection_metadata") or {})
+        self.metadata.setdefault("hnsw:space", self.space)
+
+        self.embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        self.sq_norms = np.load(os.path.join(index_dir, SQ_NORMS_FILE), mmap_mode="r")
+        self.ids = StringColumn.load(os.path.join(index_dir, IDS_PREFIX))
+        self.documents = StringColumn.load(os.path.join(index_dir, DOCUMENTS_PREFIX))
+        self.metadatas = JsonColumn.load(os.path.join(index_dir, METADATAS_PREFIX))
+        self.filter_columns = {
+            field: StringColumn.load(os.path.join(index_dir, FIELD_PREFIX + field))
+            for field in self.meta.get("filter_fields", [])
+        }
+
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(self.ids.to_list())}
+        self._value_rows = {}  # field -> {값: row 배열} (where 필터용, 필요할 때 생성)
+
+        self.ivf_centroids = None
+        centroids_path = os.path.join(index_dir, IVF_CENTROIDS_FILE)
+        if use_ivf and os.path.exists(centroids_path):
+            self.ivf_centroids = np.load(centroids_path)
+            self.ivf_centroid_sq_norms = (self.ivf_centroids ** 2).sum(axis=1)
+            self.ivf_offsets = np.load(os.path.join(index_dir, IVF_OFFSETS_FILE), mmap_mode="r")
+            self.ivf_rows = np.load(os.path.join(index_dir, IVF_ROWS_FILE), mmap_mode="r")
+
+        self.codes = CompressedCodes.load(index_dir, compression) if compression else None
+
+    def count(self):
+        return len(self.ids)
+
+    @property
+    def source_version(self):
+        """
+        내보낼 때의 증분 반영 버전(pai:version). 그 뒤의 증분 반영은 이 인덱스에 없음.
+        """
+        return self.metadata.get("pai:version")
+
+    def content_marker(self):
+        # 다시 내보낸 인덱스는 exported_at 이 달라짐
+        return f"{self.meta.get('exported_at', '')}:{self.count()}"
+
+    # ---------------------------------------------------------
+    # where 필터 (Chroma 문법 중 $eq/$ne/$in/$nin/$and/$or 지원)
+    # ---------------------------------------------------------
+    def _value_index(self, field):
+        index = self._value_rows.get(field)
+        if index is None:
+            if field in self.filter_columns:
+                values = self.filter_columns[field].to_list()
+            else:
+                # 별도 컬럼이 없는 필드는 메타데이터를 디코딩 (느린 경로)
+                values = [str(self.metadatas[row].get(field, "")) for row in range(self.count())]
+            groups = {}
+            for row, value in enumerate(values):
+                groups.setdefault(value, []).append(row)
+            index = {value: np.asarray(rows, dtype=np.int64) for value, rows in groups.items()}
+            self._value_rows[field] = index
+        return index
+
+    def _rows_mask(self, field, values):
+        index = self._value_index(field)
+        mask = np.zeros(self.count(), dtype=bool)
+        for value in values:
+            rows = index.get(str(value))
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _where_mask(self, where):
+        if not where:
+            return None
+
+        mask = np.ones(self.count(), dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._where_mask(sub)
+            elif key == "$or":
+                any_mask = np.zeros(self.count(), dtype=bool)
+                for sub in cond:
+                    any_mask |= self._where_mask(sub)
+                mask &= any_mask
+            else:
+                if not isinstance(cond, dict):
+                    cond = {"$eq": cond}
+                for op, value in cond.items():
+                    if op == "$eq":
+                        mask &= self._rows_mask(key, [value])
+                    elif op == "$ne":
+                        mask &= ~self._rows_mask(key, [value])
+                    elif op == "$in":
+                        mask &= self._rows_mask(key, value)
+                    elif op == "$nin":
+                        mask &= ~self._rows_mask(key, value)
+                    else:
+                        raise ValueError(f"지원하지 않는 where 연산자입니다: {op}")
+        return mask
+
+    # ---------------------------------------------------------
+    # 검색
+    # ---------------------------------------------------------
+    def _search_exact(self, queries, n, mask):
+        m = queries.shape[0]
+        best_dist = np.empty((m, 0), dtype=np.float32)
+        best_rows = np.empty((m, 0), dtype=np.int64)
+
+        for start in range(0, self.count(), self.block_size):
+            end = min(start + self.block_size, self.count())
+            dist = _pairwise_distances(
+                queries, self.embeddings[start:end], self.sq_norms[start:end], self.space
+            )
+            if mask is not None:
+                dist[:, ~mask[start:end]] = np.inf
+            best_dist, best_rows = _merge_top_n(
+                best_dist, best_rows, dist, np.arange(start, end), n
+            )
+
+        return best_dist, best_rows
+
+    def _search_ivf(self, queries, n, mask):
+        centroid_dist = _pairwise_distances(
+            queries, self.ivf_centroids, self.ivf_centroid_sq_norms, self.space
+        )
+        nprobe = min(self.nprobe, len(self.ivf_centroids))
+        probes = np.argpartition(centroid_dist, nprobe - 1, axis=1)[:, :nprobe]
+
+        all_dist, all_rows = [], []
+        for qi, lists in enumerate(probes):
+            rows = np.concatenate(
+                [self.ivf_rows[self.ivf_offsets[l]:self.ivf_offsets[l + 1]] for l in lists]
+            )
+            if mask is not None:
+                rows = rows[mask[rows]]
+            rows = np.sort(rows)  # mmap 접근을 순차적으로
+            dist = _pairwise_distances(
+                queries[qi:qi + 1], self.embeddings[rows], self.sq_norms[rows], self.space
+            )[0]
+            if len(rows) > n:
+                part = np.argpartition(dist, n - 1)[:n]
+                rows, dist = rows[part], dist[part]
+            all_dist.append(dist)
+            all_rows.append(rows)
+
+        return all_dist, all_rows
+
+    def _search_compressed(self, queries, n, mask):
+        """
+        1차: 압축 코드로 n * rescore_factor 개 후보 선별
+        2차: 후보만 full 벡터로 정확한 거리 재계산 후 상위 n개
+        """
+        m = queries.shape[0]
+        shortlist_n = min(n * self.rescore_factor, self.count())
+        prepared = self.codes.prepare_queries(queries)
+        best_dist = np.empty((m, 0), dtype=np.float32)
+        best_rows = np.empty((m, 0), dtype=np.int64)
+
+        for start in range(0, self.count(), self.block_size):
+            end = min(start + self.block_size, self.count())
+            dist = np.asarray(self.codes.block_distances(prepared, start, end), dtype=np.float32)
+            if mask is not None:
+                dist[:, ~mask[start:end]] = np.inf
+            best_dist, best_rows = _merge_top_n(
+                best_dist, best_rows, dist, np.arange(start, end), shortlist_n
+            )
+
+        all_dist, all_rows = [], []
+        for qi in range(m):
+            rows = np.sort(best_rows[qi][np.isfinite(best_dist[qi])])  # mmap 접근을 순차적으로
+            dist = _pairwise_distances(
+                queries[qi:qi + 1], self.embeddings[rows], self.sq_norms[rows], self.space
+            )[0]
+            if len(rows) > n:
+                part = np.argpartition(dist, n - 1)[:n]
+                rows, dist = rows[part], dist[part]
+            all_dist.append(dist)
+            all_rows.append(rows)
+
+        return all_dist, all_rows
+
+    def _rows_result(self, rows, include, distances=None):
+        result = {"ids": self.ids.take(rows)}
+        if "documents" in include:
+            result["documents"] = self.documents.take(rows)
+        if "metadatas" in include:
+            result["metadatas"] = self.metadatas.take(rows)
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self.embeddings[np.asarray(rows, dtype=np.int64)])
+        if distances is not None:
+            result["distances"] = [float(d) for d in distances]
+        return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=QUERY_DEFAULT_INCLUDE):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        mask = self._where_mask(where)
+        n = max(1, min(n_results, self.count()))
+
+        if self.codes is not None:
+            dist_rows = zip(*self._search_compressed(queries, n, mask))
+        elif self.ivf_centroids is not None:
+            dist_rows = zip(*self._search_ivf(queries, n, mask))
+        else:
+            best_dist, best_rows = self._search_exact(queries, n, mask)
+            dist_rows = zip(best_dist, best_rows)
+
+        output = {key: [] for key in ("ids", *include)}
+        for dist, rows in dist_rows:
+            order = np.argsort(dist, kind="stable")
+            dist, rows = dist[order], rows[order]
+            valid = np.isfinite(dist)
+            row_result = self._rows_result(
+                rows[valid],
+                include,
+                distances=dist[valid] if "distances" in include else None,
+            )
+            for key in output:
+                output[key].append(row_result.get(key, []))
+        return output
+
+    def get(self, ids=None, where=None, include=GET_DEFAULT_INCLUDE, limit=None, offset=None):
+        if ids is not None:
+            rows = np.asarray(
+                [self.id_to_row[i] for i in ids if i in self.id_to_row], dtype=np.int64
+            )
+        else:
+            rows = np.arange(self.count())
+
+        mask = self._where_mask(where)
+        if mask is not None:
+            rows = rows[mask[rows]]
+
+        start = offset or 0
+        end = start + limit if limit is not None else None
+        return self._rows_result(rows[start:end], include)
+
+
+# =========================================================
+# Chroma → mmap 내보내기 / IVF 빌드
+# =========================================================
+def export_chroma_collection(collection, out_dir, batch_size=EXPORT_BATCH_SIZE,
+                             filter_fields=FILTER_FIELDS, strip_fields=(), log=print):
+    """
+    Chroma 컬렉션의 임베딩/문서/메타데이터를 MmapBackend 형식으로 내보냅니다.
+    strip_fields 에 지정한 메타데이터 필드는 청구항별로 저장하지 않습니다.
+    (특허 단위 값은 PatentMetaStore 에 한 번만 두고 조회 시 보강)
+    파일은 형제 임시 디렉토리에 쓴 뒤 out_dir 로 원자적으로 교체합니다. (atomic_store.build_store_dir)
+    서빙 중인 워커가 매핑한 이전 파일은 그대로 남고, 이전 IVF / 압축 코드는 새 버전에 따라오지 않습니다.
+    """
+    started = time.time()
+    with build_store_dir(out_dir) as build_dir:
+        meta = _export_files(collection, build_dir, batch_size, filter_fields, strip_fields, log, started)
+    log(f"[export] 완료: {meta['count']}개, dim={meta['dim']} ({time.time() - started:.1f}s)")
+    return meta
+
+
+def _export_files(collection, out_dir, batch_size, filter_fields, strip_fields, log, started):
+    total = collection.count()
+    ids_writer = StringColumnWriter(os.path.join(out_dir, IDS_PREFIX))
+    docs_writer = StringColumnWriter(os.path.join(out_dir, DOCUMENTS_PREFIX))
+    metas_writer = JsonColumnWriter(os.path.join(out_dir, METADATAS_PREFIX))
+    field_writers = {
+        field: StringColumnWriter(os.path.join(out_dir, FIELD_PREFIX + field))
+        for field in filter_fields
+    }
+
+    embeddings = None
+    offset = 0
+    while offset < total:
+        batch = collection.get(
+            include=["documents", "metadatas", "embeddings"],
+            limit=batch_size,
+            offset=offset,
+        )
+        ids = batch.get("ids", [])
+        if not ids:
+            break
+
+        vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.lib.format.open_memmap(
+                os.path.join(out_dir, EMBEDDINGS_FILE),
+                mode="w+",
+                dtype=np.float32,
+                shape=(total, vectors.shape[1]),
+            )
+        embeddings[offset:offset + len(ids)] = vectors
+
+        metas = [meta or {} for meta in batch["metadatas"]]
+        ids_writer.extend(ids)
+        docs_writer.extend(batch["documents"])
+        metas_writer.extend(
+            {k: v for k, v in meta.items() if k not in strip_fields} for meta in metas
+        )
+        for field, writer in field_writers.items():
+            writer.extend(str(meta.get(field, "")) for meta in metas)
+
+        offset += len(ids)
+        log(f"[export] {offset}/{total} ({time.time() - started:.1f}s)")
+
+    for writer in [ids_writer, docs_writer, metas_writer, *field_writers.values()]:
+        writer.close()
+
+    if offset != total or embeddings is None:
+        raise RuntimeError(f"내보내기 중 컬렉션 크기가 달라졌습니다: {offset}/{total}")
+
+    embeddings.flush()
+    sq_norms = np.empty(total, dtype=np.float32)
+    for start in range(0, total, DEFAULT_BLOCK_SIZE):
+        block = np.asarray(embeddings[start:start + DEFAULT_BLOCK_SIZE], dtype=np.float32)
+        sq_norms[start:start + len(block)] = (block ** 2).sum(axis=1)
+    np.save(os.path.join(out_dir, SQ_NORMS_FILE), sq_norms)
+
+    collection_metadata = dict(collection.metadata or {})
+    meta = {
+        "name": collection.name,
+        "count": total,
+        "dim": int(embeddings.shape[1]),
+        "space": collection_metadata.get("hnsw:space", "l2"),
+        "filter_fields": list(filter_fields),
+        "stripped_fields": list(strip_fields),
+        "collection_metadata": collection_metadata,
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def build_ivf(index_dir, n_lists, iterations=10, sample_size=100_000, seed=0, log=print):
+    """
+    MmapBackend 디렉토리에 IVF(k-means 코스 양자화) 리스트를 추가합니다.
+    cosine 공간이면 정규화된 벡터로 군집화합니다.
+    기존 파일을 하드 링크한 새 버전 디렉토리에 써서 원자적으로 게시합니다. (atomic_store.extend_store_dir)
+    """
+    started = time.time()
+    with extend_store_dir(index_dir) as build_dir:
+        n_lists = _write_ivf(build_dir, n_lists, iterations, sample_size, seed, log)
+    log(f"[ivf] 완료: 리스트 {n_lists}개 ({time.time() - started:.1f}s)")
+
+
+def _write_ivf(index_dir, n_lists, iterations, sample_size, seed, log):
+    with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+
+    embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    total = embeddings.shape[0]
+    n_lists = max(1, min(n_lists, total))
+    rng = np.random.default_rng(seed)
+
+    def prepare(block):
+        block = np.asarray(block, dtype=np.float32)
+        if meta["space"] == "cosine":
+            block = block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-12)
+        return block
+
+    def assign(block, centroids):
+        c_sq = (centroids ** 2).sum(axis=1)
+        return _pairwise_distances(block, centroids, c_sq, "l2").argmin(axis=1)
+
+    # 1. 샘플로 k-means
+    sample_rows = np.sort(rng.choice(total, size=min(sample_size, total), replace=False))
+    sample = prepare(embeddings[sample_rows])
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+    for it in range(iterations):
+        labels = assign(sample, centroids)
+        counts = np.bincount(labels, minlength=n_lists)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty][:, None]
+        # 빈 리스트는 임의 샘플로 다시 시드
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+        log(f"[ivf] k-means {it + 1}/{iterations} (빈 리스트 {len(empty)}개)")
+
+    # 2. 전체 행을 가장 가까운 리스트에 배정
+    labels = np.empty(total, dtype=np.int64)
+    for start in range(0, total, DEFAULT_BLOCK_SIZE):
+        block = prepare(embeddings[start:start + DEFAULT_BLOCK_SIZE])
+        labels[start:start + len(block)] = assign(block, centroids)
+
+    rows = np.argsort(labels, kind="stable").astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=n_lists)))).astype(np.int64)
+
+    # 다시 만드는 경우 기존 파일은 이전 버전과 inode 를 공유하므로 그 자리에서 덮어쓰지 않음
+    save_npy(os.path.join(index_dir, IVF_CENTROIDS_FILE), centroids)
+    save_npy(os.path.join(index_dir, IVF_OFFSETS_FILE), offsets)
+    save_npy(os.path.join(index_dir, IVF_ROWS_FILE), rows)
+    return n_lists
+
+
+def detach_chroma_system(chroma_path):
+    """
+    chroma_path 의 공유 Chroma System 을 프로세스 캐시에서 떼어 내, 다음 PersistentClient 가
+    새 System(다른 프로세스의 쓰기가 반영된 HNSW 세그먼트)을 열게 합니다.
+    SharedSystemClient.clear_system_cache() 와 달리 기존 System 을 멈추지 않으므로 이미 핸들을 받아
+    질의 중인 스레드는 그대로 끝나고, 기존 System 은 마지막 참조가 사라지면 GC 로 정리됩니다.
+    떼어 낸 System 이 있으면 True.
+    """
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return False
+    systems = getattr(SharedSystemClient, "_identifier_to_system", None)
+    if not isinstance(systems, dict):
+        return False
+    return systems.pop(chroma_path, None) is not None
+
+
+def open_vector_backend(kind, chroma_path, collection_name, mmap_path=None, **mmap_options):
+    """
+    VECTOR_BACKEND 설정값에 따라 백엔드를 엽니다.
+    mmap 이 요청됐지만 디렉토리가 없으면 경고 후 Chroma 로 대체합니다.
+    """
+    if kind == "mmap":
+        if mmap_path and os.path.exists(os.path.join(mmap_path, META_FILE)):
+            return MmapBackend(mmap_path, **mmap_options)
+        print(f"⚠️ 경고: mmap 인덱스를 찾을 수 없어 Chroma 를 사용합니다: {mmap_path}")
+
+    import chromadb
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    return ChromaBackend(
+        client.get_collection(name=collection_name),
+        version_file=VersionFile(version_file_path(chroma_path)),
+        path=chroma_path,
+    )
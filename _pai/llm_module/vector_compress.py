@@ -0,0 +1,185 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from .atomic_store import extend_store_dir, replacing, resolve_store_dir
+
+# ✅ 상수 설정
+COMPRESSION_METHODS = ("pca", "int8", "binary")
+DEFAULT_PCA_DIM = 256  # PCA 축소 차원
+DEFAULT_RESCORE_FACTOR = 4  # 1차(압축) 검색에서 n_results * factor 개를 뽑아 full 벡터로 재점수화
+PCA_SAMPLE_SIZE = 100_000  # PCA 학습에 사용할 샘플 수
+CODE_BLOCK_SIZE = 65536
+
+CODES_META_FILE = "codes_{method}.json"
+CODES_FILE = "codes_{method}.npy"
+CODES_PARAMS_FILE = "codes_{method}_params.npz"
+
+# 바이트별 1의 개수 (binary 코드 해밍 거리 계산용)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def _prepare(vectors, space):
+    """
+    압축 전처리: cosine 공간이면 L2 정규화 (이후 l2 근사가 cosine 순위와 일치)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if space == "cosine":
+        vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+    return vectors
+
+
+class CompressedCodes:
+    """
+    MmapBackend 의 1차(후보 생성) 검색용 압축 코드.
+
+    - pca   : 평균 제거 후 상위 주성분으로 사영 (float32, d 차원)
+              ip 공간은 q·x = (q-μ)·(x-μ) + x·μ + (쿼리 상수) 이므로 행별 x·μ(mean_dots)를 더해 순위를 맞춤
+    - int8  : 차원별 대칭 스칼라 양자화 (x ≈ code * scale)
+    - binary: 평균 제거 후 부호 비트 (8차원당 1바이트), 해밍 거리
+    block_distances() 는 작을수록 가까운 근사 거리를 반환하며, 최종 순위는 full 벡터 재점수화로 결정합니다.
+    """
+
+    def __init__(self, method, space, codes, params):
+        self.method = method
+        self.space = space
+        self.codes = codes
+        self.params = params
+
+    @classmethod
+    def load(cls, index_dir, method):
+        index_dir = resolve_store_dir(index_dir)
+        with open(os.path.join(index_dir, CODES_META_FILE.format(method=method)), encoding="utf-8") as f:
+            meta = json.load(f)
+        codes = np.load(os.path.join(index_dir, CODES_FILE.format(method=method)), mmap_mode="r")
+        params = dict(np.load(os.path.join(index_dir, CODES_PARAMS_FILE.format(method=method))))
+        if method == "pca" and meta["space"] == "ip" and "mean_dots" not in params:
+            raise ValueError("ip 공간 pca 코드에 mean_dots 가 없습니다. compress_vector_backend 로 다시 만들어 주세요.")
+        return cls(method, meta["space"], codes, params)
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes)
+
+    def prepare_queries(self, queries):
+        q = _prepare(queries, self.space)
+        if self.method == "pca":
+            return (q - self.params["mean"]) @ self.params["components"]
+        if self.method == "int8":
+            return q
+        return np.packbits(q - self.params["mean"] > 0, axis=1)
+
+    def block_distances(self, prepared, start, end):
+        block = np.asarray(self.codes[start:end])
+
+        if self.method == "pca":
+            if self.space == "ip":
+                return -(prepared @ block.T + self.params["mean_dots"][start:end][None, :])
+            q_sq = (prepared ** 2).sum(axis=1)[:, None]
+            b_sq = self.params["sq_norms"][start:end][None, :]
+            return q_sq - 2 * prepared @ block.T + b_sq
+
+        if self.method == "int8":
+            # q·x ≈ (q * scale)·code
+            dots = (prepared * self.params["scale"]) @ block.astype(np.float32).T
+            if self.space == "ip":
+                return -dots
+            return self.params["sq_norms"][start:end][None, :] - 2 * dots
+
+        # binary: 해밍 거리
+        xor = np.bitwise_xor(prepared[:, None, :], block[None, :, :])
+        return _POPCOUNT[xor].sum(axis=2).astype(np.float32)
+
+
+# =========================================================
+# 코드 생성
+# =========================================================
+def build_compressed_codes(index_dir, method, pca_dim=DEFAULT_PCA_DIM,
+                           sample_size=PCA_SAMPLE_SIZE, seed=0, log=print):
+    """
+    MmapBackend 디렉토리의 embeddings.npy 로부터 압축 코드를 만들어 같은 디렉토리에 저장합니다.
+    기존 파일을 하드 링크한 새 버전 디렉토리에 써서 원자적으로 게시합니다. (atomic_store.extend_store_dir)
+    """
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"지원하지 않는 압축 방식입니다: {method}")
+
+    started = time.time()
+    with extend_store_dir(index_dir) as build_dir:
+        meta = _write_compressed_codes(build_dir, method, pca_dim, sample_size, seed)
+
+    log(
+        f"[compress] {method}: {meta['full_bytes'] / 2**20:.1f}MiB → "
+        f"{meta['code_bytes'] / 2**20:.1f}MiB ({time.time() - started:.1f}s)"
+    )
+    return meta
+
+
+def _write_compressed_codes(index_dir, method, pca_dim, sample_size, seed):
+    with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+        space = json.load(f)["space"]
+
+    embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+    total, dim = embeddings.shape
+    rng = np.random.default_rng(seed)
+    sample_rows = np.sort(rng.choice(total, size=min(sample_size, total), replace=False))
+    sample = _prepare(embeddings[sample_rows], space)
+
+    # 1. 파라미터 학습 (샘플 기준)
+    params = {}
+    if method == "pca":
+        mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        out_dim = min(pca_dim, vt.shape[0])
+        params = {"mean": mean, "components": vt[:out_dim].T.astype(np.float32)}
+        code_shape, code_dtype = (total, out_dim), np.float32
+    elif method == "int8":
+        params = {"scale": (np.abs(sample).max(axis=0) / 127.0 + 1e-12).astype(np.float32)}
+        code_shape, code_dtype = (total, dim), np.int8
+    else:
+        params = {"mean": sample.mean(axis=0)}
+        code_shape, code_dtype = (total, (dim + 7) // 8), np.uint8
+
+    # 2. 전체 행 인코딩 (블록 단위 스트리밍)
+    sq_norms = np.empty(total, dtype=np.float32)
+    mean_dots = np.empty(total, dtype=np.float32)
+    with replacing(os.path.join(index_dir, CODES_FILE.format(method=method))) as tmp_path:
+        codes = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=code_dtype, shape=code_shape)
+        for start in range(0, total, CODE_BLOCK_SIZE):
+            block = _prepare(embeddings[start:start + CODE_BLOCK_SIZE], space)
+            end = start + len(block)
+            if method == "pca":
+                projected = (block - params["mean"]) @ params["components"]
+                codes[start:end] = projected
+                sq_norms[start:end] = (projected ** 2).sum(axis=1)
+                mean_dots[start:end] = block @ params["mean"]
+            elif method == "int8":
+                codes[start:end] = np.clip(np.rint(block / params["scale"]), -127, 127)
+                sq_norms[start:end] = (block ** 2).sum(axis=1)
+            else:
+                codes[start:end] = np.packbits(block - params["mean"] > 0, axis=1)
+        codes.flush()
+
+    if method in ("pca", "int8"):
+        params["sq_norms"] = sq_norms
+    if method == "pca":
+        params["mean_dots"] = mean_dots
+
+    with replacing(os.path.join(index_dir, CODES_PARAMS_FILE.format(method=method))) as tmp_path:
+        with open(tmp_path, "wb") as f:  # 파일 객체로 넘겨야 np.savez 가 .npz 를 덧붙이지 않음
+            np.savez(f, **params)
+    meta = {
+        "method": method,
+        "space": space,
+        "count": int(total),
+        "dim": int(dim),
+        "code_shape": list(code_shape),
+        "code_bytes": int(codes.nbytes),
+        "full_bytes": int(embeddings.nbytes),
+        "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with replacing(os.path.join(index_dir, CODES_META_FILE.format(method=method))) as tmp_path:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta